@@ -103,7 +103,7 @@ export const projectsApi = {
       throw new Error('Project ID is required to fetch project content');
     }
     console.log(`Fetching full project data for project ${id}`);
-    return apiRequest(`/projects/${id}`)
+    return apiRequest(`/projects/${id}?include_content=true`)
       .then(result => {
         console.log(`Fetched complete project data for project ${id}`);
         
@@ -360,6 +360,21 @@ export const documentsApi = {
         return result;
       });
   },
+
+  /**
+   * Get a slice of a document's content by character offsets
+   * @param {number|string} documentId - Document ID
+   * @param {number} start - First character (inclusive)
+   * @param {number} [end] - Last character (exclusive); follow next_start for the rest
+   */
+  getDocumentContent: (documentId, start = 0, end) => {
+    if (!documentId) {
+      throw new Error('Document ID is required to fetch document content');
+    }
+    const params = new URLSearchParams({ start });
+    if (end !== undefined) params.append('end', end);
+    return apiRequest(`/documents/${documentId}/content?${params.toString()}`);
+  },
   
   /**
    * Update a document
@@ -18,7 +18,7 @@ export const GlobalStateProvider = ({ children }) => {
     
     try {
       console.log(`[GlobalState] Fetching project data for project ${projectId}`);
-      const response = await apiRequest(`/projects/${projectId}`);
+      const response = await apiRequest(`/projects/${projectId}?include_content=true`);
       
       // Store the response in the global state
       setProjectResponses(prev => ({
@@ -0,0 +1,38 @@
+"""Add documents.content_length and store content uncompressed for ranged reads
+
+Revision ID: a7d2e9f41c63
+Revises: f3a6c1d8b92e
+Create Date: 2025-08-13 10:27:09.334871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d2e9f41c63'
+down_revision: Union[str, None] = 'f3a6c1d8b92e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('documents', sa.Column(
+        'content_length', sa.Integer(), nullable=True))
+    op.execute("UPDATE documents SET content_length = length(content) WHERE content IS NOT NULL")
+
+    if op.get_bind().dialect.name == 'postgresql':
+        # Out-of-line but uncompressed TOAST storage lets substr() fetch only the
+        # chunks a range needs instead of decompressing the whole transcript.
+        # Applies to values written from now on.
+        op.execute("ALTER TABLE documents ALTER COLUMN content SET STORAGE EXTERNAL")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("ALTER TABLE documents ALTER COLUMN content SET STORAGE EXTENDED")
+    op.drop_column('documents', 'content_length')
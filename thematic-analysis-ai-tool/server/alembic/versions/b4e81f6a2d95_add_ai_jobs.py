@@ -0,0 +1,74 @@
+"""Add ai_jobs and ai_job_events
+
+Revision ID: b4e81f6a2d95
+Revises: a7d2e9f41c63
+Create Date: 2025-08-15 09:41:52.118604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4e81f6a2d95'
+down_revision: Union[str, None] = 'a7d2e9f41c63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('ai_jobs',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('user_id', sa.Integer(), nullable=False),
+                    sa.Column('kind', sa.String(length=30), nullable=False),
+                    sa.Column('params', sa.JSON(), nullable=False),
+                    sa.Column('status', sa.String(length=20), nullable=False),
+                    sa.Column('stage', sa.String(length=30), nullable=False),
+                    sa.Column('chunks_total', sa.Integer(), nullable=False),
+                    sa.Column('chunks_done', sa.Integer(), nullable=False),
+                    sa.Column('chunks_failed', sa.Integer(), nullable=False),
+                    sa.Column('result', sa.JSON(), nullable=True),
+                    sa.Column('error', sa.Text(), nullable=True),
+                    sa.Column('locked_at', sa.DateTime(), nullable=True),
+                    sa.Column('started_at', sa.DateTime(), nullable=True),
+                    sa.Column('completed_at', sa.DateTime(), nullable=True),
+                    sa.Column('created_at', sa.DateTime(), nullable=False),
+                    sa.Column('updated_at', sa.DateTime(), nullable=False),
+                    sa.ForeignKeyConstraint(
+                        ['user_id'], ['users.id'], ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    op.create_index(op.f('ix_ai_jobs_id'), 'ai_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_ai_jobs_user_id'),
+                    'ai_jobs', ['user_id'], unique=False)
+    op.create_index(op.f('ix_ai_jobs_status'),
+                    'ai_jobs', ['status'], unique=False)
+
+    op.create_table('ai_job_events',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('job_id', sa.Integer(), nullable=False),
+                    sa.Column('event', sa.String(length=30), nullable=False),
+                    sa.Column('data', sa.JSON(), nullable=True),
+                    sa.Column('created_at', sa.DateTime(), nullable=False),
+                    sa.ForeignKeyConstraint(
+                        ['job_id'], ['ai_jobs.id'], ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    op.create_index(op.f('ix_ai_job_events_id'),
+                    'ai_job_events', ['id'], unique=False)
+    op.create_index(op.f('ix_ai_job_events_job_id'),
+                    'ai_job_events', ['job_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_ai_job_events_job_id'), table_name='ai_job_events')
+    op.drop_index(op.f('ix_ai_job_events_id'), table_name='ai_job_events')
+    op.drop_table('ai_job_events')
+    op.drop_index(op.f('ix_ai_jobs_status'), table_name='ai_jobs')
+    op.drop_index(op.f('ix_ai_jobs_user_id'), table_name='ai_jobs')
+    op.drop_index(op.f('ix_ai_jobs_id'), table_name='ai_jobs')
+    op.drop_table('ai_jobs')
@@ -0,0 +1,33 @@
+"""Add extraction_version and file_hash index to documents
+
+Revision ID: c4a7e2d91b30
+Revises: 5007fd6340e6
+Create Date: 2025-08-04 10:12:41.503118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a7e2d91b30'
+down_revision: Union[str, None] = '5007fd6340e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing rows keep a NULL version and are never reused by the extraction cache
+    op.add_column('documents', sa.Column(
+        'extraction_version', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_documents_file_hash'),
+                    'documents', ['file_hash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_documents_file_hash'), table_name='documents')
+    op.drop_column('documents', 'extraction_version')
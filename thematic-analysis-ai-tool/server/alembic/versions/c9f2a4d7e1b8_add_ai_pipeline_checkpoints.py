@@ -0,0 +1,48 @@
+"""Add ai_pipeline_checkpoints
+
+Revision ID: c9f2a4d7e1b8
+Revises: b4e81f6a2d95
+Create Date: 2025-08-18 14:06:27.503419
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9f2a4d7e1b8'
+down_revision: Union[str, None] = 'b4e81f6a2d95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('ai_pipeline_checkpoints',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('job_id', sa.Integer(), nullable=False),
+                    sa.Column('stage', sa.String(length=30), nullable=False),
+                    sa.Column('key', sa.String(length=64), nullable=False),
+                    sa.Column('data', sa.JSON(), nullable=True),
+                    sa.Column('created_at', sa.DateTime(), nullable=False),
+                    sa.ForeignKeyConstraint(
+                        ['job_id'], ['ai_jobs.id'], ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('id'),
+                    sa.UniqueConstraint('job_id', 'stage', 'key',
+                                        name='uq_ai_pipeline_checkpoint')
+                    )
+    op.create_index(op.f('ix_ai_pipeline_checkpoints_id'),
+                    'ai_pipeline_checkpoints', ['id'], unique=False)
+    op.create_index(op.f('ix_ai_pipeline_checkpoints_job_id'),
+                    'ai_pipeline_checkpoints', ['job_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_ai_pipeline_checkpoints_job_id'),
+                  table_name='ai_pipeline_checkpoints')
+    op.drop_index(op.f('ix_ai_pipeline_checkpoints_id'),
+                  table_name='ai_pipeline_checkpoints')
+    op.drop_table('ai_pipeline_checkpoints')
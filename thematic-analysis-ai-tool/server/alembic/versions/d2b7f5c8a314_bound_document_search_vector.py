@@ -0,0 +1,46 @@
+"""Index only a bounded prefix of document content for search
+
+Revision ID: d2b7f5c8a314
+Revises: c9f2a4d7e1b8
+Create Date: 2025-08-19 10:21:44.106382
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2b7f5c8a314'
+down_revision: Union[str, None] = 'c9f2a4d7e1b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _set_search_vector(content: str) -> None:
+    # A generated column's expression cannot be altered; drop it and add it back
+    op.execute("DROP INDEX IF EXISTS ix_documents_search_vector")
+    op.execute("ALTER TABLE documents DROP COLUMN IF EXISTS search_vector")
+    op.execute(f"""
+        ALTER TABLE documents ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('english', {content}), 'B')
+        ) STORED
+    """)
+    op.execute(
+        "CREATE INDEX ix_documents_search_vector ON documents USING gin (search_vector)")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # PostgreSQL rejects a tsvector over 1MB, so storing a very large document failed.
+    # SQLite's FTS5 index has no such limit and is left as it is.
+    if op.get_bind().dialect.name == 'postgresql':
+        _set_search_vector("left(coalesce(content, ''), 250000)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        _set_search_vector("coalesce(content, '')")
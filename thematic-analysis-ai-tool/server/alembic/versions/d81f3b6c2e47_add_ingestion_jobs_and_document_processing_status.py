@@ -0,0 +1,65 @@
+"""Add ingestion_jobs and document processing status
+
+Revision ID: d81f3b6c2e47
+Revises: c4a7e2d91b30
+Create Date: 2025-08-06 14:27:09.771254
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd81f3b6c2e47'
+down_revision: Union[str, None] = 'c4a7e2d91b30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing documents were processed synchronously
+    op.add_column('documents', sa.Column(
+        'processing_status', sa.String(length=20), nullable=True))
+    op.execute("UPDATE documents SET processing_status = 'completed'")
+    op.alter_column('documents', 'processing_status', nullable=False)
+    op.add_column('documents', sa.Column(
+        'processing_error', sa.Text(), nullable=True))
+
+    op.create_table('ingestion_jobs',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('document_id', sa.Integer(), nullable=False),
+                    sa.Column('status', sa.String(length=20), nullable=False),
+                    sa.Column('attempts', sa.Integer(), nullable=False),
+                    sa.Column('max_attempts', sa.Integer(), nullable=False),
+                    sa.Column('last_error', sa.Text(), nullable=True),
+                    sa.Column('spool_path', sa.String(), nullable=False),
+                    sa.Column('filename', sa.String(), nullable=False),
+                    sa.Column('available_at', sa.DateTime(), nullable=False),
+                    sa.Column('locked_at', sa.DateTime(), nullable=True),
+                    sa.Column('completed_at', sa.DateTime(), nullable=True),
+                    sa.Column('created_at', sa.DateTime(), nullable=False),
+                    sa.Column('updated_at', sa.DateTime(), nullable=False),
+                    sa.ForeignKeyConstraint(
+                        ['document_id'], ['documents.id'], ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    op.create_index(op.f('ix_ingestion_jobs_id'),
+                    'ingestion_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_ingestion_jobs_document_id'),
+                    'ingestion_jobs', ['document_id'], unique=False)
+    op.create_index(op.f('ix_ingestion_jobs_status'),
+                    'ingestion_jobs', ['status'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_ingestion_jobs_status'), table_name='ingestion_jobs')
+    op.drop_index(op.f('ix_ingestion_jobs_document_id'),
+                  table_name='ingestion_jobs')
+    op.drop_index(op.f('ix_ingestion_jobs_id'), table_name='ingestion_jobs')
+    op.drop_table('ingestion_jobs')
+    op.drop_column('documents', 'processing_error')
+    op.drop_column('documents', 'processing_status')
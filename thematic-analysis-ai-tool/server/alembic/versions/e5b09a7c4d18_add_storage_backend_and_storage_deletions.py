@@ -0,0 +1,50 @@
+"""Add documents.storage_backend and the storage_deletions outbox
+
+Revision ID: e5b09a7c4d18
+Revises: d81f3b6c2e47
+Create Date: 2025-08-08 09:41:55.120387
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b09a7c4d18'
+down_revision: Union[str, None] = 'd81f3b6c2e47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # NULL for existing rows, which are all stored on Cloudinary
+    op.add_column('documents', sa.Column(
+        'storage_backend', sa.String(length=20), nullable=True))
+
+    op.create_table('storage_deletions',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('object_key', sa.String(), nullable=False),
+                    sa.Column('backend', sa.String(length=20), nullable=False),
+                    sa.Column('attempts', sa.Integer(), nullable=False),
+                    sa.Column('last_error', sa.Text(), nullable=True),
+                    sa.Column('available_at', sa.DateTime(), nullable=False),
+                    sa.Column('created_at', sa.DateTime(), nullable=False),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    op.create_index(op.f('ix_storage_deletions_id'),
+                    'storage_deletions', ['id'], unique=False)
+    op.create_index(op.f('ix_storage_deletions_available_at'),
+                    'storage_deletions', ['available_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_storage_deletions_available_at'),
+                  table_name='storage_deletions')
+    op.drop_index(op.f('ix_storage_deletions_id'),
+                  table_name='storage_deletions')
+    op.drop_table('storage_deletions')
+    op.drop_column('documents', 'storage_backend')
@@ -0,0 +1,53 @@
+"""Add ai_coded_chunks
+
+Revision ID: e8c3b1f5a927
+Revises: d2b7f5c8a314
+Create Date: 2025-08-20 09:42:13.218604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8c3b1f5a927'
+down_revision: Union[str, None] = 'd2b7f5c8a314'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('ai_coded_chunks',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('codebook_id', sa.Integer(), nullable=False),
+                    sa.Column('document_id', sa.Integer(), nullable=False),
+                    sa.Column('chunk_key', sa.String(length=64), nullable=False),
+                    sa.Column('created_at', sa.DateTime(), nullable=False),
+                    sa.ForeignKeyConstraint(
+                        ['codebook_id'], ['codebooks.id'], ondelete='CASCADE'),
+                    sa.ForeignKeyConstraint(
+                        ['document_id'], ['documents.id'], ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('id'),
+                    sa.UniqueConstraint('codebook_id', 'document_id', 'chunk_key',
+                                        name='uq_ai_coded_chunk')
+                    )
+    op.create_index(op.f('ix_ai_coded_chunks_id'),
+                    'ai_coded_chunks', ['id'], unique=False)
+    op.create_index(op.f('ix_ai_coded_chunks_codebook_id'),
+                    'ai_coded_chunks', ['codebook_id'], unique=False)
+    op.create_index(op.f('ix_ai_coded_chunks_document_id'),
+                    'ai_coded_chunks', ['document_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_ai_coded_chunks_document_id'),
+                  table_name='ai_coded_chunks')
+    op.drop_index(op.f('ix_ai_coded_chunks_codebook_id'),
+                  table_name='ai_coded_chunks')
+    op.drop_index(op.f('ix_ai_coded_chunks_id'),
+                  table_name='ai_coded_chunks')
+    op.drop_table('ai_coded_chunks')
@@ -0,0 +1,52 @@
+"""Add document_chunks
+
+Revision ID: f1d4a8c2b6e3
+Revises: e8c3b1f5a927
+Create Date: 2025-08-21 11:08:52.664271
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1d4a8c2b6e3'
+down_revision: Union[str, None] = 'e8c3b1f5a927'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('document_chunks',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('document_id', sa.Integer(), nullable=False),
+                    sa.Column('chunk_size', sa.Integer(), nullable=False),
+                    sa.Column('chunk_overlap', sa.Integer(), nullable=False),
+                    sa.Column('chunk_index', sa.Integer(), nullable=False),
+                    sa.Column('start_char', sa.Integer(), nullable=False),
+                    sa.Column('end_char', sa.Integer(), nullable=False),
+                    sa.Column('chunk_hash', sa.String(length=64), nullable=False),
+                    sa.Column('content_hash', sa.String(length=64), nullable=False),
+                    sa.Column('created_at', sa.DateTime(), nullable=False),
+                    sa.ForeignKeyConstraint(
+                        ['document_id'], ['documents.id'], ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('id'),
+                    sa.UniqueConstraint('document_id', 'chunk_size', 'chunk_overlap', 'chunk_index',
+                                        name='uq_document_chunk')
+                    )
+    op.create_index(op.f('ix_document_chunks_id'),
+                    'document_chunks', ['id'], unique=False)
+    op.create_index(op.f('ix_document_chunks_document_id'),
+                    'document_chunks', ['document_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_document_chunks_document_id'),
+                  table_name='document_chunks')
+    op.drop_index(op.f('ix_document_chunks_id'),
+                  table_name='document_chunks')
+    op.drop_table('document_chunks')
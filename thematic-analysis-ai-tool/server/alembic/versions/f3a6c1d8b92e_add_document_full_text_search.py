@@ -0,0 +1,75 @@
+"""Add the full-text search index on documents
+
+Revision ID: f3a6c1d8b92e
+Revises: e5b09a7c4d18
+Create Date: 2025-08-11 14:02:37.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a6c1d8b92e'
+down_revision: Union[str, None] = 'e5b09a7c4d18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        # A generated column is filled for existing rows and kept current on every write.
+        # Only a prefix of the content is indexed: a tsvector may not exceed 1MB.
+        op.execute("""
+            ALTER TABLE documents ADD COLUMN search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+                setweight(to_tsvector('english', left(coalesce(content, ''), 250000)), 'B')
+            ) STORED
+        """)
+        op.execute(
+            "CREATE INDEX ix_documents_search_vector ON documents USING gin (search_vector)")
+    elif dialect == 'sqlite':
+        op.execute("""
+            CREATE VIRTUAL TABLE documents_fts USING fts5(
+                name, content, content='documents', content_rowid='id',
+                tokenize='porter unicode61')
+        """)
+        op.execute("""
+            CREATE TRIGGER documents_fts_insert AFTER INSERT ON documents BEGIN
+                INSERT INTO documents_fts(rowid, name, content)
+                VALUES (new.id, new.name, coalesce(new.content, ''));
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER documents_fts_delete AFTER DELETE ON documents BEGIN
+                INSERT INTO documents_fts(documents_fts, rowid, name, content)
+                VALUES ('delete', old.id, old.name, coalesce(old.content, ''));
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER documents_fts_update AFTER UPDATE OF name, content ON documents BEGIN
+                INSERT INTO documents_fts(documents_fts, rowid, name, content)
+                VALUES ('delete', old.id, old.name, coalesce(old.content, ''));
+                INSERT INTO documents_fts(rowid, name, content)
+                VALUES (new.id, new.name, coalesce(new.content, ''));
+            END
+        """)
+        # Index the documents that already exist
+        op.execute("INSERT INTO documents_fts(documents_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_documents_search_vector")
+        op.execute("ALTER TABLE documents DROP COLUMN IF EXISTS search_vector")
+    elif dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS documents_fts_update")
+        op.execute("DROP TRIGGER IF EXISTS documents_fts_delete")
+        op.execute("DROP TRIGGER IF EXISTS documents_fts_insert")
+        op.execute("DROP TABLE IF EXISTS documents_fts")
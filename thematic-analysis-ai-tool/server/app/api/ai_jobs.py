@@ -0,0 +1,180 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, List, Optional
+from sqlalchemy.orm import Session, sessionmaker
+from app.db.session import get_db
+from app.core.auth import get_current_user
+from app.core.config import settings
+from app.schemas.ai_services import InitialCodingRequest, DeductiveCodingRequest
+from app.services.ai.ai_job_runner import AIJobNotFound, AIJobRunner, AIJobStateError, get_ai_job_runner
+import asyncio
+import json
+import time
+
+router = APIRouter()
+
+# Seconds between comment lines that keep idle proxies from closing a stream
+SSE_KEEPALIVE_SECONDS = 15.0
+
+
+def _job_error(e: ValueError) -> HTTPException:
+    # By type, not message: a failed job's error text may say anything, "not found" included
+    if isinstance(e, AIJobNotFound):
+        return HTTPException(status_code=404, detail=str(e))
+    if isinstance(e, AIJobStateError):
+        return HTTPException(status_code=409, detail=str(e))
+    return HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/initial-coding", status_code=202, response_model=Dict[str, Any])
+def queue_initial_coding(
+    request: InitialCodingRequest,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    """Queue AI initial coding; follow it at /ai/jobs/{id}/events"""
+    try:
+        return get_ai_job_runner().submit(db, "initial_coding", current_user.id, {
+            "document_ids": request.document_ids,
+            "use_cache": request.use_cache,
+            "incremental": request.incremental
+        })
+    except ValueError as e:
+        raise _job_error(e)
+
+
+@router.post("/deductive-coding", status_code=202, response_model=Dict[str, Any])
+def queue_deductive_coding(
+    request: DeductiveCodingRequest,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    """Queue AI deductive coding; follow it at /ai/jobs/{id}/events"""
+    try:
+        return get_ai_job_runner().submit(db, "deductive_coding", current_user.id, {
+            "document_ids": request.document_ids,
+            "codebook_ids": request.codebook_ids,
+            "use_cache": request.use_cache
+        })
+    except ValueError as e:
+        raise _job_error(e)
+
+
+@router.get("/", response_model=List[Dict[str, Any]])
+def list_ai_jobs(
+    limit: int = 20,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    """The user's most recent AI jobs"""
+    return get_ai_job_runner().list_jobs(db, current_user.id, min(max(limit, 1), 100))
+
+
+@router.get("/{job_id}", response_model=Dict[str, Any])
+def get_ai_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    """Status, stage and chunk progress of an AI job"""
+    try:
+        return AIJobRunner.serialize_job(get_ai_job_runner().get_job(db, job_id, current_user.id))
+    except ValueError as e:
+        raise _job_error(e)
+
+
+@router.get("/{job_id}/result", response_model=Dict[str, Any])
+def get_ai_job_result(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    """The pipeline response of a completed job (409 while it is still running)"""
+    try:
+        return get_ai_job_runner().result(db, job_id, current_user.id)
+    except ValueError as e:
+        raise _job_error(e)
+
+
+@router.post("/{job_id}/cancel", response_model=Dict[str, Any])
+def cancel_ai_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    """Cancel a pending or running job; a running one stops at its next chunk"""
+    try:
+        return get_ai_job_runner().cancel(db, job_id, current_user.id)
+    except ValueError as e:
+        raise _job_error(e)
+
+
+@router.post("/{job_id}/resume", status_code=202, response_model=Dict[str, Any])
+def resume_ai_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    """Queue a failed or cancelled job again, skipping the LLM calls it already completed"""
+    try:
+        return get_ai_job_runner().resume(db, job_id, current_user.id)
+    except ValueError as e:
+        raise _job_error(e)
+
+
+@router.get("/{job_id}/events")
+async def stream_ai_job_events(
+    job_id: int,
+    request: Request,
+    after: int = 0,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    """
+    Server-Sent Events for an AI job: stage, chunk_done, refinement_done,
+    grouping_done and finally completed, failed or cancelled, after which the stream
+    ends. Each event carries its id, so a reconnecting client (Last-Event-ID,
+    or `after`) picks up where it left off.
+    """
+    runner = get_ai_job_runner()
+    try:
+        await asyncio.to_thread(runner.get_job, db, job_id, current_user.id)
+    except ValueError as e:
+        raise _job_error(e)
+
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        after = max(after, int(last_event_id))
+    # The stream outlives the request's session, so it reads through its own
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=db.get_bind())
+
+    return StreamingResponse(
+        _event_stream(runner, factory, job_id, after, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def _event_stream(runner: AIJobRunner, factory: sessionmaker, job_id: int, after: int, request: Request):
+    last_version: Optional[int] = None
+    last_read = last_sent = time.monotonic()
+    while True:
+        # Re-read when this process recorded an event, and now and then for other processes
+        if runner.version != last_version or time.monotonic() - last_read >= settings.AI_JOB_POLL_SECONDS:
+            last_version, last_read = runner.version, time.monotonic()
+            events, finished = await asyncio.to_thread(runner.read_events, factory, job_id, after)
+            for event in events:
+                after = event["id"]
+                yield f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+                last_sent = time.monotonic()
+            if finished:
+                return
+            if events:
+                continue
+
+        if time.monotonic() - last_sent >= SSE_KEEPALIVE_SECONDS:
+            yield ": keep-alive\n\n"
+            last_sent = time.monotonic()
+        if await request.is_disconnected():
+            return
+        await asyncio.sleep(0.25)
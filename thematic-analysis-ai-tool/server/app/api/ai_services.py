@@ -4,27 +4,36 @@ from app.db.session import get_db
 from app.core.auth import get_current_user
 from app.services.ai.ai_coding_service import AICodingService
 from app.services.ai.ai_report_generation import AIReportGenerationService
+from app.services.ai.llm_cache import get_llm_cache
+from app.services.ai.llm_service import LLMService
 from app.schemas.ai_services import InitialCodingRequest, DeductiveCodingRequest, ThemeGenerationRequest
 from app.models.code_assignments import CodeAssignment
 from app.models.code import Code
 from app.models.project import Project
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import Session, joinedload
+import asyncio
 
 
 router = APIRouter()
 
+# The endpoints below are async so a single worker can hold many AI requests
+# while they wait on the provider. Queries and commits are blocking, so they
+# run through asyncio.to_thread and never on the event loop itself.
+
 
 @router.post("/initial-coding", response_model=Dict[str, Any])
-def ai_initial_coding(
+async def ai_initial_coding(
     request: InitialCodingRequest,
     db=Depends(get_db),
     current_user=Depends(get_current_user)
 ):
     try:
-        return AICodingService.generate_code(
+        return await AICodingService.agenerate_code(
             document_ids=request.document_ids,
             db=db,
-            user_id=current_user.id
+            user_id=current_user.id,
+            use_cache=request.use_cache,
+            incremental=request.incremental
         )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -34,18 +43,19 @@ def ai_initial_coding(
 
 
 @router.post("/deductive-coding", response_model=Dict[str, Any])
-def ai_deductive_coding(
+async def ai_deductive_coding(
     request: DeductiveCodingRequest,
     db=Depends(get_db),
     current_user=Depends(get_current_user)
 ):
     """Perform deductive coding using existing codes from a codebook"""
     try:
-        return AICodingService.deductive_coding(
+        return await AICodingService.adeductive_coding(
             document_ids=request.document_ids,
             codebook_ids=request.codebook_ids,
             db=db,
-            user_id=current_user.id
+            user_id=current_user.id,
+            use_cache=request.use_cache
         )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -55,44 +65,21 @@ def ai_deductive_coding(
 
 
 @router.post("/generate-themes", response_model=List[Dict[str, Any]])
-def ai_generate_themes(
+async def ai_generate_themes(
     request: ThemeGenerationRequest,
     db=Depends(get_db),
     current_user=Depends(get_current_user)
 ):
     """Generate themes from code assignments using AI"""
     try:
-        # Allow access if the current user is either the creator of the code assignment
-        # or the owner of the project associated with the code assignment
-        code_assignments = db.query(CodeAssignment).join(Project, CodeAssignment.project_id == Project.id).filter(
-            CodeAssignment.id.in_(request.code_assignment_ids),
-            (CodeAssignment.created_by_id == current_user.id) | (
-                Project.owner_id == current_user.id)
-        ).options(
-            joinedload(CodeAssignment.code),
-            joinedload(CodeAssignment.document)
-        ).all()
-
-        if not code_assignments:
-            raise ValueError(
-                "No valid code assignments found for the provided IDs")
-
-        code_assignments_data = []
+        code_assignments_data = await asyncio.to_thread(
+            _theme_generation_input, db, request.code_assignment_ids, current_user.id)
 
-        for ca in code_assignments:
-            if ca.code is not None:  # Ensure code exists
-                code_info = {
-                    "code_id": ca.code_id,
-                    "document_id": ca.document_id,
-                    "text": f"Code: {ca.code.name} - {ca.code.description or 'No description'}\n\nText snapshot from the documents: {ca.text_snapshot}",
-                    "project_id": ca.code.project_id if ca.code else None
-                }
-                code_assignments_data.append(code_info)
-
-        themes_response = AICodingService.generate_themes(
+        themes_response = await AICodingService.agenerate_themes(
             code_assignments=code_assignments_data,
             db=db,
-            user_id=current_user.id
+            user_id=current_user.id,
+            use_cache=request.use_cache
         )
 
         result = []
@@ -111,72 +98,29 @@ def ai_generate_themes(
 
 
 @router.post("/generate-report", response_model=Dict[str, Any])
-def ai_generate_report(
+async def ai_generate_report(
     request: ThemeGenerationRequest,
     db=Depends(get_db),
     current_user=Depends(get_current_user)
 ):
     """Generate a report based on code assignments and save it to the project"""
     try:
-        # Fetch code assignments and ensure access
-        code_assignments = db.query(CodeAssignment).join(Project, CodeAssignment.project_id == Project.id).filter(
-            CodeAssignment.id.in_(request.code_assignment_ids),
-            (CodeAssignment.created_by_id == current_user.id) | (
-                Project.owner_id == current_user.id)
-        ).options(
-            joinedload(CodeAssignment.code).joinedload(Code.theme),
-            joinedload(CodeAssignment.document)
-        ).all()
-
-        if not code_assignments:
-            raise ValueError(
-                "No valid code assignments found for the provided IDs")
-
-        # Ensure all code assignments belong to the same project
-        project_ids = {
-            ca.code.project_id for ca in code_assignments if ca.code}
-        if len(project_ids) != 1:
-            raise ValueError(
-                "Code assignments must belong to the same project")
-
-        # Format data for report generation - keep it simple but complete
-        code_assignments_data = []
-        for ca in code_assignments:
-            if ca.code is not None:
-                code_info = {
-                    "code_id": ca.code_id,
-                    "document_id": ca.document_id,
-                    "project_id": ca.project_id,
-                    "text": f"Code: {ca.code.name} - {ca.code.description or 'No description'}\n\nText snapshot from the documents: {ca.text_snapshot}"
-                }
-
-                # Only add theme info if it exists
-                if ca.code.theme:
-                    code_info["theme_id"] = ca.code.theme_id
-                    code_info["theme_name"] = ca.code.theme.name
-                    code_info["theme_description"] = ca.code.theme.description
-
-                code_assignments_data.append(code_info)
+        code_assignments_data, project_id = await asyncio.to_thread(
+            _report_generation_input, db, request.code_assignment_ids, current_user.id)
 
         # Generate the report using AIReportGenerationService
-        report_response = AIReportGenerationService.generate_report(
+        report_response = await AIReportGenerationService.agenerate_report(
             code_assignments=code_assignments_data,
             db=db,
-            user_id=current_user.id
+            user_id=current_user.id,
+            use_cache=request.use_cache
         )
 
         if "error" in report_response:
             raise ValueError(
                 f"Report generation failed: {report_response['error']}")
 
-        # Save the report to the project's report field
-        project_id = list(project_ids)[0]  # Get the single project ID
-        project = db.query(Project).filter(Project.id == project_id).first()
-        if not project:
-            raise ValueError("Associated project not found")
-
-        project.report = report_response["report"]
-        db.commit()
+        await asyncio.to_thread(_save_report, db, project_id, report_response["report"])
 
         return {
             "message": "Report generated and saved successfully",
@@ -189,3 +133,108 @@ def ai_generate_report(
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+@router.get("/llm-cache", response_model=Dict[str, Any])
+def ai_llm_cache_stats(current_user=Depends(get_current_user)):
+    """Hit rate and size of the local LLM response cache"""
+    cache = get_llm_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+@router.get("/llm-services", response_model=Dict[str, Any])
+def ai_llm_service_stats(current_user=Depends(get_current_user)):
+    """Shared LLM service instances and how often each chain has been used"""
+    return LLMService.registry_stats()
+
+
+def _theme_generation_input(db: Session, code_assignment_ids: List[int], user_id: int) -> List[dict]:
+    """Code assignments the user may use, formatted for theme generation"""
+    # Allow access if the current user is either the creator of the code assignment
+    # or the owner of the project associated with the code assignment
+    code_assignments = db.query(CodeAssignment).join(Project, CodeAssignment.project_id == Project.id).filter(
+        CodeAssignment.id.in_(code_assignment_ids),
+        (CodeAssignment.created_by_id == user_id) | (
+            Project.owner_id == user_id)
+    ).options(
+        joinedload(CodeAssignment.code),
+        joinedload(CodeAssignment.document)
+    ).all()
+
+    if not code_assignments:
+        raise ValueError(
+            "No valid code assignments found for the provided IDs")
+
+    code_assignments_data = []
+
+    for ca in code_assignments:
+        if ca.code is not None:  # Ensure code exists
+            code_info = {
+                "code_id": ca.code_id,
+                "document_id": ca.document_id,
+                "text": f"Code: {ca.code.name} - {ca.code.description or 'No description'}\n\nText snapshot from the documents: {ca.text_snapshot}",
+                "project_id": ca.code.project_id if ca.code else None,
+                "code_name": ca.code.name,
+                "code_description": ca.code.description,
+                "text_snapshot": ca.text_snapshot
+            }
+            code_assignments_data.append(code_info)
+
+    return code_assignments_data
+
+
+def _report_generation_input(db: Session, code_assignment_ids: List[int], user_id: int) -> tuple[List[dict], int]:
+    """Code assignments the user may use, formatted for the report, and their project"""
+    # Fetch code assignments and ensure access
+    code_assignments = db.query(CodeAssignment).join(Project, CodeAssignment.project_id == Project.id).filter(
+        CodeAssignment.id.in_(code_assignment_ids),
+        (CodeAssignment.created_by_id == user_id) | (
+            Project.owner_id == user_id)
+    ).options(
+        joinedload(CodeAssignment.code).joinedload(Code.theme),
+        joinedload(CodeAssignment.document)
+    ).all()
+
+    if not code_assignments:
+        raise ValueError(
+            "No valid code assignments found for the provided IDs")
+
+    # Ensure all code assignments belong to the same project
+    project_ids = {
+        ca.code.project_id for ca in code_assignments if ca.code}
+    if len(project_ids) != 1:
+        raise ValueError(
+            "Code assignments must belong to the same project")
+
+    # Format data for report generation - keep it simple but complete
+    code_assignments_data = []
+    for ca in code_assignments:
+        if ca.code is not None:
+            code_info = {
+                "code_id": ca.code_id,
+                "document_id": ca.document_id,
+                "project_id": ca.project_id,
+                "text": f"Code: {ca.code.name} - {ca.code.description or 'No description'}\n\nText snapshot from the documents: {ca.text_snapshot}"
+            }
+
+            # Only add theme info if it exists
+            if ca.code.theme:
+                code_info["theme_id"] = ca.code.theme_id
+                code_info["theme_name"] = ca.code.theme.name
+                code_info["theme_description"] = ca.code.theme.description
+
+            code_assignments_data.append(code_info)
+
+    return code_assignments_data, list(project_ids)[0]
+
+
+def _save_report(db: Session, project_id: int, report: str) -> None:
+    """Save the report to the project's report field"""
+    project = db.query(Project).filter(Project.id == project_id).first()
+    if not project:
+        raise ValueError("Associated project not found")
+
+    project.report = report
+    db.commit()
@@ -1,51 +1,102 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
 import os
 import pathlib
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Union
+import time
 import asyncio
 from app.db.session import get_db, SessionLocal
 from app.core.auth import get_current_user
 from app.core.permissions import PermissionChecker
 from app.models.user import User
 from app.models.document import DocumentType
-from app.schemas.document import DocumentOut, DocumentUpdate, BulkUploadResult, DocumentUpload
+from app.schemas.document import (
+    DocumentOut, DocumentSummary, DocumentUpdate, BulkUploadResult, DocumentUpload,
+    DocumentSearchResults, DocumentContentRange
+)
+from app.core.config import settings
 from app.services.document_service import DocumentService
+from app.services.document.ingestion import SpooledUpload, UploadByteBudget, UploadIngestionService, get_upload_budget
+from app.services.document.ingestion_queue import get_ingestion_queue
+from app.services.document.management import DocumentBusyError
+from app.services.document.extraction_cache import get_extraction_cache
 
 router = APIRouter()
 
 
+def _document_type_for(filename: Optional[str]) -> DocumentType:
+    ext = pathlib.Path(filename or "").suffix.lower()
+    if ext == ".pdf":
+        return DocumentType.PDF
+    elif ext == ".docx":
+        return DocumentType.DOCX
+    elif ext in (".csv", ".xlsx", ".xls"):
+        return DocumentType.CSV
+    return DocumentType.TEXT
+
+
+def _ingest(
+    db: Session,
+    name: str,
+    description: Optional[str],
+    project_id: int,
+    uploaded_by_id: int,
+    upload: SpooledUpload,
+    filename: str,
+    background: bool
+) -> DocumentUpload:
+    """Process the upload now, or queue it and return the pending document"""
+    if background:
+        return get_ingestion_queue().enqueue(
+            db, name, description, _document_type_for(filename),
+            project_id, uploaded_by_id, upload, filename)
+    return DocumentService.create_document(
+        db, name, description, _document_type_for(filename),
+        project_id, uploaded_by_id, upload, filename)
+
+
+def _upload_error(e: ValueError) -> HTTPException:
+    if "too large" in str(e).lower():
+        return HTTPException(status_code=413, detail=str(e))
+    return HTTPException(status_code=400, detail=str(e))
+
+
 async def _do_single_upload(
     project_id: int,
     file: UploadFile,
     name: Optional[str],
     description: Optional[str],
     db: Session,
-    current_user: User
+    current_user: User,
+    request_budget: Optional[UploadByteBudget] = None,
+    background: bool = False
 ) -> DocumentUpload:
-    content = await file.read()
-    ext = pathlib.Path(file.filename or "").suffix.lower()
-    if ext == ".pdf":
-        doc_type = DocumentType.PDF
-    elif ext == ".docx":
-        doc_type = DocumentType.DOCX
-    elif ext in (".csv", ".xlsx", ".xls"):
-        doc_type = DocumentType.CSV
-    else:
-        doc_type = DocumentType.TEXT
-
-    with SessionLocal() as db:
-        return await asyncio.to_thread(
-            DocumentService.create_document,
-            db,
-            str(name or file.filename),
-            description,
-            doc_type,
-            project_id,
-            getattr(current_user, "id"),
-            content,
-            str(file.filename)
-        )
+    """
+    Spool one file and create its document.
+
+    The file's size is reserved against the request's budget and the global
+    budget before it is read, so concurrent uploads wait instead of piling up
+    in memory.
+    """
+    size = UploadIngestionService.declared_size(file)
+    UploadIngestionService.check_size(file.filename, size)
+    request_budget = request_budget or UploadByteBudget(0)
+
+    async with request_budget.reserve(size), get_upload_budget().reserve(size):
+        with await UploadIngestionService.spool(file) as upload:
+            with SessionLocal() as db:
+                # Parsing waits on the extraction pool, so keep it off the event loop
+                return await asyncio.to_thread(
+                    _ingest,
+                    db,
+                    str(name or file.filename),
+                    description,
+                    project_id,
+                    getattr(current_user, "id"),
+                    upload,
+                    str(file.filename),
+                    background
+                )
 
 # Maybe not needed
 
@@ -56,36 +107,40 @@ async def upload_document(
     file: UploadFile = File(...),
     name: Optional[str] = Form(None),
     description: Optional[str] = Form(None),
+    background: Optional[bool] = Form(None),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    """Upload a single document"""
-    PermissionChecker.check_project_access(db, project_id, current_user)
+    """
+    Upload a single document.
 
-    content = await file.read()
-    ext = pathlib.Path(file.filename or "").suffix.lower()
-    if ext == ".pdf":
-        doc_type = DocumentType.PDF
-    elif ext == ".docx":
-        doc_type = DocumentType.DOCX
-    elif ext in (".csv", ".xlsx", ".xls"):
-        doc_type = DocumentType.CSV
-    else:
-        doc_type = DocumentType.TEXT
+    With `background` (default: DOCUMENT_BACKGROUND_INGESTION) the document is
+    returned as pending and processed by the ingestion queue; poll
+    /documents/{id}/status for the result.
+    """
+    PermissionChecker.check_project_access(db, project_id, current_user)
+    if background is None:
+        background = settings.DOCUMENT_BACKGROUND_INGESTION
 
     try:
-        return DocumentService.create_document(
-            db=db,
-            name=str(name or file.filename),
-            description=description,
-            document_type=doc_type,
-            project_id=project_id,
-            uploaded_by_id=getattr(current_user, "id"),
-            file_content=content,
-            filename=str(file.filename)
-        )
+        size = UploadIngestionService.declared_size(file)
+        UploadIngestionService.check_size(file.filename, size)
+        async with get_upload_budget().reserve(size):
+            with await UploadIngestionService.spool(file) as upload:
+                # Parsing waits on the extraction pool, so keep it off the event loop
+                return await asyncio.to_thread(
+                    _ingest,
+                    db=db,
+                    name=str(name or file.filename),
+                    description=description,
+                    project_id=project_id,
+                    uploaded_by_id=getattr(current_user, "id"),
+                    upload=upload,
+                    filename=str(file.filename),
+                    background=background
+                )
     except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        raise _upload_error(e)
 
 # Needed
 
@@ -94,22 +149,29 @@ async def upload_document(
 async def bulk_upload_documents(
     project_id: int = Form(...),
     files: List[UploadFile] = File(...),
+    background: Optional[bool] = Form(None),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     PermissionChecker.check_project_access(db, project_id, current_user)
+    if background is None:
+        background = settings.DOCUMENT_BACKGROUND_INGESTION
 
     uploaded = []
     failed = []
+    # Files of one bulk request share this budget on top of the global one
+    request_budget = UploadByteBudget(settings.DOCUMENT_UPLOAD_REQUEST_INFLIGHT_BYTES)
 
     async def _wrap(file: UploadFile):
         try:
             doc = await _do_single_upload(
-                project_id, file, None, None, db, current_user
+                project_id, file, None, None, db, current_user, request_budget, background
             )
             uploaded.append(doc)
         except HTTPException as e:
             failed.append({"filename": file.filename, "error": e.detail})
+        except ValueError as e:
+            failed.append({"filename": file.filename, "error": str(e)})
 
     tasks = [_wrap(file) for file in files]
     await asyncio.gather(*tasks)
@@ -122,34 +184,147 @@ async def bulk_upload_documents(
         "total_errors":       len(failed),
     }
 
+
+@router.get("/extraction-cache/stats")
+def get_extraction_cache_stats(
+    current_user: User = Depends(get_current_user)
+):
+    """Hit/miss counters of the content-hash extraction cache for this process"""
+    return get_extraction_cache().stats()
+
+
+@router.get("/ingestion/dead-letter")
+def get_dead_letter_jobs(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Background ingestion jobs that ran out of attempts"""
+    return get_ingestion_queue().dead_letter(db, getattr(current_user, "id"))
+
+
+@router.post("/ingestion/jobs/{job_id}/retry")
+def retry_ingestion_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Re-queue a dead-lettered ingestion job"""
+    try:
+        return get_ingestion_queue().retry(db, job_id, getattr(current_user, "id"))
+    except ValueError as e:
+        if "not found" in str(e).lower():
+            raise HTTPException(status_code=404, detail=str(e))
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/{document_id}/status")
+async def get_document_status(
+    document_id: int,
+    wait: float = 0,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Processing status of a document. With `wait` (seconds, up to 30) the call
+    long-polls until processing finishes or the time is up; it waits with
+    asyncio.sleep, so a long poll does not hold a worker thread.
+    """
+    document = await asyncio.to_thread(
+        PermissionChecker.check_document_access, db, document_id, current_user)
+    queue = get_ingestion_queue()
+
+    deadline = time.monotonic() + min(max(wait, 0), 30)
+    last_version, last_read = queue.version, time.monotonic()
+    while document.processing_status in ("pending", "processing"):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        await asyncio.sleep(min(remaining, 0.25))
+        # Re-read when this process changed a job, and now and then for other workers
+        if queue.version != last_version or time.monotonic() - last_read >= 1.0:
+            last_version, last_read = queue.version, time.monotonic()
+            await asyncio.to_thread(db.refresh, document)
+
+    return await asyncio.to_thread(queue.job_status, db, document)
+
 # Maybe not needed
 
 
-@router.get("/project/{project_id}", response_model=List[DocumentOut])
+@router.get("/project/{project_id}", response_model=Union[List[DocumentSummary], List[DocumentOut]])
 def get_project_documents(
     project_id: int,
+    include_content: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get all documents for a project"""
+    """
+    Get all documents for a project. Content is left out unless
+    `include_content` is set; use /documents/{id}/content to page through it.
+    """
     documents = DocumentService.get_documents_by_project(
-        db, project_id, getattr(current_user, 'id')
+        db, project_id, getattr(current_user, 'id'), include_content=include_content
+    )
+    # Listings without content leave the field out rather than send null
+    if include_content:
+        return [DocumentOut.model_validate(document) for document in documents]
+    return [DocumentSummary.model_validate(document) for document in documents]
+
+
+
+@router.get("/project/{project_id}/search", response_model=DocumentSearchResults)
+def search_project_documents(
+    project_id: int,
+    q: str = Query(..., min_length=1),
+    document_type: Optional[DocumentType] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Ranked full-text search of a project's documents, with snippets"""
+    PermissionChecker.check_project_access(db, project_id, current_user)
+    return DocumentService.search_documents(
+        db, project_id, getattr(current_user, 'id'), q, document_type, limit, offset
     )
-    return documents
 
 # Maybe not needed
 
 
-@router.get("/{document_id}", response_model=DocumentOut)
+@router.get("/{document_id}", response_model=Union[DocumentSummary, DocumentOut])
 def get_document(
     document_id: int,
+    include_content: bool = True,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get a specific document"""
     document = PermissionChecker.check_document_access(
         db, document_id, current_user)
-    return document
+    if not include_content:
+        return DocumentSummary.model_validate(document)
+    return DocumentOut.model_validate(document)
+
+
+@router.get("/{document_id}/content", response_model=DocumentContentRange)
+def get_document_content(
+    document_id: int,
+    start: int = Query(0, ge=0),
+    end: Optional[int] = Query(None, ge=0),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Characters [start, end) of a document's content. At most
+    DOCUMENT_CONTENT_MAX_RANGE_CHARS are returned per call; follow
+    `next_start` to read the rest.
+    """
+    document = PermissionChecker.check_document_access(
+        db, document_id, current_user)
+    try:
+        return DocumentService.get_content_range(
+            db, document, start, end, settings.DOCUMENT_CONTENT_MAX_RANGE_CHARS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 # Needed
 
@@ -196,6 +371,8 @@ def delete_document(
             raise HTTPException(
                 status_code=500, detail="Failed to delete document")
         return {"message": "Document deleted successfully"}
+    except DocumentBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except ValueError as e:
         if "not found" in str(e).lower():
             raise HTTPException(status_code=404, detail=str(e))
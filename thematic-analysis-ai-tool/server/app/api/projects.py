@@ -42,11 +42,17 @@ def list_projects(
 @router.get("/{project_id}", response_model=ProjectComprehensive)
 def get_project(
     project_id: int,
+    include_content: bool = False,
     db: Session = Depends(get_db),
     current_user: UserOut = Depends(get_current_user)
 ):
+    """
+    Everything needed to open a project. Document content is left out unless
+    `include_content` is set; clients page through it with
+    /documents/{id}/content.
+    """
     project_data = ProjectService.get_project_comprehensive(
-        db, project_id, getattr(current_user, 'id'))
+        db, project_id, getattr(current_user, 'id'), include_content)
     if not project_data:
         raise HTTPException(status_code=404, detail="Project not found")
 
@@ -1,3 +1,4 @@
+from typing import Any, Dict, List, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -17,12 +18,146 @@ class Settings(BaseSettings):
     BACKEND_URL: str
     FRONTEND_URL: str
 
-    CLOUDINARY_CLOUD_NAME: str
-    CLOUDINARY_API_KEY: str
-    CLOUDINARY_API_SECRET: str
+    # Only needed when STORAGE_BACKEND is "cloudinary"
+    CLOUDINARY_CLOUD_NAME: Optional[str] = None
+    CLOUDINARY_API_KEY: Optional[str] = None
+    CLOUDINARY_API_SECRET: Optional[str] = None
     UPLOAD_FOLDER: str = "TA_documents"
 
+    # Object storage for uploaded files: "cloudinary" or "local"
+    STORAGE_BACKEND: str = "cloudinary"
+    LOCAL_STORAGE_ROOT: str = "uploads/storage"
+    LOCAL_STORAGE_BASE_URL: Optional[str] = None
+    # Background deletion of stored files
+    STORAGE_OUTBOX_POLL_SECONDS: float = 5.0
+    STORAGE_OUTBOX_MAX_ATTEMPTS: int = 8
+    # Deletions wait this long, so an upload still reusing the object can commit its document
+    STORAGE_OUTBOX_GRACE_SECONDS: float = 300.0
+    STORAGE_OUTBOX_DRAIN_ON_STARTUP: bool = False
+
+    # Document extraction process pool (None = one worker per core, 0 = parse in the request worker)
+    DOCUMENT_EXTRACTION_WORKERS: Optional[int] = None
+    DOCUMENT_EXTRACTION_MAX_PENDING: int = 64
+    DOCUMENT_EXTRACTION_TIMEOUT_SECONDS: float = 120.0
+    DOCUMENT_EXTRACTION_INLINE_MAX_BYTES: int = 64 * 1024
+
+    # Streaming upload ingestion (bytes; 0 disables a limit)
+    DOCUMENT_UPLOAD_MAX_FILE_BYTES: int = 200 * 1024 * 1024
+    DOCUMENT_UPLOAD_REQUEST_INFLIGHT_BYTES: int = 128 * 1024 * 1024
+    DOCUMENT_UPLOAD_GLOBAL_INFLIGHT_BYTES: int = 512 * 1024 * 1024
+    DOCUMENT_UPLOAD_SPOOL_MEMORY_BYTES: int = 1024 * 1024
+    DOCUMENT_UPLOAD_CHUNK_BYTES: int = 1024 * 1024
+    DOCUMENT_UPLOAD_SPOOL_DIR: Optional[str] = None
+
+    # Background ingestion queue (off by default: uploads are processed in the request;
+    # the upload endpoints also take a per-request `background` form flag)
+    DOCUMENT_BACKGROUND_INGESTION: bool = False
+    DOCUMENT_INGESTION_WORKERS: int = 2
+    DOCUMENT_INGESTION_MAX_ATTEMPTS: int = 3
+    DOCUMENT_INGESTION_RETRY_BASE_SECONDS: float = 5.0
+    DOCUMENT_INGESTION_LEASE_SECONDS: float = 600.0
+    DOCUMENT_INGESTION_POLL_SECONDS: float = 2.0
+    DOCUMENT_INGESTION_SPOOL_DIR: str = "uploads/ingestion"
+
+    # Largest slice of document content returned by one /documents/{id}/content call
+    DOCUMENT_CONTENT_MAX_RANGE_CHARS: int = 256 * 1024
+
+    # Provider pools: calls the pipelines make to a pool's provider are spread over its
+    # routes by weighted round-robin, failing over to the other routes when a call fails
+    # (e.g. AI_PROVIDER_ROUTES='{"google_genai": [
+    #   {"name": "gemini", "provider": "google_genai", "model": "gemini-2.0-flash", "weight": 3},
+    #   {"name": "groq", "provider": "groq", "model": "llama-3.3-70b-versatile"},
+    #   {"name": "local", "provider": "openai", "model": "qwen2.5",
+    #    "base_url": "http://localhost:8001/v1", "api_key": "none"}]}').
+    # A route's name keys its AI_RATE_LIMITS and AI_PROVIDER_MAX_CONCURRENT_REQUESTS, and a
+    # pool runs as many calls at once as its routes together. A route rests for
+    # AI_ROUTE_COOLDOWN_SECONDS after AI_ROUTE_FAILURE_THRESHOLD failures in a row or once
+    # its quota is exhausted.
+    AI_PROVIDER_ROUTES: Dict[str, List[Dict[str, Any]]] = {}
+    AI_ROUTE_FAILURE_THRESHOLD: int = 3
+    AI_ROUTE_COOLDOWN_SECONDS: float = 60.0
+
+    # AI coding splits documents into chunks of about AI_CHUNK_SIZE characters that overlap
+    # by AI_CHUNK_OVERLAP. Chunk boundaries are stored per document (document_chunks) once it
+    # is processed or first coded, and recomputed only when its content or these values change
+    AI_CHUNK_SIZE: int = 4000
+    AI_CHUNK_OVERLAP: int = 150
+
+    # LLM calls in flight at once during chunked coding, per provider
+    # (e.g. AI_PROVIDER_MAX_CONCURRENT_REQUESTS='{"google_genai": 8}')
+    AI_MAX_CONCURRENT_REQUESTS: int = 4
+    AI_PROVIDER_MAX_CONCURRENT_REQUESTS: Dict[str, int] = {}
+
+    # Requests- and tokens-per-minute budgets, keyed by provider or provider:model
+    # (e.g. AI_RATE_LIMITS='{"google_genai": {"rpm": 1000, "tpm": 4000000},
+    #                        "google_genai:gemini-2.0-flash": {"rpm": 15}}').
+    # Unlisted providers are only slowed down by the rate limit errors they return.
+    AI_RATE_LIMITS: Dict[str, Dict[str, int]] = {}
+    AI_RATE_LIMIT_OUTPUT_TOKENS: int = 1024  # reserved per call for the response
+    AI_RATE_LIMIT_MAX_ATTEMPTS: int = 6
+    AI_RATE_LIMIT_BASE_DELAY_SECONDS: float = 1.0
+    AI_RATE_LIMIT_MAX_DELAY_SECONDS: float = 60.0
+
+    # Local cache of LLM responses (requests can still opt out with use_cache=false)
+    AI_LLM_CACHE_ENABLED: bool = True
+    AI_LLM_CACHE_PATH: str = ".cache/llm_responses.sqlite3"
+    AI_LLM_CACHE_TTL_SECONDS: float = 30 * 24 * 3600
+    AI_LLM_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+
+    # Code refinement packs several codes into one prompt, up to this many prompt
+    # tokens (about four characters each) and codes; 0 sends one call per code
+    AI_REFINEMENT_BATCH_TOKENS: int = 6000
+    AI_REFINEMENT_BATCH_MAX_CODES: int = 15
+
+    # Code grouping sends at most this many codes per prompt. Larger codebooks are
+    # clustered by similarity into prompts of about AI_GROUPING_CLUSTER_SIZE codes,
+    # grouped in parallel, and the groups merged at most AI_GROUPING_MAX_GROUPS_PER_PROMPT
+    # at a time
+    AI_GROUPING_MAX_CODES_PER_PROMPT: int = 60
+    AI_GROUPING_CLUSTER_SIZE: int = 40
+    AI_GROUPING_MAX_GROUPS_PER_PROMPT: int = 40
+
+    # Theme generation sees each code once, with up to AI_THEME_SNIPPETS_PER_CODE
+    # sampled snippets. Codes are split by similarity into partitions of at most
+    # AI_THEME_MAX_CODES_PER_PROMPT whose candidate themes are generated concurrently,
+    # then consolidated (AI_THEME_MAX_CANDIDATES_PER_PROMPT at a time) into at most
+    # AI_THEME_MAX_THEMES themes
+    AI_THEME_MAX_CODES_PER_PROMPT: int = 40
+    AI_THEME_SNIPPETS_PER_CODE: int = 3
+    AI_THEME_SNIPPET_CHARS: int = 300
+    AI_THEME_MAX_CANDIDATES_PER_PROMPT: int = 40
+    AI_THEME_MAX_THEMES: int = 8
+
+    # "provider:model" entries whose chat model and chains are built at startup
+    # (e.g. AI_WARM_UP_MODELS='["google_genai:gemini-2.0-flash"]')
+    AI_WARM_UP_MODELS: List[str] = []
+
+    # The local_fake provider answers offline from the prompt itself (benchmarks, tests).
+    # Each call takes LOCAL_FAKE_LATENCY_SECONDS +/- LOCAL_FAKE_LATENCY_JITTER and fails
+    # with LOCAL_FAKE_ERROR_RATE, or answers 429 with LOCAL_FAKE_RATE_LIMIT_RATE asking to
+    # retry after LOCAL_FAKE_RETRY_AFTER_SECONDS; draws are seeded by LOCAL_FAKE_SEED
+    LOCAL_FAKE_LATENCY_SECONDS: float = 0.0
+    LOCAL_FAKE_LATENCY_JITTER: float = 0.0
+    LOCAL_FAKE_ERROR_RATE: float = 0.0
+    LOCAL_FAKE_RATE_LIMIT_RATE: float = 0.0
+    LOCAL_FAKE_RETRY_AFTER_SECONDS: float = 1.0
+    LOCAL_FAKE_CODES_PER_CALL: int = 3
+    LOCAL_FAKE_SEED: int = 0
+
+    # Background AI jobs (/ai/jobs). Worker threads run whole pipelines apart from
+    # the web threadpool; their chunk calls still share AI_MAX_CONCURRENT_REQUESTS.
+    # A running job's worker renews its lease from a heartbeat; a job whose lease
+    # expires (its worker died) is marked failed and can be resumed.
+    AI_JOB_WORKERS: int = 2
+    AI_JOB_LEASE_SECONDS: float = 1800.0
+    AI_JOB_POLL_SECONDS: float = 2.0
+    AI_JOB_RESUME_ON_STARTUP: bool = False
+
     GOOGLE_API_KEY: str
+    # Only needed by provider routes that use these providers
+    OPENAI_API_KEY: Optional[str] = None
+    ANTHROPIC_API_KEY: Optional[str] = None
+    GROQ_API_KEY: Optional[str] = None
 
     # Load .env from server folder when running from project root
     model_config = SettingsConfigDict(env_file=[".env", "server/.env"])
@@ -1,15 +1,50 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 # Import all models first to ensure they're registered with SQLAlchemy
 from app.models import (
     User, Project, Theme, Codebook, Code,
-    Document, Annotation, CodeAssignment
+    Document, Annotation, CodeAssignment, IngestionJob, StorageDeletion,
+    AIJob, AIJobEvent, AIPipelineCheckpoint
 )
 
-from app.api import auth, users, projects, documents, codes, annotations, code_assignments, ai_services, codebooks, themes, code_review
+from app.api import auth, users, projects, documents, codes, annotations, code_assignments, ai_services, ai_jobs, codebooks, themes, code_review
+from app.core.config import settings
+from app.db.session import engine
+from app.services.document.extraction_pool import get_extraction_pool
+from app.services.document.ingestion_queue import get_ingestion_queue
+from app.services.storage import get_storage_outbox
+from app.services.ai.llm_service import LLMService
+from app.services.ai.ai_job_runner import get_ai_job_runner
 
-app = FastAPI(title="Thematic Analysis AI Tool", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.DOCUMENT_BACKGROUND_INGESTION:
+        # Pick up jobs queued before the last restart
+        get_ingestion_queue().start(engine)
+    if settings.STORAGE_OUTBOX_DRAIN_ON_STARTUP:
+        # Finish file deletions queued before the last restart
+        get_storage_outbox().start(engine)
+    if settings.AI_JOB_RESUME_ON_STARTUP:
+        # Run AI jobs queued before the last restart
+        get_ai_job_runner().start(engine)
+    for entry in settings.AI_WARM_UP_MODELS:
+        provider, _, model_name = entry.partition(":")
+        try:
+            LLMService.warm_up(model_name=model_name, provider=provider)
+        except Exception as e:
+            print(f"⚠️ Could not warm up LLM service {entry}: {str(e)}")
+    yield
+    # Stop background workers on shutdown
+    get_ingestion_queue().shutdown()
+    get_storage_outbox().shutdown()
+    get_ai_job_runner().shutdown()
+    get_extraction_pool().shutdown()
+
+
+app = FastAPI(title="Thematic Analysis AI Tool", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -39,6 +74,7 @@ app.include_router(
     codebooks.router, prefix="/api/v1/codebooks", tags=["Codebooks"])
 app.include_router(code_review.router,
                    prefix="/api/v1/code-review", tags=["Code Review"])
+app.include_router(ai_jobs.router, prefix="/api/v1/ai/jobs", tags=["AI Jobs"])
 app.include_router(ai_services.router, prefix="/api/v1/ai",
                    tags=["AI Services"])
 
@@ -7,9 +7,14 @@ from .code import Code
 from .document import Document, DocumentType
 from .annotation import Annotation, AnnotationType
 from .code_assignments import CodeAssignment
+from .ingestion_job import IngestionJob
+from .storage_deletion import StorageDeletion
+from .ai_job import AIJob, AIJobEvent, AIPipelineCheckpoint, AICodedChunk
+from .document_chunk import DocumentChunk
 
 __all__ = [
     'User', 'Project', 'Theme', 'Codebook', 'Code',
-    'Document', 'Annotation', 'CodeAssignment',
+    'Document', 'Annotation', 'CodeAssignment', 'IngestionJob', 'StorageDeletion',
+    'AIJob', 'AIJobEvent', 'AIPipelineCheckpoint', 'AICodedChunk', 'DocumentChunk',
     'project_collaborators', 'DocumentType', 'AnnotationType'
 ]
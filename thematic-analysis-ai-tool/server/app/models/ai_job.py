@@ -0,0 +1,88 @@
+from sqlalchemy import Column, Integer, Text, DateTime, ForeignKey, String, JSON, UniqueConstraint
+from sqlalchemy.orm import relationship
+import datetime
+from app.db.session import Base
+
+
+def _utcnow() -> datetime.datetime:
+    # Naive UTC, so values compare the same way on SQLite and PostgreSQL
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class AIJob(Base):
+    """One queued AI coding pipeline run (initial or deductive coding)"""
+    __tablename__ = "ai_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    kind = Column(String(30), nullable=False)  # initial_coding, deductive_coding
+    params = Column(JSON, nullable=False)  # document_ids, codebook_ids, model_name, provider, use_cache
+
+    status = Column(String(20), nullable=False, default="pending", index=True)  # pending, running, completed, failed, cancelled
+    stage = Column(String(30), nullable=False, default="queued")  # queued, coding, refinement, grouping, saving, done
+    chunks_total = Column(Integer, nullable=False, default=0)
+    chunks_done = Column(Integer, nullable=False, default=0)
+    chunks_failed = Column(Integer, nullable=False, default=0)
+
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+
+    # Claim lease, renewed by every progress event
+    locked_at = Column(DateTime, nullable=True)
+    started_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=_utcnow)
+    updated_at = Column(DateTime, nullable=False, default=_utcnow, onupdate=_utcnow)
+
+    events = relationship("AIJobEvent", back_populates="job",
+                          cascade="all, delete-orphan", order_by="AIJobEvent.id")
+    checkpoints = relationship("AIPipelineCheckpoint", back_populates="job",
+                               cascade="all, delete-orphan")
+
+
+class AIJobEvent(Base):
+    """Progress event of an AI job; ids order the stream and resume it after a reconnect"""
+    __tablename__ = "ai_job_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("ai_jobs.id", ondelete="CASCADE"), nullable=False, index=True)
+    event = Column(String(30), nullable=False)  # stage, chunk_done, refinement_done, grouping_done, completed, failed, cancelled
+    data = Column(JSON, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=_utcnow)
+
+    job = relationship("AIJob", back_populates="events")
+
+
+class AIPipelineCheckpoint(Base):
+    """
+    Output of one LLM call of an AI job's pipeline, so a resumed run skips it.
+    `key` is a digest of the call's input; the "saving" stage holds a single
+    marker row written in the same transaction as the codes.
+    """
+    __tablename__ = "ai_pipeline_checkpoints"
+    __table_args__ = (UniqueConstraint("job_id", "stage", "key", name="uq_ai_pipeline_checkpoint"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("ai_jobs.id", ondelete="CASCADE"), nullable=False, index=True)
+    stage = Column(String(30), nullable=False)  # coding, refinement, grouping, group_merging, saving
+    key = Column(String(64), nullable=False)
+    data = Column(JSON, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=_utcnow)
+
+    job = relationship("AIJob", back_populates="checkpoints")
+
+
+class AICodedChunk(Base):
+    """
+    A document chunk initial coding has coded into an AI session codebook, so
+    an incremental run codes only new or changed chunks. `chunk_key` is a
+    digest of the chunk text, the chunking parameters and the prompt version.
+    """
+    __tablename__ = "ai_coded_chunks"
+    __table_args__ = (UniqueConstraint("codebook_id", "document_id", "chunk_key", name="uq_ai_coded_chunk"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    codebook_id = Column(Integer, ForeignKey("codebooks.id", ondelete="CASCADE"), nullable=False, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False, index=True)
+    chunk_key = Column(String(64), nullable=False)
+    created_at = Column(DateTime, nullable=False, default=_utcnow)
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON, Enum
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON, Enum, event, inspect
+from sqlalchemy.orm import relationship, deferred
 import datetime
 import enum
 from app.db.session import Base
@@ -19,14 +19,20 @@ class Document(Base):
     name = Column(String, nullable=False)
     description = Column(Text, nullable=True)
 
-    # Cloudinary integration
+    # Object storage (Cloudinary by default); the columns hold the key and URL of any backend
     cloudinary_public_id = Column(String, nullable=True)
     cloudinary_url = Column(String, nullable=True)
+    storage_backend = Column(String(20), nullable=True)  # cloudinary, local; NULL means cloudinary
 
     file_size = Column(Integer, nullable=True)
-    file_hash = Column(String, nullable=True)
-    content = Column(Text, nullable=True)
+    file_hash = Column(String, nullable=True, index=True)
+    # Deferred: listings never need the full text; read ranges with substr()
+    # or undefer(Document.content) where the whole text is wanted
+    content = deferred(Column(Text, nullable=True))
+    content_length = Column(Integer, nullable=True)  # characters, kept in step with content
     file_metadata = Column(JSON, nullable=True)
+    # EXTRACTION_VERSION of the parser that produced content/file_metadata
+    extraction_version = Column(Integer, nullable=True)
 
     document_type = Column(Enum(DocumentType), nullable=False)
 
@@ -37,6 +43,8 @@ class Document(Base):
     updated_at = Column(DateTime, default=datetime.datetime.now(datetime.timezone.utc),
                         onupdate=datetime.datetime.now(datetime.timezone.utc), nullable=False)
     processed_at = Column(DateTime, nullable=True)
+    processing_status = Column(String(20), nullable=False, default="completed")  # pending, processing, completed, failed
+    processing_error = Column(Text, nullable=True)
 
     code_assignments = relationship("CodeAssignment", back_populates="document", cascade="all, delete-orphan")
     project = relationship("Project", back_populates="documents")
@@ -44,6 +52,74 @@ class Document(Base):
     # segments = relationship("DocumentSegment", back_populates="document", cascade="all, delete-orphan")
     # quotes = relationship("Quote", back_populates="document", cascade="all, delete-orphan")
     annotations = relationship("Annotation", back_populates="document")
+    ingestion_jobs = relationship("IngestionJob", back_populates="document", cascade="all, delete-orphan")
 
     def __repr__(self):
         return f"<Document(id={self.id}, name='{self.name}', type={self.document_type.value})>"
+
+
+@event.listens_for(Document, "before_insert")
+@event.listens_for(Document, "before_update")
+def _set_content_length(mapper, connection, target):
+    if inspect(target).attrs.content.history.has_changes():
+        target.content_length = len(target.content) if target.content is not None else None
+
+
+# Full-text search index over name and content. It lives outside the ORM
+# columns because each database builds it differently: PostgreSQL uses a
+# generated tsvector column with a GIN index, SQLite an FTS5 table kept in
+# sync by triggers. Both are maintained by the database on every write.
+SEARCH_TEXT_CONFIG = "english"
+# PostgreSQL rejects a tsvector over 1MB, which would make inserting a very
+# large document fail; only this many leading characters of content are indexed
+SEARCH_CONTENT_MAX_CHARS = 250_000
+
+POSTGRES_SEARCH_DDL = [
+    f"""ALTER TABLE documents ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('{SEARCH_TEXT_CONFIG}', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('{SEARCH_TEXT_CONFIG}',
+                                  left(coalesce(content, ''), {SEARCH_CONTENT_MAX_CHARS})), 'B')
+        ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_documents_search_vector ON documents USING gin (search_vector)",
+]
+
+SQLITE_SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+        name, content, content='documents', content_rowid='id', tokenize='porter unicode61')""",
+    """CREATE TRIGGER IF NOT EXISTS documents_fts_insert AFTER INSERT ON documents BEGIN
+        INSERT INTO documents_fts(rowid, name, content)
+        VALUES (new.id, new.name, coalesce(new.content, ''));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS documents_fts_delete AFTER DELETE ON documents BEGIN
+        INSERT INTO documents_fts(documents_fts, rowid, name, content)
+        VALUES ('delete', old.id, old.name, coalesce(old.content, ''));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS documents_fts_update AFTER UPDATE OF name, content ON documents BEGIN
+        INSERT INTO documents_fts(documents_fts, rowid, name, content)
+        VALUES ('delete', old.id, old.name, coalesce(old.content, ''));
+        INSERT INTO documents_fts(rowid, name, content)
+        VALUES (new.id, new.name, coalesce(new.content, ''));
+    END""",
+]
+
+
+@event.listens_for(Document.__table__, "after_create")
+def _create_search_index(target, connection, **kw):
+    """Set up the search index (and content storage) when create_all creates the table"""
+    if connection.dialect.name == "postgresql":
+        # Uncompressed out-of-line storage, so substr() reads only the chunks of a range
+        statements = ["ALTER TABLE documents ALTER COLUMN content SET STORAGE EXTERNAL"] + POSTGRES_SEARCH_DDL
+    elif connection.dialect.name == "sqlite":
+        statements = SQLITE_SEARCH_DDL
+    else:
+        return
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+
+
+@event.listens_for(Document.__table__, "after_drop")
+def _drop_search_index(target, connection, **kw):
+    # The triggers go with the documents table; the FTS5 table does not
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql("DROP TABLE IF EXISTS documents_fts")
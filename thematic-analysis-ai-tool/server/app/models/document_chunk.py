@@ -0,0 +1,31 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, String, UniqueConstraint
+import datetime
+from app.db.session import Base
+
+
+def _utcnow() -> datetime.datetime:
+    # Naive UTC, so values compare the same way on SQLite and PostgreSQL
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class DocumentChunk(Base):
+    """
+    Where one chunk of a document's content starts and ends, for one chunk
+    size and overlap. `content_hash` is the digest of the whole content the
+    chunks were cut from, so rows of an older content are recognised and
+    replaced; `chunk_hash` is the digest of the chunk's own text.
+    """
+    __tablename__ = "document_chunks"
+    __table_args__ = (UniqueConstraint("document_id", "chunk_size", "chunk_overlap", "chunk_index",
+                                       name="uq_document_chunk"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False, index=True)
+    chunk_size = Column(Integer, nullable=False)
+    chunk_overlap = Column(Integer, nullable=False)
+    chunk_index = Column(Integer, nullable=False)
+    start_char = Column(Integer, nullable=False)
+    end_char = Column(Integer, nullable=False)
+    chunk_hash = Column(String(64), nullable=False)
+    content_hash = Column(String(64), nullable=False)
+    created_at = Column(DateTime, nullable=False, default=_utcnow)
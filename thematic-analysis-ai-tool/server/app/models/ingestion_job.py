@@ -0,0 +1,35 @@
+from sqlalchemy import Column, Integer, Text, DateTime, ForeignKey, String
+from sqlalchemy.orm import relationship
+import datetime
+from app.db.session import Base
+
+
+def _utcnow() -> datetime.datetime:
+    # Naive UTC, so values compare the same way on SQLite and PostgreSQL
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class IngestionJob(Base):
+    """One queued extraction + storage upload for a document uploaded in the background"""
+    __tablename__ = "ingestion_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False, index=True)
+
+    status = Column(String(20), nullable=False, default="pending", index=True)  # pending, running, completed, dead
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    last_error = Column(Text, nullable=True)
+
+    # Spooled upload the worker reads; removed once the job completes
+    spool_path = Column(String, nullable=False)
+    filename = Column(String, nullable=False)
+
+    # Retries are scheduled by pushing available_at forward; locked_at is the claim lease
+    available_at = Column(DateTime, nullable=False, default=_utcnow)
+    locked_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=_utcnow)
+    updated_at = Column(DateTime, nullable=False, default=_utcnow, onupdate=_utcnow)
+
+    document = relationship("Document", back_populates="ingestion_jobs")
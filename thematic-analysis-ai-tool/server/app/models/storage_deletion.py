@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, Text, DateTime, String
+import datetime
+from app.db.session import Base
+
+
+def _utcnow() -> datetime.datetime:
+    # Naive UTC, so values compare the same way on SQLite and PostgreSQL
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class StorageDeletion(Base):
+    """Outbox row for a stored file to delete once its document is gone"""
+    __tablename__ = "storage_deletions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    object_key = Column(String, nullable=False)
+    backend = Column(String(20), nullable=False)  # storage backend that holds the object
+
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    available_at = Column(DateTime, nullable=False, default=_utcnow, index=True)
+    created_at = Column(DateTime, nullable=False, default=_utcnow)
@@ -6,15 +6,19 @@ from pydantic import BaseModel, Field
 
 class InitialCodingRequest(BaseModel):
     document_ids: List[int]
+    use_cache: bool = True  # false re-sends every prompt to the provider
+    incremental: bool = False  # true codes only chunks the latest AI session has not coded yet
 
 
 class ThemeGenerationRequest(BaseModel):
     code_assignment_ids: List[int]
+    use_cache: bool = True
 
 
 class DeductiveCodingRequest(BaseModel):
     document_ids: List[int]
     codebook_ids: List[int]
+    use_cache: bool = True
 
 
 # LLM output schemas
@@ -65,6 +69,48 @@ class ThemeOutput(BaseModel):
         description="List of code names that relate to this theme.")
 
 
+class CandidateTheme(BaseModel):
+    """
+    Represents a theme proposed for one partition of the codes.
+    """
+    theme_name: str = Field(description="The name of the theme.")
+    theme_description: str = Field(
+        description="Detailed description of the theme.")
+    related_code_ids: List[int] = Field(
+        description="IDs of the codes that relate to this theme, from their 'Code ID' labels.")
+
+
+class MultipleThemesOutput(BaseModel):
+    """
+    Represents the candidate themes generated from one partition of the codes.
+    """
+    reasoning: str = Field(
+        description="The reasoning behind the themes.")
+    themes: List[CandidateTheme] = Field(
+        description="Themes identified among the given codes.")
+
+
+class ConsolidatedTheme(BaseModel):
+    """
+    Represents a theme formed by consolidating candidate themes.
+    """
+    theme_name: str = Field(description="The name of the theme.")
+    theme_description: str = Field(
+        description="Detailed description of the theme.")
+    source_themes: List[int] = Field(
+        description="Numbers of the candidate themes combined into this one, from their 'Theme N:' headings.")
+
+
+class ThemeConsolidationOutput(BaseModel):
+    """
+    Represents the themes consolidated from candidate themes.
+    """
+    reasoning: str = Field(
+        description="The reasoning behind the consolidation.")
+    themes: List[ConsolidatedTheme] = Field(
+        description="The consolidated themes.")
+
+
 class DeductiveCodingOutput(BaseModel):
     """
     Represents the output of deductive coding using existing codes.
@@ -97,6 +143,24 @@ class CodeRefinementOutput(BaseModel):
         description="Confidence score (0-1) for the refinement decision.")
 
 
+class CodeRefinementDecision(CodeRefinementOutput):
+    """
+    Refinement decision for one code of a batch.
+    """
+    code_number: int = Field(
+        description="The number of the code this decision is about, from its 'Code N:' heading.")
+    code_name: str = Field(
+        description="The name of the code this decision is about, exactly as given.")
+
+
+class BatchCodeRefinementOutput(BaseModel):
+    """
+    Represents the refinement decisions for a batch of codes.
+    """
+    decisions: List[CodeRefinementDecision] = Field(
+        description="One refinement decision per code, in the order the codes were given.")
+
+
 class CodeGroup(BaseModel):
     """
     Represents a group of related codes.
@@ -123,6 +187,28 @@ class CodeGroupingOutput(BaseModel):
         default=[], description="Codes that don't fit into any group")
 
 
+class MergedCodeGroup(BaseModel):
+    """
+    Represents a group formed from groups proposed for different parts of a codebook.
+    """
+    group_name: str = Field(
+        description="Name of the merged group (like a sub-theme)")
+    group_description: str = Field(
+        description="Description of what the merged group represents")
+    source_groups: List[int] = Field(
+        description="Numbers of the groups combined into this one, from their 'Group N:' headings")
+
+
+class CodeGroupMergeOutput(BaseModel):
+    """
+    Represents the output of merging code groups.
+    """
+    reasoning: str = Field(
+        description="Overall reasoning for which groups were merged")
+    groups: List[MergedCodeGroup] = Field(
+        description="Merged groups; groups not listed in any source_groups are kept as they are")
+
+
 class ReportOutput(BaseModel):
     """
     Represents the output of the report generation process.
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 
 class CodeAssignment(BaseModel):
@@ -7,6 +7,9 @@ class CodeAssignment(BaseModel):
     document_id: int
     text: str
     project_id: int
+    code_name: Optional[str] = None
+    code_description: Optional[str] = None
+    text_snapshot: Optional[str] = None
 
 
 class ThemeGenerationRequest(BaseModel):
@@ -22,3 +25,4 @@ class ThemeGenerationResponse(BaseModel):
     created_at: str
     reasoning: str
     related_codes: List[str]
+    related_code_ids: List[int] = []
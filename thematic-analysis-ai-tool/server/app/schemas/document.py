@@ -35,8 +35,8 @@ class DocumentUpdate(BaseModel):
     description: Optional[str] = None
 
 
-class DocumentOut(DocumentBase):
-    """Complete document output schema"""
+class DocumentSummary(DocumentBase):
+    """Document output without its content"""
     model_config = ConfigDict(from_attributes=True)
 
     # Required fields
@@ -48,10 +48,27 @@ class DocumentOut(DocumentBase):
     file_size: Optional[int] = None
     file_hash: Optional[str] = None
     raw_content_url: Optional[str] = None
-    content: Optional[str] = None
+    content_length: Optional[int] = None
     # raw_content: Optional[str] = None
     file_metadata: Optional[Dict[str, Any]] = None
     processed_at: Optional[datetime] = None
+    processing_status: Optional[str] = None
+    processing_error: Optional[str] = None
+
+
+class DocumentOut(DocumentSummary):
+    """Complete document output schema"""
+    content: Optional[str] = None
+
+
+class DocumentContentRange(BaseModel):
+    """A slice of document content by character offsets"""
+    document_id: int
+    start: int
+    end: int
+    total_length: int
+    content: str
+    next_start: Optional[int] = None
 
 
 class DocumentUpload(BaseModel):
@@ -64,6 +81,31 @@ class DocumentUpload(BaseModel):
     upload_status: str = "success"
 
 
+class SearchSnippet(BaseModel):
+    """A window of document content around search matches"""
+    text: str
+    start: int  # character offsets into the document content
+    end: int
+    highlights: List[List[int]]  # [start, end] offsets of matched words
+
+
+class DocumentSearchHit(BaseModel):
+    document_id: int
+    name: str
+    document_type: DocumentType
+    rank: float
+    snippets: List[SearchSnippet]
+
+
+class DocumentSearchResults(BaseModel):
+    """One page of ranked search results"""
+    query: str
+    total: int
+    limit: int
+    offset: int
+    results: List[DocumentSearchHit]
+
+
 class BulkUploadResult(BaseModel):
     """Response schema for bulk file uploads"""
     uploaded_documents: List[DocumentUpload]
@@ -2,7 +2,7 @@ from pydantic import BaseModel, ConfigDict
 from typing import List, Optional, TYPE_CHECKING, Dict, Any, Union
 from datetime import datetime
 from app.schemas.user import UserOut
-from app.schemas.document import DocumentOut
+from app.schemas.document import DocumentOut, DocumentSummary
 from app.schemas.code import CodeOut
 from app.schemas.codebook import CodebookOut, FinalizedCodebook
 from app.schemas.code_assignment import CodeAssignmentOut
@@ -40,7 +40,7 @@ class ProjectOut(ProjectBase):
     id: int
     owner_id: int
 
-    documents: Optional[List[DocumentOut]] = None
+    documents: Optional[List[DocumentSummary]] = None
     codes: Optional[List[CodeOut]] = None
     codebooks: Optional[List[CodebookOut]] = None
     # quotes: Optional[List[QuoteOut]] = None
@@ -1,13 +1,57 @@
 from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.ai_job import AICodedChunk
+from app.models.code import Code
+from app.models.code_assignments import CodeAssignment
 from app.schemas.ai_services import MultipleCodesOutput, DeductiveCodingOutput
-from app.services.ai.llm_service import LLMService
+from app.services.ai.llm_service import LLMService, prompt_version
 from app.services.codebook_service import CodebookService
 from app.services.ai.ai_coding_validators import AICodingValidators
-from app.services.ai.ai_coding_utils import AICodingUtils
-from app.utils.chunks import create_chunks
+from app.services.ai.ai_coding_utils import AICodingUtils, ProgressCallback
+from app.services.ai.chunk_executor import ChunkOutcome
+from app.services.ai.pipeline_checkpoints import PipelineCancelled, PipelineCheckpoints, PipelineIncomplete
+from collections import Counter, defaultdict
+from app.services.ai.quote_alignment import QuoteAligner
+from app.services.document.chunk_store import get_chunk_store
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+import asyncio
+import hashlib
+import json
 import re
 
 
+class CodingPlan(NamedTuple):
+    """Everything a coding run needs from the database before its LLM calls"""
+    work: list  # (document, chunk number, chunk count, chunk text, chunk start), in document order
+    inputs: List[dict]  # LLM input for each entry of `work`
+    codes_dict: dict  # codes known before the run (deductive coding)
+    ai_session_codebook: Any
+    # Optional parts default to None rather than a shared {} or [], which every plan built
+    # without them would hold; read them with `or`
+    contents: Optional[Dict[int, str]] = None  # document id -> content, for placing quotes
+    # Incremental initial coding
+    assignments: Optional[List[dict]] = None  # assignments saved by earlier runs of the session
+    chunk_keys: Optional[List[str]] = None  # chunk key of each entry of `work`
+    coded_chunks: Optional[Dict[int, List[str]]] = None  # document id -> keys of chunks coded earlier, still current
+    stale_assignment_ids: Optional[List[int]] = None  # saved, unreviewed assignments whose text left the document
+    skipped_chunks: int = 0
+
+
+class ChunkedDocuments(NamedTuple):
+    """The chunks of a run's documents, from the chunk store"""
+    work: list  # (document, chunk number, chunk count, chunk text, chunk start), in document order
+    contents: Dict[int, str]  # document id -> content the chunks were cut from
+    chunk_hashes: List[str]  # digest of the text of each entry of `work`
+
+
+class SessionState(NamedTuple):
+    """What an AI session codebook holds from earlier initial coding runs"""
+    codes_dict: dict  # code_name -> code_data, status "existing"
+    assignments: List[dict]  # assignment_data of its codes, status "existing"
+    coded_chunks: Dict[int, List[str]]  # document id -> keys of its chunks coded and still current
+    stale_assignment_ids: List[int]
+
+
 class AICodeGenerationService:
     """Service for generating AI-based code assignments using in-memory processing"""
 
@@ -17,124 +61,98 @@ class AICodeGenerationService:
         db: Session,
         user_id: int,
         model_name: str = "gemini-2.0-flash",
-        provider: str = "google_genai"
+        provider: str = "google_genai",
+        use_cache: bool = True,
+        progress: Optional[ProgressCallback] = None,
+        checkpoints: Optional[PipelineCheckpoints] = None,
+        incremental: bool = False
     ) -> dict:
 
-        llm_service = LLMService(model_name=model_name, provider=provider)
+        llm_service = LLMService.get(model_name=model_name, provider=provider)
+        ai_session_codebook = None
 
         try:
-            documents = AICodingValidators.get_and_validate_documents(
-                db, document_ids, user_id)
-            if not AICodingValidators.validate_llm_service(llm_service, "initial_coding"):
+            plan = AICodeGenerationService._plan_initial_coding(
+                db, document_ids, user_id, llm_service, incremental)
+            if plan is None:
                 return AICodeGenerationService._create_empty_response(None)
-
-            project, research_context = AICodingValidators.get_project_and_research_context(
-                db, documents[0].project_id, user_id
+            ai_session_codebook = plan.ai_session_codebook
+            if not plan.work:
+                return AICodeGenerationService._nothing_to_code_response(plan)
+
+            outcomes = AICodingUtils.chunk_executor(checkpoints, "coding").map(
+                provider,
+                lambda input_data: AICodingUtils.make_rate_limited_llm_call(
+                    llm_service=llm_service,
+                    service_type="initial_coding",
+                    input_data=input_data,
+                    provider=provider,
+                    use_cache=use_cache
+                ),
+                plan.inputs,
+                on_done=AICodingUtils.chunk_progress(progress, plan.work)
             )
-            if not project:
-                return AICodeGenerationService._create_empty_response(None)
+            if checkpoints:
+                checkpoints.require_complete("coding", outcomes)
+            return AICodeGenerationService._merge_initial_coding(plan, outcomes)
 
-            # Create AI session codebook (this needs to be in DB)
-            ai_session_codebook = CodebookService.get_or_create_ai_session_codebook(
-                db=db,
-                user_id=user_id,
-                project_id=documents[0].project_id,  # type: ignore
-                session_type="AI_initial_coding"
-            )
+        except (PipelineCancelled, PipelineIncomplete):
+            raise
+        except Exception as e:
+            if checkpoints:
+                # Fail the job instead, so that resuming it retries only what is missing
+                raise
+            print(f"Error in in-memory code generation: {str(e)}")
+            return AICodeGenerationService._create_empty_response(ai_session_codebook)
 
-            # Get existing codes context
-            existing_codes = AICodingValidators.get_existing_codes(
-                db, documents[0].project_id, user_id)  # type: ignore
-            existing_codes_text = AICodingUtils.format_codes_for_llm(
-                existing_codes)
-
-            # Process documents and generate code requests (in-memory)
-            codes_dict = {}  # code_name -> code_data
-            assignments = []  # list of assignment_data
-
-            for document in documents:
-                chunks = create_chunks(str(document.content), chunk_size=4000)
-
-                for chunk_idx, chunk in enumerate(chunks):
-                    chunk_num = chunk_idx + 1
-                    print(
-                        f"Processing chunk {chunk_num}/{len(chunks)} for document {document.id}")
-
-                    try:
-                        coding_response: MultipleCodesOutput = AICodingUtils.make_rate_limited_llm_call(
-                            llm_service=llm_service,
-                            service_type="initial_coding",
-                            input_data={
-                                "text": chunk,
-                                "research_context": research_context,
-                                "existing_codes": existing_codes_text
-                            },
-                            provider=provider
-                        )
-
-                        print(f"✅ Chunk {chunk_num} succeeded")
-                        print(
-                            f"LLM Response - Found {len(coding_response.codes)} codes in chunk")
-
-                        # Process each code (in-memory)
-                        for code_output in coding_response.codes:
-                            code_name = code_output.code
-
-                            # Add code to in-memory dict
-                            if code_name not in codes_dict:
-                                valid_color = code_output.color if AICodeGenerationService.is_valid_hex_color(
-                                    code_output.color) else "#3B82F6"
-                                codes_dict[code_name] = {
-                                    "name": code_name,
-                                    "description": code_output.code_description or f"Auto-created code: {code_name}",
-                                    "color": valid_color,  # Default color if not provided or invalid
-                                    "project_id": document.project_id,
-                                    "is_auto_generated": True,
-                                    "status": "created"
-                                }
-                                print(f"Code: {code_name}, Is new: True")
-                            else:
-                                print(f"Code: {code_name}, Is new: False")
-
-                            # Add assignment to in-memory list
-                            quote = code_output.quote
-                            start_char = chunk.find(quote) if quote else 0
-                            end_char = start_char + \
-                                len(quote) if quote else len(chunk)
-
-                            assignments.append({
-                                "document_id": document.id,
-                                "code_name": code_name,
-                                "start_char": start_char,
-                                "end_char": end_char,
-                                "text": quote or chunk[:100] + "...",
-                                "confidence": code_output.confidence,
-                                "status": "created"
-                            })
-
-                    except Exception as e:
-                        print(
-                            f"❌ Error processing chunk {chunk_num}: {str(e)}")
-                        continue
+    @staticmethod
+    async def agenerate_initial_codes_in_memory(
+        document_ids: list[int],
+        db: Session,
+        user_id: int,
+        model_name: str = "gemini-2.0-flash",
+        provider: str = "google_genai",
+        use_cache: bool = True,
+        progress: Optional[ProgressCallback] = None,
+        checkpoints: Optional[PipelineCheckpoints] = None,
+        incremental: bool = False
+    ) -> dict:
+        """Async initial coding: database work on a worker thread, LLM calls awaited on the loop"""
+        llm_service = LLMService.get(model_name=model_name, provider=provider)
+        ai_session_codebook = None
 
-            print(
-                f"Generated {len(assignments)} assignments for {len(codes_dict)} unique codes (in-memory)")
-
-            return {
-                "results": assignments,  # For compatibility with main service
-                "codes_dict": codes_dict,
-                "assignments": assignments,
-                "ai_session_codebook": ai_session_codebook,
-                "summary": {
-                    "total_requests": len(assignments),
-                    "total_codes": len(codes_dict),
-                    "successful_assignments": len(assignments),
-                    "codes_created": len(codes_dict),
-                    "errors": []
-                }
-            }
+        try:
+            plan = await asyncio.to_thread(
+                AICodeGenerationService._plan_initial_coding,
+                db, document_ids, user_id, llm_service, incremental)
+            if plan is None:
+                return AICodeGenerationService._create_empty_response(None)
+            ai_session_codebook = plan.ai_session_codebook
+            if not plan.work:
+                return AICodeGenerationService._nothing_to_code_response(plan)
+
+            outcomes = await AICodingUtils.chunk_executor(checkpoints, "coding").amap(
+                provider,
+                lambda input_data: AICodingUtils.amake_rate_limited_llm_call(
+                    llm_service=llm_service,
+                    service_type="initial_coding",
+                    input_data=input_data,
+                    provider=provider,
+                    use_cache=use_cache
+                ),
+                plan.inputs,
+                on_done=AICodingUtils.chunk_progress(progress, plan.work)
+            )
+            if checkpoints:
+                checkpoints.require_complete("coding", outcomes)
+            return AICodeGenerationService._merge_initial_coding(plan, outcomes)
 
+        except (PipelineCancelled, PipelineIncomplete):
+            raise
         except Exception as e:
+            if checkpoints:
+                # Fail the job instead, so that resuming it retries only what is missing
+                raise
             print(f"Error in in-memory code generation: {str(e)}")
             return AICodeGenerationService._create_empty_response(ai_session_codebook)
 
@@ -145,19 +163,245 @@ class AICodeGenerationService:
         db: Session,
         user_id: int,
         model_name: str = "gemini-2.0-flash",
-        provider: str = "google_genai"
+        provider: str = "google_genai",
+        use_cache: bool = True,
+        progress: Optional[ProgressCallback] = None,
+        checkpoints: Optional[PipelineCheckpoints] = None
     ) -> dict:
         """Generate deductive codes and assignments, keeping everything in memory"""
         print(
             f"🚀 Starting deductive coding for {len(document_ids)} documents (in-memory)")
 
-        llm_service = LLMService(model_name=model_name, provider=provider)
+        llm_service = LLMService.get(model_name=model_name, provider=provider)
+
+        plan = AICodeGenerationService._plan_deductive_coding(
+            db, document_ids, codebook_ids, user_id, llm_service)
+        if plan is None:
+            return {"codebook_ids": codebook_ids, "results": [], "codes_dict": {}, "assignments": [], "summary": {}}
+
+        outcomes = AICodingUtils.chunk_executor(checkpoints, "coding").map(
+            provider,
+            lambda input_data: AICodingUtils.make_rate_limited_llm_call(
+                llm_service=llm_service,
+                service_type="deductive_coding",
+                input_data=input_data,
+                provider=provider,
+                use_cache=use_cache
+            ),
+            plan.inputs,
+            on_done=AICodingUtils.chunk_progress(progress, plan.work)
+        )
+        if checkpoints:
+            checkpoints.require_complete("coding", outcomes)
+        return AICodeGenerationService._merge_deductive_coding(plan, outcomes, codebook_ids)
+
+    @staticmethod
+    async def agenerate_deductive_codes_in_memory(
+        document_ids: list[int],
+        codebook_ids: list[int],
+        db: Session,
+        user_id: int,
+        model_name: str = "gemini-2.0-flash",
+        provider: str = "google_genai",
+        use_cache: bool = True,
+        progress: Optional[ProgressCallback] = None,
+        checkpoints: Optional[PipelineCheckpoints] = None
+    ) -> dict:
+        """Async deductive coding: database work on a worker thread, LLM calls awaited on the loop"""
+        print(
+            f"🚀 Starting deductive coding for {len(document_ids)} documents (in-memory)")
+
+        llm_service = LLMService.get(model_name=model_name, provider=provider)
+
+        plan = await asyncio.to_thread(
+            AICodeGenerationService._plan_deductive_coding,
+            db, document_ids, codebook_ids, user_id, llm_service)
+        if plan is None:
+            return {"codebook_ids": codebook_ids, "results": [], "codes_dict": {}, "assignments": [], "summary": {}}
+
+        outcomes = await AICodingUtils.chunk_executor(checkpoints, "coding").amap(
+            provider,
+            lambda input_data: AICodingUtils.amake_rate_limited_llm_call(
+                llm_service=llm_service,
+                service_type="deductive_coding",
+                input_data=input_data,
+                provider=provider,
+                use_cache=use_cache
+            ),
+            plan.inputs,
+            on_done=AICodingUtils.chunk_progress(progress, plan.work)
+        )
+        if checkpoints:
+            checkpoints.require_complete("coding", outcomes)
+        return AICodeGenerationService._merge_deductive_coding(plan, outcomes, codebook_ids)
+
+    # Helper methods
+    @staticmethod
+    def _plan_initial_coding(
+        db: Session,
+        document_ids: list[int],
+        user_id: int,
+        llm_service: LLMService,
+        incremental: bool = False
+    ) -> Optional[CodingPlan]:
+        """
+        Validate the request and prepare one LLM input per chunk. An
+        incremental run continues the user's latest AI session codebook and
+        plans only the chunks it has not coded yet.
+        """
+        documents = AICodingValidators.get_and_validate_documents(
+            db, document_ids, user_id)
+        if not AICodingValidators.validate_llm_service(llm_service, "initial_coding"):
+            return None
+
+        project, research_context = AICodingValidators.get_project_and_research_context(
+            db, documents[0].project_id, user_id
+        )
+        if not project:
+            return None
+
+        ai_session_codebook = None
+        if incremental:
+            ai_session_codebook = CodebookService.get_latest_ai_session_codebook(
+                db=db,
+                user_id=user_id,
+                project_id=documents[0].project_id,  # type: ignore
+                session_type="AI_initial_coding"
+            )
+        if ai_session_codebook is None:
+            # Create AI session codebook (this needs to be in DB)
+            ai_session_codebook = CodebookService.get_or_create_ai_session_codebook(
+                db=db,
+                user_id=user_id,
+                project_id=documents[0].project_id,  # type: ignore
+                session_type="AI_initial_coding"
+            )
+
+        # Get existing codes context
+        existing_codes = AICodingValidators.get_existing_codes(
+            db, documents[0].project_id, user_id)  # type: ignore
+        existing_codes_text = AICodingUtils.format_codes_for_llm(
+            existing_codes)
+
+        work, contents, chunk_hashes = AICodeGenerationService._chunk_documents(db, documents)
+        chunk_keys = [AICodeGenerationService.chunk_key(chunk_hash) for chunk_hash in chunk_hashes]
+        session = AICodeGenerationService._load_session(db, ai_session_codebook, work, chunk_keys, contents)
+
+        # Code only the chunks the session has not coded yet
+        todo = [index for index, ((document, *_), key) in enumerate(zip(work, chunk_keys))
+                if key not in session.coded_chunks.get(document.id, ())]
+        if len(todo) < len(work):
+            print(f"♻️ {len(work) - len(todo)} of {len(work)} chunks already coded in {ai_session_codebook.name}")
+        work = [work[index] for index in todo]
+        inputs = [{
+            "text": chunk,
+            "research_context": research_context,
+            "existing_codes": existing_codes_text
+        } for _, _, _, chunk, _ in work]
+        return CodingPlan(
+            work, inputs, session.codes_dict, ai_session_codebook, contents,
+            assignments=session.assignments,
+            chunk_keys=[chunk_keys[index] for index in todo],
+            coded_chunks=session.coded_chunks,
+            stale_assignment_ids=session.stale_assignment_ids,
+            skipped_chunks=len(chunk_keys) - len(todo)
+        )
+
+    @staticmethod
+    def _merge_initial_coding(plan: CodingPlan, outcomes: List[ChunkOutcome]) -> dict:
+        """
+        Fold chunk results into codes and assignments, in chunk order, after
+        those the session saved earlier
+        """
+        codes_dict = dict(plan.codes_dict)  # code_name -> code_data
+        assignments = []  # list of assignment_data
+        aligners: Dict[int, QuoteAligner] = {}  # document id -> aligner, built on first quote
+
+        # Merge in chunk order, so the result does not depend on which call finished first
+        for (document, chunk_num, chunk_count, chunk, chunk_start), outcome in zip(plan.work, outcomes):
+            if outcome.error is not None:
+                print(
+                    f"❌ Error processing chunk {chunk_num}/{chunk_count} of document {document.id}: {str(outcome.error)}")
+                continue
 
-        # Validation
+            coding_response: MultipleCodesOutput = outcome.result
+            print(
+                f"✅ Chunk {chunk_num}/{chunk_count} of document {document.id}: {len(coding_response.codes)} codes")
+
+            # Process each code (in-memory)
+            for code_output in coding_response.codes:
+                code_name = code_output.code
+
+                # Add code to in-memory dict
+                if code_name not in codes_dict:
+                    valid_color = code_output.color if AICodeGenerationService.is_valid_hex_color(
+                        code_output.color) else "#3B82F6"
+                    codes_dict[code_name] = {
+                        "name": code_name,
+                        "description": code_output.code_description or f"Auto-created code: {code_name}",
+                        "color": valid_color,  # Default color if not provided or invalid
+                        "project_id": document.project_id,
+                        "is_auto_generated": True,
+                        "status": "created"
+                    }
+
+                # Add assignment to in-memory list, at its absolute place in the document
+                quote = code_output.quote
+                start_char, end_char, text = AICodeGenerationService._place_quote(
+                    plan, aligners, document, chunk, chunk_start, quote)
+
+                assignments.append({
+                    "document_id": document.id,
+                    "code_name": code_name,
+                    "start_char": start_char,
+                    "end_char": end_char,
+                    "text": text,
+                    "confidence": code_output.confidence,
+                    "status": "created"
+                })
+
+        AICodeGenerationService._report_alignment(aligners)
+        print(
+            f"Generated {len(assignments)} assignments for {len(codes_dict)} unique codes (in-memory)")
+
+        # Chunks coded now or earlier; failed ones stay uncoded, so the next incremental run retries them
+        coded_chunks = {document_id: set(keys) for document_id, keys in (plan.coded_chunks or {}).items()}
+        if plan.chunk_keys is not None:
+            for (document, *_), key, outcome in zip(plan.work, plan.chunk_keys, outcomes):
+                if outcome.error is None:
+                    coded_chunks.setdefault(document.id, set()).add(key)
+
+        return {
+            "results": assignments,  # For compatibility with main service
+            "codes_dict": codes_dict,
+            "assignments": (plan.assignments or []) + assignments,
+            "ai_session_codebook": plan.ai_session_codebook,
+            "coded_chunks": {document_id: sorted(keys) for document_id, keys in coded_chunks.items()},
+            "stale_assignment_ids": list(plan.stale_assignment_ids or []),
+            "summary": {
+                "total_requests": len(assignments),
+                "total_codes": len(codes_dict),
+                "successful_assignments": len(assignments),
+                "codes_created": len([code for code in codes_dict.values() if code.get("status") == "created"]),
+                "chunks_coded": len(plan.work),
+                "chunks_skipped": plan.skipped_chunks,
+                "errors": []
+            }
+        }
+
+    @staticmethod
+    def _plan_deductive_coding(
+        db: Session,
+        document_ids: list[int],
+        codebook_ids: list[int],
+        user_id: int,
+        llm_service: LLMService
+    ) -> Optional[CodingPlan]:
+        """Validate the request and prepare one LLM input per chunk"""
         documents = AICodingValidators.get_and_validate_documents(
             db, document_ids, user_id)
         if not AICodingValidators.validate_llm_service(llm_service, "deductive_coding"):
-            return {"codebook_ids": codebook_ids, "results": [], "codes_dict": {}, "assignments": [], "summary": {}}
+            return None
         # Gather and validate provided codebooks
         codebooks = []
         for cb_id in codebook_ids:
@@ -166,20 +410,17 @@ class AICodeGenerationService:
             if cb:
                 codebooks.append(cb)
         if not codebooks:
-            return {"codebook_ids": codebook_ids, "results": [], "codes_dict": {}, "assignments": [], "summary": {}}
+            return None
 
         # Get project and research context
         project, research_context = AICodingValidators.get_project_and_research_context(
             db, documents[0].project_id, user_id  # type: ignore
         )
         if not project:
-            return {"codebook_ids": codebook_ids, "results": [], "codes_dict": {}, "assignments": [], "summary": {}}
-
-        # Process documents for deductive coding (in-memory)
-        codes_dict = {}  # code_name -> code_data
-        assignments = []  # list of assignment_data
+            return None
 
         # Pre-populate codes_dict with existing codes from provided codebooks
+        codes_dict = {}  # code_name -> code_data
         for cb in codebooks:
             for code in cb.codes:
                 codes_dict[code.name] = {
@@ -191,70 +432,64 @@ class AICodeGenerationService:
                     "status": "existing"
                 }
 
-        for document in documents:
-            print(f"Processing document ID: {document.id}")
+        # Format codes for LLM
+        codes_text = "\n".join(
+            [f"- {code.name}: {code.description}" for cb in codebooks for code in cb.codes])
+
+        work, contents, _ = AICodeGenerationService._chunk_documents(db, documents)
+        inputs = [{
+            "text": chunk,
+            "research_context": research_context,
+            "available_codes": codes_text
+        } for _, _, _, chunk, _ in work]
+        return CodingPlan(work, inputs, codes_dict, None, contents)
 
-            chunks = create_chunks(str(document.content), chunk_size=4000)
-            print(f"Created {len(chunks)} chunks for document {document.id}")
+    @staticmethod
+    def _merge_deductive_coding(plan: CodingPlan, outcomes: List[ChunkOutcome], codebook_ids: list[int]) -> dict:
+        """Turn chunk results into assignments of the known codes, in chunk order"""
+        codes_dict = plan.codes_dict
+        assignments = []  # list of assignment_data
+        aligners: Dict[int, QuoteAligner] = {}  # document id -> aligner, built on first quote
 
-            for chunk_idx, chunk in enumerate(chunks):
-                chunk_num = chunk_idx + 1
+        # Merge in chunk order, so the result does not depend on which call finished first
+        for (document, chunk_num, chunk_count, chunk, chunk_start), outcome in zip(plan.work, outcomes):
+            if outcome.error is not None:
                 print(
-                    f"Processing chunk {chunk_num}/{len(chunks)} for document {document.id}")
-
-                try:
-                    # Format codes for LLM
-                    codes_text = "\n".join(
-                        [f"- {code.name}: {code.description}" for cb in codebooks for code in cb.codes])
-
-                    deductive_response: DeductiveCodingOutput = AICodingUtils.make_rate_limited_llm_call(
-                        llm_service=llm_service,
-                        service_type="deductive_coding",
-                        input_data={
-                            "text": chunk,
-                            "research_context": research_context,
-                            "available_codes": codes_text
-                        },
-                        provider=provider
-                    )
-
-                    print(f"✅ Chunk {chunk_num} succeeded")
-                    print(
-                        f"LLM Response - Found {len(deductive_response.assigned_codes)} code assignments in chunk")
-
-                    # Process each assigned code (in-memory)
-                    for i, code_name in enumerate(deductive_response.assigned_codes):
-                        if code_name in codes_dict:
-                            # Calculate character positions
-                            quote = deductive_response.quote
-                            start_char = chunk.find(quote) if quote else 0
-                            end_char = start_char + \
-                                len(quote) if quote else len(chunk)
-
-                            # Get confidence score if available
-                            confidence = 75  # default
-                            if (hasattr(deductive_response, 'confidence_scores') and
-                                deductive_response.confidence_scores and
-                                    i < len(deductive_response.confidence_scores)):
-                                confidence = int(
-                                    deductive_response.confidence_scores[i] * 100)
-
-                            assignments.append({
-                                "document_id": document.id,
-                                "code_name": code_name,
-                                "start_char": start_char,
-                                "end_char": end_char,
-                                "text": quote or chunk[:100] + "...",
-                                "confidence": confidence,
-                                "status": "created"
-                            })
-
-                            print(f"Added assignment for code: {code_name}")
-
-                except Exception as e:
-                    print(f"❌ Error processing chunk {chunk_num}: {str(e)}")
-                    continue
+                    f"❌ Error processing chunk {chunk_num}/{chunk_count} of document {document.id}: {str(outcome.error)}")
+                continue
 
+            deductive_response: DeductiveCodingOutput = outcome.result
+            print(
+                f"✅ Chunk {chunk_num}/{chunk_count} of document {document.id}: {len(deductive_response.assigned_codes)} code assignments")
+
+            # One quote for all the codes of the chunk, so place it once
+            if any(code_name in codes_dict for code_name in deductive_response.assigned_codes):
+                start_char, end_char, text = AICodeGenerationService._place_quote(
+                    plan, aligners, document, chunk, chunk_start, deductive_response.quote)
+
+            # Process each assigned code (in-memory)
+            for i, code_name in enumerate(deductive_response.assigned_codes):
+                if code_name in codes_dict:
+
+                    # Get confidence score if available
+                    confidence = 75  # default
+                    if (hasattr(deductive_response, 'confidence_scores') and
+                        deductive_response.confidence_scores and
+                            i < len(deductive_response.confidence_scores)):
+                        confidence = int(
+                            deductive_response.confidence_scores[i] * 100)
+
+                    assignments.append({
+                        "document_id": document.id,
+                        "code_name": code_name,
+                        "start_char": start_char,
+                        "end_char": end_char,
+                        "text": text,
+                        "confidence": confidence,
+                        "status": "created"
+                    })
+
+        AICodeGenerationService._report_alignment(aligners)
         print(
             f"Generated {len(assignments)} assignments for {len(codes_dict)} codes (in-memory)")
 
@@ -272,7 +507,152 @@ class AICodeGenerationService:
             }
         }
 
-    # Helper methods
+    @staticmethod
+    def _chunk_documents(db: Session, documents) -> ChunkedDocuments:
+        """
+        Every chunk of the documents, in document order, with boundaries from
+        the chunk store (split and stored on first use). Content is read here,
+        on the caller's session, before any work is handed to other threads.
+        """
+        documents = list(documents)
+        contents = {document.id: document.content or "" for document in documents}
+        stored = get_chunk_store().get_chunks(db, documents)
+        work, chunk_hashes = [], []
+        for document in documents:
+            content, chunks = contents[document.id], stored[document.id]
+            print(f"Using {len(chunks)} chunks for document {document.id}")
+            work.extend(
+                (document, chunk.index + 1, len(chunks), chunk.text(content), chunk.start)
+                for chunk in chunks
+            )
+            chunk_hashes.extend(chunk.chunk_hash for chunk in chunks)
+        return ChunkedDocuments(work, contents, chunk_hashes)
+
+    @staticmethod
+    def chunk_key(chunk_hash: str) -> str:
+        """
+        Identity of a chunk for incremental coding: the digest of its text, how
+        it was cut and the prompt that codes it
+        """
+        return hashlib.sha256(json.dumps([
+            prompt_version("initial_coding"),
+            settings.AI_CHUNK_SIZE,
+            settings.AI_CHUNK_OVERLAP,
+            chunk_hash
+        ]).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _load_session(db: Session, ai_session_codebook, work: list, chunk_keys: List[str],
+                      contents: Dict[int, str]) -> SessionState:
+        """
+        What the session codebook holds from earlier runs: its codes and their
+        assignments, which join the refinement and grouping of this run, and
+        the chunks of this run's documents it has coded.
+
+        Saved assignments in a document whose text changed are placed again
+        in its new text; unreviewed ones whose text is gone become stale.
+        """
+        coded = defaultdict(set)
+        for document_id, chunk_key in db.query(AICodedChunk.document_id, AICodedChunk.chunk_key).filter(
+                AICodedChunk.codebook_id == ai_session_codebook.id,
+                AICodedChunk.document_id.in_(list(contents))):
+            coded[document_id].add(chunk_key)
+
+        current = defaultdict(set)
+        for (document, *_), key in zip(work, chunk_keys):
+            current[document.id].add(key)
+        # Documents with coded chunks that are no longer in their text
+        changed = {document_id for document_id, keys in coded.items() if not keys <= current[document_id]}
+
+        codes = db.query(Code).filter(Code.codebook_id == ai_session_codebook.id).all()
+        codes_dict = {code.name: {
+            "id": code.id,
+            "name": code.name,
+            "description": code.description,
+            "color": code.color,
+            "project_id": code.project_id,
+            "is_auto_generated": code.is_auto_generated,
+            "group_name": code.group_name,
+            "status": "existing"
+        } for code in codes}
+        code_names = {code.id: code.name for code in codes}
+
+        assignments, stale = [], []
+        rows = db.query(CodeAssignment).filter(
+            CodeAssignment.code_id.in_(list(code_names))).order_by(CodeAssignment.id).all() if code_names else []
+        aligners: Dict[int, QuoteAligner] = {}
+        for row in rows:
+            assignment = {
+                "id": row.id,
+                "document_id": row.document_id,
+                "code_name": code_names[row.code_id],
+                "start_char": row.start_char,
+                "end_char": row.end_char,
+                "text": row.text_snapshot or "",
+                "confidence": row.confidence,
+                "status": "existing"
+            }
+            if row.document_id in changed and assignment["text"]:
+                aligner = aligners.get(row.document_id)
+                if aligner is None:
+                    aligner = aligners[row.document_id] = QuoteAligner(contents[row.document_id])
+                span = aligner.align(assignment["text"], (row.start_char, row.end_char))
+                if span is None and row.status == "pending":
+                    stale.append(row.id)
+                    continue
+                if span is not None and span != (row.start_char, row.end_char):
+                    assignment["start_char"], assignment["end_char"] = span
+                    assignment["moved"] = True
+            assignments.append(assignment)
+
+        if stale:
+            print(f"🧹 {len(stale)} unreviewed assignments no longer match their document and will be removed")
+        return SessionState(
+            codes_dict, assignments,
+            {document_id: sorted(coded[document_id] & current[document_id]) for document_id in coded},
+            stale
+        )
+
+    @staticmethod
+    def _nothing_to_code_response(plan: CodingPlan) -> dict:
+        print(f"✅ All {plan.skipped_chunks} chunks already coded in {plan.ai_session_codebook.name}")
+        response = AICodeGenerationService._create_empty_response(plan.ai_session_codebook)
+        response["summary"] = {"chunks_coded": 0, "chunks_skipped": plan.skipped_chunks}
+        return response
+
+    @staticmethod
+    def _place_quote(plan: CodingPlan, aligners: Dict[int, QuoteAligner], document, chunk: str,
+                     chunk_start: int, quote: Optional[str]) -> Tuple[int, int, str]:
+        """
+        Absolute (start_char, end_char, text) of a quote in its document; the
+        whole chunk when the quote cannot be placed
+        """
+        chunk_end = chunk_start + len(chunk)
+        if not quote:
+            return chunk_start, chunk_end, chunk[:100] + "..."
+
+        content = (plan.contents or {}).get(document.id)
+        if content is None:
+            # Plans built without contents: align within the chunk and shift by its start
+            start_char, end_char = QuoteAligner(chunk).locate(quote, 0, len(chunk))
+            return start_char + chunk_start, end_char + chunk_start, quote
+
+        aligner = aligners.get(document.id)
+        if aligner is None:
+            aligner = aligners[document.id] = QuoteAligner(content)
+        span = aligner.align(quote, (chunk_start, chunk_end))
+        if span is None:
+            return chunk_start, chunk_end, quote
+        # The document's own wording, which may differ from the model's in spacing or quote marks
+        return span[0], span[1], content[span[0]:span[1]]
+
+    @staticmethod
+    def _report_alignment(aligners: Dict[int, QuoteAligner]) -> None:
+        stats = sum((aligner.stats for aligner in aligners.values()), Counter())
+        if stats:
+            print(f"Placed quotes: {stats['exact']} exact, {stats['fuzzy']} fuzzy, "
+                  f"{stats['unplaced']} at their whole chunk")
+
     @staticmethod
     def _create_empty_response(ai_session_codebook) -> dict:
         if ai_session_codebook is None:
@@ -1,25 +1,242 @@
 from sqlalchemy.orm import Session
 from collections import defaultdict
-from app.schemas.ai_services import CodeGroupingOutput
+from app.core.config import settings
+from app.schemas.ai_services import CodeGroupingOutput, CodeGroupMergeOutput
 from app.services.ai.llm_service import LLMService
 from app.services.ai.ai_coding_utils import AICodingUtils
+from app.services.ai.chunk_executor import ChunkOutcome
+from app.services.ai.code_clustering import CodeClustering
+from app.services.ai.pipeline_checkpoints import PipelineCancelled, PipelineCheckpoints
+from typing import List, Optional
 
 
 class AICodeGroupingService:
-    """Service for grouping AI-generated codes using in-memory processing"""
+    """
+    Service for grouping AI-generated codes using in-memory processing.
+
+    Up to AI_GROUPING_MAX_CODES_PER_PROMPT live codes are grouped in a single
+    call. Larger codebooks are grouped map-reduce style, so no prompt grows
+    with the codebook: the codes are clustered by TF-IDF similarity, each
+    cluster is grouped in its own call (in parallel), and the groups are then
+    merged in batches of similar groups, round by round, until all of them
+    fit into one merging prompt or a round merges nothing.
+    """
+
+    # Codes listed per group in a merging prompt; the rest are only counted
+    MERGE_CODES_SHOWN = 8
+    MAX_MERGE_ROUNDS = 5
 
     @staticmethod
     def perform_code_grouping_in_memory(
         codes_dict: dict,
         assignments: list,
         llm_service: LLMService,
-        provider: str
+        provider: str,
+        use_cache: bool = True,
+        checkpoints: Optional[PipelineCheckpoints] = None
     ) -> dict:
 
         if len(codes_dict) < 2:
             print("⏭️ Not enough codes for grouping (need at least 2)")
             return codes_dict
 
+        try:
+            live_codes = AICodeGroupingService._live_codes(codes_dict)
+            if len(live_codes) > settings.AI_GROUPING_MAX_CODES_PER_PROMPT:
+                AICodeGroupingService._group_in_clusters(
+                    codes_dict, assignments, live_codes, llm_service, provider, use_cache, checkpoints)
+                return codes_dict
+
+            grouping_response: CodeGroupingOutput = AICodingUtils.checkpointed_call(
+                checkpoints,
+                "grouping",
+                lambda input_data: AICodingUtils.make_rate_limited_llm_call(
+                    llm_service=llm_service,
+                    service_type="code_grouping",
+                    input_data=input_data,
+                    provider=provider,
+                    use_cache=use_cache
+                ),
+                AICodeGroupingService._grouping_input(codes_dict, assignments)
+            )
+            AICodeGroupingService._apply_grouping(codes_dict, grouping_response)
+
+        except PipelineCancelled:
+            raise
+        except Exception as e:
+            if checkpoints:
+                # Fail the job instead, so that resuming it retries the grouping
+                raise
+            print(f"❌ Error in code grouping: {str(e)}")
+            # Continue without grouping
+
+        return codes_dict
+
+    @staticmethod
+    async def aperform_code_grouping_in_memory(
+        codes_dict: dict,
+        assignments: list,
+        llm_service: LLMService,
+        provider: str,
+        use_cache: bool = True,
+        checkpoints: Optional[PipelineCheckpoints] = None
+    ) -> dict:
+        """Async counterpart of perform_code_grouping_in_memory"""
+        if len(codes_dict) < 2:
+            print("⏭️ Not enough codes for grouping (need at least 2)")
+            return codes_dict
+
+        try:
+            live_codes = AICodeGroupingService._live_codes(codes_dict)
+            if len(live_codes) > settings.AI_GROUPING_MAX_CODES_PER_PROMPT:
+                await AICodeGroupingService._agroup_in_clusters(
+                    codes_dict, assignments, live_codes, llm_service, provider, use_cache, checkpoints)
+                return codes_dict
+
+            grouping_response: CodeGroupingOutput = await AICodingUtils.acheckpointed_call(
+                checkpoints,
+                "grouping",
+                lambda input_data: AICodingUtils.amake_rate_limited_llm_call(
+                    llm_service=llm_service,
+                    service_type="code_grouping",
+                    input_data=input_data,
+                    provider=provider,
+                    use_cache=use_cache
+                ),
+                AICodeGroupingService._grouping_input(codes_dict, assignments)
+            )
+            AICodeGroupingService._apply_grouping(codes_dict, grouping_response)
+
+        except PipelineCancelled:
+            raise
+        except Exception as e:
+            if checkpoints:
+                # Fail the job instead, so that resuming it retries the grouping
+                raise
+            print(f"❌ Error in code grouping: {str(e)}")
+            # Continue without grouping
+
+        return codes_dict
+
+    @staticmethod
+    def _group_in_clusters(
+        codes_dict: dict,
+        assignments: list,
+        live_codes: List[str],
+        llm_service: LLMService,
+        provider: str,
+        use_cache: bool,
+        checkpoints: Optional[PipelineCheckpoints]
+    ) -> None:
+        """Group a large codebook cluster by cluster, then merge the clusters' groups"""
+        code_samples = AICodeGroupingService._code_samples(assignments)
+        clusters = AICodeGroupingService._cluster_codes(codes_dict, code_samples, live_codes)
+        print(f"🧩 Grouping {len(live_codes)} codes in {len(clusters)} clusters")
+
+        # Map: one grouping call per cluster
+        outcomes = AICodingUtils.chunk_executor(checkpoints, "grouping").map(
+            provider,
+            lambda input_data: AICodingUtils.make_rate_limited_llm_call(
+                llm_service=llm_service,
+                service_type="code_grouping",
+                input_data=input_data,
+                provider=provider,
+                use_cache=use_cache
+            ),
+            [AICodeGroupingService._cluster_input(codes_dict, code_samples, cluster) for cluster in clusters]
+        )
+        if checkpoints:
+            checkpoints.require_complete("grouping", outcomes)
+        groups = AICodeGroupingService._cluster_groups(clusters, outcomes)
+
+        # Reduce: merge similar groups, a bounded batch per call
+        for _ in range(AICodeGroupingService.MAX_MERGE_ROUNDS):
+            batches = AICodeGroupingService._merge_batches(groups)
+            if not batches:
+                break
+            merge_outcomes = AICodingUtils.chunk_executor(checkpoints, "group_merging").map(
+                provider,
+                lambda input_data: AICodingUtils.make_rate_limited_llm_call(
+                    llm_service=llm_service,
+                    service_type="code_group_merging",
+                    input_data=input_data,
+                    provider=provider,
+                    use_cache=use_cache
+                ),
+                [AICodeGroupingService._merge_input(groups, batch) for batch in batches]
+            )
+            if checkpoints:
+                checkpoints.require_complete("group_merging", merge_outcomes)
+            merged = AICodeGroupingService._merge_groups(groups, batches, merge_outcomes)
+            finished = len(batches) == 1 or len(merged) == len(groups)
+            groups = merged
+            if finished:
+                break
+
+        AICodeGroupingService._apply_groups(codes_dict, groups)
+
+    @staticmethod
+    async def _agroup_in_clusters(
+        codes_dict: dict,
+        assignments: list,
+        live_codes: List[str],
+        llm_service: LLMService,
+        provider: str,
+        use_cache: bool,
+        checkpoints: Optional[PipelineCheckpoints]
+    ) -> None:
+        """Async counterpart of _group_in_clusters"""
+        code_samples = AICodeGroupingService._code_samples(assignments)
+        clusters = AICodeGroupingService._cluster_codes(codes_dict, code_samples, live_codes)
+        print(f"🧩 Grouping {len(live_codes)} codes in {len(clusters)} clusters")
+
+        outcomes = await AICodingUtils.chunk_executor(checkpoints, "grouping").amap(
+            provider,
+            lambda input_data: AICodingUtils.amake_rate_limited_llm_call(
+                llm_service=llm_service,
+                service_type="code_grouping",
+                input_data=input_data,
+                provider=provider,
+                use_cache=use_cache
+            ),
+            [AICodeGroupingService._cluster_input(codes_dict, code_samples, cluster) for cluster in clusters]
+        )
+        if checkpoints:
+            checkpoints.require_complete("grouping", outcomes)
+        groups = AICodeGroupingService._cluster_groups(clusters, outcomes)
+
+        for _ in range(AICodeGroupingService.MAX_MERGE_ROUNDS):
+            batches = AICodeGroupingService._merge_batches(groups)
+            if not batches:
+                break
+            merge_outcomes = await AICodingUtils.chunk_executor(checkpoints, "group_merging").amap(
+                provider,
+                lambda input_data: AICodingUtils.amake_rate_limited_llm_call(
+                    llm_service=llm_service,
+                    service_type="code_group_merging",
+                    input_data=input_data,
+                    provider=provider,
+                    use_cache=use_cache
+                ),
+                [AICodeGroupingService._merge_input(groups, batch) for batch in batches]
+            )
+            if checkpoints:
+                checkpoints.require_complete("group_merging", merge_outcomes)
+            merged = AICodeGroupingService._merge_groups(groups, batches, merge_outcomes)
+            finished = len(batches) == 1 or len(merged) == len(groups)
+            groups = merged
+            if finished:
+                break
+
+        AICodeGroupingService._apply_groups(codes_dict, groups)
+
+    @staticmethod
+    def _live_codes(codes_dict: dict) -> List[str]:
+        return [name for name, data in codes_dict.items() if data.get("status") != "deleted"]
+
+    @staticmethod
+    def _code_samples(assignments: list) -> dict:
+        """code name -> texts of its live assignments"""
         code_assignments = defaultdict(list)
         for assignment in assignments:
             if assignment.get("status") != "deleted":
@@ -28,57 +245,170 @@ class AICodeGroupingService:
                     text = assignment.get("text", "")
                     if text:
                         code_assignments[code_name].append(text)
+        return code_assignments
 
-        codes_info = {}
-        for code_name, code_data in codes_dict.items():
-            if code_data.get("status") != "deleted":
-                codes_info[code_name] = {
-                    "name": code_name,
-                    "description": code_data.get("description", ""),
-                }
+    @staticmethod
+    def _grouping_input(codes_dict: dict, assignments: list) -> dict:
+        """LLM input describing every live code and a sample of its assignments"""
+        return AICodeGroupingService._cluster_input(
+            codes_dict,
+            AICodeGroupingService._code_samples(assignments),
+            AICodeGroupingService._live_codes(codes_dict)
+        )
 
+    @staticmethod
+    def _cluster_input(codes_dict: dict, code_samples: dict, code_names: List[str]) -> dict:
+        """LLM input describing `code_names` and a sample of their assignments"""
+        codes_info = {
+            code_name: {
+                "name": code_name,
+                "description": codes_dict[code_name].get("description", ""),
+            }
+            for code_name in code_names
+        }
         codes_summary, assignments_sample = AICodeGroupingService._prepare_llm_input(
-            codes_info, code_assignments
+            codes_info, code_samples
         )
+        return {
+            "codes_summary": codes_summary,
+            "assignments_sample": assignments_sample
+        }
 
-        try:
-            grouping_response: CodeGroupingOutput = AICodingUtils.make_rate_limited_llm_call(
-                llm_service=llm_service,
-                service_type="code_grouping",
-                input_data={
-                    "codes_summary": codes_summary,
-                    "assignments_sample": assignments_sample
-                },
-                provider=provider
-            )
+    @staticmethod
+    def _cluster_codes(codes_dict: dict, code_samples: dict, live_codes: List[str]) -> List[List[str]]:
+        """Live codes split into clusters of similar codes, each small enough for one prompt"""
+        texts = [
+            " ".join([code_name, codes_dict[code_name].get("description") or ""] + code_samples[code_name][:3])
+            for code_name in live_codes
+        ]
+        clusters = CodeClustering.cluster(
+            CodeClustering.tfidf(texts),
+            settings.AI_GROUPING_CLUSTER_SIZE,
+            settings.AI_GROUPING_MAX_CODES_PER_PROMPT
+        )
+        return [[live_codes[index] for index in cluster] for cluster in clusters]
+
+    @staticmethod
+    def _cluster_groups(clusters: List[List[str]], outcomes: List[ChunkOutcome]) -> List[dict]:
+        """
+        Groups proposed for each cluster, as {"name", "description", "codes"}.
+        Only the cluster's own codes are kept, each in the first group naming it.
+        """
+        groups = []
+        for cluster, outcome in zip(clusters, outcomes):
+            if outcome.error is not None:
+                print(f"❌ Error grouping a cluster of {len(cluster)} codes: {str(outcome.error)}")
+                continue
 
-            # Apply grouping to in-memory codes
-            groups_applied = 0
+            grouping_response: CodeGroupingOutput = outcome.result
+            unclaimed = set(cluster)
             for group in grouping_response.groups:
-                print(
-                    f"📋 Applying group '{group.group_name}' to codes: {group.code_names}")
-
-                for code_name in group.code_names:
-                    if code_name in codes_dict:
-                        codes_dict[code_name]["group_name"] = group.group_name
-                        groups_applied += 1
-                        print(
-                            f"✅ Applied group '{group.group_name}' to code '{code_name}'")
-                    else:
-                        print(f"⚠️ Code '{code_name}' not found in codes_dict")
-
-            if grouping_response.ungrouped_codes:
-                print(
-                    f"📝 Ungrouped codes: {grouping_response.ungrouped_codes}")
+                codes = [name for name in dict.fromkeys(group.code_names) if name in unclaimed]
+                unclaimed.difference_update(codes)
+                if codes:
+                    groups.append({
+                        "name": group.group_name,
+                        "description": group.group_description,
+                        "codes": codes
+                    })
+        return groups
+
+    @staticmethod
+    def _merge_batches(groups: List[dict]) -> List[List[int]]:
+        """Indexes of similar groups to merge in one call each; batches of one are left out"""
+        if len(groups) < 2:
+            return []
+        max_groups = max(settings.AI_GROUPING_MAX_GROUPS_PER_PROMPT, 2)
+        vectors = CodeClustering.tfidf([f"{group['name']} {group['description']}" for group in groups])
+        return [batch for batch in CodeClustering.cluster(vectors, max_groups, max_groups) if len(batch) > 1]
+
+    @staticmethod
+    def _merge_input(groups: List[dict], batch: List[int]) -> dict:
+        """LLM input listing the groups of a merging batch with some of their codes"""
+        shown = AICodeGroupingService.MERGE_CODES_SHOWN
+        sections = []
+        for position, index in enumerate(batch, 1):
+            group = groups[index]
+            codes = group["codes"]
+            more = f" and {len(codes) - shown} more" if len(codes) > shown else ""
+            sections.append(
+                f"Group {position}:\n"
+                f"Name: {group['name']}\n"
+                f"Description: {group['description']}\n"
+                f"Codes ({len(codes)}): {', '.join(codes[:shown])}{more}\n"
+            )
+        return {
+            "groups_text": "\n".join(sections),
+            "group_count": len(batch)
+        }
+
+    @staticmethod
+    def _merge_groups(groups: List[dict], batches: List[List[int]], outcomes: List[ChunkOutcome]) -> List[dict]:
+        """
+        Groups after a merging round: merged groups first, then every group no
+        merge took, unchanged. Each group is a source of at most one merge.
+        """
+        merged = []
+        used = set()
+        for batch, outcome in zip(batches, outcomes):
+            if outcome.error is not None:
+                print(f"❌ Error merging a batch of {len(batch)} groups: {str(outcome.error)}")
+                continue
+
+            merge_response: CodeGroupMergeOutput = outcome.result
+            for merged_group in merge_response.groups:
+                sources = [
+                    batch[number - 1] for number in dict.fromkeys(merged_group.source_groups)
+                    if 1 <= number <= len(batch) and batch[number - 1] not in used
+                ]
+                if not sources:
+                    continue
+                used.update(sources)
+                merged.append({
+                    "name": merged_group.group_name,
+                    "description": merged_group.group_description,
+                    "codes": [code for index in sources for code in groups[index]["codes"]]
+                })
 
+        merged.extend(group for index, group in enumerate(groups) if index not in used)
+        print(f"🔗 Merged {len(groups)} groups into {len(merged)}")
+        return merged
+
+    @staticmethod
+    def _apply_groups(codes_dict: dict, groups: List[dict]) -> None:
+        """Apply merged groups to in-memory codes"""
+        groups_applied = 0
+        for group in groups:
+            for code_name in group["codes"]:
+                if code_name in codes_dict:
+                    codes_dict[code_name]["group_name"] = group["name"]
+                    groups_applied += 1
+        print(
+            f"✅ In-memory grouping complete: {groups_applied} codes in {len(groups)} groups")
+
+    @staticmethod
+    def _apply_grouping(codes_dict: dict, grouping_response: CodeGroupingOutput) -> None:
+        """Apply grouping to in-memory codes"""
+        groups_applied = 0
+        for group in grouping_response.groups:
             print(
-                f"✅ In-memory grouping complete: {groups_applied} codes grouped")
+                f"📋 Applying group '{group.group_name}' to codes: {group.code_names}")
 
-        except Exception as e:
-            print(f"❌ Error in code grouping: {str(e)}")
-            # Continue without grouping
+            for code_name in group.code_names:
+                if code_name in codes_dict:
+                    codes_dict[code_name]["group_name"] = group.group_name
+                    groups_applied += 1
+                    print(
+                        f"✅ Applied group '{group.group_name}' to code '{code_name}'")
+                else:
+                    print(f"⚠️ Code '{code_name}' not found in codes_dict")
 
-        return codes_dict
+        if grouping_response.ungrouped_codes:
+            print(
+                f"📝 Ungrouped codes: {grouping_response.ungrouped_codes}")
+
+        print(
+            f"✅ In-memory grouping complete: {groups_applied} codes grouped")
 
     @staticmethod
     def _prepare_llm_input(codes_info: dict, code_assignments: dict) -> tuple[str, str]:
@@ -1,8 +1,12 @@
 from sqlalchemy.orm import Session
 from collections import defaultdict
-from app.schemas.ai_services import CodeRefinementOutput
+from typing import List, Optional
+from app.core.config import settings
+from app.schemas.ai_services import CodeRefinementOutput, BatchCodeRefinementOutput
 from app.services.ai.llm_service import LLMService
 from app.services.ai.ai_coding_utils import AICodingUtils
+from app.services.ai.chunk_executor import ChunkOutcome
+from app.services.ai.pipeline_checkpoints import PipelineCheckpoints
 
 
 class AICodingRefinement:
@@ -15,12 +19,109 @@ class AICodingRefinement:
         llm_service: LLMService,
         ai_session_codebook,
         user_id: int,
-        provider: str
+        provider: str,
+        use_cache: bool = True,
+        checkpoints: Optional[PipelineCheckpoints] = None
     ) -> tuple[dict, list]:
-        """Refine codes in memory without database operations"""
+        """
+        Refine codes in memory without database operations. Several codes are
+        reviewed per LLM call, within AI_REFINEMENT_BATCH_TOKENS; any code a
+        batch did not settle is reviewed again on its own.
+        """
         print(
             f"🔄 Starting in-memory code refinement for {len(codes_dict)} codes")
 
+        requests = AICodingRefinement._refinement_requests(
+            codes_dict, assignments)
+        executor = AICodingUtils.chunk_executor(checkpoints, "refinement")
+        batches, singles = AICodingRefinement._plan_batches(requests)
+
+        # Several codes per call first; codes a batch did not settle get a call of their own
+        batch_outcomes = executor.map(
+            provider,
+            lambda batch_input: AICodingUtils.make_rate_limited_llm_call(
+                llm_service=llm_service,
+                service_type="batch_code_refinement",
+                input_data=batch_input,
+                provider=provider,
+                use_cache=use_cache
+            ),
+            [AICodingRefinement._batch_input(requests, batch) for batch in batches]
+        )
+        outcomes, remaining = AICodingRefinement._batch_outcomes(
+            requests, batches, batch_outcomes, singles)
+
+        single_outcomes = executor.map(
+            provider,
+            lambda request: AICodingUtils.make_rate_limited_llm_call(
+                llm_service=llm_service,
+                service_type="code_refinement",
+                input_data=request[1],
+                provider=provider,
+                use_cache=use_cache
+            ),
+            [requests[index] for index in remaining]
+        )
+        for index, outcome in zip(remaining, single_outcomes):
+            outcomes[index] = outcome
+        if checkpoints:
+            checkpoints.require_complete("refinement", outcomes)  # type: ignore
+        return AICodingRefinement._apply_refinements(codes_dict, assignments, requests, outcomes)
+
+    @staticmethod
+    async def arefine_codes_in_memory(
+        codes_dict: dict,
+        assignments: list,
+        llm_service: LLMService,
+        ai_session_codebook,
+        user_id: int,
+        provider: str,
+        use_cache: bool = True,
+        checkpoints: Optional[PipelineCheckpoints] = None
+    ) -> tuple[dict, list]:
+        """Async counterpart of refine_codes_in_memory"""
+        print(
+            f"🔄 Starting in-memory code refinement for {len(codes_dict)} codes")
+
+        requests = AICodingRefinement._refinement_requests(
+            codes_dict, assignments)
+        executor = AICodingUtils.chunk_executor(checkpoints, "refinement")
+        batches, singles = AICodingRefinement._plan_batches(requests)
+
+        batch_outcomes = await executor.amap(
+            provider,
+            lambda batch_input: AICodingUtils.amake_rate_limited_llm_call(
+                llm_service=llm_service,
+                service_type="batch_code_refinement",
+                input_data=batch_input,
+                provider=provider,
+                use_cache=use_cache
+            ),
+            [AICodingRefinement._batch_input(requests, batch) for batch in batches]
+        )
+        outcomes, remaining = AICodingRefinement._batch_outcomes(
+            requests, batches, batch_outcomes, singles)
+
+        single_outcomes = await executor.amap(
+            provider,
+            lambda request: AICodingUtils.amake_rate_limited_llm_call(
+                llm_service=llm_service,
+                service_type="code_refinement",
+                input_data=request[1],
+                provider=provider,
+                use_cache=use_cache
+            ),
+            [requests[index] for index in remaining]
+        )
+        for index, outcome in zip(remaining, single_outcomes):
+            outcomes[index] = outcome
+        if checkpoints:
+            checkpoints.require_complete("refinement", outcomes)  # type: ignore
+        return AICodingRefinement._apply_refinements(codes_dict, assignments, requests, outcomes)
+
+    @staticmethod
+    def _refinement_requests(codes_dict: dict, assignments: list) -> list[tuple[str, dict]]:
+        """(code name, LLM input) for every live code that has assignments"""
         # Group assignments by code name
         code_assignments = defaultdict(list)
         for assignment in assignments:
@@ -29,9 +130,7 @@ class AICodingRefinement:
                 if code_name:
                     code_assignments[code_name].append(assignment)
 
-        codes_to_delete = set()
-        codes_to_modify = {}
-
+        requests = []
         for code_name, code_data in codes_dict.items():
             if code_data.get("status") == "deleted":
                 continue
@@ -46,39 +145,139 @@ class AICodingRefinement:
                 text = assignment.get('text', '')
                 assignments_text += f"{i}. \"{text}\"\n\n"
 
-            try:
-                refinement_response: CodeRefinementOutput = AICodingUtils.make_rate_limited_llm_call(
-                    llm_service=llm_service,
-                    service_type="code_refinement",
-                    input_data={
-                        "code_name": code_name,
-                        "code_description": code_data.get("description", ""),
-                        "assignments_text": assignments_text,
-                        "assignment_count": len(code_assignments_for_code)
-                    },
-                    provider=provider
-                )
-
-                if refinement_response.action.lower() == "delete":
-                    print(
-                        f"🗑️ Deleting code '{code_name}': {refinement_response.reasoning}")
-                    codes_to_delete.add(code_name)
+            requests.append((code_name, {
+                "code_name": code_name,
+                "code_description": code_data.get("description", ""),
+                "assignments_text": assignments_text,
+                "assignment_count": len(code_assignments_for_code)
+            }))
+        return requests
 
-                elif refinement_response.action.lower() == "modify":
-                    print(
-                        f"✏️ Modifying code '{code_name}' -> '{refinement_response.refined_code_name}': {refinement_response.reasoning}")
-                    codes_to_modify[code_name] = {
-                        "new_name": refinement_response.refined_code_name,
-                        "new_description": refinement_response.refined_code_description,
-                        "reasoning": refinement_response.reasoning
-                    }
-
-                else:  # keep
-                    print(
-                        f"✅ Keeping code '{code_name}': {refinement_response.reasoning}")
+    @staticmethod
+    def _plan_batches(requests: list[tuple[str, dict]]) -> tuple[list[list[int]], list[int]]:
+        """
+        Pack requests, in order, into batches that stay within the prompt token
+        budget and code limit. Returns the batches (indexes into `requests`)
+        and the indexes left for single-code calls: codes too large to share a
+        prompt, and batches that would hold only one code.
+        """
+        budget = settings.AI_REFINEMENT_BATCH_TOKENS
+        max_codes = settings.AI_REFINEMENT_BATCH_MAX_CODES
+        if budget <= 0 or max_codes < 2:
+            return [], list(range(len(requests)))
+
+        batches: list[list[int]] = []
+        singles: list[int] = []
+        current: list[int] = []
+        current_tokens = 0
+        for index, (_, input_data) in enumerate(requests):
+            tokens = sum(len(str(value)) for value in input_data.values()) // 4
+            if tokens > budget // 2:
+                singles.append(index)
+                continue
+            if current and (current_tokens + tokens > budget or len(current) >= max_codes):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(index)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
 
-            except Exception as e:
-                error_msg = str(e)
+        singles.extend(batch[0] for batch in batches if len(batch) == 1)
+        batches = [batch for batch in batches if len(batch) > 1]
+        print(
+            f"📦 Refining {len(requests)} codes in {len(batches)} batched and {len(singles)} single-code calls")
+        return batches, sorted(singles)
+
+    @staticmethod
+    def _batch_input(requests: list[tuple[str, dict]], batch: list[int]) -> dict:
+        """LLM input listing every code of a batch with its assignments"""
+        sections = []
+        for position, index in enumerate(batch, 1):
+            input_data = requests[index][1]
+            sections.append(
+                f"Code {position}:\n"
+                f"Name: {input_data['code_name']}\n"
+                f"Description: {input_data['code_description']}\n"
+                f"Assignments ({input_data['assignment_count']}):\n"
+                f"{input_data['assignments_text']}"
+            )
+        return {
+            "codes_text": "\n".join(sections),
+            "code_count": len(batch)
+        }
+
+    @staticmethod
+    def _batch_outcomes(
+        requests: list[tuple[str, dict]],
+        batches: list[list[int]],
+        batch_outcomes: List[ChunkOutcome],
+        singles: list[int]
+    ) -> tuple[List[Optional[ChunkOutcome]], list[int]]:
+        """
+        Per-code outcomes from the batched decisions, and the indexes of codes
+        that still need their own call: single-code requests plus any code whose
+        batch failed or came back without a valid decision for it.
+
+        A decision belongs to the code with its number in the batch, and only
+        if it repeats that code's name exactly, so codes whose names differ
+        only in case or spacing cannot take each other's decision. A number
+        with no such decision, or with several, is left to a single-code call.
+        """
+        outcomes: List[Optional[ChunkOutcome]] = [None] * len(requests)
+        remaining = list(singles)
+
+        for batch, batch_outcome in zip(batches, batch_outcomes):
+            if batch_outcome.error is not None:
+                print(
+                    f"❌ Error refining a batch of {len(batch)} codes: {str(batch_outcome.error)}")
+                remaining.extend(batch)
+                continue
+
+            batch_response: BatchCodeRefinementOutput = batch_outcome.result
+            decisions = defaultdict(list)  # code number -> decisions
+            for decision in batch_response.decisions:
+                decisions[decision.code_number].append(decision)
+
+            for position, index in enumerate(batch, 1):
+                matching = decisions.get(position, [])
+                decision = matching[0] if len(matching) == 1 else None
+                if (decision is None or decision.code_name != requests[index][0]
+                        or not AICodingRefinement._is_valid_decision(decision)):
+                    remaining.append(index)
+                    continue
+                outcomes[index] = ChunkOutcome(CodeRefinementOutput(**{
+                    **decision.model_dump(exclude={"code_name"}),
+                    "action": decision.action.strip().lower()
+                }), None)
+
+        fallback = len(remaining) - len(singles)
+        if fallback:
+            print(
+                f"↩️ {fallback} codes without a valid batched decision fall back to single-code refinement")
+        return outcomes, sorted(remaining)
+
+    @staticmethod
+    def _is_valid_decision(decision: CodeRefinementOutput) -> bool:
+        action = decision.action.strip().lower()
+        if action not in ("keep", "modify", "delete"):
+            return False
+        return action != "modify" or bool(decision.refined_code_name.strip())
+
+    @staticmethod
+    def _apply_refinements(
+        codes_dict: dict,
+        assignments: list,
+        requests: list[tuple[str, dict]],
+        outcomes: List[ChunkOutcome]
+    ) -> tuple[dict, list]:
+        """Apply each code's keep/modify/delete decision to codes and assignments"""
+        codes_to_delete = set()
+        codes_to_modify = {}
+
+        for (code_name, _), outcome in zip(requests, outcomes):
+            if outcome.error is not None:
+                error_msg = str(outcome.error)
                 print(f"❌ Error refining code '{code_name}': {error_msg}")
 
                 # Check if this is a rate limit error
@@ -92,6 +291,26 @@ class AICodingRefinement:
                 else:
                     print(
                         f"⚠️ Processing error for code '{code_name}' - keeping unchanged")
+                continue
+
+            refinement_response: CodeRefinementOutput = outcome.result
+            if refinement_response.action.lower() == "delete":
+                print(
+                    f"🗑️ Deleting code '{code_name}': {refinement_response.reasoning}")
+                codes_to_delete.add(code_name)
+
+            elif refinement_response.action.lower() == "modify":
+                print(
+                    f"✏️ Modifying code '{code_name}' -> '{refinement_response.refined_code_name}': {refinement_response.reasoning}")
+                codes_to_modify[code_name] = {
+                    "new_name": refinement_response.refined_code_name,
+                    "new_description": refinement_response.refined_code_description,
+                    "reasoning": refinement_response.reasoning
+                }
+
+            else:  # keep
+                print(
+                    f"✅ Keeping code '{code_name}': {refinement_response.reasoning}")
 
         # Apply changes to in-memory structures
         new_codes_dict = {}
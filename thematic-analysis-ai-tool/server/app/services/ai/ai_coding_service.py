@@ -3,11 +3,13 @@ from app.services.ai.ai_code_generation import AICodeGenerationService
 from app.services.ai.ai_theme_generation import AIThemeGenerationService
 from app.services.ai.ai_code_grouping import AICodeGroupingService
 from app.services.ai.ai_coding_refinement import AICodingRefinement
-from app.services.ai.ai_coding_utils import AICodingUtils
+from app.services.ai.ai_coding_utils import AICodingUtils, ProgressCallback
 from app.services.ai.llm_service import LLMService
+from app.services.ai.pipeline_checkpoints import PipelineCheckpoints
 from app.models.code import Code
 from app.schemas.ai_theme_generation import CodeAssignment, ThemeGenerationResponse
-from typing import List
+from typing import Dict, List, Optional
+import asyncio
 
 
 class AICodingService:
@@ -19,10 +21,21 @@ class AICodingService:
         db: Session,
         user_id: int,
         model_name: str = "gemini-2.0-flash",
-        provider: str = "google_genai"
+        provider: str = "google_genai",
+        use_cache: bool = True,
+        progress: Optional[ProgressCallback] = None,
+        checkpoints: Optional[PipelineCheckpoints] = None,
+        incremental: bool = False
     ) -> dict:
+        """
+        Initial coding, refinement and grouping of the documents' codes. An
+        incremental run continues the latest AI session codebook: only chunks
+        it has not coded go to the LLM, and refinement and grouping see its
+        saved codes and assignments as well as the new ones.
+        """
         print(
             f"🚀 Starting AI code generation for {len(document_ids)} documents")
+        AICodingService._check_not_saved(checkpoints)
 
         # Step 1: Generate initial codes and assignments (in-memory only)
         response = AICodeGenerationService.generate_initial_codes_in_memory(
@@ -30,7 +43,11 @@ class AICodingService:
             db=db,
             user_id=user_id,
             model_name=model_name,
-            provider=provider
+            provider=provider,
+            use_cache=use_cache,
+            progress=progress,
+            checkpoints=checkpoints,
+            incremental=incremental
         )
 
         # Check if initial generation failed
@@ -48,71 +65,187 @@ class AICodingService:
 
         # Step 2: Refinement phase (modify in-memory structures)
         print("🔄 Starting code refinement phase...")
+        AICodingUtils.report(progress, "stage", stage="refinement")
 
+        # Refinement calls wait out a short Retry-After pause; only a spent quota skips them
         quota_status = AICodingUtils.get_rate_limit_status(provider)
         if not quota_status.get("quota_exhausted", False):
-            llm_service = LLMService(model_name=model_name, provider=provider)
+            llm_service = LLMService.get(model_name=model_name, provider=provider)
             codes_dict, assignments = AICodingRefinement.refine_codes_in_memory(
                 codes_dict=codes_dict,
                 assignments=assignments,
                 llm_service=llm_service,
                 ai_session_codebook=ai_session_codebook,
                 user_id=user_id,
-                provider=provider
+                provider=provider,
+                use_cache=use_cache,
+                checkpoints=checkpoints
             )
             print("✅ Code refinement complete (in-memory)")
+            AICodingUtils.report(progress, "refinement_done", codes=len(codes_dict))
         else:
             print("⚠️ Quota exhausted - skipping refinement phase")
+            AICodingUtils.report(progress, "refinement_done", codes=len(codes_dict), skipped=True)
 
         # Step 3: Code grouping phase (modify in-memory structures)
+        AICodingUtils.report(progress, "stage", stage="grouping")
         if len(codes_dict) > 2:
             print(
                 f"🔄 Starting code grouping phase for {len(codes_dict)} codes...")
-            llm_service = LLMService(model_name=model_name, provider=provider)
+            llm_service = LLMService.get(model_name=model_name, provider=provider)
 
             codes_dict = AICodeGroupingService.perform_code_grouping_in_memory(
                 codes_dict=codes_dict,
                 assignments=assignments,
                 llm_service=llm_service,
-                provider=provider
+                provider=provider,
+                use_cache=use_cache,
+                checkpoints=checkpoints
             )
             print("✅ Code grouping complete (in-memory)")
+            AICodingUtils.report(progress, "grouping_done", codes_grouped=len(
+                [c for c in codes_dict.values() if c.get("group_name")]))
         else:
             print(
                 f"⏭️ Skipping code grouping ({len(codes_dict)} codes - need more than 2)")
+            AICodingUtils.report(progress, "grouping_done", codes_grouped=0, skipped=True)
 
         # Step 4: Apply all changes to database at once
         print("🔄 Applying all changes to database...")
+        AICodingUtils.report(progress, "stage", stage="saving")
 
         final_codes, final_assignments = AICodingService._apply_changes_to_database(
             db=db,
             codes_dict=codes_dict,
             assignments=assignments,
             ai_session_codebook=ai_session_codebook,
-            user_id=user_id
+            user_id=user_id,
+            checkpoints=checkpoints,
+            coded_chunks=response.get("coded_chunks"),
+            stale_assignment_ids=response.get("stale_assignment_ids")
         )
 
         print(
             f"✅ Database update complete: {len(final_codes)} codes, {len(final_assignments)} assignments")
 
         # Step 5: Format final response
-        final_response = {
-            "ai_session_codebook": {
-                "id": ai_session_codebook.id,
-                "name": ai_session_codebook.name,
-                "description": ai_session_codebook.description,
-                "is_ai_generated": ai_session_codebook.is_ai_generated,
-                "finalized": ai_session_codebook.finalized,
-            },
-            "results": final_assignments,
-            "summary": {
-                "total_codes": len(final_codes),
-                "total_assignments": len(final_assignments),
-                "codes_created": len([c for c in final_codes if c.get("was_created", False)]),
-                "codes_modified": len([c for c in final_codes if c.get("was_modified", False)]),
-                "codes_grouped": len([c for c in final_codes if c.get("group_name")])
-            }
-        }
+        final_response = AICodingService._code_generation_response(
+            ai_session_codebook, final_codes, final_assignments)
+
+        print(
+            f"🎉 AI coding pipeline complete: {len(final_assignments)} final assignments, {len(final_codes)} codes")
+        return final_response
+
+    @staticmethod
+    async def agenerate_code(
+        document_ids: list[int],
+        db: Session,
+        user_id: int,
+        model_name: str = "gemini-2.0-flash",
+        provider: str = "google_genai",
+        use_cache: bool = True,
+        progress: Optional[ProgressCallback] = None,
+        checkpoints: Optional[PipelineCheckpoints] = None,
+        incremental: bool = False
+    ) -> dict:
+        """
+        Async counterpart of generate_code. LLM calls are awaited on the event
+        loop; database reads and writes run on a worker thread, one at a time,
+        so the session is never used concurrently.
+        """
+        print(
+            f"🚀 Starting AI code generation for {len(document_ids)} documents")
+        await asyncio.to_thread(AICodingService._check_not_saved, checkpoints)
+
+        # Step 1: Generate initial codes and assignments (in-memory only)
+        response = await AICodeGenerationService.agenerate_initial_codes_in_memory(
+            document_ids=document_ids,
+            db=db,
+            user_id=user_id,
+            model_name=model_name,
+            provider=provider,
+            use_cache=use_cache,
+            progress=progress,
+            checkpoints=checkpoints,
+            incremental=incremental
+        )
+
+        # Check if initial generation failed
+        if not response.get("results") or response.get("summary", {}).get("quota_exhausted"):
+            print("❌ Initial code generation failed or quota exhausted")
+            return response
+
+        # In-memory structures
+        codes_dict = response["codes_dict"]  # code_name -> code_data
+        assignments = response["assignments"]  # list of assignment_data
+        ai_session_codebook = response["ai_session_codebook"]
+
+        print(
+            f"✅ Initial coding complete: {len(assignments)} assignments, {len(codes_dict)} codes (in-memory)")
+
+        # Step 2: Refinement phase (modify in-memory structures)
+        print("🔄 Starting code refinement phase...")
+        AICodingUtils.report(progress, "stage", stage="refinement")
+
+        # Refinement calls wait out a short Retry-After pause; only a spent quota skips them
+        quota_status = AICodingUtils.get_rate_limit_status(provider)
+        if not quota_status.get("quota_exhausted", False):
+            llm_service = LLMService.get(model_name=model_name, provider=provider)
+            codes_dict, assignments = await AICodingRefinement.arefine_codes_in_memory(
+                codes_dict=codes_dict,
+                assignments=assignments,
+                llm_service=llm_service,
+                ai_session_codebook=ai_session_codebook,
+                user_id=user_id,
+                provider=provider,
+                use_cache=use_cache,
+                checkpoints=checkpoints
+            )
+            print("✅ Code refinement complete (in-memory)")
+            AICodingUtils.report(progress, "refinement_done", codes=len(codes_dict))
+        else:
+            print("⚠️ Quota exhausted - skipping refinement phase")
+            AICodingUtils.report(progress, "refinement_done", codes=len(codes_dict), skipped=True)
+
+        # Step 3: Code grouping phase (modify in-memory structures)
+        AICodingUtils.report(progress, "stage", stage="grouping")
+        if len(codes_dict) > 2:
+            print(
+                f"🔄 Starting code grouping phase for {len(codes_dict)} codes...")
+            llm_service = LLMService.get(model_name=model_name, provider=provider)
+
+            codes_dict = await AICodeGroupingService.aperform_code_grouping_in_memory(
+                codes_dict=codes_dict,
+                assignments=assignments,
+                llm_service=llm_service,
+                provider=provider,
+                use_cache=use_cache,
+                checkpoints=checkpoints
+            )
+            print("✅ Code grouping complete (in-memory)")
+            AICodingUtils.report(progress, "grouping_done", codes_grouped=len(
+                [c for c in codes_dict.values() if c.get("group_name")]))
+        else:
+            print(
+                f"⏭️ Skipping code grouping ({len(codes_dict)} codes - need more than 2)")
+            AICodingUtils.report(progress, "grouping_done", codes_grouped=0, skipped=True)
+
+        # Step 4: Apply all changes to database at once
+        print("🔄 Applying all changes to database...")
+        AICodingUtils.report(progress, "stage", stage="saving")
+
+        final_codes, final_assignments = await asyncio.to_thread(
+            AICodingService._apply_changes_to_database,
+            db, codes_dict, assignments, ai_session_codebook, user_id, checkpoints,
+            response.get("coded_chunks"), response.get("stale_assignment_ids")
+        )
+
+        print(
+            f"✅ Database update complete: {len(final_codes)} codes, {len(final_assignments)} assignments")
+
+        # Step 5: Format final response
+        final_response = AICodingService._code_generation_response(
+            ai_session_codebook, final_codes, final_assignments)
 
         print(
             f"🎉 AI coding pipeline complete: {len(final_assignments)} final assignments, {len(final_codes)} codes")
@@ -125,9 +258,13 @@ class AICodingService:
         db: Session,
         user_id: int,
         model_name: str = "gemini-2.0-flash",
-        provider: str = "google_genai"
+        provider: str = "google_genai",
+        use_cache: bool = True,
+        progress: Optional[ProgressCallback] = None,
+        checkpoints: Optional[PipelineCheckpoints] = None
     ) -> dict:
         print(f"🚀 Starting deductive coding for {len(document_ids)} documents")
+        AICodingService._check_not_saved(checkpoints)
 
         # Step 1: Generate deductive codes and assignments (in-memory only)
         response = AICodeGenerationService.generate_deductive_codes_in_memory(
@@ -136,7 +273,10 @@ class AICodingService:
             db=db,
             user_id=user_id,
             model_name=model_name,
-            provider=provider
+            provider=provider,
+            use_cache=use_cache,
+            progress=progress,
+            checkpoints=checkpoints
         )
 
         # Check if initial generation failed
@@ -153,6 +293,7 @@ class AICodingService:
 
         # Step 2: Apply all changes to database at once
         print("🔄 Applying all changes to database...")
+        AICodingUtils.report(progress, "stage", stage="saving")
 
         # Apply assignments to database (no new codes expected)
         final_codes, final_assignments = AICodingService._apply_changes_to_database(
@@ -160,25 +301,76 @@ class AICodingService:
             codes_dict=codes_dict,
             assignments=assignments,
             ai_session_codebook=None,
-            user_id=user_id
+            user_id=user_id,
+            checkpoints=checkpoints
         )
 
         print(
             f"✅ Database update complete: {len(final_codes)} codes, {len(final_assignments)} assignments")
 
         # Step 3: Format final response
-        # Format final response
-        final_response = {
-            "codebook_ids": codebook_ids,
-            "results": final_assignments,
-            "summary": {
-                "total_codes": len(final_codes),
-                "total_assignments": len(final_assignments),
-                "codes_created": len([c for c in final_codes if c.get("was_created", False)]),
-                "codes_modified": len([c for c in final_codes if c.get("was_modified", False)]),
-                "codes_grouped": len([c for c in final_codes if c.get("group_name")])
-            }
-        }
+        final_response = AICodingService._deductive_coding_response(
+            codebook_ids, final_codes, final_assignments)
+
+        print(
+            f"🎉 Deductive coding pipeline complete: {len(final_assignments)} final assignments, {len(final_codes)} codes")
+        return final_response
+
+    @staticmethod
+    async def adeductive_coding(
+        document_ids: list[int],
+        codebook_ids: list[int],
+        db: Session,
+        user_id: int,
+        model_name: str = "gemini-2.0-flash",
+        provider: str = "google_genai",
+        use_cache: bool = True,
+        progress: Optional[ProgressCallback] = None,
+        checkpoints: Optional[PipelineCheckpoints] = None
+    ) -> dict:
+        """Async counterpart of deductive_coding"""
+        print(f"🚀 Starting deductive coding for {len(document_ids)} documents")
+        await asyncio.to_thread(AICodingService._check_not_saved, checkpoints)
+
+        # Step 1: Generate deductive codes and assignments (in-memory only)
+        response = await AICodeGenerationService.agenerate_deductive_codes_in_memory(
+            document_ids=document_ids,
+            codebook_ids=codebook_ids,
+            db=db,
+            user_id=user_id,
+            model_name=model_name,
+            provider=provider,
+            use_cache=use_cache,
+            progress=progress,
+            checkpoints=checkpoints
+        )
+
+        # Check if initial generation failed
+        if not response.get("assignments") or response.get("summary", {}).get("quota_exhausted"):
+            print("❌ Deductive coding failed or quota exhausted")
+            return response
+
+        codes_dict = response["codes_dict"]
+        assignments = response["assignments"]
+
+        print(
+            f"✅ Deductive coding complete: {len(assignments)} assignments (in-memory)")
+
+        # Step 2: Apply all changes to database at once
+        print("🔄 Applying all changes to database...")
+        AICodingUtils.report(progress, "stage", stage="saving")
+
+        final_codes, final_assignments = await asyncio.to_thread(
+            AICodingService._apply_changes_to_database,
+            db, codes_dict, assignments, None, user_id, checkpoints
+        )
+
+        print(
+            f"✅ Database update complete: {len(final_codes)} codes, {len(final_assignments)} assignments")
+
+        # Step 3: Format final response
+        final_response = AICodingService._deductive_coding_response(
+            codebook_ids, final_codes, final_assignments)
 
         print(
             f"🎉 Deductive coding pipeline complete: {len(final_assignments)} final assignments, {len(final_codes)} codes")
@@ -190,31 +382,52 @@ class AICodingService:
         db: Session,
         user_id: int,
         model_name: str = "gemini-2.0-flash",
-        provider: str = "google_genai"
+        provider: str = "google_genai",
+        use_cache: bool = True
     ) -> List[ThemeGenerationResponse]:
         print(
             f"🚀 Starting theme generation for {len(code_assignments)} assignments")
 
-        # Import CodeAssignment schema from ai_theme_generation
-        from app.schemas.ai_theme_generation import CodeAssignment
-
-        # Convert the input dictionaries to CodeAssignment objects
-        code_assignment_objects = [
-            CodeAssignment(
-                code_id=assignment.get("code_id", 0),
-                document_id=assignment.get("document_id", 0),
-                text=assignment.get("text", ""),
-                project_id=assignment.get("project_id", 0)
-            )
-            for assignment in code_assignments
-        ]
+        code_assignment_objects = AICodingService._to_code_assignments(
+            code_assignments)
 
         themes = AIThemeGenerationService.generate_themes_in_memory(
             code_assignments=code_assignment_objects,
             db=db,
             user_id=user_id,
             model_name=model_name,
-            provider=provider
+            provider=provider,
+            use_cache=use_cache
+        )
+
+        if themes:
+            print(f"✅ Theme generation complete: {len(themes)} themes created")
+        else:
+            print("❌ Theme generation failed or no themes generated")
+
+        return themes
+
+    @staticmethod
+    async def agenerate_themes(
+        code_assignments: List[dict],
+        db: Session,
+        user_id: int,
+        model_name: str = "gemini-2.0-flash",
+        provider: str = "google_genai",
+        use_cache: bool = True
+    ) -> List[ThemeGenerationResponse]:
+        """Async counterpart of generate_themes"""
+        print(
+            f"🚀 Starting theme generation for {len(code_assignments)} assignments")
+
+        themes = await AIThemeGenerationService.agenerate_themes_in_memory(
+            code_assignments=AICodingService._to_code_assignments(
+                code_assignments),
+            db=db,
+            user_id=user_id,
+            model_name=model_name,
+            provider=provider,
+            use_cache=use_cache
         )
 
         if themes:
@@ -228,19 +441,88 @@ class AICodingService:
     def get_rate_limit_status(provider: str) -> dict:
         return AICodingUtils.get_rate_limit_status(provider)
 
+    @staticmethod
+    def _check_not_saved(checkpoints: Optional[PipelineCheckpoints]) -> None:
+        """A resumed run must not save its codes and assignments twice"""
+        if checkpoints and checkpoints.saving_started():
+            raise ValueError(
+                f"AI job {checkpoints.run_id} already saved its results and cannot be run again")
+
+    @staticmethod
+    def _to_code_assignments(code_assignments: List[dict]) -> List[CodeAssignment]:
+        """Convert the input dictionaries to CodeAssignment objects"""
+        return [
+            CodeAssignment(
+                code_id=assignment.get("code_id", 0),
+                document_id=assignment.get("document_id", 0),
+                text=assignment.get("text", ""),
+                project_id=assignment.get("project_id", 0),
+                code_name=assignment.get("code_name"),
+                code_description=assignment.get("code_description"),
+                text_snapshot=assignment.get("text_snapshot")
+            )
+            for assignment in code_assignments
+        ]
+
+    @staticmethod
+    def _pipeline_summary(final_codes: list, final_assignments: list) -> dict:
+        return {
+            "total_codes": len(final_codes),
+            "total_assignments": len(final_assignments),
+            "codes_created": len([c for c in final_codes if c.get("was_created", False)]),
+            "codes_modified": len([c for c in final_codes if c.get("was_modified", False)]),
+            "codes_grouped": len([c for c in final_codes if c.get("group_name")])
+        }
+
+    @staticmethod
+    def _code_generation_response(ai_session_codebook, final_codes: list, final_assignments: list) -> dict:
+        return {
+            "ai_session_codebook": {
+                "id": ai_session_codebook.id,
+                "name": ai_session_codebook.name,
+                "description": ai_session_codebook.description,
+                "is_ai_generated": ai_session_codebook.is_ai_generated,
+                "finalized": ai_session_codebook.finalized,
+            },
+            "results": final_assignments,
+            "summary": AICodingService._pipeline_summary(final_codes, final_assignments)
+        }
+
+    @staticmethod
+    def _deductive_coding_response(codebook_ids: list[int], final_codes: list, final_assignments: list) -> dict:
+        return {
+            "codebook_ids": codebook_ids,
+            "results": final_assignments,
+            "summary": AICodingService._pipeline_summary(final_codes, final_assignments)
+        }
+
     @staticmethod
     def _apply_changes_to_database(
         db: Session,
         codes_dict: dict,
         assignments: list,
         ai_session_codebook,
-        user_id: int
+        user_id: int,
+        checkpoints: Optional[PipelineCheckpoints] = None,
+        coded_chunks: Optional[Dict[int, List[str]]] = None,
+        stale_assignment_ids: Optional[List[int]] = None
     ) -> tuple[list, list]:
-        """Apply all in-memory changes to the database in a single transaction"""
+        """
+        Apply all in-memory changes to the database in a single transaction.
+        A checkpointed run's saving marker is part of the same transaction, as
+        is the record of the chunks initial coding coded into the session
+        codebook (document id -> chunk keys, replacing what it held for those
+        documents). Assignments saved by earlier runs are updated, not
+        inserted again; `stale_assignment_ids` of them are removed.
+        """
         from app.services.code_service import CodeService
+        from app.models.ai_job import AICodedChunk
         from app.models.code import Code
         import datetime
 
+        if checkpoints:
+            checkpoints.mark_saving(db)
+
         # Create all codes first (only for new codes)
         created_codes = {}  # code_name -> database_code
 
@@ -254,6 +536,14 @@ class AICodingService:
                 Code.project_id == code_data["project_id"]
             ).first()
 
+            if existing_code is None and code_data.get("id"):
+                # A code saved by an earlier run of the session, renamed by refinement
+                existing_code = db.query(Code).filter(Code.id == code_data["id"]).first()
+                if existing_code:
+                    print(f"DEBUG: Renaming code '{existing_code.name}' to '{code_name}'")
+                    existing_code.name = code_name
+                    existing_code.description = code_data["description"]
+
             if existing_code:
                 # Code already exists - use the existing one
                 print(
@@ -280,10 +570,12 @@ class AICodingService:
                     color=code_data.get("color", "#3B82F6"),
                     is_auto_generated=code_data.get("is_auto_generated", True),
                     codebook_id=ai_session_codebook.id,
-                    group_name=code_data.get("group_name")
+                    group_name=code_data.get("group_name"),
+                    commit=False  # committed below, with the assignments
                 )
                 created_codes[code_name] = code
-            except Exception as e:
+            except ValueError as e:
+                # Validation failed before anything was written, so the transaction is intact
                 print(f"ERROR: Failed to create code '{code_name}': {str(e)}")
                 # If code creation fails (e.g., duplicate name), try to get existing code
                 existing_code = db.query(Code).filter(
@@ -296,6 +588,10 @@ class AICodingService:
                     print(
                         f"ERROR: Could not create or find code '{code_name}' - skipping")
                     continue
+            except Exception as e:
+                print(f"❌ Error creating code '{code_name}': {str(e)}")
+                db.rollback()
+                raise e
 
         # Create all assignments using bulk insert for efficiency
         from app.models.code_assignments import CodeAssignment
@@ -304,6 +600,8 @@ class AICodingService:
         assignment_mappings = []
         assignment_data_list = []  # Keep track of assignment data for later matching
 
+        moved_mappings = []  # saved assignments placed again in their changed document
+
         for assignment_data in assignments:
             if assignment_data.get("status") == "deleted":
                 continue
@@ -314,6 +612,16 @@ class AICodingService:
 
             code = created_codes[code_name]
 
+            if assignment_data.get("status") == "existing":
+                if assignment_data.get("moved"):
+                    moved_mappings.append({
+                        "id": assignment_data["id"],
+                        "start_char": assignment_data["start_char"],
+                        "end_char": assignment_data["end_char"],
+                        "updated_at": datetime.datetime.now(datetime.timezone.utc)
+                    })
+                continue
+
             assignment_mappings.append({
                 "document_id": assignment_data["document_id"],
                 "code_id": code.id,
@@ -343,6 +651,25 @@ class AICodingService:
                 db.rollback()
                 raise e
 
+        if moved_mappings:
+            db.bulk_update_mappings(CodeAssignment.__mapper__, moved_mappings)
+        if stale_assignment_ids:
+            db.query(CodeAssignment).filter(
+                CodeAssignment.id.in_(stale_assignment_ids),
+                CodeAssignment.status == "pending"
+            ).delete(synchronize_session=False)
+            print(f"🧹 Removed {len(stale_assignment_ids)} stale assignments")
+
+        if coded_chunks and ai_session_codebook is not None:
+            db.query(AICodedChunk).filter(
+                AICodedChunk.codebook_id == ai_session_codebook.id,
+                AICodedChunk.document_id.in_(list(coded_chunks))
+            ).delete(synchronize_session=False)
+            db.add_all([
+                AICodedChunk(codebook_id=ai_session_codebook.id, document_id=document_id, chunk_key=chunk_key)
+                for document_id, chunk_keys in coded_chunks.items() for chunk_key in chunk_keys
+            ])
+
         # Commit all changes
         try:
             db.commit()
@@ -1,7 +1,19 @@
 from sqlalchemy.orm import Session
-from app.services.ai.llm_service import LLMService
-from app.utils.rate_limiter import with_exponential_backoff, get_rate_limiter
-from typing import Tuple
+from app.services.ai.llm_service import LLMService, SERVICE_PROMPTS
+from app.utils.rate_limiter import with_exponential_backoff, with_async_exponential_backoff, get_rate_limiter
+from app.services.ai.llm_cache import LLMResponseCache, get_llm_cache
+from app.services.ai.chunk_executor import get_chunk_executor
+from app.services.ai.pipeline_checkpoints import PipelineCheckpoints
+from app.services.ai.provider_router import ProviderRoute, get_provider_router
+from app.services.ai.quote_alignment import QuoteAligner
+from app.core.config import settings
+from typing import Any, Callable, Dict, Optional, Tuple
+import asyncio
+import json
+
+
+# Receives pipeline progress events, e.g. ("chunk_done", {"document_id": 3, ...})
+ProgressCallback = Callable[[str, Dict[str, Any]], None]
 
 
 class AICodingUtils:
@@ -23,42 +35,165 @@ class AICodingUtils:
 
     @staticmethod
     def find_quote_position(doc_content: str, chunk: str, quote: str, chunk_start: int) -> Tuple[int, int]:
+        """
+        Absolute offsets of `quote` in `doc_content`, looking in its chunk first;
+        the chunk's span when it cannot be placed. Placing many quotes of one
+        document is cheaper with one QuoteAligner for all of them.
+        """
+        return QuoteAligner(doc_content).locate(quote, chunk_start, chunk_start + len(chunk))
 
-        quote_start_in_chunk = chunk.find(quote)
-        if quote_start_in_chunk != -1:
-            start_idx = chunk_start + quote_start_in_chunk
-            end_idx = start_idx + len(quote)
-        else:
-            start_idx = chunk_start
-            end_idx = chunk_start + len(chunk)
-
-        return start_idx, end_idx
-
-    @staticmethod
-    def make_rate_limited_llm_call(llm_service, service_type: str, input_data: dict, provider: str):
-        """Make an LLM call with rate limiting - same retry strategy for all services"""
-        service_mapping = {
-            "initial_coding": llm_service.initial_coding_llm,
-            "theme_generation": llm_service.theme_generation_llm,
-            "deductive_coding": llm_service.deductive_coding_llm,
-            "code_refinement": llm_service.code_refinement_llm,
-            "code_grouping": llm_service.code_grouping_llm,
-            "report_generation": llm_service.report_generation_llm,
-        }
-
-        llm_method = service_mapping.get(service_type)
-        if not llm_method:
+    @staticmethod
+    def get_llm_method(llm_service, service_type: str):
+        """The runnable of `llm_service` for a pipeline step"""
+        if service_type not in SERVICE_PROMPTS:
             raise ValueError(f"Unknown service type: {service_type}")
+        # Chains are built lazily, so look up only the one this step needs
+        return getattr(llm_service, f"{service_type}_llm")
+
+    @staticmethod
+    def make_rate_limited_llm_call(llm_service, service_type: str, input_data: dict, provider: str, use_cache: bool = True):
+        """
+        Make an LLM call with rate limiting - same retry strategy for all services.
+        When `provider` names a pool of provider routes, the call goes to one of its routes.
+        """
+        router = get_provider_router()
+        if router.routes(provider):
+            return router.call(provider, lambda route: AICodingUtils._rate_limited_call(
+                AICodingUtils.route_llm_service(route), service_type, input_data, route.name, use_cache))
+        return AICodingUtils._rate_limited_call(llm_service, service_type, input_data, provider, use_cache)
+
+    @staticmethod
+    def _rate_limited_call(llm_service, service_type: str, input_data: dict, provider: str, use_cache: bool):
+        llm_method = AICodingUtils.get_llm_method(llm_service, service_type)
+        model = getattr(llm_service, "model_name", None)
+
+        cache = get_llm_cache() if use_cache else None
+        if cache:
+            key = LLMResponseCache.key(provider, model, service_type,
+                                       AICodingUtils.render_input(llm_method, input_data))
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
 
         # Apply consistent rate limiting to all services
-        @with_exponential_backoff(provider)
+        @with_exponential_backoff(provider, model, AICodingUtils.estimate_tokens(input_data))
         def make_call():
             return llm_method.invoke(input_data)
 
-        return make_call()
+        result = make_call()
+        if cache:
+            cache.put(key, result, provider, model, service_type)
+        return result
+
+    @staticmethod
+    async def amake_rate_limited_llm_call(llm_service, service_type: str, input_data: dict, provider: str, use_cache: bool = True):
+        """Async LLM call with the same rate limiting, caching and routing, using ainvoke"""
+        router = get_provider_router()
+        if router.routes(provider):
+            return await router.acall(provider, lambda route: AICodingUtils._arate_limited_call(
+                AICodingUtils.route_llm_service(route), service_type, input_data, route.name, use_cache))
+        return await AICodingUtils._arate_limited_call(llm_service, service_type, input_data, provider, use_cache)
+
+    @staticmethod
+    async def _arate_limited_call(llm_service, service_type: str, input_data: dict, provider: str, use_cache: bool):
+        llm_method = AICodingUtils.get_llm_method(llm_service, service_type)
+        model = getattr(llm_service, "model_name", None)
+
+        cache = get_llm_cache() if use_cache else None
+        if cache:
+            key = LLMResponseCache.key(provider, model, service_type,
+                                       AICodingUtils.render_input(llm_method, input_data))
+            cached = await asyncio.to_thread(cache.get, key)
+            if cached is not None:
+                return cached
+
+        @with_async_exponential_backoff(provider, model, AICodingUtils.estimate_tokens(input_data))
+        async def make_call():
+            return await llm_method.ainvoke(input_data)
+
+        result = await make_call()
+        if cache:
+            await asyncio.to_thread(cache.put, key, result, provider, model, service_type)
+        return result
+
+    @staticmethod
+    def route_llm_service(route: ProviderRoute) -> LLMService:
+        """The shared LLM service of a provider route"""
+        return LLMService.get(model_name=route.model, provider=route.provider,
+                              base_url=route.base_url, api_key=route.api_key)
+
+    @staticmethod
+    def render_input(llm_method, input_data: dict) -> str:
+        """
+        The prompt `llm_method` sends for `input_data`, so cache keys change
+        with the prompt templates. Falls back to the raw input.
+        """
+        prompt = getattr(llm_method, "first", None)
+        try:
+            rendered = prompt.invoke(input_data).to_string()  # type: ignore
+            if isinstance(rendered, str):
+                return rendered
+        except Exception:
+            pass
+        return json.dumps(input_data, sort_keys=True, default=str)
+
+    @staticmethod
+    def report(progress: Optional[ProgressCallback], event: str, **data) -> None:
+        """Send a progress event if anyone is listening"""
+        if progress:
+            progress(event, data)
+
+    @staticmethod
+    def chunk_progress(progress: Optional[ProgressCallback], work: list):
+        """
+        Announce the coding stage and return an on_done callback for
+        ChunkExecutor that reports a chunk_done event per chunk of `work`
+        """
+        if progress is None:
+            return None
+        progress("stage", {"stage": "coding", "chunks_total": len(work)})
+
+        def on_done(index: int, outcome) -> None:
+            document, chunk_num, chunk_count = work[index][:3]
+            progress("chunk_done", {
+                "document_id": document.id,
+                "chunk": chunk_num,
+                "chunk_count": chunk_count,
+                "error": str(outcome.error) if outcome.error is not None else None
+            })
+        return on_done
+
+    @staticmethod
+    def chunk_executor(checkpoints: Optional[PipelineCheckpoints], stage: str):
+        """The executor for a stage's LLM calls, checkpointed when the run keeps checkpoints"""
+        return checkpoints.executor(stage) if checkpoints else get_chunk_executor()
+
+    @staticmethod
+    def checkpointed_call(checkpoints: Optional[PipelineCheckpoints], stage: str, fn, input_data: dict):
+        """`fn(input_data)` for a single-call stage, checkpointed when the run keeps checkpoints"""
+        return checkpoints.call(stage, fn, input_data) if checkpoints else fn(input_data)
+
+    @staticmethod
+    async def acheckpointed_call(checkpoints: Optional[PipelineCheckpoints], stage: str, fn, input_data: dict):
+        """Async counterpart of checkpointed_call"""
+        if checkpoints:
+            return await checkpoints.acall(stage, fn, input_data)
+        return await fn(input_data)
+
+    @staticmethod
+    def estimate_tokens(input_data: dict) -> int:
+        """
+        Tokens to reserve against a tokens-per-minute budget: about four
+        characters per prompt token, plus an allowance for the response
+        """
+        chars = sum(len(str(value)) for value in input_data.values())
+        return chars // 4 + settings.AI_RATE_LIMIT_OUTPUT_TOKENS
 
     @staticmethod
     def get_rate_limit_status(provider: str) -> dict:
-        """Get rate limit status for a provider"""
+        """Get rate limit status for a provider; a routed pool's quota is spent only when all its routes' are"""
+        router = get_provider_router()
+        if router.routes(provider):
+            return router.status(provider)
         rate_limiter = get_rate_limiter()
         return rate_limiter.get_status(provider)
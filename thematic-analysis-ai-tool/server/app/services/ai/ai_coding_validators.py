@@ -3,7 +3,7 @@ from fastapi import HTTPException
 from app.core.permissions import PermissionChecker
 from app.models.user import User
 from app.models.document import Document
-from app.services.ai.llm_service import LLMService
+from app.services.ai.llm_service import LLMService, SERVICE_PROMPTS
 from app.services.codebook_service import CodebookService
 from app.services.project_service import ProjectService
 from typing import Optional, Tuple
@@ -40,6 +40,10 @@ class AICodingValidators:
                     raise ValueError(
                         f"Permission error for document {doc.id}: {e.detail}")
 
+            if doc.processing_status != "completed":  # type: ignore
+                raise ValueError(
+                    f"Document {doc.id} is still being processed ({doc.processing_status})")
+
         return documents
 
     @staticmethod
@@ -85,14 +89,8 @@ class AICodingValidators:
 
     @staticmethod
     def validate_llm_service(llm_service: LLMService, service_type: str) -> bool:
-        service_mapping = {
-            "initial_coding": llm_service.initial_coding_llm,
-            "theme_generation": llm_service.theme_generation_llm,
-            "deductive_coding": llm_service.deductive_coding_llm,
-            "code_refinement": llm_service.code_refinement_llm
-        }
-
-        if not service_mapping.get(service_type):
+        # Only the requested chain is looked up, so only it gets built
+        if service_type not in SERVICE_PROMPTS or not getattr(llm_service, f"{service_type}_llm", None):
             print("LLM service is not initialized or model is not available.")
             return False
         return True
@@ -0,0 +1,468 @@
+"""
+Database-backed background runner for AI coding pipelines
+"""
+import json
+import datetime
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session, sessionmaker
+from app.core.config import settings
+from app.models.ai_job import AIJob, AIJobEvent
+from app.services.ai.ai_coding_service import AICodingService
+from app.services.ai.pipeline_checkpoints import PipelineCancelled, PipelineCheckpoints
+
+JOB_KINDS = ("initial_coding", "deductive_coding")
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+# A job in these statuses is held by the worker whose claim set its locked_at
+LEASED_STATUSES = ("running", "cancelled")
+RESUMABLE_STATUSES = ("failed", "cancelled")
+
+
+class AIJobNotFound(ValueError):
+    """No AI job with that id belongs to the user"""
+
+
+class AIJobStateError(ValueError):
+    """The job's status does not allow the operation, e.g. the result of a failed job"""
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class AIJobProgress:
+    """
+    Progress callback handed to the pipeline for one job. Every event is
+    stored in `ai_job_events` and folded into the job's stage and chunk
+    counters. Chunk events arrive from several executor threads, so writes
+    are serialised.
+
+    Events are also where a running job learns it was cancelled: `stop` is
+    set and PipelineCancelled is raised into the pipeline. `stop` is also set
+    when the worker loses the job's lease (see AIJobLease); the run then
+    records nothing more.
+    """
+
+    def __init__(self, runner: "AIJobRunner", factory: sessionmaker, job_id: int, stop: threading.Event):
+        self.runner = runner
+        self.factory = factory
+        self.job_id = job_id
+        self.stop = stop
+        self._lock = threading.Lock()
+
+    def __call__(self, event: str, data: Dict[str, Any]) -> None:
+        with self._lock, self.factory() as db:
+            job = db.query(AIJob).filter(AIJob.id == self.job_id).first()
+            if job is None:
+                return
+            if self.stop.is_set() or job.status == "cancelled":  # type: ignore
+                self.stop.set()
+                raise PipelineCancelled(f"AI job {self.job_id} was cancelled")
+            AIJobProgress.apply(job, event, data)
+            db.add(AIJobEvent(job_id=self.job_id, event=event, data=data))
+            db.commit()
+        self.runner.notify()
+
+    @staticmethod
+    def apply(job: AIJob, event: str, data: Dict[str, Any]) -> None:
+        if event == "stage":
+            job.stage = data["stage"]
+            if "chunks_total" in data:
+                job.chunks_total = data["chunks_total"]
+        elif event == "chunk_done":
+            job.chunks_done = job.chunks_done + 1  # type: ignore
+            if data.get("error"):
+                job.chunks_failed = job.chunks_failed + 1  # type: ignore
+
+
+class AIJobLease:
+    """
+    A worker's hold on one running job: the job's `locked_at` as this worker
+    last wrote it.
+
+    While the pipeline runs, a heartbeat thread renews the lease every
+    `interval` seconds, so stages that report no progress for a long time
+    (refinement batches, grouping, merge rounds, provider backoff) do not
+    outlive it. Each renewal is an UPDATE conditional on the value last
+    written. Once the job has been failed for an expired lease, or resumed
+    and claimed by another worker, renewals stop matching; `lost` is then
+    set and the pipeline is stopped at its next call or progress event.
+    """
+
+    def __init__(
+        self,
+        factory: sessionmaker,
+        job_id: int,
+        locked_at: datetime.datetime,
+        interval: float,
+        lost: threading.Event
+    ):
+        self.factory = factory
+        self.job_id = job_id
+        self.locked_at = locked_at
+        self.interval = interval
+        self.lost = lost
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "AIJobLease":
+        self._thread = threading.Thread(
+            target=self._beat, name=f"ai-job-lease-{self.job_id}", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._done.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def held(self):
+        """Filter conditions matching the job only while this lease holds it"""
+        return (AIJob.id == self.job_id, AIJob.status.in_(LEASED_STATUSES),
+                AIJob.locked_at == self.locked_at)
+
+    def renew(self) -> bool:
+        """Move the lease forward; False once the job is no longer held by it"""
+        now = _utcnow()
+        with self.factory() as db:
+            renewed = db.query(AIJob).filter(*self.held()).update(
+                {"locked_at": now}, synchronize_session=False)
+            db.commit()
+        if renewed:
+            self.locked_at = now
+        return bool(renewed)
+
+    def _beat(self) -> None:
+        while not self._done.wait(self.interval):
+            try:
+                renewed = self.renew()
+            except Exception as e:
+                # A database hiccup is retried at the next beat; the lease outlasts a few of them
+                print(f"⚠️ Could not renew the lease of AI job {self.job_id}: {e}")
+                continue
+            if not renewed:
+                print(f"⚠️ AI job {self.job_id} lost its lease; stopping the run")
+                self.lost.set()
+                return
+
+
+class AIJobRunner:
+    """
+    Runs initial and deductive coding as queued jobs, so the HTTP request
+    that starts one returns at once with a job id.
+
+    Jobs live in the `ai_jobs` table and are claimed by worker threads with a
+    conditional UPDATE (pending -> running), like the document ingestion
+    queue. The claiming worker holds the job's lease until it finishes the
+    job, which it does with an UPDATE conditional on that lease. The number
+    of workers is independent of the web threadpool.
+    Progress events are persisted per job for the SSE stream and its
+    reconnects.
+
+    Each LLM call a job makes is checkpointed (see PipelineCheckpoints). A
+    job that failed, was cancelled, or whose worker died and let the lease
+    expire (and was marked failed) can be resumed, and then only repeats the
+    calls that had not succeeded.
+    """
+
+    # Renewals per lease period, so a few missed beats do not cost the lease
+    HEARTBEATS_PER_LEASE = 3
+
+    def __init__(self, workers: int, lease_seconds: float, poll_seconds: float):
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+
+        self._bind = None
+        self._session_factory: Optional[sessionmaker] = None
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        # Bumped whenever any job records an event, so streams know when to re-read
+        self._changed = threading.Lock()
+        self._version = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def submit(self, db: Session, kind: str, user_id: int, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Queue a pipeline run; `params` are keyword arguments for the pipeline"""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown AI job kind: {kind}")
+
+        job = AIJob(kind=kind, user_id=user_id, params=params,
+                    status="pending", stage="queued")
+        db.add(job)
+        db.flush()
+        db.add(AIJobEvent(job_id=job.id, event="stage", data={"stage": "queued"}))
+        db.commit()
+
+        self.start(db.get_bind())
+        with self._wakeup:
+            self._wakeup.notify()
+        return AIJobRunner.serialize_job(job)
+
+    def get_job(self, db: Session, job_id: int, user_id: int) -> AIJob:
+        job = db.query(AIJob).filter(AIJob.id == job_id, AIJob.user_id == user_id).first()
+        if not job:
+            raise AIJobNotFound("AI job not found")
+        return job
+
+    def list_jobs(self, db: Session, user_id: int, limit: int = 20) -> List[Dict[str, Any]]:
+        jobs = db.query(AIJob).filter(AIJob.user_id == user_id).order_by(
+            AIJob.id.desc()).limit(limit).all()
+        return [AIJobRunner.serialize_job(job) for job in jobs]
+
+    def result(self, db: Session, job_id: int, user_id: int) -> Dict[str, Any]:
+        """The pipeline's response for a completed job"""
+        job = self.get_job(db, job_id, user_id)
+        if job.status == "failed":  # type: ignore
+            raise AIJobStateError(f"AI job failed: {job.error}")
+        if job.status != "completed":  # type: ignore
+            raise AIJobStateError(f"AI job is not completed yet (status: {job.status})")
+        return job.result  # type: ignore
+
+    def cancel(self, db: Session, job_id: int, user_id: int) -> Dict[str, Any]:
+        """
+        Cancel a job. A pending job stops at once; a running one stops at its
+        next progress event and keeps its lease until its worker lets go.
+        """
+        job = self.get_job(db, job_id, user_id)
+        if job.status in FINISHED_STATUSES:  # type: ignore
+            raise AIJobStateError(f"AI job cannot be cancelled once it is {job.status}")
+        if not (job.status == "pending" and AIJobRunner._finish(  # type: ignore
+                db, job.id, "cancelled", AIJob.status == "pending", error="Cancelled before it started")):
+            # Running, or claimed since it was read: its worker stops at its next progress event
+            db.query(AIJob).filter(
+                AIJob.id == job.id, AIJob.status.in_(("pending", "running"))
+            ).update({"status": "cancelled"}, synchronize_session=False)
+        db.commit()
+        db.refresh(job)
+        self.notify()
+        return AIJobRunner.serialize_job(job)
+
+    def resume(self, db: Session, job_id: int, user_id: int) -> Dict[str, Any]:
+        """Queue a failed or cancelled job again; its checkpointed calls are not repeated"""
+        job = self.get_job(db, job_id, user_id)
+        # A cancelled job still holds its lease while its worker winds down
+        if job.status not in RESUMABLE_STATUSES or job.locked_at is not None:  # type: ignore
+            raise AIJobStateError(f"AI job cannot be resumed while it is {job.status}")
+
+        job.status = "pending"  # type: ignore
+        job.stage = "queued"  # type: ignore
+        job.chunks_total = job.chunks_done = job.chunks_failed = 0  # type: ignore
+        job.result = job.error = job.completed_at = None  # type: ignore
+        db.add(AIJobEvent(job_id=job.id, event="stage", data={"stage": "queued", "resumed": True}))
+        db.commit()
+
+        self.start(db.get_bind())
+        with self._wakeup:
+            self._wakeup.notify()
+        self.notify()
+        return AIJobRunner.serialize_job(job)
+
+    def read_events(
+        self,
+        factory: sessionmaker,
+        job_id: int,
+        after_id: int,
+        limit: int = 500
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """Events after `after_id`, and whether the job had finished before they were read"""
+        with factory() as db:
+            # Status first: a job's final event commits together with its status
+            status = db.query(AIJob.status).filter(AIJob.id == job_id).scalar()
+            events = db.query(AIJobEvent).filter(
+                AIJobEvent.job_id == job_id, AIJobEvent.id > after_id
+            ).order_by(AIJobEvent.id).limit(limit).all()
+            serialized = [{"id": e.id, "event": e.event, "data": e.data or {}} for e in events]
+        return serialized, status in FINISHED_STATUSES and len(serialized) < limit
+
+    def notify(self) -> None:
+        with self._changed:
+            self._version += 1
+
+    def process_next(self) -> bool:
+        """Claim and run one pending job; returns False when none was waiting"""
+        factory = self._session_factory
+        if factory is None:
+            return False
+        claim = self._claim(factory)
+        if claim is None:
+            return False
+        self._run(factory, *claim)
+        return True
+
+    def start(self, bind) -> None:
+        """Start the worker threads against `bind` if they are not running"""
+        with self._lock:
+            if self._bind is not bind:
+                self._bind = bind
+                self._session_factory = sessionmaker(
+                    autocommit=False, autoflush=False, bind=bind)
+            self._threads = [t for t in self._threads if t.is_alive()]
+            if self._threads or self.workers <= 0:
+                return
+            self._stop = threading.Event()
+            for index in range(self.workers):
+                thread = threading.Thread(
+                    target=self._worker, args=(self._stop,),
+                    name=f"ai-job-worker-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Stop the worker threads; a job still running is failed once its lease expires"""
+        with self._lock:
+            self._stop.set()
+            threads, self._threads = self._threads, []
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in threads:
+            thread.join(timeout)
+
+    def _worker(self, stop: threading.Event) -> None:
+        while not stop.is_set():
+            try:
+                worked = self.process_next()
+            except Exception as e:
+                print(f"AI job worker error: {e}")
+                worked = False
+            if not worked:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_seconds)
+
+    def _claim(self, factory: sessionmaker) -> Optional[Tuple[int, datetime.datetime]]:
+        """Id of the job this worker claimed, and the `locked_at` its lease starts from"""
+        now = _utcnow()
+        with factory() as db:
+            self._fail_abandoned(db, now)
+            candidates = db.query(AIJob.id).filter(AIJob.status == "pending").order_by(
+                AIJob.id).limit(max(self.workers, 1) * 2).all()
+            for (job_id,) in candidates:
+                # Only one worker's UPDATE can match while the job is still pending
+                claimed = db.query(AIJob).filter(
+                    AIJob.id == job_id, AIJob.status == "pending"
+                ).update({
+                    "status": "running",
+                    "locked_at": now,
+                    "started_at": now
+                }, synchronize_session=False)
+                db.commit()
+                if claimed:
+                    return job_id, now
+        return None
+
+    def _fail_abandoned(self, db: Session, now: datetime.datetime) -> None:
+        lease_expired = now - datetime.timedelta(seconds=self.lease_seconds)
+        abandoned = db.query(AIJob.id, AIJob.status, AIJob.locked_at).filter(
+            AIJob.status.in_(LEASED_STATUSES), AIJob.locked_at < lease_expired).all()
+        finished = 0
+        for job_id, status, locked_at in abandoned:
+            # Only if its lease was not renewed since it was read
+            held = (AIJob.status == status, AIJob.locked_at == locked_at)
+            if status == "cancelled":
+                finished += self._finish(db, job_id, "cancelled", *held, error="Cancelled")
+            else:
+                finished += self._finish(db, job_id, "failed", *held,
+                                         error="Interrupted: the job's worker stopped renewing its lease; "
+                                               "resume it to continue")
+        if finished:
+            db.commit()
+            self.notify()
+
+    def _run(self, factory: sessionmaker, job_id: int, locked_at: datetime.datetime) -> None:
+        with factory() as db:
+            job = db.query(AIJob).filter(AIJob.id == job_id).first()
+            if job is None:
+                return
+            kind, user_id, params = job.kind, int(job.user_id), dict(job.params)  # type: ignore
+            stop = threading.Event()
+            progress = AIJobProgress(self, factory, job_id, stop)
+            checkpoints = PipelineCheckpoints(factory, job_id, stop)
+            pipeline = AICodingService.generate_code if kind == "initial_coding" \
+                else AICodingService.deductive_coding
+            print(f"🚀 Running AI job {job_id} ({kind})")
+
+            lease = AIJobLease(factory, job_id, locked_at,
+                               self.lease_seconds / self.HEARTBEATS_PER_LEASE, stop)
+            with lease:
+                try:
+                    result = pipeline(db=db, user_id=user_id, progress=progress,
+                                      checkpoints=checkpoints, **params)
+                    # Keep only what JSON can hold (datetimes become strings)
+                    outcome = {"status": "completed", "result": json.loads(json.dumps(result, default=str))}
+                except PipelineCancelled:
+                    db.rollback()
+                    print(f"🛑 AI job {job_id} cancelled")
+                    outcome = {"status": "cancelled", "error": "Cancelled"}
+                except Exception as e:
+                    db.rollback()
+                    print(f"❌ AI job {job_id} failed: {e}")
+                    outcome = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+
+            if self._finish(db, job_id, outcome.pop("status"), *lease.held(), **outcome):
+                db.commit()
+            else:
+                # Failed for an expired lease (and maybe resumed elsewhere); that run owns the job now
+                db.rollback()
+                print(f"⚠️ AI job {job_id} lost its lease; its outcome was discarded")
+        self.notify()
+
+    @staticmethod
+    def _finish(
+        db: Session,
+        job_id: int,
+        status: str,
+        *conditions,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None
+    ) -> bool:
+        """
+        Record a job's outcome and final event if the job still matches
+        `conditions`; False when it does not, e.g. the lease was lost
+        """
+        finished = db.query(AIJob).filter(AIJob.id == job_id, *conditions).update({
+            "status": status,
+            "stage": "done",
+            "result": result,
+            "error": error,
+            "locked_at": None,
+            "completed_at": _utcnow()
+        }, synchronize_session=False)
+        if not finished:
+            return False
+        data = {"summary": (result or {}).get("summary", {})} if status == "completed" else {"error": error}
+        db.add(AIJobEvent(job_id=job_id, event=status, data=data))
+        return True
+
+    @staticmethod
+    def serialize_job(job: AIJob) -> Dict[str, Any]:
+        return {
+            "id": job.id,
+            "kind": job.kind,
+            "status": job.status,
+            "stage": job.stage,
+            "chunks_total": job.chunks_total or 0,
+            "chunks_done": job.chunks_done or 0,
+            "chunks_failed": job.chunks_failed or 0,
+            "error": job.error,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "completed_at": job.completed_at
+        }
+
+
+# Global instance
+_ai_job_runner = AIJobRunner(
+    workers=settings.AI_JOB_WORKERS,
+    lease_seconds=settings.AI_JOB_LEASE_SECONDS,
+    poll_seconds=settings.AI_JOB_POLL_SECONDS
+)
+
+
+def get_ai_job_runner() -> AIJobRunner:
+    """Get the global AI job runner."""
+    return _ai_job_runner
@@ -14,7 +14,8 @@ class AIReportGenerationService:
         db: Session,
         user_id: int,
         model_name: str = "gemini-2.0-flash",
-        provider: str = "google_genai"
+        provider: str = "google_genai",
+        use_cache: bool = True
     ) -> dict:
         """Generate a report using LLM based on code assignments"""
         print(
@@ -28,8 +29,78 @@ class AIReportGenerationService:
             else:
                 print(f"📌 Assignment type: {type(first_assignment)}")
 
-        llm_service = LLMService(model_name=model_name, provider=provider)
+        llm_service = LLMService.get(model_name=model_name, provider=provider)
+        input_data = AIReportGenerationService._report_input(code_assignments)
 
+        try:
+            # Log what we're sending to the LLM
+            print(
+                f"📝 Sending data to LLM: {len(input_data['codes_summary'])} chars of code data, {len(input_data['themes_summary'])} chars of theme data")
+
+            # Generate report using LLM
+            report_response: ReportOutput = AICodingUtils.make_rate_limited_llm_call(
+                llm_service=llm_service,
+                service_type="report_generation",
+                input_data=input_data,
+                provider=provider,
+                use_cache=use_cache
+            )
+            return AIReportGenerationService._report_result(report_response)
+
+        except Exception as e:
+            import traceback
+            print(f"❌ Error generating report: {str(e)}")
+            print(f"Traceback: {traceback.format_exc()}")
+            return {"error": str(e)}
+
+    @staticmethod
+    async def agenerate_report(
+        code_assignments: list,
+        db: Session,
+        user_id: int,
+        model_name: str = "gemini-2.0-flash",
+        provider: str = "google_genai",
+        use_cache: bool = True
+    ) -> dict:
+        """Async counterpart of generate_report"""
+        print(
+            f"📄 Starting report generation for {len(code_assignments)} assignments")
+
+        # Debug the structure of the first assignment
+        if code_assignments:
+            first_assignment = code_assignments[0]
+            if isinstance(first_assignment, dict):
+                print(f"📌 Assignment keys: {list(first_assignment.keys())}")
+            else:
+                print(f"📌 Assignment type: {type(first_assignment)}")
+
+        llm_service = LLMService.get(model_name=model_name, provider=provider)
+        input_data = AIReportGenerationService._report_input(code_assignments)
+
+        try:
+            # Log what we're sending to the LLM
+            print(
+                f"📝 Sending data to LLM: {len(input_data['codes_summary'])} chars of code data, {len(input_data['themes_summary'])} chars of theme data")
+
+            # Generate report using LLM
+            report_response: ReportOutput = await AICodingUtils.amake_rate_limited_llm_call(
+                llm_service=llm_service,
+                service_type="report_generation",
+                input_data=input_data,
+                provider=provider,
+                use_cache=use_cache
+            )
+            return AIReportGenerationService._report_result(report_response)
+
+        except Exception as e:
+            import traceback
+            print(f"❌ Error generating report: {str(e)}")
+            print(f"Traceback: {traceback.format_exc()}")
+            return {"error": str(e)}
+
+    @staticmethod
+    def _report_input(code_assignments: list) -> dict:
+        """Codes and themes summaries for the report LLM call"""
         # Extract code and theme information safely
         codes_summary_lines = []
         themes_summary_lines = []
@@ -73,43 +144,27 @@ class AIReportGenerationService:
                     print(f"⚠️ Error processing assignment object: {str(e)}")
 
         # Prepare input data for LLM
-        input_data = {
+        return {
             "codes_summary": "\n".join(codes_summary_lines) if codes_summary_lines else "No codes available",
             "themes_summary": "\n".join(themes_summary_lines) if themes_summary_lines else "No themes available",
             "assignments_count": len(code_assignments)
         }
 
-        try:
-            # Log what we're sending to the LLM
+    @staticmethod
+    def _report_result(report_response: ReportOutput) -> dict:
+        """Report dict from the LLM response"""
+        # Handle response safely
+        if hasattr(report_response, 'report_text') and hasattr(report_response, 'summary'):
+            print(f"✅ Successfully generated report")
+            return {
+                "report": report_response.report_text,
+                "summary": report_response.summary
+            }
+        else:
+            # Handle case where response doesn't have expected structure
             print(
-                f"📝 Sending data to LLM: {len(input_data['codes_summary'])} chars of code data, {len(input_data['themes_summary'])} chars of theme data")
-
-            # Generate report using LLM
-            report_response: ReportOutput = AICodingUtils.make_rate_limited_llm_call(
-                llm_service=llm_service,
-                service_type="report_generation",
-                input_data=input_data,
-                provider=provider
-            )
-
-            # Handle response safely
-            if hasattr(report_response, 'report_text') and hasattr(report_response, 'summary'):
-                print(f"✅ Successfully generated report")
-                return {
-                    "report": report_response.report_text,
-                    "summary": report_response.summary
-                }
-            else:
-                # Handle case where response doesn't have expected structure
-                print(
-                    f"⚠️ Unexpected report response structure: {type(report_response)}")
-                return {
-                    "report": str(report_response),
-                    "summary": "Report generated with unexpected structure"
-                }
-
-        except Exception as e:
-            import traceback
-            print(f"❌ Error generating report: {str(e)}")
-            print(f"Traceback: {traceback.format_exc()}")
-            return {"error": str(e)}
+                f"⚠️ Unexpected report response structure: {type(report_response)}")
+            return {
+                "report": str(report_response),
+                "summary": "Report generated with unexpected structure"
+            }
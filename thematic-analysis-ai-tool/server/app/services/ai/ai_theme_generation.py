@@ -1,16 +1,34 @@
 from sqlalchemy.orm import Session
-from app.schemas.ai_services import ThemeOutput
+from app.core.config import settings
+from app.schemas.ai_services import MultipleThemesOutput, ThemeConsolidationOutput
 from app.services.ai.llm_service import LLMService
 from app.services.theme_service import ThemeService
 from app.services.ai.ai_coding_validators import AICodingValidators
 from app.services.ai.ai_coding_utils import AICodingUtils
-from app.schemas.ai_theme_generation import CodeAssignment, ThemeGenerationRequest, ThemeGenerationResponse
-from sqlalchemy.sql.schema import Column
-from typing import List
+from app.services.ai.chunk_executor import ChunkOutcome, get_chunk_executor
+from app.services.ai.code_clustering import CodeClustering
+from app.schemas.ai_theme_generation import CodeAssignment, ThemeGenerationResponse
+from typing import List, Tuple
+import numpy as np
+import asyncio
 
 
 class AIThemeGenerationService:
-    """Service for generating themes using in-memory processing"""
+    """
+    Service for generating themes using in-memory processing.
+
+    The prompts stay bounded however many assignments are selected: every
+    code appears once, with its assignment count and a few sampled snippets.
+    Codes are split by similarity into partitions of at most
+    AI_THEME_MAX_CODES_PER_PROMPT, candidate themes are generated for every
+    partition concurrently, and with more than one partition the candidates
+    are consolidated, round by round in batches of similar candidates, into
+    at most AI_THEME_MAX_THEMES themes.
+    """
+
+    # Codes listed per candidate in a consolidation prompt; the rest are only counted
+    CONSOLIDATION_CODES_SHOWN = 8
+    MAX_CONSOLIDATION_ROUNDS = 5
 
     @staticmethod
     def generate_themes_in_memory(
@@ -18,70 +36,126 @@ class AIThemeGenerationService:
         db: Session,
         user_id: int,
         model_name: str = "gemini-2.0-flash",
-        provider: str = "google_genai"
+        provider: str = "google_genai",
+        use_cache: bool = True
     ) -> List[ThemeGenerationResponse]:
         """Generate themes in memory and immediately apply to database"""
         print(
             f"🚀 Starting theme generation for {len(code_assignments)} assignments")
 
-        llm_service = LLMService(model_name=model_name, provider=provider)
+        llm_service = LLMService.get(model_name=model_name, provider=provider)
 
         # Validation
-        if not AICodingValidators.validate_llm_service(llm_service, "theme_generation"):
+        if not AICodingValidators.validate_llm_service(llm_service, "theme_candidates"):
             return []
 
-        # Extract relevant code information from assignments
-        # Since we're using Pydantic schema objects, we need to handle them differently
-        # than SQLAlchemy models
-        codes = []
-        for assignment in code_assignments:
-            codes.append(assignment.text)
+        def call(service_type: str, input_data: dict):
+            return AICodingUtils.make_rate_limited_llm_call(
+                llm_service=llm_service,
+                service_type=service_type,
+                input_data=input_data,
+                provider=provider,
+                use_cache=use_cache
+            )
 
-        print(f"Collected {len(codes)} code items for theme generation")
+        try:
+            codes = AIThemeGenerationService._code_summaries(code_assignments)
+            partitions = AIThemeGenerationService._partition_codes(codes)
+            print(f"Collected {len(codes)} codes in {len(partitions)} partitions for theme generation")
 
-        # Format codes for LLM
-        codes_text = AIThemeGenerationService._format_codes_for_theme_generation(
-            codes)
+            # Map: candidate themes for every partition, concurrently
+            outcomes = get_chunk_executor().map(
+                provider,
+                lambda input_data: call("theme_candidates", input_data),
+                [AIThemeGenerationService._candidates_input(partition) for partition in partitions]
+            )
+            themes = AIThemeGenerationService._candidate_themes(partitions, outcomes)
 
-        try:
-            # Make rate-limited LLM call
-            llm_response: ThemeOutput = AICodingUtils.make_rate_limited_llm_call(
+            # Reduce: consolidate the candidates of different partitions
+            if len(partitions) > 1:
+                for _ in range(AIThemeGenerationService.MAX_CONSOLIDATION_ROUNDS):
+                    batches = AIThemeGenerationService._consolidation_batches(themes)
+                    pending = [batch for batch in batches if len(batch) > 1]
+                    consolidation_outcomes = get_chunk_executor().map(
+                        provider,
+                        lambda input_data: call("theme_consolidation", input_data),
+                        [AIThemeGenerationService._consolidation_input(themes, batch) for batch in pending]
+                    )
+                    consolidated = AIThemeGenerationService._consolidate(
+                        themes, batches, pending, consolidation_outcomes)
+                    finished = len(batches) == 1 or len(consolidated) >= len(themes)
+                    themes = consolidated
+                    if finished:
+                        break
+
+            return AIThemeGenerationService._create_themes(
+                db, user_id, code_assignments, codes, themes)
+
+        except Exception as e:
+            print(f"❌ Error generating theme: {str(e)}")
+            import traceback
+            print(f"Traceback: {traceback.format_exc()}")
+            return []
+
+    @staticmethod
+    async def agenerate_themes_in_memory(
+        code_assignments: List[CodeAssignment],
+        db: Session,
+        user_id: int,
+        model_name: str = "gemini-2.0-flash",
+        provider: str = "google_genai",
+        use_cache: bool = True
+    ) -> List[ThemeGenerationResponse]:
+        """Async counterpart of generate_themes_in_memory; themes are saved on a worker thread"""
+        print(
+            f"🚀 Starting theme generation for {len(code_assignments)} assignments")
+
+        llm_service = LLMService.get(model_name=model_name, provider=provider)
+
+        # Validation
+        if not AICodingValidators.validate_llm_service(llm_service, "theme_candidates"):
+            return []
+
+        def call(service_type: str, input_data: dict):
+            return AICodingUtils.amake_rate_limited_llm_call(
                 llm_service=llm_service,
-                service_type="theme_generation",
-                input_data={"codes_text": codes_text},
-                provider=provider
+                service_type=service_type,
+                input_data=input_data,
+                provider=provider,
+                use_cache=use_cache
             )
 
-            if not code_assignments or len(code_assignments) == 0:
-                print("❌ Error: No code assignments provided")
-                return []
-
-            # Create theme in database
-            theme = ThemeService.create_theme(
-                db=db,
-                name=llm_response.theme_name,
-                project_id=code_assignments[0].project_id,
-                user_id=user_id,
-                description=llm_response.theme_description
+        try:
+            codes = AIThemeGenerationService._code_summaries(code_assignments)
+            partitions = AIThemeGenerationService._partition_codes(codes)
+            print(f"Collected {len(codes)} codes in {len(partitions)} partitions for theme generation")
+
+            outcomes = await get_chunk_executor().amap(
+                provider,
+                lambda input_data: call("theme_candidates", input_data),
+                [AIThemeGenerationService._candidates_input(partition) for partition in partitions]
             )
+            themes = AIThemeGenerationService._candidate_themes(partitions, outcomes)
 
-            # Convert SQLAlchemy model to dictionary
-            theme_dict = {
-                "id": theme.id,
-                "name": theme.name,
-                "description": theme.description or "",
-                "project_id": theme.project_id,
-                "user_id": theme.user_id,
-                "created_at": theme.created_at.isoformat(),
-                "reasoning": llm_response.reasoning,
-                "related_codes": llm_response.related_codes
-            }
-
-            # Create response object
-            result = ThemeGenerationResponse(**theme_dict)
+            if len(partitions) > 1:
+                for _ in range(AIThemeGenerationService.MAX_CONSOLIDATION_ROUNDS):
+                    batches = AIThemeGenerationService._consolidation_batches(themes)
+                    pending = [batch for batch in batches if len(batch) > 1]
+                    consolidation_outcomes = await get_chunk_executor().amap(
+                        provider,
+                        lambda input_data: call("theme_consolidation", input_data),
+                        [AIThemeGenerationService._consolidation_input(themes, batch) for batch in pending]
+                    )
+                    consolidated = AIThemeGenerationService._consolidate(
+                        themes, batches, pending, consolidation_outcomes)
+                    finished = len(batches) == 1 or len(consolidated) >= len(themes)
+                    themes = consolidated
+                    if finished:
+                        break
 
-            print(f"✅ Successfully generated and created theme: {theme.name}")
-            return [result]
+            return await asyncio.to_thread(
+                AIThemeGenerationService._create_themes,
+                db, user_id, code_assignments, codes, themes)
 
         except Exception as e:
             print(f"❌ Error generating theme: {str(e)}")
@@ -90,23 +164,220 @@ class AIThemeGenerationService:
             return []
 
     @staticmethod
-    def _format_codes_for_theme_generation(codes) -> str:
-        """Format codes for theme generation LLM input"""
-        if not codes:
-            return "No codes available for theme generation."
-
-        codes_text = "List of codes from the codebook:\n\n"
-        for code in codes:
-            # Handle both string inputs and code objects
-            if isinstance(code, str):
-                codes_text += f"Code text: {code}\n\n"
-            else:
-                # Handle code objects with name and description attributes
-                try:
-                    codes_text += f"Code: {code.name}\n\n"
-                    codes_text += f"Description: {code.description or 'No description provided'}\n\n"
-                except AttributeError:
-                    # Fallback for any other type
-                    codes_text += f"Code data: {str(code)}\n\n"
-
-        return codes_text
+    def _code_summaries(code_assignments: List[CodeAssignment]) -> List[dict]:
+        """One entry per code, in order of first use, with its count and sampled snippets"""
+        codes = {}  # code_id -> summary
+        for assignment in code_assignments:
+            code = codes.setdefault(assignment.code_id, {
+                "code_id": assignment.code_id,
+                "name": assignment.code_name or f"Code {assignment.code_id}",
+                "description": assignment.code_description or "",
+                "count": 0,
+                "snippets": []
+            })
+            code["count"] += 1
+            snippet = assignment.text_snapshot if assignment.text_snapshot is not None else assignment.text
+            if snippet and snippet.strip():
+                code["snippets"].append((assignment.document_id, snippet.strip()))
+
+        for code in codes.values():
+            code["snippets"] = AIThemeGenerationService._sample_snippets(
+                code["snippets"], settings.AI_THEME_SNIPPETS_PER_CODE)
+        return list(codes.values())
+
+    @staticmethod
+    def _sample_snippets(snippets: List[Tuple[int, str]], count: int) -> List[str]:
+        """
+        Up to `count` distinct snippets, most typical of the code first (by
+        TF-IDF similarity to the code's centroid), spread over documents
+        """
+        unique = list({text: (document_id, text) for document_id, text in reversed(snippets)}.values())[::-1]
+        if len(unique) > count:
+            vectors = CodeClustering.tfidf([text for _, text in unique])
+            order = np.argsort(-(vectors @ vectors.mean(axis=0)), kind="stable").tolist()
+            # The most typical snippet of each document first, then the most typical of the rest
+            chosen, documents = [], set()
+            for index in order:
+                if unique[index][0] not in documents:
+                    documents.add(unique[index][0])
+                    chosen.append(index)
+            chosen += [index for index in order if index not in chosen]
+            unique = [unique[index] for index in chosen[:count]]
+
+        limit = settings.AI_THEME_SNIPPET_CHARS
+        return [text if len(text) <= limit else text[:limit] + "..." for _, text in unique]
+
+    @staticmethod
+    def _partition_codes(codes: List[dict]) -> List[List[dict]]:
+        """Codes split into partitions of similar codes, each small enough for one prompt"""
+        max_codes = max(settings.AI_THEME_MAX_CODES_PER_PROMPT, 1)
+        if len(codes) <= max_codes:
+            return [codes] if codes else []
+        vectors = CodeClustering.tfidf([
+            " ".join([code["name"], code["description"]] + code["snippets"]) for code in codes
+        ])
+        return [[codes[index] for index in cluster]
+                for cluster in CodeClustering.cluster(vectors, max_codes, max_codes)]
+
+    @staticmethod
+    def _candidates_input(partition: List[dict]) -> dict:
+        """LLM input describing the codes of a partition"""
+        sections = []
+        for code in partition:
+            lines = [
+                f"Code ID {code['code_id']}: {code['name']}",
+                f"Description: {code['description'] or 'No description'}",
+                f"Assignments: {code['count']}"
+            ]
+            lines += [f"  - \"{snippet}\"" for snippet in code["snippets"]]
+            sections.append("\n".join(lines))
+        return {
+            "codes_text": "\n\n".join(sections),
+            "code_count": len(partition),
+            "max_themes": settings.AI_THEME_MAX_THEMES
+        }
+
+    @staticmethod
+    def _candidate_themes(partitions: List[List[dict]], outcomes: List[ChunkOutcome]) -> List[dict]:
+        """
+        Candidate themes as {"name", "description", "reasoning", "code_ids"},
+        keeping only code IDs of the partition the theme was generated for
+        """
+        themes = []
+        for partition, outcome in zip(partitions, outcomes):
+            if outcome.error is not None:
+                print(f"❌ Error generating themes for {len(partition)} codes: {str(outcome.error)}")
+                continue
+
+            themes_response: MultipleThemesOutput = outcome.result
+            code_ids = {code["code_id"] for code in partition}
+            for theme in themes_response.themes[:settings.AI_THEME_MAX_THEMES]:
+                related = [code_id for code_id in dict.fromkeys(theme.related_code_ids) if code_id in code_ids]
+                if related:
+                    themes.append({
+                        "name": theme.theme_name,
+                        "description": theme.theme_description,
+                        "reasoning": themes_response.reasoning,
+                        "code_ids": related
+                    })
+        if not themes and outcomes:
+            raise ValueError("No themes could be generated")
+        return themes
+
+    @staticmethod
+    def _consolidation_batches(themes: List[dict]) -> List[List[int]]:
+        """Indexes of similar candidate themes to consolidate in one call each"""
+        max_themes = max(settings.AI_THEME_MAX_CANDIDATES_PER_PROMPT, 2)
+        if len(themes) <= max_themes:
+            return [list(range(len(themes)))] if themes else []
+        vectors = CodeClustering.tfidf([f"{theme['name']} {theme['description']}" for theme in themes])
+        return CodeClustering.cluster(vectors, max_themes, max_themes)
+
+    @staticmethod
+    def _consolidation_input(themes: List[dict], batch: List[int]) -> dict:
+        """LLM input listing the candidate themes of a batch with their codes"""
+        shown = AIThemeGenerationService.CONSOLIDATION_CODES_SHOWN
+        sections = []
+        for position, index in enumerate(batch, 1):
+            theme = themes[index]
+            code_ids = theme["code_ids"]
+            more = f" and {len(code_ids) - shown} more" if len(code_ids) > shown else ""
+            sections.append(
+                f"Theme {position}:\n"
+                f"Name: {theme['name']}\n"
+                f"Description: {theme['description']}\n"
+                f"Code IDs ({len(code_ids)}): {', '.join(str(code_id) for code_id in code_ids[:shown])}{more}\n"
+            )
+        return {
+            "themes_text": "\n".join(sections),
+            "theme_count": len(batch),
+            "max_themes": settings.AI_THEME_MAX_THEMES
+        }
+
+    @staticmethod
+    def _consolidate(
+        themes: List[dict],
+        batches: List[List[int]],
+        pending: List[List[int]],
+        outcomes: List[ChunkOutcome]
+    ) -> List[dict]:
+        """
+        Themes after a consolidation round. A consolidated theme takes the
+        codes of its candidates; candidates a consolidation leaves out are
+        dropped, while those of single-theme or failed batches are kept.
+        """
+        consolidated = []
+        results = dict(zip(map(tuple, pending), outcomes))
+        for batch in batches:
+            outcome = results.get(tuple(batch))
+            if outcome is None or outcome.error is not None:
+                if outcome is not None:
+                    print(f"❌ Error consolidating {len(batch)} themes: {str(outcome.error)}")
+                consolidated.extend(themes[index] for index in batch)
+                continue
+
+            consolidation: ThemeConsolidationOutput = outcome.result
+            used = set()
+            for theme in consolidation.themes[:settings.AI_THEME_MAX_THEMES]:
+                sources = [
+                    batch[number - 1] for number in dict.fromkeys(theme.source_themes)
+                    if 1 <= number <= len(batch) and batch[number - 1] not in used
+                ]
+                if not sources:
+                    continue
+                used.update(sources)
+                consolidated.append({
+                    "name": theme.theme_name,
+                    "description": theme.theme_description,
+                    "reasoning": consolidation.reasoning,
+                    "code_ids": list(dict.fromkeys(
+                        code_id for index in sources for code_id in themes[index]["code_ids"]))
+                })
+        print(f"🔗 Consolidated {len(themes)} candidate themes into {len(consolidated)}")
+        return consolidated
+
+    @staticmethod
+    def _create_themes(
+        db: Session,
+        user_id: int,
+        code_assignments: List[CodeAssignment],
+        codes: List[dict],
+        themes: List[dict]
+    ) -> List[ThemeGenerationResponse]:
+        """Save the generated themes, the best supported first, and build the response"""
+        if not code_assignments or len(code_assignments) == 0:
+            print("❌ Error: No code assignments provided")
+            return []
+
+        names = {code["code_id"]: code["name"] for code in codes}
+        themes = sorted(themes, key=lambda theme: -len(theme["code_ids"]))[:settings.AI_THEME_MAX_THEMES]
+        results = []
+        for theme_data in themes:
+            try:
+                # Create theme in database
+                theme = ThemeService.create_theme(
+                    db=db,
+                    name=theme_data["name"],
+                    project_id=code_assignments[0].project_id,
+                    user_id=user_id,
+                    description=theme_data["description"]
+                )
+            except ValueError as e:
+                # e.g. a theme of that name already exists; the others are still saved
+                print(f"⚠️ Skipping theme '{theme_data['name']}': {str(e)}")
+                continue
+
+            results.append(ThemeGenerationResponse(
+                id=theme.id,
+                name=theme.name,
+                description=theme.description or "",
+                project_id=theme.project_id,
+                user_id=theme.user_id,
+                created_at=theme.created_at.isoformat(),
+                reasoning=theme_data["reasoning"],
+                related_codes=[names[code_id] for code_id in theme_data["code_ids"]],
+                related_code_ids=theme_data["code_ids"]
+            ))
+            print(f"✅ Successfully generated and created theme: {theme.name}")
+
+        return results
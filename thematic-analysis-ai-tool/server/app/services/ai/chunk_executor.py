@@ -0,0 +1,137 @@
+"""
+Concurrent execution of per-chunk LLM calls with a per-provider cap
+"""
+import asyncio
+import weakref
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Sequence, TypeVar
+from app.core.config import settings
+from app.services.ai.provider_router import get_provider_router
+
+T = TypeVar("T")
+
+
+class ChunkOutcome(NamedTuple):
+    """Result of one chunk: the value, or the exception its call raised"""
+    result: Any
+    error: Optional[Exception]
+
+
+class ChunkExecutor:
+    """
+    Runs a function over many chunks at once while keeping no more than the
+    provider's limit of calls in flight.
+
+    The limit is a semaphore per provider shared by every run in the process,
+    so two coding runs against the same provider split its allowance rather
+    than doubling it. A pool of provider routes may run as many calls as its
+    routes together, so routed runs use every route's allowance. Outcomes come back in input order whatever order the
+    calls finish in, and a failing chunk does not stop the others.
+
+    `amap` is the asyncio counterpart: calls are coroutines awaited on the
+    running loop, so waiting on the provider holds no thread at all.
+    """
+
+    def __init__(
+        self,
+        default_limit: int,
+        provider_limits: Optional[Dict[str, int]] = None,
+        pools: Optional[Dict[str, List[str]]] = None
+    ):
+        self.default_limit = default_limit
+        self.provider_limits = dict(provider_limits or {})
+        self.pools = dict(pools or {})  # pool -> names of its provider routes
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        # Per event loop, since asyncio primitives belong to the loop that first waits on them
+        self._async_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = \
+            weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def limit(self, provider: str) -> int:
+        """Calls allowed in flight for `provider`, at least 1"""
+        routes = self.pools.get(provider)
+        if routes:
+            return sum(max(int(self.provider_limits.get(route, self.default_limit)), 1) for route in routes)
+        return max(int(self.provider_limits.get(provider, self.default_limit)), 1)
+
+    def map(
+        self,
+        provider: str,
+        fn: Callable[[T], Any],
+        items: Sequence[T],
+        on_done: Optional[Callable[[int, ChunkOutcome], None]] = None
+    ) -> List[ChunkOutcome]:
+        """
+        Call `fn` on every item; outcome i belongs to items[i]. `on_done(i,
+        outcome)` is called as each item finishes, from the thread that ran it.
+        """
+        if not items:
+            return []
+
+        semaphore = self._semaphore(provider)
+
+        def run(index: int) -> ChunkOutcome:
+            with semaphore:
+                try:
+                    outcome = ChunkOutcome(fn(items[index]), None)
+                except Exception as e:
+                    outcome = ChunkOutcome(None, e)
+            if on_done:
+                on_done(index, outcome)
+            return outcome
+
+        workers = min(self.limit(provider), len(items))
+        if workers == 1:
+            return [run(index) for index in range(len(items))]
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"llm-{provider}") as pool:
+            return list(pool.map(run, range(len(items))))
+
+    async def amap(
+        self,
+        provider: str,
+        fn: Callable[[T], Awaitable[Any]],
+        items: Sequence[T],
+        on_done: Optional[Callable[[int, ChunkOutcome], None]] = None
+    ) -> List[ChunkOutcome]:
+        """Await `fn` on every item concurrently; outcome i belongs to items[i]"""
+        semaphore = self._async_semaphore(provider)
+
+        async def run(index: int) -> ChunkOutcome:
+            async with semaphore:
+                try:
+                    outcome = ChunkOutcome(await fn(items[index]), None)
+                except Exception as e:
+                    outcome = ChunkOutcome(None, e)
+            if on_done:
+                on_done(index, outcome)
+            return outcome
+
+        return list(await asyncio.gather(*(run(index) for index in range(len(items)))))
+
+    def _async_semaphore(self, provider: str) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphores = self._async_semaphores.setdefault(loop, {})
+            if provider not in semaphores:
+                semaphores[provider] = asyncio.Semaphore(self.limit(provider))
+            return semaphores[provider]
+
+    def _semaphore(self, provider: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if provider not in self._semaphores:
+                self._semaphores[provider] = threading.BoundedSemaphore(self.limit(provider))
+            return self._semaphores[provider]
+
+
+# Global instance
+_chunk_executor = ChunkExecutor(
+    default_limit=settings.AI_MAX_CONCURRENT_REQUESTS,
+    provider_limits=settings.AI_PROVIDER_MAX_CONCURRENT_REQUESTS,
+    pools={pool: [route.name for route in routes] for pool, routes in get_provider_router().pools.items()}
+)
+
+
+def get_chunk_executor() -> ChunkExecutor:
+    """Get the global chunk executor."""
+    return _chunk_executor
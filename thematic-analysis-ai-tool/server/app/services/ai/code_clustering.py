@@ -0,0 +1,134 @@
+"""
+Cheap similarity clustering of codes, used to split large codebooks before grouping
+"""
+import re
+import math
+import numpy as np
+from typing import List
+
+_TOKEN = re.compile(r"[a-z][a-z0-9']+")
+_STOP_WORDS = frozenset("""
+a about after all also an and any are as at be been being but by can could did do does
+for from had has have how i if in into is it its just me more most my no not of on only
+or other our out over own same she he so some such than that the their them then there
+these they this those through to too up very was we were what when where which while who
+why will with would you your
+""".split())
+
+
+class CodeClustering:
+    """
+    TF-IDF vectors and size-bounded spherical k-means over short texts.
+
+    Everything is deterministic (fixed seed, stable ordering), so the same
+    codes always produce the same clusters, and with them the same prompts.
+    """
+
+    # Columns kept in the TF-IDF matrix, most widespread terms first
+    MAX_FEATURES = 4096
+
+    @staticmethod
+    def tfidf(texts: List[str]) -> np.ndarray:
+        """Row-normalised TF-IDF matrix of `texts`; rows without known terms are zero"""
+        documents = [
+            [token for token in _TOKEN.findall(text.lower()) if token not in _STOP_WORDS]
+            for text in texts
+        ]
+        document_frequency = {}
+        for tokens in documents:
+            for token in set(tokens):
+                document_frequency[token] = document_frequency.get(token, 0) + 1
+
+        # Terms used by a single text cannot make two texts similar
+        terms = sorted(
+            (term for term, count in document_frequency.items() if count > 1),
+            key=lambda term: (-document_frequency[term], term)
+        )[:CodeClustering.MAX_FEATURES]
+        if not terms:
+            return np.zeros((len(texts), 1), dtype=np.float32)
+        columns = {term: column for column, term in enumerate(terms)}
+
+        counts = np.zeros((len(texts), len(terms)), dtype=np.float32)
+        for row, tokens in enumerate(documents):
+            for token in tokens:
+                column = columns.get(token)
+                if column is not None:
+                    counts[row, column] += 1
+
+        frequency = np.array([document_frequency[term] for term in terms], dtype=np.float32)
+        idf = np.log((1 + len(texts)) / (1 + frequency)) + 1
+        vectors = np.log1p(counts) * idf
+        return CodeClustering._normalise(vectors)
+
+    @staticmethod
+    def cluster(vectors: np.ndarray, target_size: int, max_size: int) -> List[List[int]]:
+        """
+        Row indexes of `vectors` split into clusters of about `target_size`
+        and never more than `max_size`, ordered by their first member
+        """
+        count = len(vectors)
+        max_size = max(max_size, 1)
+        if count <= max_size:
+            return [list(range(count))] if count else []
+
+        labels = CodeClustering._kmeans(vectors, math.ceil(count / max(target_size, 1)))
+        clusters = []
+        for label in np.unique(labels):
+            members = np.flatnonzero(labels == label)
+            if len(members) <= max_size:
+                clusters.append(members.tolist())
+            elif len(members) < count:
+                # Still too large: split that cluster again
+                clusters.extend(
+                    [int(members[index]) for index in sub_cluster]
+                    for sub_cluster in CodeClustering.cluster(vectors[members], target_size, max_size)
+                )
+            else:
+                # k-means could not separate them (e.g. identical vectors): cut in order of similarity
+                centre = vectors[members].mean(axis=0)
+                ordered = members[np.argsort(-(vectors[members] @ centre), kind="stable")]
+                clusters.extend(
+                    sorted(ordered[start:start + max_size].tolist())
+                    for start in range(0, len(ordered), max_size)
+                )
+        return sorted(clusters, key=lambda members: members[0])
+
+    @staticmethod
+    def _kmeans(vectors: np.ndarray, k: int, iterations: int = 25) -> np.ndarray:
+        """Cluster label per row, by cosine similarity (rows are unit length or zero)"""
+        count = len(vectors)
+        k = min(max(k, 1), count)
+        rng = np.random.default_rng(0)
+
+        # k-means++ seeding on cosine distance
+        centres = [vectors[int(rng.integers(count))]]
+        for _ in range(1, k):
+            distance = 1 - np.max(vectors @ np.array(centres).T, axis=1)
+            distance = np.clip(distance, 0, None)
+            total = distance.sum()
+            index = int(rng.choice(count, p=distance / total)) if total > 0 else int(rng.integers(count))
+            centres.append(vectors[index])
+        centres = np.array(centres)
+
+        labels = np.zeros(count, dtype=int)
+        for iteration in range(iterations):
+            similarity = vectors @ centres.T
+            new_labels = np.argmax(similarity, axis=1)
+            if iteration and np.array_equal(new_labels, labels):
+                break
+            labels = new_labels
+            for label in range(k):
+                members = labels == label
+                if members.any():
+                    centres[label] = vectors[members].mean(axis=0)
+                else:
+                    # Re-seed an empty cluster with the row that fits its own cluster worst
+                    worst = int(np.argmin(similarity[np.arange(count), labels]))
+                    centres[label] = vectors[worst]
+            centres = CodeClustering._normalise(centres)
+        return labels
+
+    @staticmethod
+    def _normalise(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
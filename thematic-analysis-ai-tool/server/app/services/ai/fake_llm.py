@@ -0,0 +1,268 @@
+"""
+Deterministic offline chat model behind the `local_fake` provider
+"""
+import re
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from typing import Any, Callable, Dict, List, Type
+from pydantic import BaseModel
+from langchain_core.runnables import Runnable, RunnableLambda
+from app.core.config import settings
+from app.schemas.ai_services import (
+    CodeOutput, MultipleCodesOutput, ThemeOutput, CandidateTheme, MultipleThemesOutput,
+    ConsolidatedTheme, ThemeConsolidationOutput, DeductiveCodingOutput, CodeRefinementOutput,
+    CodeRefinementDecision, BatchCodeRefinementOutput, CodeGroup, CodeGroupingOutput,
+    MergedCodeGroup, CodeGroupMergeOutput, ReportOutput
+)
+
+LOCAL_FAKE_PROVIDER = "local_fake"
+
+_SENTENCE = re.compile(r"[^.!?\n]*[A-Za-z][^.!?\n]*[.!?]?")
+_WORD = re.compile(r"[A-Za-z]{4,}")
+_COMMON_WORDS = frozenset("""
+about after again also been before being could does doing from have having here into just
+more most other over really same some such than that their them then there these they this
+those through very were what when where which while will with would your said says interviewer
+participant
+""".split())
+
+
+class FakeProviderError(Exception):
+    """An injected provider failure; not a rate limit, so it is not retried"""
+    status_code = 500
+
+
+class FakeRateLimitError(Exception):
+    """An injected 429 carrying the Retry-After the rate limiter honours"""
+    status_code = 429
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class FakeChatModel:
+    """
+    Stand-in for a chat model that answers from the prompt itself.
+
+    `with_structured_output(schema)` returns a runnable producing a valid
+    `schema` instance built from the rendered prompt: codes name the key
+    words of quoted sentences, deductive coding picks codebook codes whose
+    names occur in the text, refinement keeps every code, and grouping,
+    merging and themes gather items by the first word of their names.
+
+    Every call sleeps LOCAL_FAKE_LATENCY_SECONDS (± LOCAL_FAKE_LATENCY_JITTER)
+    and fails with LOCAL_FAKE_ERROR_RATE or LOCAL_FAKE_RATE_LIMIT_RATE. The
+    draws are seeded by LOCAL_FAKE_SEED, the prompt and how often that prompt
+    was sent before, so runs repeat exactly however calls are scheduled,
+    and a retried call gets a fresh draw.
+    """
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._lock = threading.Lock()
+        self._attempts: Dict[str, int] = {}
+        self.calls = 0
+
+    def with_structured_output(self, schema: Type[BaseModel]) -> Runnable:
+        respond = _RESPONDERS.get(schema)
+        if respond is None:
+            raise ValueError(f"The {LOCAL_FAKE_PROVIDER} provider cannot produce {schema.__name__}")
+
+        def invoke(prompt_value) -> BaseModel:
+            text = FakeChatModel._prompt_text(prompt_value)
+            time.sleep(self._draw(text))
+            return respond(FakeChatModel._human_text(prompt_value))
+
+        async def ainvoke(prompt_value) -> BaseModel:
+            text = FakeChatModel._prompt_text(prompt_value)
+            await asyncio.sleep(self._draw(text))
+            return respond(FakeChatModel._human_text(prompt_value))
+
+        return RunnableLambda(invoke, afunc=ainvoke, name=f"{LOCAL_FAKE_PROVIDER}:{schema.__name__}")
+
+    def _draw(self, text: str) -> float:
+        """Latency of this call; raises the injected failure if it draws one"""
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            attempt = self._attempts.get(digest, 0)
+            self._attempts[digest] = attempt + 1
+            self.calls += 1
+        rng = random.Random(f"{settings.LOCAL_FAKE_SEED}:{digest}:{attempt}")
+
+        latency = settings.LOCAL_FAKE_LATENCY_SECONDS + rng.uniform(
+            -settings.LOCAL_FAKE_LATENCY_JITTER, settings.LOCAL_FAKE_LATENCY_JITTER)
+        draw = rng.random()
+        if draw < settings.LOCAL_FAKE_RATE_LIMIT_RATE:
+            raise FakeRateLimitError(
+                "429 Too Many Requests (injected by local_fake)", settings.LOCAL_FAKE_RETRY_AFTER_SECONDS)
+        if draw < settings.LOCAL_FAKE_RATE_LIMIT_RATE + settings.LOCAL_FAKE_ERROR_RATE:
+            raise FakeProviderError("500 Internal error (injected by local_fake)")
+        return max(latency, 0.0)
+
+    @staticmethod
+    def _prompt_text(prompt_value) -> str:
+        to_string = getattr(prompt_value, "to_string", None)
+        return to_string() if callable(to_string) else str(prompt_value)
+
+    @staticmethod
+    def _human_text(prompt_value) -> str:
+        """The last message of the prompt, which carries the call's input"""
+        messages = getattr(prompt_value, "to_messages", None)
+        if callable(messages):
+            return str(messages()[-1].content)
+        return FakeChatModel._prompt_text(prompt_value)
+
+
+def _after(text: str, heading: str) -> str:
+    index = text.find(heading)
+    return text[index + len(heading):] if index >= 0 else text
+
+
+def _section(text: str, heading: str, next_heading: str) -> str:
+    section = _after(text, heading)
+    index = section.find(next_heading)
+    return section[:index] if index >= 0 else section
+
+
+def _key_word(text: str) -> str:
+    """The longest uncommon word of `text`, first one on ties"""
+    words = [word.lower() for word in _WORD.findall(text) if word.lower() not in _COMMON_WORDS]
+    return max(words, key=len) if words else "general"
+
+
+def _color(name: str) -> str:
+    return "#" + hashlib.md5(name.encode("utf-8")).hexdigest()[:6].upper()
+
+
+def _by_first_word(names: List[str]) -> Dict[str, List[int]]:
+    """Positions of `names`, gathered by their first word"""
+    gathered: Dict[str, List[int]] = {}
+    for position, name in enumerate(names):
+        words = name.split()
+        gathered.setdefault(words[0].lower() if words else "other", []).append(position)
+    return gathered
+
+
+def _initial_coding(text: str) -> MultipleCodesOutput:
+    existing = set(re.findall(r"^- ([^:\n]+)", _section(text, "Existing Codes", "Text to Analyze:"), re.M))
+    passage = _after(text, "Text to Analyze:\n")
+    sentences = [match.group().strip() for match in _SENTENCE.finditer(passage)]
+    sentences = [sentence for sentence in sentences if len(sentence) > 15]
+    count = min(settings.LOCAL_FAKE_CODES_PER_CALL, len(sentences))
+    chosen = [sentences[(index * len(sentences)) // count] for index in range(count)] if count else []
+
+    codes = []
+    for quote in chosen:
+        name = f"{_key_word(quote).title()} concerns"
+        codes.append(CodeOutput(
+            reasoning=f"The passage talks about {_key_word(quote)}.",
+            code=name,
+            quote=quote,
+            code_description=f"Passages about {_key_word(quote)}.",
+            is_new_code=name not in existing,
+            existing_code_rationale="Same topic." if name in existing else "",
+            confidence=80,
+            color=_color(name)
+        ))
+    return MultipleCodesOutput(codes=codes, analysis_notes=f"{len(codes)} codes from {len(sentences)} sentences")
+
+
+def _deductive_coding(text: str) -> DeductiveCodingOutput:
+    available = re.findall(r"^- ([^:\n]+)", _section(text, "Available Codes", "Text to Analyze:"), re.M)
+    passage = _after(text, "Text to Analyze:\n")
+    sentences = [match.group().strip() for match in _SENTENCE.finditer(passage)]
+    lowered = passage.lower()
+    assigned = [name for name in available if name.split()[0].lower() in lowered] if available else []
+    if not assigned and available:
+        assigned = [available[0]]
+    assigned = assigned[:settings.LOCAL_FAKE_CODES_PER_CALL]
+    return DeductiveCodingOutput(
+        reasoning="Codebook codes whose names occur in the passage.",
+        assigned_codes=assigned,
+        quote=sentences[0] if sentences else passage.strip()[:200],
+        confidence_scores=[0.8] * len(assigned),
+        rationale="The passage mentions them."
+    )
+
+
+def _code_refinement(text: str) -> CodeRefinementOutput:
+    return CodeRefinementOutput(action="keep", reasoning="The assignments fit the code.", confidence=0.8)
+
+
+def _batch_code_refinement(text: str) -> BatchCodeRefinementOutput:
+    codes = re.findall(r"^Code (\d+):\nName: (.*)$", text, re.M)
+    return BatchCodeRefinementOutput(decisions=[
+        CodeRefinementDecision(code_number=int(number), code_name=name, action="keep",
+                               reasoning="The assignments fit the code.", confidence=0.8)
+        for number, name in codes
+    ])
+
+
+def _code_grouping(text: str) -> CodeGroupingOutput:
+    names = re.findall(r"^Code: (.*)$", text, re.M)
+    return CodeGroupingOutput(reasoning="Codes sharing their first word.", groups=[
+        CodeGroup(group_name=f"{word.title()} group", group_description=f"Codes about {word}.",
+                  code_names=[names[position] for position in positions], rationale="Same first word.")
+        for word, positions in _by_first_word(names).items()
+    ])
+
+
+def _code_group_merging(text: str) -> CodeGroupMergeOutput:
+    names = re.findall(r"^Name: (.*)$", text, re.M)
+    return CodeGroupMergeOutput(reasoning="Groups sharing their first word.", groups=[
+        MergedCodeGroup(group_name=names[positions[0]], group_description=f"Codes about {word}.",
+                        source_groups=[position + 1 for position in positions])
+        for word, positions in _by_first_word(names).items() if len(positions) > 1
+    ])
+
+
+def _theme_candidates(text: str) -> MultipleThemesOutput:
+    codes = re.findall(r"^Code ID (\d+): (.*)$", text, re.M)
+    names = [name for _, name in codes]
+    return MultipleThemesOutput(reasoning="Codes sharing their first word.", themes=[
+        CandidateTheme(theme_name=f"{word.title()} theme", theme_description=f"Experiences of {word}.",
+                       related_code_ids=[int(codes[position][0]) for position in positions])
+        for word, positions in _by_first_word(names).items()
+    ])
+
+
+def _theme_consolidation(text: str) -> ThemeConsolidationOutput:
+    names = re.findall(r"^Name: (.*)$", text, re.M)
+    return ThemeConsolidationOutput(reasoning="Themes sharing their first word.", themes=[
+        ConsolidatedTheme(theme_name=names[positions[0]], theme_description=f"Experiences of {word}.",
+                          source_themes=[position + 1 for position in positions])
+        for word, positions in _by_first_word(names).items()
+    ])
+
+
+def _theme_generation(text: str) -> ThemeOutput:
+    names = list(dict.fromkeys(re.findall(r"^Code: (.*?)(?: - |$)", text, re.M)))
+    word = _key_word(" ".join(names) or text)
+    return ThemeOutput(reasoning="The most prominent topic.", theme_name=f"{word.title()} theme",
+                       theme_description=f"Experiences of {word}.", related_codes=names)
+
+
+def _report_generation(text: str) -> ReportOutput:
+    lines = [line for line in text.splitlines() if line.startswith("- ")]
+    return ReportOutput(
+        report_text="\n".join(["# Report", ""] + lines),
+        summary=f"A report on {len(lines)} codes and themes."
+    )
+
+
+_RESPONDERS: Dict[Type[BaseModel], Callable[[str], Any]] = {
+    MultipleCodesOutput: _initial_coding,
+    DeductiveCodingOutput: _deductive_coding,
+    CodeRefinementOutput: _code_refinement,
+    BatchCodeRefinementOutput: _batch_code_refinement,
+    CodeGroupingOutput: _code_grouping,
+    CodeGroupMergeOutput: _code_group_merging,
+    MultipleThemesOutput: _theme_candidates,
+    ThemeConsolidationOutput: _theme_consolidation,
+    ThemeOutput: _theme_generation,
+    ReportOutput: _report_generation,
+}
@@ -0,0 +1,174 @@
+"""
+Persistent cache of LLM responses, keyed by a hash of the rendered prompt
+"""
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Any, Dict, Optional
+from pydantic import BaseModel, ValidationError
+from app.core.config import settings
+from app.schemas import ai_services
+
+
+class LLMResponseCache:
+    """
+    SQLite-backed store of structured LLM responses.
+
+    Entries are keyed by provider, model, service type and the rendered
+    prompt, so a change to any of them (including the prompt templates)
+    misses. Only pydantic outputs from app.schemas.ai_services are stored,
+    as JSON, and an entry that no longer validates against its schema is
+    treated as a miss.
+
+    Entries expire after `ttl_seconds`. When the stored responses grow past
+    `max_bytes` the least recently used are evicted down to 90% of it.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float, max_bytes: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "expired": 0, "evictions": 0}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_responses ("
+            " key TEXT PRIMARY KEY, provider TEXT, model TEXT, service_type TEXT,"
+            " schema TEXT NOT NULL, payload TEXT NOT NULL, size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_llm_responses_accessed_at ON llm_responses (accessed_at)")
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0]
+
+    @staticmethod
+    def key(provider: str, model: Optional[str], service_type: str, rendered_input: str) -> str:
+        return hashlib.sha256(
+            json.dumps([provider, model, service_type, rendered_input]).encode("utf-8")
+        ).hexdigest()
+
+    def get(self, key: str) -> Optional[BaseModel]:
+        """The cached response for `key`, or None"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT schema, payload, size, created_at FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+
+            schema_name, payload, size, created_at = row
+            schema = getattr(ai_services, schema_name, None)
+            try:
+                if now - created_at > self.ttl_seconds:
+                    self._stats["expired"] += 1
+                    raise ValueError("expired")
+                if not (isinstance(schema, type) and issubclass(schema, BaseModel)):
+                    raise ValueError(f"unknown schema {schema_name}")
+                value = schema.model_validate_json(payload)
+            except (ValueError, ValidationError):
+                self._delete(key, size)
+                self._stats["misses"] += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE llm_responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._stats["hits"] += 1
+            return value
+
+    def put(self, key: str, value: Any, provider: str, model: Optional[str], service_type: str) -> bool:
+        """Store `value` if it is a response schema; False when it cannot be cached"""
+        schema = type(value)
+        if not isinstance(value, BaseModel) or getattr(ai_services, schema.__name__, None) is not schema:
+            return False
+        payload = value.model_dump_json()
+        size = len(payload.encode("utf-8"))
+        if size > self.max_bytes:
+            return False
+
+        now = time.time()
+        with self._lock:
+            previous = self._conn.execute(
+                "SELECT size FROM llm_responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses"
+                " (key, provider, model, service_type, schema, payload, size, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, provider, model, service_type, schema.__name__, payload, size, now, now)
+            )
+            self._total_bytes += size - (previous[0] if previous else 0)
+            self._stats["writes"] += 1
+            if self._total_bytes > self.max_bytes:
+                self._evict(now)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+            stats.update(entries=entries, bytes=self._total_bytes, max_bytes=self.max_bytes,
+                         ttl_seconds=self.ttl_seconds)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_responses")
+            self._total_bytes = 0
+
+    def _delete(self, key: str, size: int) -> None:
+        self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+        self._total_bytes -= size
+
+    def _evict(self, now: float) -> None:
+        """Drop expired entries, then least recently used ones down to 90% of max_bytes"""
+        expired = self._conn.execute(
+            "DELETE FROM llm_responses WHERE created_at < ?", (now - self.ttl_seconds,)).rowcount
+        self._stats["expired"] += max(expired, 0)
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0]
+
+        target = int(self.max_bytes * 0.9)
+        if self._total_bytes <= target:
+            return
+        freed, victims = 0, []
+        for key, size in self._conn.execute(
+                "SELECT key, size FROM llm_responses ORDER BY accessed_at"):
+            if self._total_bytes - freed <= target:
+                break
+            victims.append((key,))
+            freed += size
+        self._conn.executemany("DELETE FROM llm_responses WHERE key = ?", victims)
+        self._total_bytes -= freed
+        self._stats["evictions"] += len(victims)
+
+
+# Global instance, opened on first use
+_llm_cache: Optional[LLMResponseCache] = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """Get the global LLM response cache, or None when caching is disabled."""
+    global _llm_cache
+    if not settings.AI_LLM_CACHE_ENABLED:
+        return None
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            _llm_cache = LLMResponseCache(
+                path=settings.AI_LLM_CACHE_PATH,
+                ttl_seconds=settings.AI_LLM_CACHE_TTL_SECONDS,
+                max_bytes=settings.AI_LLM_CACHE_MAX_BYTES
+            )
+        return _llm_cache
@@ -1,31 +1,32 @@
 from langchain.chat_models import init_chat_model
 from langchain_core.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
 from langchain_core.runnables import Runnable
-from app.schemas.ai_services import CodeOutput, MultipleCodesOutput, ThemeOutput, DeductiveCodingOutput, CodeRefinementOutput, CodeGroupingOutput, ReportOutput
+from typing import Any, Dict, List, Optional, Tuple
+import functools
+import hashlib
+import json
+import threading
+import time
+from app.schemas.ai_services import CodeOutput, MultipleCodesOutput, ThemeOutput, DeductiveCodingOutput, CodeRefinementOutput, BatchCodeRefinementOutput, CodeGroupingOutput, CodeGroupMergeOutput, MultipleThemesOutput, ThemeConsolidationOutput, ReportOutput
 from app.prompts.initial_coding import system_message
 from app.prompts.theme_generation import system_message as theme_system_message
+from app.prompts.theme_candidates import system_message as theme_candidates_system_message
+from app.prompts.theme_consolidation import system_message as theme_consolidation_system_message
 from app.prompts.deductive_coding import system_message as deductive_system_message
 from app.prompts.code_refinement import system_message as refinement_system_message
+from app.prompts.batch_code_refinement import system_message as batch_refinement_system_message
 from app.prompts.code_grouping import system_message as grouping_system_message
+from app.prompts.code_group_merging import system_message as group_merging_system_message
 from app.prompts.report_generation import system_message as report_system_message
 from app.utils.llm_provider_api_key import get_llm_provider_api_key
+from app.services.ai.fake_llm import LOCAL_FAKE_PROVIDER, FakeChatModel
 
 
-class LLMService:
-    def __init__(self, model_name: str, provider: str = "google_genai"):
-        self.model_name = model_name
-        self.provider = provider
-        self.llm = init_chat_model(
-            model=self.model_name,
-            model_provider=self.provider,
-            api_key=get_llm_provider_api_key(self.provider),
-        )
-
-        # Initial coding prompt with enhanced context
-        initial_coding_prompt = ChatPromptTemplate.from_messages(
-            [
-                SystemMessagePromptTemplate.from_template(system_message),
-                HumanMessagePromptTemplate.from_template("""
+# Initial coding prompt with enhanced context
+initial_coding_prompt = ChatPromptTemplate.from_messages(
+    [
+        SystemMessagePromptTemplate.from_template(system_message),
+        HumanMessagePromptTemplate.from_template("""
 Research Context:
 {research_context}
 
@@ -35,32 +36,54 @@ Existing Codes (use these if they fit, or create new ones):
 Text to Analyze:
 {text}
 """),
-            ]
-        )
-        self.initial_coding_llm: Runnable = (
-            initial_coding_prompt |
-            self.llm.with_structured_output(MultipleCodesOutput)
-        )
-
-        # Theme generation prompt
-        theme_prompt = ChatPromptTemplate.from_messages(
-            [
-                SystemMessagePromptTemplate.from_template(
-                    theme_system_message),
-                HumanMessagePromptTemplate.from_template("{codes_text}"),
-            ]
-        )
-        self.theme_generation_llm: Runnable = (
-            theme_prompt |
-            self.llm.with_structured_output(ThemeOutput)
-        )
-
-        # Deductive coding prompt
-        deductive_coding_prompt = ChatPromptTemplate.from_messages(
-            [
-                SystemMessagePromptTemplate.from_template(
-                    deductive_system_message),
-                HumanMessagePromptTemplate.from_template("""
+    ]
+)
+
+# Theme generation prompt
+theme_prompt = ChatPromptTemplate.from_messages(
+    [
+        SystemMessagePromptTemplate.from_template(
+            theme_system_message),
+        HumanMessagePromptTemplate.from_template("{codes_text}"),
+    ]
+)
+
+# Candidate themes for one partition of the codes
+theme_candidates_prompt = ChatPromptTemplate.from_messages(
+    [
+        SystemMessagePromptTemplate.from_template(
+            theme_candidates_system_message),
+        HumanMessagePromptTemplate.from_template("""
+Generate at most {max_themes} themes.
+
+Codes ({code_count}):
+
+{codes_text}
+"""),
+    ]
+)
+
+# Consolidation of candidate themes from several partitions
+theme_consolidation_prompt = ChatPromptTemplate.from_messages(
+    [
+        SystemMessagePromptTemplate.from_template(
+            theme_consolidation_system_message),
+        HumanMessagePromptTemplate.from_template("""
+Consolidate into at most {max_themes} themes.
+
+Candidate Themes ({theme_count}):
+
+{themes_text}
+"""),
+    ]
+)
+
+# Deductive coding prompt
+deductive_coding_prompt = ChatPromptTemplate.from_messages(
+    [
+        SystemMessagePromptTemplate.from_template(
+            deductive_system_message),
+        HumanMessagePromptTemplate.from_template("""
 Research Context:
 {research_context}
 
@@ -70,19 +93,15 @@ Available Codes from Codebook:
 Text to Analyze:
 {text}
 """),
-            ]
-        )
-        self.deductive_coding_llm: Runnable = (
-            deductive_coding_prompt |
-            self.llm.with_structured_output(DeductiveCodingOutput)
-        )
-
-        # Code refinement prompt
-        refinement_prompt = ChatPromptTemplate.from_messages(
-            [
-                SystemMessagePromptTemplate.from_template(
-                    refinement_system_message),
-                HumanMessagePromptTemplate.from_template("""
+    ]
+)
+
+# Code refinement prompt
+refinement_prompt = ChatPromptTemplate.from_messages(
+    [
+        SystemMessagePromptTemplate.from_template(
+            refinement_system_message),
+        HumanMessagePromptTemplate.from_template("""
 Code to Review:
 Name: {code_name}
 Description: {code_description}
@@ -92,47 +111,231 @@ All Text Assignments for this Code:
 
 Total number of assignments: {assignment_count}
 """),
-            ]
-        )
-        self.code_refinement_llm: Runnable = (
-            refinement_prompt |
-            self.llm.with_structured_output(CodeRefinementOutput)
-        )
-
-        # Code grouping prompt
-        grouping_prompt = ChatPromptTemplate.from_messages(
-            [
-                SystemMessagePromptTemplate.from_template(
-                    grouping_system_message),
-                HumanMessagePromptTemplate.from_template("""
+    ]
+)
+
+# Batched code refinement prompt (several codes per call)
+batch_refinement_prompt = ChatPromptTemplate.from_messages(
+    [
+        SystemMessagePromptTemplate.from_template(
+            batch_refinement_system_message),
+        HumanMessagePromptTemplate.from_template("""
+Codes to Review ({code_count}):
+
+{codes_text}
+"""),
+    ]
+)
+
+# Code grouping prompt
+grouping_prompt = ChatPromptTemplate.from_messages(
+    [
+        SystemMessagePromptTemplate.from_template(
+            grouping_system_message),
+        HumanMessagePromptTemplate.from_template("""
 Codes to Group:
 {codes_summary}
 
 Sample assignments for context:
 {assignments_sample}
 """),
-            ]
-        )
-        self.code_grouping_llm: Runnable = (
-            grouping_prompt |
-            self.llm.with_structured_output(CodeGroupingOutput)
-        )
-
-        report_prompt = ChatPromptTemplate.from_messages(
-            [
-                SystemMessagePromptTemplate.from_template(
-                    report_system_message),
-                HumanMessagePromptTemplate.from_template("""
+    ]
+)
+
+# Code group merging prompt (reduce step of grouping large codebooks)
+group_merging_prompt = ChatPromptTemplate.from_messages(
+    [
+        SystemMessagePromptTemplate.from_template(
+            group_merging_system_message),
+        HumanMessagePromptTemplate.from_template("""
+Groups to Merge ({group_count}):
+
+{groups_text}
+"""),
+    ]
+)
+
+# Report generation prompt
+report_prompt = ChatPromptTemplate.from_messages(
+    [
+        SystemMessagePromptTemplate.from_template(
+            report_system_message),
+        HumanMessagePromptTemplate.from_template("""
 Codes Summary:
 {codes_summary}
 Themes Summary:
 {themes_summary}
 Assignments Count: {assignments_count}
 """),
-            ]
-        )
+    ]
+)
+
+# Prompt and structured output for each pipeline step
+SERVICE_PROMPTS: Dict[str, Tuple[ChatPromptTemplate, Any]] = {
+    "initial_coding": (initial_coding_prompt, MultipleCodesOutput),
+    "theme_generation": (theme_prompt, ThemeOutput),
+    "theme_candidates": (theme_candidates_prompt, MultipleThemesOutput),
+    "theme_consolidation": (theme_consolidation_prompt, ThemeConsolidationOutput),
+    "deductive_coding": (deductive_coding_prompt, DeductiveCodingOutput),
+    "code_refinement": (refinement_prompt, CodeRefinementOutput),
+    "batch_code_refinement": (batch_refinement_prompt, BatchCodeRefinementOutput),
+    "code_grouping": (grouping_prompt, CodeGroupingOutput),
+    "code_group_merging": (group_merging_prompt, CodeGroupMergeOutput),
+    "report_generation": (report_prompt, ReportOutput),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def prompt_version(service_type: str) -> str:
+    """Digest of a pipeline step's prompt and output schema; changes whenever either does"""
+    prompt, schema = SERVICE_PROMPTS[service_type]
+    return hashlib.sha256(json.dumps(
+        [prompt.pretty_repr(), schema.model_json_schema()], sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+class LLMService:
+    """
+    Chat model for one provider and model, with a prompt-plus-structured-output
+    chain per pipeline step.
+
+    Use `LLMService.get` rather than the constructor: it returns the
+    process-wide instance for the provider and model, so every request shares
+    one chat model and with it the provider client and its connection pool.
+    The chat model and each chain are built on first use only.
+    """
+
+    _registry: Dict[Tuple[str, str, Optional[str], Optional[str]], "LLMService"] = {}
+    _registry_lock = threading.Lock()
+    _registry_stats = {"hits": 0, "misses": 0}
+
+    def __init__(self, model_name: str, provider: str = "google_genai",
+                 base_url: Optional[str] = None, api_key: Optional[str] = None):
+        self.model_name = model_name
+        self.provider = provider
+        # Set by provider routes, e.g. an OpenAI-compatible local endpoint or a second key
+        self.base_url = base_url
+        self.api_key = api_key
+        self.created_at = time.time()
+        self._llm = None
+        self._chains: Dict[str, Runnable] = {}
+        self._chain_uses: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get(cls, model_name: str, provider: str = "google_genai",
+            base_url: Optional[str] = None, api_key: Optional[str] = None) -> "LLMService":
+        """The shared instance for `provider` and `model_name` (and endpoint and key), created on first request"""
+        key = (provider, model_name, base_url, api_key)
+        with cls._registry_lock:
+            service = cls._registry.get(key)
+            if service is not None:
+                cls._registry_stats["hits"] += 1
+                return service
+            cls._registry_stats["misses"] += 1
+            service = cls._registry[key] = cls(
+                model_name=model_name, provider=provider, base_url=base_url, api_key=api_key)
+            return service
+
+    @classmethod
+    def warm_up(cls, model_name: str, provider: str = "google_genai", service_types: Optional[List[str]] = None) -> "LLMService":
+        """Build the chat model and chains ahead of the first request (no API call is made)"""
+        service = cls.get(model_name=model_name, provider=provider)
+        for service_type in service_types or list(SERVICE_PROMPTS):
+            service.chain(service_type)
+        return service
+
+    @classmethod
+    def registry_stats(cls) -> Dict[str, Any]:
+        with cls._registry_lock:
+            services = list(cls._registry.values())
+            stats: Dict[str, Any] = dict(cls._registry_stats)
+        stats["instances"] = [service.stats() for service in services]
+        return stats
+
+    @classmethod
+    def clear_registry(cls) -> None:
+        with cls._registry_lock:
+            cls._registry.clear()
+            cls._registry_stats.update(hits=0, misses=0)
+
+    @property
+    def llm(self):
+        with self._lock:
+            if self._llm is None and self.provider == LOCAL_FAKE_PROVIDER:
+                # Offline model for benchmarks; still goes through prompts, cache and rate limiter
+                self._llm = FakeChatModel(self.model_name)
+            elif self._llm is None:
+                options = {"base_url": self.base_url} if self.base_url else {}
+                self._llm = init_chat_model(
+                    model=self.model_name,
+                    model_provider=self.provider,
+                    api_key=self.api_key or get_llm_provider_api_key(self.provider),
+                    **options
+                )
+            return self._llm
+
+    def chain(self, service_type: str) -> Runnable:
+        """The chain for a pipeline step, built on first use"""
+        if service_type not in SERVICE_PROMPTS:
+            raise ValueError(f"Unknown service type: {service_type}")
+        llm = self.llm
+        with self._lock:
+            chain = self._chains.get(service_type)
+            if chain is None:
+                prompt, output_schema = SERVICE_PROMPTS[service_type]
+                chain = self._chains[service_type] = (
+                    prompt | llm.with_structured_output(output_schema)
+                )
+            self._chain_uses[service_type] = self._chain_uses.get(service_type, 0) + 1
+            return chain
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "provider": self.provider,
+                "model_name": self.model_name,
+                "base_url": self.base_url,
+                "created_at": self.created_at,
+                "model_loaded": self._llm is not None,
+                "chain_uses": dict(self._chain_uses),
+            }
+
+    @property
+    def initial_coding_llm(self) -> Runnable:
+        return self.chain("initial_coding")
+
+    @property
+    def theme_generation_llm(self) -> Runnable:
+        return self.chain("theme_generation")
+
+    @property
+    def theme_candidates_llm(self) -> Runnable:
+        return self.chain("theme_candidates")
+
+    @property
+    def theme_consolidation_llm(self) -> Runnable:
+        return self.chain("theme_consolidation")
+
+    @property
+    def deductive_coding_llm(self) -> Runnable:
+        return self.chain("deductive_coding")
+
+    @property
+    def code_refinement_llm(self) -> Runnable:
+        return self.chain("code_refinement")
+
+    @property
+    def batch_code_refinement_llm(self) -> Runnable:
+        return self.chain("batch_code_refinement")
+
+    @property
+    def code_grouping_llm(self) -> Runnable:
+        return self.chain("code_grouping")
+
+    @property
+    def code_group_merging_llm(self) -> Runnable:
+        return self.chain("code_group_merging")
 
-        self.report_generation_llm: Runnable = (
-            report_prompt |
-            self.llm.with_structured_output(ReportOutput)
-        )
+    @property
+    def report_generation_llm(self) -> Runnable:
+        return self.chain("report_generation")
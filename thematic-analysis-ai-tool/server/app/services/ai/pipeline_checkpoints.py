@@ -0,0 +1,235 @@
+"""
+Checkpoints of an AI job's LLM calls, so a resumed run skips finished work
+"""
+import json
+import asyncio
+import hashlib
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, TypeVar
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.orm import Session, sessionmaker
+from app.models.ai_job import AIPipelineCheckpoint
+from app.schemas import ai_services
+from app.services.ai.chunk_executor import ChunkExecutor, ChunkOutcome, get_chunk_executor
+
+T = TypeVar("T")
+
+
+class PipelineCancelled(Exception):
+    """Raised inside a pipeline whose job has been cancelled"""
+
+
+class PipelineIncomplete(Exception):
+    """Raised when calls of a checkpointed stage failed; resuming the job retries only those"""
+
+
+class PipelineCheckpoints:
+    """
+    Checkpoints of one pipeline run, keyed by its AI job id.
+
+    Every successful LLM call of the coding, refinement and grouping stages
+    is stored under a digest of its input. When a failed or cancelled run is
+    resumed, calls whose input has not changed are answered from their
+    checkpoints, so the run picks up at the first chunk or stage that had not
+    finished; merging and the stages after it are recomputed from the
+    restored outputs. Failed calls are not stored and run again.
+
+    Saving codes is not repeatable, so it is guarded by a marker committed
+    in the same transaction as the codes.
+
+    `stop` is set when the job is cancelled; calls that have not started yet
+    then fail with PipelineCancelled instead of reaching the provider.
+    """
+
+    def __init__(self, factory: sessionmaker, run_id: int, stop: Optional[threading.Event] = None):
+        self.factory = factory
+        self.run_id = run_id
+        self.stop = stop or threading.Event()
+        self._lock = threading.Lock()
+        self._loaded: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def key(input_data: Any) -> str:
+        return hashlib.sha256(
+            json.dumps(input_data, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+
+    def restore(self, stage: str, input_data: Any) -> Optional[BaseModel]:
+        """The stored output of the call for `input_data`, or None"""
+        data = self._load(stage).get(PipelineCheckpoints.key(input_data))
+        if not data:
+            return None
+        schema = getattr(ai_services, data.get("schema", ""), None)
+        if not (isinstance(schema, type) and issubclass(schema, BaseModel)):
+            return None
+        try:
+            return schema.model_validate(data["value"])
+        except (KeyError, ValidationError):
+            return None
+
+    def store(self, stage: str, input_data: Any, value: Any) -> None:
+        """Checkpoint a call's output; only response schemas are stored"""
+        schema = type(value)
+        if not isinstance(value, BaseModel) or getattr(ai_services, schema.__name__, None) is not schema:
+            return
+        key = PipelineCheckpoints.key(input_data)
+        data = {"schema": schema.__name__, "value": value.model_dump(mode="json")}
+        try:
+            with self._lock, self.factory() as db:
+                checkpoint = db.query(AIPipelineCheckpoint).filter(
+                    AIPipelineCheckpoint.job_id == self.run_id,
+                    AIPipelineCheckpoint.stage == stage,
+                    AIPipelineCheckpoint.key == key
+                ).first()
+                if checkpoint is None:
+                    db.add(AIPipelineCheckpoint(job_id=self.run_id, stage=stage, key=key, data=data))
+                else:
+                    checkpoint.data = data  # type: ignore
+                db.commit()
+                self._loaded.setdefault(stage, {})[key] = data
+        except Exception as e:
+            # The result is still good; only a resume would have to repeat the call
+            print(f"⚠️ Could not checkpoint {stage} call of AI job {self.run_id}: {e}")
+
+    def call(self, stage: str, fn: Callable[[T], Any], input_data: T) -> Any:
+        """`fn(input_data)`, answered from its checkpoint when there is one"""
+        restored = self.restore(stage, input_data)
+        if restored is not None:
+            print(f"♻️ Restored {stage} call from checkpoint")
+            return restored
+        self.check()
+        result = fn(input_data)
+        self.store(stage, input_data, result)
+        return result
+
+    async def acall(self, stage: str, fn: Callable[[T], Awaitable[Any]], input_data: T) -> Any:
+        """Async counterpart of call; checkpoint reads and writes run on a worker thread"""
+        restored = await asyncio.to_thread(self.restore, stage, input_data)
+        if restored is not None:
+            print(f"♻️ Restored {stage} call from checkpoint")
+            return restored
+        self.check()
+        result = await fn(input_data)
+        await asyncio.to_thread(self.store, stage, input_data, result)
+        return result
+
+    def executor(self, stage: str) -> "CheckpointedExecutor":
+        """A ChunkExecutor stand-in whose calls are checkpointed under `stage`"""
+        return CheckpointedExecutor(self, stage, get_chunk_executor())
+
+    def check(self) -> None:
+        if self.stop.is_set():
+            raise PipelineCancelled(f"AI job {self.run_id} was cancelled")
+
+    def require_complete(self, stage: str, outcomes: List[ChunkOutcome]) -> None:
+        """
+        Fail the run if any call of `stage` failed, rather than carry on with
+        partial results: the job then fails and can be resumed
+        """
+        errors = [outcome.error for outcome in outcomes if outcome.error is not None]
+        if not errors:
+            return
+        self.check()
+        raise PipelineIncomplete(
+            f"{len(errors)} of {len(outcomes)} {stage} calls failed (first error: {errors[0]}); "
+            f"resume the job to retry them")
+
+    def saving_started(self) -> bool:
+        """Whether an earlier attempt of this run already began saving codes"""
+        return bool(self._load("saving"))
+
+    def mark_saving(self, db: Session) -> None:
+        """Add the saving marker to `db`, so it commits together with the codes"""
+        db.add(AIPipelineCheckpoint(job_id=self.run_id, stage="saving", key="saving", data={}))
+
+    def _load(self, stage: str) -> Dict[str, Any]:
+        """key -> stored output for `stage`, read from the database once per run"""
+        with self._lock:
+            if stage not in self._loaded:
+                with self.factory() as db:
+                    rows = db.query(AIPipelineCheckpoint.key, AIPipelineCheckpoint.data).filter(
+                        AIPipelineCheckpoint.job_id == self.run_id,
+                        AIPipelineCheckpoint.stage == stage
+                    ).all()
+                self._loaded[stage] = {key: data for key, data in rows}
+            return self._loaded[stage]
+
+
+class CheckpointedExecutor:
+    """
+    ChunkExecutor.map and amap for one stage of a checkpointed run: items
+    with a checkpoint are restored (and reported to `on_done` first), the
+    rest run on the shared executor and are checkpointed as they succeed.
+    """
+
+    def __init__(self, checkpoints: PipelineCheckpoints, stage: str, executor: ChunkExecutor):
+        self.checkpoints = checkpoints
+        self.stage = stage
+        self.executor = executor
+
+    def map(
+        self,
+        provider: str,
+        fn: Callable[[T], Any],
+        items: Sequence[T],
+        on_done: Optional[Callable[[int, ChunkOutcome], None]] = None
+    ) -> List[ChunkOutcome]:
+        outcomes, pending = self._restore(items, on_done)
+
+        def run(item: T) -> Any:
+            self.checkpoints.check()
+            result = fn(item)
+            self.checkpoints.store(self.stage, item, result)
+            return result
+
+        ran = self.executor.map(provider, run, [items[index] for index in pending],
+                                on_done=self._forward(pending, on_done))
+        for index, outcome in zip(pending, ran):
+            outcomes[index] = outcome
+        return outcomes  # type: ignore
+
+    async def amap(
+        self,
+        provider: str,
+        fn: Callable[[T], Awaitable[Any]],
+        items: Sequence[T],
+        on_done: Optional[Callable[[int, ChunkOutcome], None]] = None
+    ) -> List[ChunkOutcome]:
+        outcomes, pending = await asyncio.to_thread(self._restore, items, on_done)
+
+        async def run(item: T) -> Any:
+            self.checkpoints.check()
+            result = await fn(item)
+            await asyncio.to_thread(self.checkpoints.store, self.stage, item, result)
+            return result
+
+        ran = await self.executor.amap(provider, run, [items[index] for index in pending],
+                                       on_done=self._forward(pending, on_done))
+        for index, outcome in zip(pending, ran):
+            outcomes[index] = outcome
+        return outcomes  # type: ignore
+
+    def _restore(self, items: Sequence[T], on_done) -> tuple[List[Optional[ChunkOutcome]], List[int]]:
+        """Outcomes restored from checkpoints (None where missing), and the indexes still to run"""
+        outcomes: List[Optional[ChunkOutcome]] = []
+        pending = []
+        for index, item in enumerate(items):
+            restored = self.checkpoints.restore(self.stage, item)
+            outcomes.append(ChunkOutcome(restored, None) if restored is not None else None)
+            if restored is None:
+                pending.append(index)
+        if len(pending) < len(items):
+            print(
+                f"♻️ Restored {len(items) - len(pending)}/{len(items)} {self.stage} calls from checkpoints")
+            if on_done:
+                for index, outcome in enumerate(outcomes):
+                    if outcome is not None:
+                        on_done(index, outcome)
+        return outcomes, pending
+
+    @staticmethod
+    def _forward(pending: List[int], on_done):
+        """Translate the executor's indexes back to positions in the full item list"""
+        if on_done is None:
+            return None
+        return lambda index, outcome: on_done(pending[index], outcome)
@@ -0,0 +1,245 @@
+"""
+Weighted round-robin routing of LLM calls over several providers, with failover
+"""
+import re
+import time
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, TypeVar
+from app.core.config import settings
+from app.utils.rate_limiter import RateLimiter, RateLimitExceeded, get_rate_limiter
+
+T = TypeVar("T")
+
+# Errors of the provider or the way to it, which another route may not have: authentication,
+# timeouts, rate limits and server errors. Anything else is the request's own fault.
+_PROVIDER_STATUS_CODES = {401, 403, 408, 429}
+_PROVIDER_ERROR_NAMES = (
+    'Timeout', 'Connection', 'Connect', 'Transport', 'RateLimit', 'ResourceExhausted', 'TooManyRequests',
+    'ServiceUnavailable', 'Unavailable', 'InternalServer', 'ServerError', 'DeadlineExceeded',
+    'Authentication', 'Unauthenticated', 'PermissionDenied'
+)
+# "503 The model is overloaded", "Error code: 429 - {...}"
+_LEADING_STATUS = re.compile(r"^\W*(?:error code:?\s*)?(\d{3})\b", re.IGNORECASE)
+
+
+class ProviderRoute(NamedTuple):
+    """One provider, model and key a pool can send calls to"""
+    name: str
+    provider: str
+    model: str
+    weight: int = 1
+    base_url: Optional[str] = None
+    api_key: Optional[str] = None
+
+    @staticmethod
+    def parse(entry: Dict[str, Any]) -> "ProviderRoute":
+        """A route from its AI_PROVIDER_ROUTES entry; `name` defaults to the provider"""
+        if not entry.get("provider") or not entry.get("model"):
+            raise ValueError(f"A provider route needs a provider and a model: {entry}")
+        weight = int(entry.get("weight", 1))
+        if weight < 1:
+            raise ValueError(f"Provider route weights must be at least 1: {entry}")
+        return ProviderRoute(
+            name=str(entry.get("name") or entry["provider"]),
+            provider=str(entry["provider"]),
+            model=str(entry["model"]),
+            weight=weight,
+            base_url=entry.get("base_url"),
+            api_key=entry.get("api_key")
+        )
+
+
+class ProviderRouter:
+    """
+    Spreads the calls made to a pool over the pool's routes.
+
+    A pool is named after the provider the pipelines ask for, so configuring
+    one changes nothing in the callers. Each call goes to the next route by
+    smooth weighted round-robin, counting only routes that are available: not
+    resting, not paused by a Retry-After, with requests left this minute and
+    quota left, as the rate limiter (keyed by route name) sees it. A call
+    that fails on its route with a provider error (see is_provider_error) is
+    retried on the other routes, the available ones first, and only fails
+    once every route has failed it. Any other error, such as output that
+    does not validate or a prompt the model rejects, is the request's fault:
+    it is raised at once and not held against the route.
+
+    A route rests for `cooldown_seconds` after `failure_threshold` failed
+    calls in a row, or straight away when its quota is exhausted; a
+    successful call makes it available again. When no route is available,
+    calls still go out, to the route that is due back first.
+    """
+
+    def __init__(
+        self,
+        pools: Optional[Dict[str, List[ProviderRoute]]] = None,
+        failure_threshold: int = 3,
+        cooldown_seconds: float = 60.0,
+        rate_limiter: Optional[RateLimiter] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.pools = {pool: list(routes) for pool, routes in (pools or {}).items() if routes}
+        for pool, routes in self.pools.items():
+            names = [route.name for route in routes]
+            if len(set(names)) != len(names):
+                raise ValueError(f"Route names of provider pool '{pool}' must be unique: {names}")
+        self.failure_threshold = max(failure_threshold, 1)
+        self.cooldown_seconds = cooldown_seconds
+        self._rate_limiter = rate_limiter
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._current: Dict[str, Dict[str, int]] = {}  # pool -> route name -> round-robin weight
+        self._failures: Dict[str, int] = {}  # route name -> failed calls in a row
+        self._resting_until: Dict[str, float] = {}
+        self._calls: Dict[str, int] = {}
+
+    @staticmethod
+    def from_settings() -> "ProviderRouter":
+        return ProviderRouter(
+            pools={pool: [ProviderRoute.parse(entry) for entry in entries]
+                   for pool, entries in settings.AI_PROVIDER_ROUTES.items()},
+            failure_threshold=settings.AI_ROUTE_FAILURE_THRESHOLD,
+            cooldown_seconds=settings.AI_ROUTE_COOLDOWN_SECONDS
+        )
+
+    def routes(self, pool: str) -> List[ProviderRoute]:
+        """The routes of `pool`; empty when calls to it are not routed"""
+        return self.pools.get(pool, [])
+
+    def order(self, pool: str) -> List[ProviderRoute]:
+        """
+        Routes to try for one call, in order: the round-robin pick, the other
+        available routes by weight, then the unavailable ones by when they are due back
+        """
+        routes = self.routes(pool)
+        if not routes:
+            return []
+        rate_limiter = self._rate_limiter or get_rate_limiter()
+        with self._lock:
+            now = self._clock()
+            due = {route.name: self._due(route, now, rate_limiter) for route in routes}
+            available = [route for route in routes if due[route.name] <= now]
+            if available:
+                # Smooth weighted round-robin (as in nginx): every pick raises each candidate
+                # by its weight and lowers the winner by the total, interleaving the routes
+                current = self._current.setdefault(pool, {})
+                for route in available:
+                    current[route.name] = current.get(route.name, 0) + route.weight
+                chosen = max(available, key=lambda route: current[route.name])
+                current[chosen.name] -= sum(route.weight for route in available)
+                others = sorted((route for route in available if route is not chosen),
+                                key=lambda route: -route.weight)
+            else:
+                chosen, others = None, []
+            unavailable = sorted((route for route in routes if due[route.name] > now),
+                                 key=lambda route: due[route.name])
+        return ([chosen] if chosen else []) + others + unavailable
+
+    def call(self, pool: str, fn: Callable[[ProviderRoute], T]) -> T:
+        """`fn(route)` on the routes of `pool` in turn until one succeeds"""
+        error: Optional[Exception] = None
+        for route in self.order(pool):
+            try:
+                result = fn(route)
+            except Exception as e:
+                if not ProviderRouter.is_provider_error(e):
+                    raise
+                error = e
+                self.record_failure(route, e)
+                continue
+            self.record_success(route)
+            return result
+        raise error or ValueError(f"No provider routes configured for '{pool}'")
+
+    async def acall(self, pool: str, fn: Callable[[ProviderRoute], Awaitable[T]]) -> T:
+        """Async counterpart of call"""
+        error: Optional[Exception] = None
+        for route in self.order(pool):
+            try:
+                result = await fn(route)
+            except Exception as e:
+                if not ProviderRouter.is_provider_error(e):
+                    raise
+                error = e
+                self.record_failure(route, e)
+                continue
+            self.record_success(route)
+            return result
+        raise error or ValueError(f"No provider routes configured for '{pool}'")
+
+    @staticmethod
+    def is_provider_error(error: Exception) -> bool:
+        """Whether `error` is a provider or transport failure that another route may not have"""
+        if isinstance(error, (TimeoutError, ConnectionError, RateLimitExceeded)):
+            return True
+        if RateLimiter._is_rate_limit_error(error):
+            return True
+        for source in (error, getattr(error, 'response', None)):
+            for attr in ('status_code', 'status', 'code'):
+                code = getattr(source, attr, None)
+                if isinstance(code, int) and not isinstance(code, bool) and \
+                        (code in _PROVIDER_STATUS_CODES or 500 <= code < 600):
+                    return True
+        if any(marker in cls.__name__ for cls in type(error).__mro__ for marker in _PROVIDER_ERROR_NAMES):
+            return True
+        match = _LEADING_STATUS.match(str(error))
+        return bool(match) and (int(match.group(1)) in _PROVIDER_STATUS_CODES or match.group(1)[0] == "5")
+
+    def record_success(self, route: ProviderRoute) -> None:
+        with self._lock:
+            self._failures[route.name] = 0
+            self._resting_until.pop(route.name, None)
+            self._calls[route.name] = self._calls.get(route.name, 0) + 1
+
+    def record_failure(self, route: ProviderRoute, error: Exception) -> None:
+        rate_limiter = self._rate_limiter or get_rate_limiter()
+        exhausted = rate_limiter.get_status(route.name)["quota_exhausted"]
+        with self._lock:
+            failures = self._failures[route.name] = self._failures.get(route.name, 0) + 1
+            if exhausted or failures >= self.failure_threshold:
+                self._resting_until[route.name] = self._clock() + self.cooldown_seconds
+        print(f"⚠️ Provider route '{route.name}' failed ({failures} in a row), failing over: {str(error)[:100]}")
+
+    def status(self, pool: str) -> Dict[str, Any]:
+        """Health of the routes of `pool`; its quota is exhausted only when every route's is"""
+        rate_limiter = self._rate_limiter or get_rate_limiter()
+        routes = []
+        for route in self.routes(pool):
+            limiter_status = rate_limiter.get_status(route.name)
+            with self._lock:
+                resting = max(self._resting_until.get(route.name, 0.0) - self._clock(), 0.0)
+                routes.append({
+                    "name": route.name,
+                    "provider": route.provider,
+                    "model": route.model,
+                    "weight": route.weight,
+                    "calls": self._calls.get(route.name, 0),
+                    "consecutive_failures": self._failures.get(route.name, 0),
+                    "resting_seconds": round(resting, 3),
+                    "quota_exhausted": limiter_status["quota_exhausted"],
+                    "status": "resting" if resting > 0 else limiter_status["status"]
+                })
+        return {
+            "provider": pool,
+            "quota_exhausted": bool(routes) and all(route["quota_exhausted"] for route in routes),
+            "status": "healthy" if any(route["status"] == "healthy" for route in routes) else "backing_off",
+            "routes": routes
+        }
+
+    def _due(self, route: ProviderRoute, now: float, rate_limiter: RateLimiter) -> float:
+        """When the route takes calls again; `now` or earlier if it is available"""
+        due = self._resting_until.get(route.name, 0.0)
+        if rate_limiter.get_status(route.name)["quota_exhausted"]:
+            due = max(due, now + self.cooldown_seconds)
+        # Paused by a Retry-After, or out of requests for the minute
+        delay = rate_limiter.delay(route.name, route.model)
+        return max(due, now + delay) if delay > 0 else due
+
+
+# Global instance
+_provider_router = ProviderRouter.from_settings()
+
+
+def get_provider_router() -> ProviderRouter:
+    """Get the global provider router."""
+    return _provider_router
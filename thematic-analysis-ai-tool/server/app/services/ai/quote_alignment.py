@@ -0,0 +1,155 @@
+"""
+Placing LLM quotes in their document: absolute character offsets from a per-document index
+"""
+import re
+import bisect
+import numpy as np
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+_WHITESPACE = re.compile(r"\s+")
+_WORD = re.compile(r"\w+")
+# Typographic characters models swap for plain ones (and back); one character each
+_TYPOGRAPHY = str.maketrans({
+    "‘": "'", "’": "'", "‚": "'", "‛": "'",
+    "“": '"', "”": '"', "„": '"', "‟": '"',
+    "–": "-", "—": "-", "−": "-", "…": ".",
+})
+_QUOTE_EDGES = " \"'.,;:-"
+
+
+class QuoteAligner:
+    """
+    Absolute offsets of quotes in one document's text.
+
+    The text is normalised once (case, typographic quotes and dashes,
+    whitespace runs) with a map back to original offsets, so a quote is
+    found by one substring search however its whitespace or quote marks
+    differ. Quotes the model paraphrased or elided are placed by a word
+    trigram index, also built once, by voting for the alignment most of
+    their trigrams agree on. Searches look inside the quote's chunk first.
+
+    Build one aligner per document and reuse it for all of its quotes.
+    """
+
+    # Share of a quote's trigrams that must line up for a fuzzy match
+    MIN_TRIGRAM_SHARE = 0.5
+    # Trigrams this common only count inside the quote's chunk
+    MAX_GLOBAL_POSTINGS = 200
+    # Words of insertion or deletion a fuzzy match tolerates
+    DRIFT = 2
+
+    def __init__(self, text: str):
+        self.text = text
+        self.normalised, self._positions = QuoteAligner._normalise_with_map(text)
+        self._words: Optional[List[Tuple[int, int]]] = None
+        self._word_starts: List[int] = []
+        self._trigrams: Dict[Tuple[str, str, str], List[int]] = {}
+        self.stats = Counter()
+
+    def locate(self, quote: str, chunk_start: int, chunk_end: int) -> Tuple[int, int]:
+        """Offsets of `quote`, or of its whole chunk when it cannot be placed"""
+        span = self.align(quote, (chunk_start, chunk_end)) if quote else None
+        return span if span is not None else (chunk_start, chunk_end)
+
+    def align(self, quote: str, window: Optional[Tuple[int, int]] = None) -> Optional[Tuple[int, int]]:
+        """(start, end) of `quote` in the text, preferring `window`; None if it is not there"""
+        needle = QuoteAligner._normalise(quote).strip(_QUOTE_EDGES)
+        if not needle:
+            self.stats["unplaced"] += 1
+            return None
+
+        low, high = (0, len(self.normalised)) if window is None else self._to_normalised(window)
+        index = self.normalised.find(needle, low, high)
+        if index < 0 and window is not None:
+            index = self.normalised.find(needle)
+        if index >= 0:
+            self.stats["exact"] += 1
+            return self._to_original(index, index + len(needle))
+
+        span = self._fuzzy(needle, low, high)
+        self.stats["fuzzy" if span else "unplaced"] += 1
+        return span
+
+    def _fuzzy(self, needle: str, low: int, high: int) -> Optional[Tuple[int, int]]:
+        """Span of the text most of the needle's word trigrams line up with"""
+        words = _WORD.findall(needle)
+        if len(words) < 3:
+            return None
+        self._build_index()
+        first = bisect.bisect_left(self._word_starts, low)
+        last = bisect.bisect_left(self._word_starts, high)
+
+        local, anywhere = [], []
+        for position in range(len(words) - 2):
+            postings = self._trigrams.get((words[position], words[position + 1], words[position + 2]), [])
+            inside = postings[bisect.bisect_left(postings, first):bisect.bisect_left(postings, last)]
+            local.extend((position, word) for word in inside)
+            if len(postings) <= QuoteAligner.MAX_GLOBAL_POSTINGS:
+                anywhere.extend((position, word) for word in postings)
+
+        needed = max(1, int(np.ceil(QuoteAligner.MIN_TRIGRAM_SHARE * (len(words) - 2))))
+        for matches in (local, anywhere):
+            span = self._best_diagonal(matches, needed)
+            if span is not None:
+                return span
+        return None
+
+    def _best_diagonal(self, matches: List[Tuple[int, int]], needed: int) -> Optional[Tuple[int, int]]:
+        """The span of the alignment (word offset) most matches agree on, within DRIFT words"""
+        if not matches:
+            return None
+        votes = Counter(word - position for position, word in matches)
+        drift = QuoteAligner.DRIFT
+        best = max(sorted(votes), key=lambda diagonal: sum(
+            votes.get(diagonal + shift, 0) for shift in range(-drift, drift + 1)))
+        aligned = [word for position, word in matches if abs(word - position - best) <= drift]
+        # Each quote trigram counts once, however many times it repeats nearby
+        if len({position for position, word in matches if abs(word - position - best) <= drift}) < needed:
+            return None
+        start_word, end_word = min(aligned), max(aligned) + 2
+        return self._to_original(self._words[start_word][0], self._words[end_word][1])  # type: ignore
+
+    def _build_index(self) -> None:
+        if self._words is not None:
+            return
+        self._words = [(match.start(), match.end()) for match in _WORD.finditer(self.normalised)]
+        self._word_starts = [start for start, _ in self._words]
+        tokens = [self.normalised[start:end] for start, end in self._words]
+        for index in range(len(tokens) - 2):
+            self._trigrams.setdefault((tokens[index], tokens[index + 1], tokens[index + 2]), []).append(index)
+
+    def _to_normalised(self, window: Tuple[int, int]) -> Tuple[int, int]:
+        start, end = window
+        return (int(np.searchsorted(self._positions, start, side="left")),
+                int(np.searchsorted(self._positions, end, side="left")))
+
+    def _to_original(self, start: int, end: int) -> Tuple[int, int]:
+        return int(self._positions[start]), int(self._positions[end - 1]) + 1
+
+    @staticmethod
+    def _normalise(text: str) -> str:
+        return _WHITESPACE.sub(" ", text.translate(_TYPOGRAPHY).lower())
+
+    @staticmethod
+    def _normalise_with_map(text: str) -> Tuple[str, np.ndarray]:
+        """The normalised text and, for each of its characters, its offset in `text`"""
+        lowered = text.translate(_TYPOGRAPHY).lower()
+        if len(lowered) != len(text):
+            # A few characters change length when lowercased (e.g. 'İ'); map those one by one
+            pieces, positions = [], []
+            for offset, character in enumerate(text.translate(_TYPOGRAPHY)):
+                lowered_character = character.lower()
+                pieces.append(lowered_character)
+                positions.extend([offset] * len(lowered_character))
+            lowered = "".join(pieces)
+            keep = np.ones(len(lowered), dtype=bool)
+            offsets = np.array(positions, dtype=np.int64)
+        else:
+            keep = np.ones(len(text), dtype=bool)
+            offsets = np.arange(len(text), dtype=np.int64)
+
+        # A whitespace run becomes its first character, as a space
+        for match in _WHITESPACE.finditer(lowered):
+            keep[match.start() + 1:match.end()] = False
+        return _WHITESPACE.sub(" ", lowered), offsets[keep]
@@ -23,8 +23,10 @@ class CodeService:
         group_name: Optional[str] = None,
         theme_id: Optional[int] = None,
         is_auto_generated: bool = False,
-        codebook_id: Optional[int] = None
+        codebook_id: Optional[int] = None,
+        commit: bool = True
     ) -> Code:
+        """Create a code; with commit=False it is only flushed, for callers that commit several changes at once"""
 
         user = db.query(User).filter(User.id == created_by_id).first()
         if not user:
@@ -79,6 +81,9 @@ class CodeService:
         )
 
         db.add(db_code)
+        if not commit:
+            db.flush()
+            return db_code
         db.commit()
         db.refresh(db_code)
         return db_code
@@ -369,6 +369,25 @@ class CodebookService:
 
         return ai_codebook
 
+    @staticmethod
+    def get_latest_ai_session_codebook(
+        db: Session,
+        user_id: int,
+        project_id: int,
+        session_type: str = "AI_generated"
+    ) -> Optional[Codebook]:
+        """The user's most recent AI session codebook in the project, unless it has been finalized"""
+        latest = db.query(Codebook).filter(
+            Codebook.user_id == user_id,
+            Codebook.project_id == project_id,
+            Codebook.is_ai_generated == True,
+            Codebook.name.like(f"{session_type}_%")
+        ).order_by(Codebook.id.desc()).first()
+
+        if latest is None or latest.finalized:
+            return None
+        return latest
+
     @staticmethod
     def get_project_finalized_codebooks(
         db: Session,
@@ -3,16 +3,46 @@ Document services module.
 
 This module provides comprehensive document management services including:
 - Document upload and file processing
-- Document retrieval and search functionality
+- Single-pass content extraction per document type, run on a process pool
+- Reuse of stored extractions for identical files (by content hash)
+- Streaming upload ingestion with in-flight byte budgets
+- Background ingestion queue with retries and a dead-letter list
+- Document retrieval and ranked full-text search
+- Stored chunk boundaries of document content for the AI services
 - Document management and analytics
 """
 
 from .upload import DocumentUploadService
+from .extraction import DocumentExtractionEngine, ExtractionResult, EXTRACTION_VERSION
+from .extraction_cache import ExtractionCache, get_extraction_cache
+from .extraction_pool import DocumentExtractionPool, get_extraction_pool
+from .ingestion import SpooledUpload, UploadByteBudget, UploadIngestionService, get_upload_budget
+from .ingestion_queue import DocumentIngestionQueue, get_ingestion_queue
+from .search import DocumentSearchIndex
+from .chunk_store import DocumentChunkStore, StoredChunk, get_chunk_store
 from .retrieval import DocumentRetrievalService
-from .management import DocumentManagementService
+from .management import DocumentBusyError, DocumentManagementService
 
 __all__ = [
     'DocumentUploadService',
+    'DocumentExtractionEngine',
+    'ExtractionResult',
+    'EXTRACTION_VERSION',
+    'ExtractionCache',
+    'get_extraction_cache',
+    'DocumentExtractionPool',
+    'get_extraction_pool',
+    'SpooledUpload',
+    'UploadByteBudget',
+    'UploadIngestionService',
+    'get_upload_budget',
+    'DocumentIngestionQueue',
+    'get_ingestion_queue',
+    'DocumentSearchIndex',
+    'DocumentChunkStore',
+    'StoredChunk',
+    'get_chunk_store',
     'DocumentRetrievalService',
+    'DocumentBusyError',
     'DocumentManagementService'
 ]
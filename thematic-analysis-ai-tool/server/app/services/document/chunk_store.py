@@ -0,0 +1,133 @@
+"""
+Stored chunk boundaries of document content, shared by the AI services
+"""
+import hashlib
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.document import Document
+from app.models.document_chunk import DocumentChunk
+from app.utils.chunks import chunk_spans
+
+
+class StoredChunk(NamedTuple):
+    """One chunk of a document: content[start:end], with the digest of that text"""
+    index: int
+    start: int
+    end: int
+    chunk_hash: str
+
+    def text(self, content: str) -> str:
+        return content[self.start:self.end]
+
+
+class DocumentChunkStore:
+    """
+    Chunks of each document's content, cut once and kept in document_chunks.
+
+    Splitting a long transcript is the slow part of planning an AI run, and
+    every run used to split the same content again. Here a document is split
+    when it is processed or first coded; later lookups read its rows back.
+    Rows carry the digest of the content they were cut from, so a document
+    whose content changed (or a new chunk size or overlap) is split again
+    and its rows replaced. Hashing the content is far cheaper than splitting it.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get_chunks(
+        self,
+        db: Session,
+        documents: Iterable[Document],
+        chunk_size: Optional[int] = None,
+        chunk_overlap: Optional[int] = None
+    ) -> Dict[int, List[StoredChunk]]:
+        """Chunks of each document's content, in order, splitting and storing those not stored yet"""
+        chunk_size = chunk_size or settings.AI_CHUNK_SIZE
+        chunk_overlap = settings.AI_CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
+        contents = {int(document.id): document.content or "" for document in documents}  # type: ignore
+        if not contents:
+            return {}
+
+        stored = defaultdict(list)
+        for row in db.query(
+                DocumentChunk.document_id, DocumentChunk.chunk_index, DocumentChunk.start_char,
+                DocumentChunk.end_char, DocumentChunk.chunk_hash, DocumentChunk.content_hash
+        ).filter(
+                DocumentChunk.document_id.in_(list(contents)),
+                DocumentChunk.chunk_size == chunk_size,
+                DocumentChunk.chunk_overlap == chunk_overlap
+        ).order_by(DocumentChunk.document_id, DocumentChunk.chunk_index):
+            stored[row.document_id].append(row)
+
+        chunks, split = {}, {}
+        for document_id, content in contents.items():
+            content_hash = DocumentChunkStore._digest(content)
+            rows = stored.get(document_id)
+            if rows and rows[0].content_hash == content_hash:
+                chunks[document_id] = [StoredChunk(row.chunk_index, row.start_char, row.end_char, row.chunk_hash)
+                                       for row in rows]
+            else:
+                chunks[document_id] = DocumentChunkStore.split(content, chunk_size, chunk_overlap)
+                split[document_id] = content_hash
+        with self._lock:
+            self.hits += len(contents) - len(split)
+            self.misses += len(split)
+
+        if split:
+            self._store(db, {document_id: chunks[document_id] for document_id in split},
+                        split, chunk_size, chunk_overlap)
+        return chunks
+
+    @staticmethod
+    def split(content: str, chunk_size: int, chunk_overlap: int) -> List[StoredChunk]:
+        return [
+            StoredChunk(index, start, end, DocumentChunkStore._digest(content[start:end]))
+            for index, (start, end) in enumerate(chunk_spans(content, chunk_size, chunk_overlap))
+        ]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    @staticmethod
+    def _store(db: Session, chunks: Dict[int, List[StoredChunk]], content_hashes: Dict[int, str],
+               chunk_size: int, chunk_overlap: int) -> None:
+        # Written and committed on a session of its own: the caller's objects are not
+        # expired, and its transaction never holds these rows while it waits on an LLM
+        with Session(bind=db.get_bind()) as store_db:
+            store_db.query(DocumentChunk).filter(
+                DocumentChunk.document_id.in_(list(chunks)),
+                DocumentChunk.chunk_size == chunk_size,
+                DocumentChunk.chunk_overlap == chunk_overlap
+            ).delete(synchronize_session=False)
+            store_db.add_all([
+                DocumentChunk(document_id=document_id, chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                              chunk_index=chunk.index, start_char=chunk.start, end_char=chunk.end,
+                              chunk_hash=chunk.chunk_hash, content_hash=content_hashes[document_id])
+                for document_id, document_chunks in chunks.items() for chunk in document_chunks
+            ])
+            try:
+                store_db.commit()
+            except IntegrityError:
+                # Another run stored the same chunks first; theirs are as good as ours
+                store_db.rollback()
+
+    @staticmethod
+    def _digest(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# Global instance
+_chunk_store = DocumentChunkStore()
+
+
+def get_chunk_store() -> DocumentChunkStore:
+    """Get the global document chunk store."""
+    return _chunk_store
@@ -0,0 +1,344 @@
+"""
+Single-pass content extraction for uploaded documents
+"""
+from typing import Dict, Any, NamedTuple, Optional, Union, BinaryIO, Iterator
+from contextlib import contextmanager
+import io
+import os
+import mmap
+import pathlib
+import pypdf
+import numpy as np
+import pandas as pd
+from docx import Document as DocxDocument
+from app.models.document import DocumentType
+
+
+# Raw upload bytes, or the path of an upload spooled to disk
+DocumentSource = Union[bytes, str]
+
+# Bump whenever an extractor's content or metadata output changes, so stored
+# extractions from older parsers are no longer reused for identical files
+EXTRACTION_VERSION = 1
+
+
+class ExtractionResult(NamedTuple):
+    """Everything the upload path needs from one walk over a file"""
+    content: str
+    segments: Dict[str, Any]
+    file_metadata: Dict[str, Any]
+
+
+class DocumentExtractionEngine:
+    """Builds the document content, its segments and file metadata in one parse per document type"""
+
+    @staticmethod
+    def extract(source: DocumentSource, document_type: DocumentType, filename: str) -> ExtractionResult:
+        """
+        Parse the file once and return content, segments and metadata.
+
+        `source` is either the file's bytes or the path of a spooled upload;
+        parsers read paths through a file handle or mmap instead of a copy.
+        """
+        extractor = _EXTRACTORS.get(document_type)
+        if extractor is None:
+            return ExtractionResult(
+                "[Unsupported document type]",
+                {"segments": [], "error": "unsupported_type"},
+                {"error": "Unsupported document type"}
+            )
+
+        try:
+            return extractor(source, filename)
+        except Exception as e:
+            print(f"Error extracting document content: {str(e)}")
+            return ExtractionResult(
+                f"[Error extracting content: {str(e)}]",
+                {"segments": [], "error": str(e)},
+                {"error": str(e)}
+            )
+
+    @staticmethod
+    def _extract_text(source: DocumentSource, filename: str) -> ExtractionResult:
+        """Text files: the decoded text is the content, one segment per non-blank line"""
+        text = DocumentExtractionEngine._decode_text(source)
+
+        segments = DocumentExtractionEngine._segment_lines(text)
+
+        structured_content = {
+            "segments": segments,
+            "total_segments": len(segments),
+            "segmentation_type": "line"
+        }
+        return ExtractionResult(text, structured_content, {})
+
+    @staticmethod
+    def _extract_pdf(source: DocumentSource, filename: str) -> ExtractionResult:
+        """PDF files: each page's text is extracted once and reused for content and line segments"""
+        content_parts = []
+        segments = []
+        # pypdf reads objects lazily, so the stream stays open while pages are walked
+        with DocumentExtractionEngine._open(source) as stream:
+            pdf_reader = pypdf.PdfReader(stream)
+            for page_num, page in enumerate(pdf_reader.pages):
+                page_text = page.extract_text()
+                content_parts.append(f"--- Page {page_num + 1} ---\n")
+                content_parts.append(page_text + "\n\n")
+
+                # Split page text into lines for segmentation
+                segments.extend(DocumentExtractionEngine._segment_lines(
+                    page_text, page_number=page_num + 1))
+            page_count = len(pdf_reader.pages)
+            pdf_metadata = DocumentExtractionEngine._pdf_info(pdf_reader.metadata)
+
+        structured_content = {
+            "segments": segments,
+            "total_segments": len(segments),
+            "segmentation_type": "line_by_page"
+        }
+        metadata = {
+            "page_count": page_count,
+            "pdf_metadata": pdf_metadata
+        }
+        return ExtractionResult("".join(content_parts), structured_content, metadata)
+
+    @staticmethod
+    def _extract_docx(source: DocumentSource, filename: str) -> ExtractionResult:
+        """DOCX files: paragraphs feed the content and sentence segments in the same loop"""
+        with DocumentExtractionEngine._open(source) as stream:
+            doc = DocxDocument(stream)
+
+        content_parts = []
+        segments = []
+        # Sentence offsets are relative to the stripped, non-empty paragraphs joined by newlines
+        stripped_length = 0
+        for paragraph_index, paragraph in enumerate(doc.paragraphs):
+            para_text = paragraph.text
+            content_parts.append(para_text + "\n")
+            if not para_text.strip():
+                content_parts.append("\n")
+                continue
+
+            stripped_text = para_text.strip()
+            paragraph_start = stripped_length + 1
+            stripped_length += len(stripped_text) + 1
+
+            # Split paragraphs into sentences for better granularity
+            sentences = [s.strip() for s in stripped_text.split('.') if s.strip()]
+            offset = paragraph_start
+            for sentence in sentences:
+                segments.append({
+                    "type": "sentence",
+                    "content": sentence + ("." if not sentence.endswith('.') else ""),
+                    "paragraph_index": paragraph_index,
+                    "character_start": offset,
+                    "character_end": offset + len(sentence) + 1
+                })
+                offset += len(sentence) + 1
+
+        structured_content = {
+            "segments": segments,
+            "total_segments": len(segments),
+            "segmentation_type": "sentence"
+        }
+        return ExtractionResult("".join(content_parts), structured_content, {})
+
+    @staticmethod
+    def _extract_spreadsheet(source: DocumentSource, filename: str) -> ExtractionResult:
+        """CSV and Excel files share DocumentType.CSV and are told apart by extension"""
+        ext = pathlib.Path(filename or "").suffix.lower()
+        if ext in (".xlsx", ".xls"):
+            return DocumentExtractionEngine._extract_excel(source)
+        return DocumentExtractionEngine._extract_csv(source)
+
+    @staticmethod
+    def _extract_csv(source: DocumentSource) -> ExtractionResult:
+        """CSV files: one read_csv call feeds the row listing, the row segments and the metadata"""
+        csv_text = DocumentExtractionEngine._decode_text(source).strip()
+
+        try:
+            df = pd.read_csv(io.StringIO(csv_text), on_bad_lines='skip',
+                             skip_blank_lines=False)
+            content_parts = [
+                f"CSV file with {len(df)} rows and {len(df.columns)} columns\n",
+                f"Columns: {', '.join(df.columns.tolist())}\n\n"
+            ]
+            segments = DocumentExtractionEngine._build_row_segments(df)
+        except Exception as e:
+            # Unparseable CSV is stored as its raw text
+            return ExtractionResult(csv_text, {"segments": [], "error": str(e)}, {"error": str(e)})
+
+        row_texts = {segment["row_index"]: segment["content"] for segment in segments}
+        for row_index in range(len(df)):
+            row_text = row_texts.get(row_index, f"Row {row_index + 1}: [empty row]")
+            content_parts.append(row_text + "\n")
+
+        structured_content = {
+            "segments": segments,
+            "total_segments": len(segments),
+            "segmentation_type": "csv_row",
+            "columns": df.columns.tolist()
+        }
+        metadata = {
+            "row_count": len(segments),
+            "column_count": len(df.columns),
+            "columns": df.columns.tolist(),
+            "processing_note": "Converted to row-based segments for thematic analysis"
+        }
+        return ExtractionResult("".join(content_parts), structured_content, metadata)
+
+    @staticmethod
+    def _extract_excel(source: DocumentSource) -> ExtractionResult:
+        """Excel files: the sheet is read once instead of being round-tripped through CSV"""
+        try:
+            with DocumentExtractionEngine._open(source) as stream:
+                df = pd.read_excel(stream)
+            content = f"Excel file with {len(df)} rows and {len(df.columns)} columns\n"
+            content += f"Columns: {', '.join(df.columns.tolist())}\n\n"
+            segments = DocumentExtractionEngine._build_row_segments(df)
+        except Exception as e:
+            return ExtractionResult(
+                "[Error extracting Excel content]",
+                {"segments": [], "error": str(e)},
+                {"error": str(e)}
+            )
+
+        content += "".join(segment["content"] + "\n" for segment in segments)
+        structured_content = {
+            "segments": segments,
+            "total_segments": len(segments),
+            "segmentation_type": "excel_row",
+            "columns": df.columns.tolist()
+        }
+        metadata = {
+            "row_count": len(df),
+            "column_count": len(df.columns),
+            "columns": df.columns.tolist(),
+            "processing_note": "Converted to row-based segments for thematic analysis"
+        }
+        return ExtractionResult(content, structured_content, metadata)
+
+    @staticmethod
+    def _build_row_segments(df: pd.DataFrame) -> list:
+        """
+        Render every non-empty row as "Row N: col: value | ..." and build its segment.
+
+        Cells are rendered column by column and each row is joined once.
+        `to_numpy()` applies the same dtype upcast as `iterrows` (an int column
+        next to a float column prints as "3.0"), so the text is identical to
+        rendering the rows one Series at a time.
+        """
+        columns = df.columns.tolist()
+        values = df.to_numpy()
+        if values.dtype.kind in "mM":
+            # iterrows boxes datetimes as Timestamps
+            values = df.astype(object).to_numpy()
+        present = pd.notna(values)
+
+        cells = np.full(values.shape, None, dtype=object)
+        for column_index, col in enumerate(columns):
+            mask = present[:, column_index]
+            rendered = f"{col}: " + pd.Series(values[mask, column_index], dtype=object).map(str)
+            cells[mask, column_index] = rendered.to_numpy(dtype=object)
+
+        rows = []
+        for row_index, (row_cells, record) in enumerate(zip(cells.tolist(), values.tolist())):
+            parts = [cell for cell in row_cells if cell is not None]
+            if parts:
+                rows.append((
+                    row_index,
+                    f"Row {row_index + 1}: " + " | ".join(parts),
+                    dict(zip(columns, record))
+                ))
+        return DocumentExtractionEngine._segment_rows(rows)
+
+    @staticmethod
+    def _segment_lines(text: str, page_number: Optional[int] = None) -> list:
+        """
+        One segment per non-blank line of `text`.
+
+        Offsets come from a running counter over the newline-split lines, so
+        the walk is linear in the text length.
+        """
+        segments = []
+        offset = 0
+        for line_index, line in enumerate(text.split('\n')):
+            line_content = line.strip()
+            if line_content:
+                segment = {"type": "line", "content": line_content}
+                if page_number is not None:
+                    segment["page_number"] = page_number
+                segment["line_number"] = line_index + 1
+                segment["character_start"] = offset
+                segment["character_end"] = offset + len(line)
+                segments.append(segment)
+            offset += len(line) + 1
+        return segments
+
+    @staticmethod
+    def _segment_rows(rows: list) -> list:
+        """
+        Row segments for (row_index, row_text, additional_data) tuples.
+
+        Offsets address the rendered rows joined by blank lines, accumulated
+        with a running counter instead of re-summing the previous rows.
+        """
+        segments = []
+        offset = 0
+        for row_index, row_text, additional_data in rows:
+            segments.append({
+                "type": "row",
+                "content": row_text,
+                "row_index": row_index,
+                "character_start": offset,
+                "character_end": offset + len(row_text),
+                "additional_data": additional_data
+            })
+            # +2 for the double line breaks between rows
+            offset += len(row_text) + 2
+        return segments
+
+    @staticmethod
+    def _open(source: DocumentSource) -> BinaryIO:
+        """A binary stream over the source; spooled uploads are read from disk"""
+        if isinstance(source, (bytes, bytearray)):
+            return io.BytesIO(source)
+        return open(source, "rb")
+
+    @staticmethod
+    @contextmanager
+    def _buffer(source: DocumentSource) -> Iterator[Union[bytes, mmap.mmap]]:
+        """The source as a bytes-like buffer; spooled uploads are memory-mapped"""
+        if isinstance(source, (bytes, bytearray)):
+            yield source
+            return
+        if os.path.getsize(source) == 0:
+            # mmap refuses empty files
+            yield b""
+            return
+        with open(source, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+    @staticmethod
+    def _decode_text(source: DocumentSource) -> str:
+        """UTF-8 text of the source with NUL characters removed"""
+        with DocumentExtractionEngine._buffer(source) as buffer:
+            if buffer.find(b'\x00') == -1:
+                # Decode straight from the buffer, without an intermediate copy
+                return str(buffer, 'utf-8', 'replace')
+            return bytes(buffer).replace(b'\x00', b'').decode('utf-8', errors='replace')
+
+    @staticmethod
+    def _pdf_info(pdf_metadata) -> Dict[str, str]:
+        """Flatten the PDF document information dictionary into JSON-safe strings"""
+        if not pdf_metadata:
+            return {}
+        return {str(key): str(value) for key, value in pdf_metadata.items()}
+
+
+_EXTRACTORS = {
+    DocumentType.TEXT: DocumentExtractionEngine._extract_text,
+    DocumentType.PDF: DocumentExtractionEngine._extract_pdf,
+    DocumentType.DOCX: DocumentExtractionEngine._extract_docx,
+    DocumentType.CSV: DocumentExtractionEngine._extract_spreadsheet,
+}
@@ -0,0 +1,92 @@
+"""
+Content-addressed reuse of earlier extractions for identical uploads
+"""
+import threading
+from typing import Any, Dict, NamedTuple, Optional
+from sqlalchemy.orm import Session
+from app.models.document import Document, DocumentType
+from .extraction import EXTRACTION_VERSION
+
+
+class CachedExtraction(NamedTuple):
+    """What a new document can take over from an identical, already processed one"""
+    content: str
+    file_metadata: Dict[str, Any]
+    cloudinary_public_id: str
+    cloudinary_url: str
+    storage_backend: str
+
+
+class ExtractionCache:
+    """
+    Looks up a stored Document with the same file hash, document type and
+    EXTRACTION_VERSION, so an identical file uploaded again (typically into
+    another project) skips both the storage upload and the parse.
+
+    The documents table is the cache: there is nothing to invalidate beyond
+    bumping EXTRACTION_VERSION. Segments are not persisted, so only content
+    and file metadata are reused.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, db: Session, file_hash: str, document_type: DocumentType) -> Optional[CachedExtraction]:
+        """Return a reusable extraction for `file_hash`, counting the hit or miss"""
+        row = db.query(
+            Document.content,
+            Document.file_metadata,
+            Document.cloudinary_public_id,
+            Document.cloudinary_url,
+            Document.storage_backend
+        ).filter(
+            Document.file_hash == file_hash,
+            Document.document_type == document_type,
+            Document.extraction_version == EXTRACTION_VERSION,
+            Document.content.isnot(None),
+            Document.cloudinary_public_id.isnot(None)
+        ).order_by(Document.id.desc()).first()
+
+        # Failed extractions are stored with an error entry; parse those again
+        if row is None or (row.file_metadata or {}).get("error"):
+            self._count(hit=False)
+            return None
+
+        self._count(hit=True)
+        return CachedExtraction(
+            content=row.content,
+            file_metadata=dict(row.file_metadata or {}),
+            cloudinary_public_id=row.cloudinary_public_id,
+            cloudinary_url=row.cloudinary_url,
+            # Rows from before storage backends were recorded are on Cloudinary
+            storage_backend=row.storage_backend or "cloudinary"
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+            "extraction_version": EXTRACTION_VERSION
+        }
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+
+# Global instance
+_extraction_cache = ExtractionCache()
+
+
+def get_extraction_cache() -> ExtractionCache:
+    """Get the global extraction cache."""
+    return _extraction_cache
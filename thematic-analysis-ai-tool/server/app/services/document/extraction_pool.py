@@ -0,0 +1,123 @@
+"""
+Process pool that runs document extraction outside the request workers
+"""
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+from app.core.config import settings
+from app.models.document import DocumentType
+from .extraction import DocumentExtractionEngine, DocumentSource, ExtractionResult
+
+
+def _extract_in_worker(source: DocumentSource, document_type: DocumentType, filename: str) -> ExtractionResult:
+    """Entry point executed inside a worker process"""
+    return DocumentExtractionEngine.extract(source, document_type, filename)
+
+
+class DocumentExtractionPool:
+    """
+    Runs CPU-bound parsing (pypdf, python-docx, pandas) in worker processes.
+
+    Submissions go through a bounded queue: once `max_pending` files are queued
+    or running, callers block until a slot frees up. Each file gets `timeout`
+    seconds; a worker that overruns it is terminated and the pool is rebuilt.
+    Files smaller than `inline_max_bytes` are parsed in the calling thread,
+    where the round trip to a worker would cost more than the parse.
+    Spooled uploads are passed to workers by path, so the file is never
+    pickled across the process boundary.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int],
+        max_pending: int,
+        timeout: float,
+        inline_max_bytes: int
+    ):
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.inline_max_bytes = inline_max_bytes
+        self._slots = threading.BoundedSemaphore(max(1, max_pending))
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def extract(self, source: DocumentSource, document_type: DocumentType, filename: str) -> ExtractionResult:
+        """Extract a document, offloading to a worker process when the pool is enabled"""
+        size = len(source) if isinstance(source, (bytes, bytearray)) else os.path.getsize(source)
+        if self.max_workers <= 0 or size < self.inline_max_bytes:
+            return DocumentExtractionEngine.extract(source, document_type, filename)
+
+        if not self._slots.acquire(timeout=self.timeout):
+            raise ValueError(
+                f"Extraction queue is full, could not start processing '{filename}'")
+        try:
+            try:
+                return self._run(source, document_type, filename)
+            except BrokenProcessPool:
+                # Another file's timeout tore the pool down; retry once on a fresh one
+                return self._run(source, document_type, filename)
+        finally:
+            self._slots.release()
+
+    def shutdown(self) -> None:
+        """Stop all worker processes"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, source: DocumentSource, document_type: DocumentType, filename: str) -> ExtractionResult:
+        executor = self._get_executor()
+        future = executor.submit(
+            _extract_in_worker, source, document_type, filename)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            self._discard_executor(executor)
+            raise ValueError(
+                f"Timed out after {self.timeout:.0f}s extracting content from '{filename}'")
+        except BrokenProcessPool:
+            self._discard_executor(executor)
+            raise
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn avoids forking a process that already runs request threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def _discard_executor(self, executor: ProcessPoolExecutor) -> None:
+        """Drop a pool whose workers are stuck or dead so the next call starts fresh"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        # ProcessPoolExecutor has no public way to stop a busy worker
+        processes = list((getattr(executor, "_processes", None) or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+
+# Global instance
+_extraction_pool = DocumentExtractionPool(
+    max_workers=settings.DOCUMENT_EXTRACTION_WORKERS,
+    max_pending=settings.DOCUMENT_EXTRACTION_MAX_PENDING,
+    timeout=settings.DOCUMENT_EXTRACTION_TIMEOUT_SECONDS,
+    inline_max_bytes=settings.DOCUMENT_EXTRACTION_INLINE_MAX_BYTES
+)
+
+
+def get_extraction_pool() -> DocumentExtractionPool:
+    """Get the global document extraction pool."""
+    return _extraction_pool
@@ -0,0 +1,208 @@
+"""
+Streaming ingestion of uploaded files: chunked spooling, incremental hashing
+and in-flight byte budgets
+"""
+import io
+import os
+import asyncio
+import uuid
+import shutil
+import hashlib
+import tempfile
+from contextlib import asynccontextmanager
+from typing import Optional, BinaryIO, AsyncIterator
+from fastapi import UploadFile
+from app.core.config import settings
+from .extraction import DocumentSource
+
+
+class SpooledUpload:
+    """
+    An uploaded file copied off the request in fixed-size chunks.
+
+    Small files stay in memory as bytes. Anything larger than the spool memory
+    limit goes to a named temporary file, which parsers and the storage upload
+    read by path. Use it as a context manager so the temporary file is removed.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        size: int,
+        file_hash: str,
+        data: Optional[bytes] = None,
+        path: Optional[str] = None
+    ):
+        self.filename = filename
+        self.size = size
+        self.file_hash = file_hash
+        self.data = data
+        self.path = path
+
+    @classmethod
+    def from_bytes(cls, data: bytes, filename: str) -> "SpooledUpload":
+        """Wrap content that is already in memory"""
+        return cls(filename, len(data), hashlib.sha256(data).hexdigest(), data=data)
+
+    @property
+    def on_disk(self) -> bool:
+        return self.path is not None
+
+    @property
+    def source(self) -> DocumentSource:
+        """What the extraction engine and pool accept: the bytes or the spool path"""
+        return self.path if self.path is not None else self.data  # type: ignore
+
+    def open(self) -> BinaryIO:
+        """A binary stream over the upload"""
+        if self.path is not None:
+            return open(self.path, "rb")
+        return io.BytesIO(self.data or b"")
+
+    def persist(self, directory: str) -> str:
+        """
+        Move the upload into `directory` for a background job and return the
+        new path. The job owns the file from then on, so cleanup() leaves it.
+        """
+        os.makedirs(directory, exist_ok=True)
+        destination = os.path.join(directory, f"{uuid.uuid4().hex}-{self.file_hash[:16]}")
+        if self.path is not None:
+            shutil.move(self.path, destination)
+            self.path = None
+        else:
+            with open(destination, "wb") as f:
+                f.write(self.data or b"")
+        return destination
+
+    def cleanup(self) -> None:
+        """Remove the spool file, if any"""
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+
+    def __enter__(self) -> "SpooledUpload":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.cleanup()
+
+
+class UploadByteBudget:
+    """
+    Caps the bytes of uploads being ingested at the same time.
+
+    `reserve(n)` waits until `n` more bytes fit under the limit, which is what
+    makes bulk uploads queue up instead of all being read at once. A file larger
+    than the whole budget is admitted once nothing else is in flight, so it is
+    serialised rather than rejected. A limit of 0 disables the budget.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self._condition: Optional[asyncio.Condition] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @asynccontextmanager
+    async def reserve(self, nbytes: int) -> AsyncIterator[None]:
+        if self.limit <= 0:
+            yield
+            return
+
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(
+                lambda: self.in_flight == 0 or self.in_flight + nbytes <= self.limit)
+            self.in_flight += nbytes
+        try:
+            yield
+        finally:
+            async with condition:
+                self.in_flight -= nbytes
+                condition.notify_all()
+
+    def _get_condition(self) -> asyncio.Condition:
+        # asyncio primitives are bound to the loop that first waits on them
+        loop = asyncio.get_running_loop()
+        if self._condition is None or self._loop is not loop:
+            self._condition = asyncio.Condition()
+            self._loop = loop
+        return self._condition
+
+
+class UploadIngestionService:
+
+    @staticmethod
+    def declared_size(file: UploadFile) -> int:
+        """Size of an upload as received, without reading it"""
+        if file.size is not None:
+            return file.size
+        position = file.file.tell()
+        file.file.seek(0, os.SEEK_END)
+        size = file.file.tell()
+        file.file.seek(position)
+        return size - position
+
+    @staticmethod
+    def check_size(filename: Optional[str], size: int) -> None:
+        """Reject files over the per-file limit before any of them is read"""
+        max_bytes = settings.DOCUMENT_UPLOAD_MAX_FILE_BYTES
+        if max_bytes > 0 and size > max_bytes:
+            raise ValueError(
+                f"File '{filename}' is too large: {size} bytes, the limit is {max_bytes} bytes")
+
+    @staticmethod
+    async def spool(file: UploadFile) -> SpooledUpload:
+        """
+        Copy an upload off the request chunk by chunk, hashing as it goes.
+
+        Only one chunk is held at a time once the upload spills to disk.
+        """
+        chunk_size = settings.DOCUMENT_UPLOAD_CHUNK_BYTES
+        memory_limit = settings.DOCUMENT_UPLOAD_SPOOL_MEMORY_BYTES
+        filename = str(file.filename)
+
+        digest = hashlib.sha256()
+        buffer = bytearray()
+        spool_file = None
+        size = 0
+        try:
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                UploadIngestionService.check_size(filename, size)
+                digest.update(chunk)
+
+                if spool_file is None and len(buffer) + len(chunk) > memory_limit:
+                    spool_file = tempfile.NamedTemporaryFile(
+                        prefix="upload-", dir=settings.DOCUMENT_UPLOAD_SPOOL_DIR, delete=False)
+                    await asyncio.to_thread(spool_file.write, bytes(buffer))
+                    buffer = bytearray()
+                if spool_file is not None:
+                    await asyncio.to_thread(spool_file.write, chunk)
+                else:
+                    buffer += chunk
+        except BaseException:
+            if spool_file is not None:
+                spool_file.close()
+                os.unlink(spool_file.name)
+            raise
+
+        if spool_file is not None:
+            spool_file.close()
+            return SpooledUpload(filename, size, digest.hexdigest(), path=spool_file.name)
+        return SpooledUpload(filename, size, digest.hexdigest(), data=bytes(buffer))
+
+
+# Global instance shared by every upload request
+_upload_budget = UploadByteBudget(settings.DOCUMENT_UPLOAD_GLOBAL_INFLIGHT_BYTES)
+
+
+def get_upload_budget() -> UploadByteBudget:
+    """Get the process-wide in-flight upload byte budget."""
+    return _upload_budget
@@ -1,10 +1,16 @@
 from sqlalchemy.orm import Session
 from typing import Dict, Any, Optional
-import cloudinary
+import os
 
 from app.core.permissions import PermissionChecker
 from app.models.document import Document
+from app.models.ingestion_job import IngestionJob
 from app.models.user import User
+from app.services.storage import get_storage_outbox
+
+
+class DocumentBusyError(ValueError):
+    """The document is being processed in the background and cannot be changed yet"""
 
 
 class DocumentManagementService:
@@ -26,19 +32,39 @@ class DocumentManagementService:
         if not document:
             raise ValueError("Document not found or access denied")
 
-        # Delete from Cloudinary
-        if document.cloudinary_public_id:  # type: ignore
-            try:
-                cloudinary.uploader.destroy(  # type: ignore
-                    document.cloudinary_public_id,
-                    resource_type="raw"
-                )
-            except Exception as e:
-                print(f"Failed to delete from Cloudinary: {e}")
+        # Take the document's jobs off the queue first: a worker's claim cannot match a
+        # deleted job. A running job may already have stored the file for this document,
+        # and deleting the row under it would leave that file behind for good
+        spools = [path for (path,) in db.query(IngestionJob.spool_path).filter(
+            IngestionJob.document_id == document.id, IngestionJob.status.in_(("pending", "dead")))]
+        db.query(IngestionJob).filter(
+            IngestionJob.document_id == document.id, IngestionJob.status != "running"
+        ).delete(synchronize_session=False)
+        if db.query(IngestionJob.id).filter(IngestionJob.document_id == document.id).first():
+            db.rollback()
+            raise DocumentBusyError("The document is still being processed; delete it once processing finishes")
+        db.expire(document, ["ingestion_jobs"])
+
+        # Identical uploads share one stored object; keep it while others use it
+        shared = document.cloudinary_public_id is not None and db.query(Document.id).filter(
+            Document.cloudinary_public_id == document.cloudinary_public_id,
+            Document.id != document.id
+        ).first() is not None
+
+        # The stored file is deleted in the background, committed with the document
+        outbox = get_storage_outbox()
+        if document.cloudinary_public_id and not shared:  # type: ignore
+            outbox.enqueue(db, str(document.cloudinary_public_id), document.storage_backend)
 
         # Delete from database
         db.delete(document)
         db.commit()
+        outbox.notify(db)
+
+        # Spool files of jobs that never finished are not cleaned up by the worker
+        for path in spools:
+            if os.path.exists(path):
+                os.unlink(path)
 
         return True
 
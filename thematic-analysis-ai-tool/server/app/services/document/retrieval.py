@@ -1,12 +1,14 @@
 """
 Document retrieval and search service
 """
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session, undefer
+from typing import Any, Dict, List, Optional
 
 from app.core.permissions import PermissionChecker
 from app.models.document import Document, DocumentType
 from app.models.user import User
+from .search import DocumentSearchIndex
 
 
 class DocumentRetrievalService:
@@ -17,7 +19,8 @@ class DocumentRetrievalService:
         db: Session,
         project_id: int,
         user_id: int,
-        document_type: Optional[DocumentType] = None
+        document_type: Optional[DocumentType] = None,
+        include_content: bool = False
     ) -> List[Document]:
         """Get all documents for a project that user has access to"""
 
@@ -37,40 +40,80 @@ class DocumentRetrievalService:
 
         if document_type:
             query = query.filter(Document.document_type == document_type)
+        if include_content:
+            query = query.options(undefer(Document.content))
 
         return query.order_by(Document.created_at.desc()).all()
 
+    @staticmethod
+    def get_content_range(
+        db: Session,
+        document: Document,
+        start: int = 0,
+        end: Optional[int] = None,
+        max_chars: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Characters [start, end) of a document's content, read with substr() so
+        only that slice leaves the database. `end` defaults to, and is capped
+        at, `start + max_chars`; `next_start` is None once the end is reached.
+        """
+        if start < 0 or (end is not None and end < start):
+            raise ValueError("Invalid content range")
+
+        total = document.content_length
+        if total is None:
+            # Rows written before content_length existed
+            total = db.query(func.length(Document.content)).filter(
+                Document.id == document.id).scalar()
+        total = int(total or 0)
+
+        if max_chars:
+            end = min(end, start + max_chars) if end is not None else start + max_chars
+        end = min(end if end is not None else total, total)
+        start = min(start, end)
+
+        text = ""
+        if end > start:
+            text = db.query(func.substr(Document.content, start + 1, end - start)).filter(
+                Document.id == document.id).scalar() or ""
+
+        return {
+            "document_id": document.id,
+            "start": start,
+            "end": end,
+            "total_length": total,
+            "content": text,
+            "next_start": end if end < total else None
+        }
+
     @staticmethod
     def search_documents(
         db: Session,
         project_id: int,
         user_id: int,
         search_text: str,
-        document_type: Optional[DocumentType] = None
-    ) -> List[Document]:
-        """Search documents by content"""
+        document_type: Optional[DocumentType] = None,
+        limit: int = 20,
+        offset: int = 0
+    ) -> Dict[str, Any]:
+        """Ranked full-text search of a project's documents, one page at a time"""
+        empty = {"query": search_text, "total": 0, "limit": limit, "offset": offset, "results": []}
 
         # Get user object
         user = db.query(User).filter(User.id == user_id).first()
         if not user:
-            return []
+            return empty
 
         # Check user access to project
         project = PermissionChecker.check_project_access(
             db, project_id, user, raise_exception=False
         )
         if not project:
-            return []
+            return empty
 
-        query = db.query(Document).filter(
-            Document.project_id == project_id,
-            Document.content.ilike(f"%{search_text}%")
-        )
-
-        if document_type:
-            query = query.filter(Document.document_type == document_type)
-
-        return query.order_by(Document.created_at.desc()).all()
+        return DocumentSearchIndex.search(
+            db, project_id, search_text, document_type, limit, offset)
 
     @staticmethod
     def get_documents_by_ids(
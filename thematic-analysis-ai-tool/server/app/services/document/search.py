@@ -0,0 +1,261 @@
+"""
+Ranked full-text search over document content
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import case, func, select, text
+from sqlalchemy.orm import Session
+from app.models.document import Document, DocumentType, SEARCH_TEXT_CONFIG
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+class DocumentSearchIndex:
+    """
+    Queries the database's full-text index on documents (see
+    app.models.document): a GIN-indexed tsvector on PostgreSQL, FTS5 on SQLite.
+    Other databases fall back to a substring match without ranking.
+
+    Every word in the query must match (stemmed), name matches rank above
+    content matches, and only the requested page is read back. Snippets are
+    cut from bounded excerpts of that page's documents, with character
+    offsets into the document so the client can fetch or highlight the exact
+    range. The database finds where each term first occurs, so a long
+    transcript costs a few hundred characters per term, not its whole content.
+    """
+
+    @staticmethod
+    def terms(query: str) -> List[str]:
+        """Lower-cased words of a query; punctuation and operators are dropped"""
+        return [word.lower() for word in _WORD.findall(query)]
+
+    @staticmethod
+    def search(
+        db: Session,
+        project_id: int,
+        query: str,
+        document_type: Optional[DocumentType] = None,
+        limit: int = 20,
+        offset: int = 0,
+        max_snippets: int = 3,
+        snippet_chars: int = 160
+    ) -> Dict[str, Any]:
+        """Ranked page of documents in `project_id` matching every word of `query`"""
+        terms = DocumentSearchIndex.terms(query)
+        if not terms:
+            return {"query": query, "total": 0, "limit": limit, "offset": offset, "results": []}
+
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql":
+            total, rows = DocumentSearchIndex._search_postgres(
+                db, project_id, terms, document_type, limit, offset)
+        elif dialect == "sqlite":
+            total, rows = DocumentSearchIndex._search_sqlite(
+                db, project_id, terms, document_type, limit, offset)
+        else:
+            total, rows = DocumentSearchIndex._search_substring(
+                db, project_id, terms, document_type, limit, offset)
+
+        # Only excerpts of the documents on this page are read
+        excerpts = DocumentSearchIndex._excerpts(
+            db, [row[0] for row in rows], terms, max_snippets, snippet_chars) if rows else {}
+
+        results = []
+        for document_id, name, doc_type, rank in rows:
+            results.append({
+                "document_id": document_id,
+                "name": name,
+                "document_type": doc_type,
+                "rank": round(float(rank), 6),
+                "snippets": DocumentSearchIndex.excerpt_snippets(
+                    excerpts.get(document_id, []), terms, max_snippets, snippet_chars)
+            })
+        return {"query": query, "total": total, "limit": limit, "offset": offset, "results": results}
+
+    @staticmethod
+    def snippets(
+        content: str,
+        terms: List[str],
+        max_snippets: int = 3,
+        snippet_chars: int = 160
+    ) -> List[Dict[str, Any]]:
+        """
+        Up to `max_snippets` non-overlapping windows around term matches.
+
+        Terms match as word prefixes, which covers most stemmed forms the index
+        matched ("wait" finds "waiting"). `start`/`end` and the highlight
+        offsets are character positions in the full content.
+        """
+        return DocumentSearchIndex.excerpt_snippets([(0, content)], terms, max_snippets, snippet_chars)
+
+    @staticmethod
+    def excerpt_snippets(
+        excerpts: List[Tuple[int, str]],
+        terms: List[str],
+        max_snippets: int = 3,
+        snippet_chars: int = 160
+    ) -> List[Dict[str, Any]]:
+        """
+        `snippets` over (offset, text) excerpts of a document rather than its
+        whole content. Offsets stay positions in the full content; a window
+        is not widened past the excerpt it falls in.
+        """
+        excerpts = DocumentSearchIndex._merge(excerpts)
+        if not excerpts:
+            return []
+        pattern = re.compile(
+            r"\b(?:" + "|".join(re.escape(term) for term in terms) + r")\w*", re.IGNORECASE)
+        radius = snippet_chars // 2
+
+        snippets: List[Dict[str, Any]] = []
+        for offset, excerpt in excerpts:
+            for match in pattern.finditer(excerpt):
+                highlight = [offset + match.start(), offset + match.end()]
+                if snippets and highlight[0] < snippets[-1]["end"]:
+                    snippets[-1]["highlights"].append(highlight)
+                    continue
+                if len(snippets) == max_snippets:
+                    break
+                start, end = DocumentSearchIndex._window(
+                    excerpt, match.start() - radius, match.end() + radius)
+                snippets.append({"start": offset + start, "end": offset + end,
+                                 "text": excerpt[start:end], "highlights": [highlight]})
+            if len(snippets) == max_snippets:
+                break
+
+        if not snippets:
+            # Matched through stemming only, or on the name: show the opening
+            offset, excerpt = excerpts[0]
+            start, end = DocumentSearchIndex._window(excerpt, 0, snippet_chars)
+            snippets.append({"start": offset + start, "end": offset + end,
+                             "text": excerpt[start:end], "highlights": []})
+
+        for snippet in snippets:
+            snippet["highlights"] = [
+                h for h in snippet["highlights"] if h[1] <= snippet["end"]]
+        return snippets
+
+    @staticmethod
+    def _excerpts(
+        db: Session,
+        document_ids: List[int],
+        terms: List[str],
+        max_snippets: int,
+        snippet_chars: int
+    ) -> Dict[int, List[Tuple[int, str]]]:
+        """
+        (offset, text) excerpts of each document: its opening, and the text
+        around the first occurrence of each term, located by the database
+        """
+        position = func.strpos if db.get_bind().dialect.name == "postgresql" else func.instr
+        # Room before an occurrence for the snippet's lead-in and widening to whole words,
+        # and after it for the snippets of later occurrences close by
+        margin = snippet_chars
+        length = margin + max_snippets * snippet_chars
+        terms = list(dict.fromkeys(terms))
+
+        lowered = func.lower(Document.content)
+        found = select(Document.id.label("id"), *[
+            position(lowered, term).label(f"found_{index}") for index, term in enumerate(terms)
+        ]).where(Document.id.in_(document_ids)).subquery()
+        columns = [found.c.id, func.substr(Document.content, 1, length)]
+        for index in range(len(terms)):
+            at = found.c[f"found_{index}"]
+            columns += [at, func.substr(Document.content, case((at > margin, at - margin), else_=1), length)]
+
+        excerpts: Dict[int, List[Tuple[int, str]]] = {}
+        for row in db.query(*columns).join(Document, Document.id == found.c.id):
+            document_excerpts = [(0, row[1] or "")]
+            for at, excerpt in zip(row[2::2], row[3::2]):
+                if at:
+                    # SQL positions count from 1
+                    document_excerpts.append((max(at - margin, 1) - 1, excerpt or ""))
+            excerpts[row[0]] = document_excerpts
+        return excerpts
+
+    @staticmethod
+    def _merge(excerpts: List[Tuple[int, str]]) -> List[Tuple[int, str]]:
+        """Excerpts in order, with overlapping or touching ones joined"""
+        merged: List[Tuple[int, str]] = []
+        for offset, excerpt in sorted(excerpts):
+            if not excerpt:
+                continue
+            if merged and offset <= merged[-1][0] + len(merged[-1][1]):
+                last_offset, last = merged[-1]
+                merged[-1] = (last_offset, last + excerpt[last_offset + len(last) - offset:])
+            else:
+                merged.append((offset, excerpt))
+        return merged
+
+    @staticmethod
+    def _window(content: str, start: int, end: int) -> Tuple[int, int]:
+        """Clamp to the content and widen to whole words"""
+        start, end = max(start, 0), min(end, len(content))
+        while start > 0 and not content[start - 1].isspace():
+            start -= 1
+        while end < len(content) and not content[end].isspace():
+            end += 1
+        return start, end
+
+    @staticmethod
+    def _search_postgres(db, project_id, terms, document_type, limit, offset):
+        params: Dict[str, Any] = {
+            "project_id": project_id,
+            "query": " ".join(terms),
+            "limit": limit,
+            "offset": offset
+        }
+        where = "d.project_id = :project_id AND d.search_vector @@ q"
+        if document_type:
+            where += " AND d.document_type = :document_type"
+            params["document_type"] = document_type.name
+        source = f"documents d, plainto_tsquery('{SEARCH_TEXT_CONFIG}', :query) q"
+
+        total = db.execute(text(
+            f"SELECT count(*) FROM {source} WHERE {where}"), params).scalar()
+        rows = db.execute(text(
+            f"SELECT d.id, d.name, d.document_type, ts_rank_cd(d.search_vector, q) AS rank "
+            f"FROM {source} WHERE {where} "
+            f"ORDER BY rank DESC, d.id DESC LIMIT :limit OFFSET :offset"), params).all()
+        return int(total or 0), [DocumentSearchIndex._row(row) for row in rows]
+
+    @staticmethod
+    def _search_sqlite(db, project_id, terms, document_type, limit, offset):
+        params: Dict[str, Any] = {
+            "project_id": project_id,
+            # Quoted terms are matched literally, so user input cannot inject FTS5 syntax
+            "query": " ".join(f'"{term}"' for term in terms),
+            "limit": limit,
+            "offset": offset
+        }
+        where = "documents_fts MATCH :query AND d.project_id = :project_id"
+        if document_type:
+            where += " AND d.document_type = :document_type"
+            params["document_type"] = document_type.name
+        source = "documents_fts JOIN documents d ON d.id = documents_fts.rowid"
+
+        total = db.execute(text(
+            f"SELECT count(*) FROM {source} WHERE {where}"), params).scalar()
+        # bm25() is lower for better matches; weight name hits above content hits
+        rows = db.execute(text(
+            f"SELECT d.id, d.name, d.document_type, -bm25(documents_fts, 4.0, 1.0) AS rank "
+            f"FROM {source} WHERE {where} "
+            f"ORDER BY rank DESC, d.id DESC LIMIT :limit OFFSET :offset"), params).all()
+        return int(total or 0), [DocumentSearchIndex._row(row) for row in rows]
+
+    @staticmethod
+    def _search_substring(db, project_id, terms, document_type, limit, offset):
+        query = db.query(Document.id, Document.name, Document.document_type).filter(
+            Document.project_id == project_id,
+            *[Document.content.ilike(f"%{term}%") for term in terms]
+        )
+        if document_type:
+            query = query.filter(Document.document_type == document_type)
+        total = query.count()
+        rows = query.order_by(Document.created_at.desc()).limit(limit).offset(offset).all()
+        return total, [(row.id, row.name, row.document_type, 0.0) for row in rows]
+
+    @staticmethod
+    def _row(row) -> Tuple[int, str, DocumentType, float]:
+        # Raw SQL returns the enum's name as stored by SQLAlchemy
+        return row[0], row[1], DocumentType[row[2]], row[3]
@@ -1,9 +1,10 @@
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Union
 
 from app.models.document import Document, DocumentType
 from app.schemas.document import DocumentUpload
 from .document.upload import DocumentUploadService
+from .document.ingestion import SpooledUpload
 from .document.retrieval import DocumentRetrievalService
 from .document.management import DocumentManagementService
 
@@ -18,7 +19,7 @@ class DocumentService:
         document_type: DocumentType,
         project_id: int,
         uploaded_by_id: int,
-        file_content: bytes,
+        file_content: Union[bytes, SpooledUpload],
         filename: str
     ) -> DocumentUpload:
         return DocumentUploadService.create_document(
@@ -31,10 +32,23 @@ class DocumentService:
         db: Session,
         project_id: int,
         user_id: int,
-        document_type: Optional[DocumentType] = None
+        document_type: Optional[DocumentType] = None,
+        include_content: bool = False
     ) -> List[Document]:
         return DocumentRetrievalService.get_documents_by_project(
-            db, project_id, user_id, document_type
+            db, project_id, user_id, document_type, include_content
+        )
+
+    @staticmethod
+    def get_content_range(
+        db: Session,
+        document: Document,
+        start: int = 0,
+        end: Optional[int] = None,
+        max_chars: Optional[int] = None
+    ) -> Dict[str, Any]:
+        return DocumentRetrievalService.get_content_range(
+            db, document, start, end, max_chars
         )
 
     @staticmethod
@@ -61,8 +75,10 @@ class DocumentService:
         project_id: int,
         user_id: int,
         search_text: str,
-        document_type: Optional[DocumentType] = None
-    ) -> List[Document]:
+        document_type: Optional[DocumentType] = None,
+        limit: int = 20,
+        offset: int = 0
+    ) -> Dict[str, Any]:
         return DocumentRetrievalService.search_documents(
-            db, project_id, user_id, search_text, document_type
+            db, project_id, user_id, search_text, document_type, limit, offset
         )
\ No newline at end of file
@@ -1,5 +1,6 @@
 from typing import Dict, Any, List, Optional
 from sqlalchemy.orm import Session, selectinload
+from app.models.document import Document
 from app.models.project import Project
 from app.models.user import User
 from app.models.theme import Theme
@@ -14,12 +15,15 @@ class ProjectComprehensiveService:
     """Handles comprehensive project data loading"""
 
     @staticmethod
-    def load_project_with_relations(db: Session, project_id: int) -> Optional[Project]:
+    def load_project_with_relations(db: Session, project_id: int, include_content: bool = False) -> Optional[Project]:
         """Load project with all necessary relationships"""
+        documents = selectinload(Project.documents)
+        if include_content:
+            documents = documents.undefer(Document.content)
         return db.query(Project).options(
             selectinload(Project.owner),
             selectinload(Project.collaborators),
-            selectinload(Project.documents),
+            documents,
             selectinload(Project.codes),
             selectinload(Project.codes).selectinload(Code.code_assignments),
             selectinload(Project.annotations).selectinload(
@@ -45,12 +49,14 @@ class ProjectComprehensiveService:
         ).all()
 
     @staticmethod
-    def get_comprehensive_data(db: Session, project_id: int, user_id: int) -> Optional[Dict[str, Any]]:
+    def get_comprehensive_data(
+        db: Session, project_id: int, user_id: int, include_content: bool = False
+    ) -> Optional[Dict[str, Any]]:
         """Get comprehensive project data with finalized code assignments and codes"""
 
         # Load project with all relationships
         project = ProjectComprehensiveService.load_project_with_relations(
-            db, project_id)
+            db, project_id, include_content)
         if not project:
             return None
 
@@ -120,7 +126,7 @@ class ProjectComprehensiveService:
             "research_details": project.research_details,
             "owner": ProjectSerializer.serialize_user_data(project.owner),
             "collaborators": [ProjectSerializer.serialize_user_data(c) for c in project.collaborators],
-            "documents": [ProjectSerializer.serialize_document(doc) for doc in project.documents],
+            "documents": [ProjectSerializer.serialize_document(doc, include_content) for doc in project.documents],
             "codes": [ProjectSerializer.serialize_code(code, user_id) for code in all_codes],
             "code_assignments": [ProjectSerializer.serialize_code_assignment(a) for a in user_code_assignments],
             "annotations": [ProjectSerializer.serialize_annotation(ann) for ann in user_annotations],
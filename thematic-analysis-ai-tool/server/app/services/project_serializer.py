@@ -20,8 +20,8 @@ class ProjectSerializer:
         }
 
     @staticmethod
-    def serialize_document(doc) -> Dict[str, Any]:
-        """Serialize document data"""
+    def serialize_document(doc, include_content: bool = False) -> Dict[str, Any]:
+        """Serialize document data; content only when asked for"""
         return {
             "id": doc.id,
             "name": doc.name,
@@ -32,7 +32,9 @@ class ProjectSerializer:
             "created_at": doc.created_at,
             "updated_at": doc.updated_at,
             "file_size": doc.file_size,
-            "content": doc.content,
+            "content_length": doc.content_length,
+            "processing_status": doc.processing_status,
+            "content": doc.content if include_content else None,
         }
 
     @staticmethod
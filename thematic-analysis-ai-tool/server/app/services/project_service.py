@@ -218,10 +218,13 @@ class ProjectService:
         return summaries
 
     @staticmethod
-    def get_project_comprehensive(db: Session, project_id: int, user_id: int) -> Optional[Dict[str, Any]]:
+    def get_project_comprehensive(
+        db: Session, project_id: int, user_id: int, include_content: bool = False
+    ) -> Optional[Dict[str, Any]]:
         """Get a project with all related data loaded efficiently"""
         # Check access first
         if not ProjectService.get_project(db, project_id, user_id):
             return None
 
-        return ProjectComprehensiveService.get_comprehensive_data(db, project_id, user_id)
+        return ProjectComprehensiveService.get_comprehensive_data(
+            db, project_id, user_id, include_content)
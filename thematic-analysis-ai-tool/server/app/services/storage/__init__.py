@@ -0,0 +1,27 @@
+"""
+Object storage services module.
+
+This module provides storage for uploaded files:
+- An async ObjectStorage interface with Cloudinary and local-disk backends
+- A bridge for calling storage from synchronous service code
+- An outbox that deletes stored files in the background
+"""
+
+from .base import ObjectStorage, StoredObject, StorageSource
+from .cloudinary_storage import CloudinaryStorage
+from .local_storage import LocalStorage
+from .factory import get_object_storage
+from .runner import run_storage
+from .outbox import StorageDeletionOutbox, get_storage_outbox
+
+__all__ = [
+    'ObjectStorage',
+    'StoredObject',
+    'StorageSource',
+    'CloudinaryStorage',
+    'LocalStorage',
+    'get_object_storage',
+    'run_storage',
+    'StorageDeletionOutbox',
+    'get_storage_outbox'
+]
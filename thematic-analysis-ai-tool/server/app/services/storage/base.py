@@ -0,0 +1,37 @@
+"""
+Object storage interface for uploaded files
+"""
+from abc import ABC, abstractmethod
+from typing import NamedTuple, Union
+
+# File content in memory, or the path of a file on local disk
+StorageSource = Union[bytes, str]
+
+
+class StoredObject(NamedTuple):
+    """Where a stored file lives: the backend key and a URL clients can fetch"""
+    key: str
+    url: str
+
+
+class ObjectStorage(ABC):
+    """
+    Async put/get/delete of raw files addressed by key.
+
+    Implementations keep their clients and connections for the life of the
+    process; blocking SDK calls run in a thread so the event loop stays free.
+    """
+
+    name: str
+
+    @abstractmethod
+    async def put(self, key: str, source: StorageSource) -> StoredObject:
+        """Store a file under `key`, replacing any existing object"""
+
+    @abstractmethod
+    async def get(self, key: str) -> bytes:
+        """Read a stored file back"""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Remove a stored file; deleting a missing key is not an error"""
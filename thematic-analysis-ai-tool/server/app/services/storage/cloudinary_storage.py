@@ -0,0 +1,74 @@
+"""
+Cloudinary object storage backend
+"""
+import asyncio
+import threading
+import requests
+import cloudinary
+import cloudinary.utils
+import cloudinary.uploader
+from app.core.config import settings
+from .base import ObjectStorage, StorageSource, StoredObject
+
+
+class CloudinaryStorage(ObjectStorage):
+    """
+    Raw-file storage on Cloudinary.
+
+    The SDK is configured on first use rather than at import, so processes
+    that never touch Cloudinary (workers, tests, local storage setups) need no
+    credentials. Uploads reuse the SDK's pooled HTTP connector; downloads go
+    through one shared requests.Session.
+    """
+
+    name = "cloudinary"
+
+    def __init__(self):
+        self._configured = False
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+
+    async def put(self, key: str, source: StorageSource) -> StoredObject:
+        self._configure()
+        upload_options = dict(
+            resource_type="raw",
+            public_id=key,
+            use_filename=True,
+            unique_filename=False
+        )
+        if isinstance(source, str):
+            # Files on disk are sent in chunks instead of being read whole
+            result = await asyncio.to_thread(
+                cloudinary.uploader.upload_large, source, **upload_options)
+        else:
+            result = await asyncio.to_thread(
+                cloudinary.uploader.upload, source, **upload_options)
+        return StoredObject(result["public_id"], result["secure_url"])
+
+    async def get(self, key: str) -> bytes:
+        self._configure()
+        url, _ = cloudinary.utils.cloudinary_url(key, resource_type="raw", secure=True)
+        response = await asyncio.to_thread(self._session.get, url, timeout=60)
+        response.raise_for_status()
+        return response.content
+
+    async def delete(self, key: str) -> None:
+        self._configure()
+        result = await asyncio.to_thread(
+            cloudinary.uploader.destroy, key, resource_type="raw")
+        if result.get("result") not in ("ok", "not found"):
+            raise ValueError(f"Cloudinary could not delete '{key}': {result}")
+
+    def _configure(self) -> None:
+        with self._lock:
+            if self._configured:
+                return
+            if not (settings.CLOUDINARY_CLOUD_NAME and settings.CLOUDINARY_API_KEY
+                    and settings.CLOUDINARY_API_SECRET):
+                raise ValueError("Cloudinary storage is selected but CLOUDINARY_* settings are missing")
+            cloudinary.config(
+                cloud_name=settings.CLOUDINARY_CLOUD_NAME,
+                api_key=settings.CLOUDINARY_API_KEY,
+                api_secret=settings.CLOUDINARY_API_SECRET
+            )
+            self._configured = True
@@ -0,0 +1,30 @@
+"""
+Selection of the configured object storage backend
+"""
+import threading
+from typing import Dict, Optional
+from app.core.config import settings
+from .base import ObjectStorage
+from .cloudinary_storage import CloudinaryStorage
+from .local_storage import LocalStorage
+
+_backends: Dict[str, ObjectStorage] = {}
+_lock = threading.Lock()
+
+
+def get_object_storage(name: Optional[str] = None) -> ObjectStorage:
+    """
+    Get the storage backend called `name`, or the one selected by
+    STORAGE_BACKEND. Backends are created once and shared.
+    """
+    name = name or settings.STORAGE_BACKEND
+    with _lock:
+        if name not in _backends:
+            if name == "cloudinary":
+                _backends[name] = CloudinaryStorage()
+            elif name == "local":
+                _backends[name] = LocalStorage(
+                    settings.LOCAL_STORAGE_ROOT, settings.LOCAL_STORAGE_BASE_URL)
+            else:
+                raise ValueError(f"Unknown storage backend: {name}")
+        return _backends[name]
@@ -0,0 +1,57 @@
+"""
+Local filesystem object storage backend
+"""
+import os
+import shutil
+import asyncio
+import pathlib
+from typing import Optional
+from .base import ObjectStorage, StorageSource, StoredObject
+
+
+class LocalStorage(ObjectStorage):
+    """
+    Files stored under a root directory, for on-prem deployments and tests.
+
+    Keys map to paths below `root`; keys that would escape it are rejected.
+    URLs are built from `base_url` when one is configured, otherwise they are
+    file:// URIs.
+    """
+
+    name = "local"
+
+    def __init__(self, root: str, base_url: Optional[str] = None):
+        self.root = pathlib.Path(root).resolve()
+        self.base_url = base_url.rstrip("/") if base_url else None
+
+    async def put(self, key: str, source: StorageSource) -> StoredObject:
+        path = self._path(key)
+        await asyncio.to_thread(self._write, path, source)
+        url = f"{self.base_url}/{key}" if self.base_url else path.as_uri()
+        return StoredObject(key, url)
+
+    async def get(self, key: str) -> bytes:
+        return await asyncio.to_thread(self._path(key).read_bytes)
+
+    async def delete(self, key: str) -> None:
+        try:
+            await asyncio.to_thread(os.unlink, self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _path(self, key: str) -> pathlib.Path:
+        path = (self.root / key).resolve()
+        if self.root not in path.parents:
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    @staticmethod
+    def _write(path: pathlib.Path, source: StorageSource) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write next to the target and rename, so readers never see a partial file
+        partial = path.with_name(path.name + ".partial")
+        if isinstance(source, str):
+            shutil.copyfile(source, partial)
+        else:
+            partial.write_bytes(source)
+        os.replace(partial, path)
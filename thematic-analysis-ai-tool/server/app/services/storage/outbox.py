@@ -0,0 +1,152 @@
+"""
+Outbox for deleting stored files after their documents are removed
+"""
+import datetime
+import threading
+from typing import List, Optional
+from sqlalchemy.orm import Session, sessionmaker
+from app.core.config import settings
+from app.models.document import Document
+from app.models.storage_deletion import StorageDeletion
+from .factory import get_object_storage
+from .runner import run_storage
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class StorageDeletionOutbox:
+    """
+    Deletes stored files in the background.
+
+    `enqueue` adds a row in the caller's transaction, so a document and its
+    pending file deletion are committed together and the request never waits
+    on the storage API. A drainer thread deletes the objects, retrying with
+    backoff. Right before deleting it re-checks that no document references
+    the key, because an identical upload may have reused the object in the
+    meantime. Fresh uploads get a key of their own, but an upload reusing an
+    existing object only references it once its document commits, so rows
+    wait `grace_seconds` before they are due. Deletes are idempotent, so two
+    processes draining the same row is harmless. With `workers=0` no thread
+    is started and rows are only processed by explicit drain_once() calls.
+    """
+
+    def __init__(
+        self,
+        poll_seconds: float,
+        max_attempts: int,
+        batch_size: int = 50,
+        workers: int = 1,
+        grace_seconds: float = 0.0
+    ):
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self.grace_seconds = grace_seconds
+        self.batch_size = batch_size
+        self.workers = workers
+
+        self._bind = None
+        self._session_factory: Optional[sessionmaker] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+
+    def enqueue(self, db: Session, object_key: str, backend: Optional[str]) -> None:
+        """Schedule `object_key` for deletion; committed with the caller's transaction"""
+        db.add(StorageDeletion(
+            object_key=object_key, backend=backend or "cloudinary",
+            available_at=_utcnow() + datetime.timedelta(seconds=self.grace_seconds)))
+
+    def notify(self, db: Session) -> None:
+        """Wake the drainer after the caller's commit"""
+        self.start(db.get_bind())
+        with self._wakeup:
+            self._wakeup.notify()
+
+    def drain_once(self) -> int:
+        """Process the deletions that are due; returns how many rows were handled"""
+        factory = self._session_factory
+        if factory is None:
+            return 0
+        with factory() as db:
+            rows: List[StorageDeletion] = db.query(StorageDeletion).filter(
+                StorageDeletion.available_at <= _utcnow()
+            ).order_by(StorageDeletion.id).limit(self.batch_size).all()
+            for row in rows:
+                self._delete(db, row)
+            return len(rows)
+
+    def start(self, bind) -> None:
+        """Start the drainer thread against `bind` if it is not running"""
+        with self._lock:
+            if self._bind is not bind:
+                self._bind = bind
+                self._session_factory = sessionmaker(
+                    autocommit=False, autoflush=False, bind=bind)
+            if self.workers <= 0 or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._stop = threading.Event()
+            self._thread = threading.Thread(
+                target=self._drain_forever, args=(self._stop,),
+                name="storage-outbox", daemon=True)
+            self._thread.start()
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        with self._lock:
+            self._stop.set()
+            thread, self._thread = self._thread, None
+        with self._wakeup:
+            self._wakeup.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+
+    def _drain_forever(self, stop: threading.Event) -> None:
+        while not stop.is_set():
+            try:
+                handled = self.drain_once()
+            except Exception as e:
+                print(f"Storage outbox error: {e}")
+                handled = 0
+            if handled < self.batch_size:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_seconds)
+
+    def _delete(self, db: Session, row: StorageDeletion) -> None:
+        still_used = db.query(Document.id).filter(
+            Document.cloudinary_public_id == row.object_key
+        ).first() is not None
+        if still_used:
+            db.delete(row)
+            db.commit()
+            return
+
+        try:
+            run_storage(get_object_storage(str(row.backend)).delete(str(row.object_key)))
+        except Exception as e:
+            row.attempts += 1  # type: ignore
+            row.last_error = f"{type(e).__name__}: {e}"  # type: ignore
+            if row.attempts >= self.max_attempts:  # type: ignore
+                print(f"Giving up deleting stored file {row.object_key}: {e}")
+                db.delete(row)
+            else:
+                delay = self.poll_seconds * 2 ** int(row.attempts)
+                row.available_at = _utcnow() + datetime.timedelta(seconds=delay)  # type: ignore
+                print(f"Failed to delete stored file {row.object_key}, retrying in {delay:.0f}s: {e}")
+        else:
+            db.delete(row)
+        db.commit()
+
+
+# Global instance
+_storage_outbox = StorageDeletionOutbox(
+    poll_seconds=settings.STORAGE_OUTBOX_POLL_SECONDS,
+    max_attempts=settings.STORAGE_OUTBOX_MAX_ATTEMPTS,
+    grace_seconds=settings.STORAGE_OUTBOX_GRACE_SECONDS
+)
+
+
+def get_storage_outbox() -> StorageDeletionOutbox:
+    """Get the global storage deletion outbox."""
+    return _storage_outbox
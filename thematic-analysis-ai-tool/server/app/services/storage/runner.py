@@ -0,0 +1,47 @@
+"""
+Bridge for calling the async storage API from synchronous code
+"""
+import asyncio
+import threading
+from typing import Any, Coroutine, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class StorageLoop:
+    """
+    One long-lived event loop on a daemon thread.
+
+    Upload processing runs in worker threads (asyncio.to_thread, the ingestion
+    queue, the delete outbox), which have no loop of their own. Running every
+    storage call on the same loop, instead of asyncio.run() per call, keeps
+    backend clients bound to one loop for the life of the process.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    def run(self, coro: Coroutine[Any, Any, T], timeout: Optional[float] = None) -> T:
+        """Run `coro` on the storage loop and wait for its result"""
+        future = asyncio.run_coroutine_threadsafe(coro, self._get_loop())
+        return future.result(timeout)
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever, name="storage-loop", daemon=True)
+                thread.start()
+                self._loop = loop
+            return self._loop
+
+
+# Global instance
+_storage_loop = StorageLoop()
+
+
+def run_storage(coro: Coroutine[Any, Any, T], timeout: Optional[float] = None) -> T:
+    """Run a storage coroutine from synchronous code."""
+    return _storage_loop.run(coro, timeout)
@@ -1,9 +1,42 @@
+import functools
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-def create_chunks(text: str, chunk_size: int = 2500, chunk_overlap: int = 150) -> list[str]:
+
+@functools.lru_cache(maxsize=16)
+def _splitter(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+    # The splitter holds no per-text state, so one per chunk size and overlap serves every call
     return RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap,
         separators=["\n\n", "\n", ".", " "],
-        
-    ).split_text(text)
\ No newline at end of file
+    )
+
+
+def create_chunks(text: str, chunk_size: int = 2500, chunk_overlap: int = 150) -> list[str]:
+    return _splitter(chunk_size, chunk_overlap).split_text(text)
+
+
+def chunk_starts(text: str, chunks: list[str]) -> list[int]:
+    """
+    Offset of each chunk of `create_chunks(text)` in `text`. Chunks are
+    stripped substrings in order, overlapping by up to chunk_overlap, so each
+    one is searched from just after the previous one's start.
+    """
+    starts = []
+    cursor = 0
+    for chunk in chunks:
+        start = text.find(chunk, cursor)
+        if start < 0:
+            start = text.find(chunk)
+        if start < 0:
+            # Not a verbatim substring (should not happen); the previous position is the best guess
+            start = cursor
+        starts.append(start)
+        cursor = start + 1
+    return starts
+
+
+def chunk_spans(text: str, chunk_size: int = 2500, chunk_overlap: int = 150) -> list[tuple[int, int]]:
+    """(start, end) of each chunk of `create_chunks(text)`, so text[start:end] is the chunk"""
+    chunks = create_chunks(text, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return [(start, start + len(chunk)) for chunk, start in zip(chunks, chunk_starts(text, chunks))]
@@ -3,11 +3,13 @@ from app.core.config import settings
 def get_llm_provider_api_key(provider: str) -> str:
     if(provider == "google_genai"):
         return settings.GOOGLE_API_KEY
-    # elif(provider == "openai"):
-    #     return settings.OPENAI_API_KEY
-    # elif(provider == "anthropic"):
-    #     return settings.ANTHROPIC_API_KEY
-    # elif(provider == "groq"):
-    #     return settings.GROQ_API_KEY
+    elif(provider == "local_fake"):
+        # Offline fake model (app/services/ai/fake_llm.py), no key needed
+        return ""
+    elif(provider in ("openai", "anthropic", "groq")):
+        api_key = getattr(settings, f"{provider.upper()}_API_KEY")
+        if not api_key:
+            raise ValueError(f"{provider.upper()}_API_KEY is not set")
+        return api_key
     else:
-        raise ValueError(f"Unsupported LLM provider: {provider}. Supported providers are: google_genai, openai, anthropic, groq.")
\ No newline at end of file
+        raise ValueError(f"Unsupported LLM provider: {provider}. Supported providers are: google_genai, local_fake, openai, anthropic, groq.")
\ No newline at end of file
@@ -1,180 +1,319 @@
+import re
 import time
+import random
+import asyncio
 import threading
-from typing import Dict, Any
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Any, List, Optional
 import logging
-import uuid
-
-logger = logging.getLogger(__name__)
 
+from app.core.config import settings
 
-class SimpleRateLimiter:
-    """Simplified rate limiter with exponential backoff for LLM API calls."""
+logger = logging.getLogger(__name__)
 
-    def __init__(self):
-        self._locks: Dict[str, threading.Lock] = {}
+_RETRY_HINT = re.compile(
+    r"retry[ _-]?(?:after|in|delay)\W{0,20}(?:seconds\W{0,5})?(\d+(?:\.\d+)?)\s*(ms)?", re.IGNORECASE)
+_RATE_LIMIT_PHRASES = [
+    'rate limit', 'ratelimit', 'too many requests', 'resource exhausted',
+    'resource_exhausted', 'quota', '429'
+]
+_RETRYABLE_STATUS_CODES = {'429', '503'}
+
+
+class RateLimitExceeded(Exception):
+    """A call was still rate limited after the limiter's last attempt"""
+
+
+class TokenBucket:
+    """
+    Refills `per_minute` units a minute, holding at most a minute's worth.
+
+    `reserve` takes its units straight away and returns how long the caller
+    must wait before using them, so the level can go negative and later
+    callers queue behind earlier ones. It never sleeps itself; the caller
+    chooses time.sleep or asyncio.sleep.
+    """
+
+    def __init__(self, per_minute: float, now: float):
+        self.capacity = float(per_minute)
+        self.rate = float(per_minute) / 60.0
+        self.level = self.capacity
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take `amount` units; seconds until they are actually available"""
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        # A request larger than the whole bucket waits for a full bucket, not forever
+        self.level -= min(amount, self.capacity)
+        return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def available(self, now: float) -> float:
+        return min(self.capacity, self.level + (now - self.updated) * self.rate)
+
+
+class RateLimiter:
+    """
+    Proactive rate limiter for LLM API calls.
+
+    Each call reserves one request and its estimated tokens from the
+    requests-per-minute and tokens-per-minute buckets configured for its
+    provider and for its provider:model pair (settings.AI_RATE_LIMITS), then
+    waits only as long as those buckets need to refill. Calls therefore run
+    at the configured quota rather than hitting it and stalling.
+
+    A rate limit error that still gets through pauses the provider for the
+    Retry-After the API asked for, or retries that one call after a
+    jittered exponential delay when no hint is given. Other errors are
+    raised straight away.
+
+    A short pause is only waited out. The provider's quota counts as
+    exhausted when a call ran out of attempts, or when the API asked for a
+    pause longer than max_delay (a daily or hourly quota), until then or
+    until a call succeeds again.
+    """
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, Dict[str, int]]] = None,
+        max_attempts: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.limits = dict(limits or {})
+        self._max_attempts = max_attempts
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._paused_until: Dict[str, float] = {}
         self._provider_status: Dict[str, Dict[str, Any]] = {}
 
-        # Exponential backoff settings
-        self._base_delay = 5.0
-        self._max_delay = 120.0
-        self._reset_after = 300.0  # Reset status after 5 minutes of success
-        self._max_attempts = 15  # Max attempts per individual operation
-
-    def _get_lock(self, provider: str) -> threading.Lock:
-        """Get or create a lock for the given provider."""
-        if provider not in self._locks:
-            self._locks[provider] = threading.Lock()
-        return self._locks[provider]
-
-    def _calculate_delay(self, attempt_count: int) -> float:
-        """Calculate exponential backoff delay for a specific attempt count."""
-        if attempt_count <= 0:
-            return 0.0
-
-        delay = self._base_delay * (2 ** (attempt_count - 1))
-        return min(delay, self._max_delay)
-
-    def _should_reset_provider_status(self, provider: str) -> bool:
-        """Check if we should reset the provider status."""
-        if provider not in self._provider_status:
-            return True
+    def reserve(self, provider: str, model: Optional[str] = None, tokens: int = 0) -> float:
+        """Reserve one call of `tokens` tokens; seconds to wait before making it"""
+        with self._lock:
+            now = self._clock()
+            wait = max(self._paused_until.get(provider, 0.0) - now, 0.0)
+            for key in self._limit_keys(provider, model):
+                limit = self.limits[key]
+                if limit.get("rpm"):
+                    wait = max(wait, self._bucket(f"{key}|rpm", limit["rpm"], now).reserve(1, now))
+                if limit.get("tpm") and tokens:
+                    wait = max(wait, self._bucket(f"{key}|tpm", limit["tpm"], now).reserve(tokens, now))
+            return wait
+
+    def delay(self, provider: str, model: Optional[str] = None) -> float:
+        """Seconds before a call to `provider` could start, without reserving anything"""
+        with self._lock:
+            now = self._clock()
+            wait = max(self._paused_until.get(provider, 0.0) - now, 0.0)
+            for key in self._limit_keys(provider, model):
+                bucket = self._buckets.get(f"{key}|rpm")
+                if self.limits[key].get("rpm") and bucket is not None:
+                    wait = max(wait, (1 - bucket.available(now)) / bucket.rate)
+            return wait
+
+    def call_with_backoff(self, provider: str, func, *args, model: Optional[str] = None, tokens: int = 0, **kwargs):
+        """Call a function once its budget allows, retrying rate limit errors"""
+        for attempt in range(1, self._max_attempts + 1):
+            wait = self.reserve(provider, model, tokens)
+            if wait > 0:
+                time.sleep(wait)
 
-        status = self._provider_status[provider]
-        last_error = status.get('last_error_time', 0)
-        return time.time() - last_error > self._reset_after
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                time.sleep(self._record_failure(provider, attempt, e))
+                continue
 
-    def _is_rate_limit_error(self, error_msg: str, exception: Exception) -> bool:
-        """Check if an error is a rate limit/quota error."""
-        rate_limit_keywords = [
-            'quota', 'exceeded', 'limit', 'rate', 'too many requests',
-            'billing', '429', 'retry', 'backoff'
-        ]
+            self._record_success(provider)
+            return result
 
-        # Check error message
-        if any(keyword in error_msg for keyword in rate_limit_keywords):
-            return True
+        # Should never reach here, but just in case
+        raise RateLimitExceeded(
+            f"Max attempts ({self._max_attempts}) exceeded for {provider} operation")
 
-        # Check HTTP status codes
-        try:
-            if hasattr(exception, 'status_code') and str(getattr(exception, 'status_code', '')) in ['429', '402', '403', '503']:
-                return True
-        except:
-            pass
+    async def acall_with_backoff(self, provider: str, func, *args, model: Optional[str] = None, tokens: int = 0, **kwargs):
+        """
+        Async counterpart of call_with_backoff for coroutine functions. Waits
+        with asyncio.sleep, so waiting for budget does not hold a thread.
+        """
+        for attempt in range(1, self._max_attempts + 1):
+            wait = self.reserve(provider, model, tokens)
+            if wait > 0:
+                await asyncio.sleep(wait)
 
-        return False
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                await asyncio.sleep(self._record_failure(provider, attempt, e))
+                continue
 
-    def call_with_backoff(self, provider: str, func, *args, **kwargs):
-        """Call a function with exponential backoff - attempts are per-operation, not global."""
-        lock = self._get_lock(provider)
+            self._record_success(provider)
+            return result
 
-        # Reset provider status if it's been successful for a while
-        with lock:
-            if self._should_reset_provider_status(provider):
-                self._provider_status[provider] = {
-                    'last_error_time': 0,
-                    'current_delay': 0
-                }
+        raise RateLimitExceeded(
+            f"Max attempts ({self._max_attempts}) exceeded for {provider} operation")
 
-        # Each operation gets its own attempt counter
-        operation_attempts = 0
+    def _limit_keys(self, provider: str, model: Optional[str]) -> List[str]:
+        keys = [provider] if provider in self.limits else []
+        if model and f"{provider}:{model}" in self.limits:
+            keys.append(f"{provider}:{model}")
+        return keys
+
+    def _bucket(self, name: str, per_minute: int, now: float) -> TokenBucket:
+        bucket = self._buckets.get(name)
+        if bucket is None or bucket.capacity != per_minute:
+            bucket = self._buckets[name] = TokenBucket(per_minute, now)
+        return bucket
+
+    def _record_success(self, provider: str) -> None:
+        with self._lock:
+            status = self._provider_status.get(provider)
+            if status:
+                status['consecutive_errors'] = 0
+                status['exhausted'] = False
+                status['exhausted_until'] = 0.0
+
+    def _record_failure(self, provider: str, attempt: int, e: Exception) -> float:
+        """
+        Seconds to wait before retrying `e`. Re-raises errors that are not
+        rate limits, and gives up after the last attempt.
+        """
+        # Non-rate-limit error, don't retry
+        if not self._is_rate_limit_error(e):
+            raise e
+
+        retry_after = self._retry_after(e)
+        with self._lock:
+            now = self._clock()
+            status = self._provider_status.setdefault(provider, {'consecutive_errors': 0})
+            status['consecutive_errors'] += 1
+            status['last_error_time'] = time.time()
+            if retry_after is not None and retry_after > self._max_delay:
+                # Longer than we would ever wait for one call: a long-window quota ran out
+                status['exhausted_until'] = max(status.get('exhausted_until', 0.0), now + retry_after)
+            if attempt >= self._max_attempts:
+                status['exhausted'] = True
+            if retry_after is not None:
+                # The API said when it will take requests again: hold every
+                # caller of this provider until then, staggered a little
+                pause = min(retry_after, self._max_delay) * random.uniform(1.0, 1.1)
+                self._paused_until[provider] = max(self._paused_until.get(provider, 0.0), now + pause)
+                delay = 0.0
+            else:
+                # Full jitter keeps retries from many callers from lining up
+                delay = random.uniform(0, min(self._max_delay, self._base_delay * (2 ** (attempt - 1))))
+
+        print(
+            f"❌ Rate limit error for {provider} (operation attempt {attempt})")
+        print(f"   Retrying in {retry_after if retry_after is not None else delay:.1f}s: {str(e)[:100]}...")
+
+        if attempt >= self._max_attempts:
+            print(
+                f"❌ Max attempts ({self._max_attempts}) reached for this operation")
+            raise RateLimitExceeded(
+                f"Max attempts ({self._max_attempts}) exceeded for {provider} operation")
+        return delay
+
+    @staticmethod
+    def _is_rate_limit_error(exception: Exception) -> bool:
+        """Check if an error is a rate limit/quota error."""
+        for source in (exception, getattr(exception, 'response', None)):
+            for attr in ('status_code', 'status', 'code'):
+                if str(getattr(source, attr, '')) in _RETRYABLE_STATUS_CODES:
+                    return True
 
-        for attempt in range(1, self._max_attempts + 1):
-            operation_attempts = attempt
+        if any(name in type(exception).__name__ for name in ('RateLimit', 'ResourceExhausted', 'TooManyRequests')):
+            return True
 
-            # Check if we should apply a delay from previous provider errors
-            with lock:
-                provider_data = self._provider_status.get(provider, {})
-                current_delay = provider_data.get('current_delay', 0)
+        error_msg = str(exception).lower()
+        return any(phrase in error_msg for phrase in _RATE_LIMIT_PHRASES)
 
-            # Wait outside the lock if needed
-            if current_delay > 0:
-                print(
-                    f"⏳ Waiting {current_delay:.1f}s before retry for {provider} (operation attempt {attempt})...")
-                time.sleep(current_delay)
+    @staticmethod
+    def _retry_after(exception: Exception) -> Optional[float]:
+        """Seconds the API asked us to wait, from the exception, its response headers or its message"""
+        value = getattr(exception, 'retry_after', None)
+        if isinstance(value, (int, float)):
+            return max(float(value), 0.0)
 
+        headers = getattr(getattr(exception, 'response', None), 'headers', None)
+        if headers is not None:
             try:
-                result = func(*args, **kwargs)
-
-                # Success - reset provider status
-                with lock:
-                    self._provider_status[provider] = {
-                        'last_error_time': 0,
-                        'current_delay': 0
-                    }
-
-                return result
-
-            except Exception as e:
-                error_msg = str(e).lower()
-
-                # Check if this is a rate limit / quota error
-                if self._is_rate_limit_error(error_msg, e):
-                    # Calculate delay for this specific attempt
-                    delay = self._calculate_delay(operation_attempts)
-
-                    with lock:
-                        self._provider_status[provider] = {
-                            'last_error_time': time.time(),
-                            'current_delay': delay
-                        }
-
-                    print(
-                        f"❌ Rate limit error for {provider} (operation attempt {operation_attempts})")
-                    print(f"   Next retry in {delay:.1f}s: {str(e)[:100]}...")
-
-                    if attempt >= self._max_attempts:
-                        print(
-                            f"❌ Max attempts ({self._max_attempts}) reached for this operation")
-                        raise Exception(
-                            f"Max attempts ({self._max_attempts}) exceeded for {provider} operation")
-
-                    # Continue to next attempt
-                    continue
-                else:
-                    # Non-rate-limit error, don't retry
-                    raise e
-
-        # Should never reach here, but just in case
-        raise Exception(
-            f"Max attempts ({self._max_attempts}) exceeded for {provider} operation")
+                if headers.get('retry-after-ms') is not None:
+                    return max(float(headers.get('retry-after-ms')) / 1000.0, 0.0)
+                header = headers.get('retry-after')
+                if header is not None:
+                    try:
+                        return max(float(header), 0.0)
+                    except ValueError:
+                        return max(parsedate_to_datetime(header).timestamp() - time.time(), 0.0)
+            except (TypeError, ValueError, AttributeError):
+                pass
+
+        match = _RETRY_HINT.search(str(exception))
+        if match:
+            seconds = float(match.group(1))
+            return seconds / 1000.0 if match.group(2) else seconds
+        return None
 
     def get_status(self, provider: str) -> Dict[str, Any]:
         """Get the current status of the rate limiter for a provider."""
-        lock = self._get_lock(provider)
-
-        with lock:
-            provider_data = self._provider_status.get(provider, {})
-            last_error = provider_data.get('last_error_time', 0)
-            current_delay = provider_data.get('current_delay', 0)
-
-            # Consider provider healthy if no recent errors
-            is_healthy = last_error == 0 or (
-                time.time() - last_error) > self._reset_after
-
-            return {
-                "provider": provider,
-                # Simplified: 0 = healthy, 1 = backing off
-                "attempt_count": 0 if is_healthy else 1,
-                "next_delay_seconds": current_delay,
-                "last_error_time": last_error if last_error > 0 else None,
-                "status": "healthy" if is_healthy else "backing_off"
-            }
+        with self._lock:
+            now = self._clock()
+            pause = max(self._paused_until.get(provider, 0.0) - now, 0.0)
+            status = self._provider_status.get(provider, {})
+            consecutive_errors = status.get('consecutive_errors', 0)
+            exhausted = status.get('exhausted', False) or status.get('exhausted_until', 0.0) > now
+            # Budget left in each of the provider's buckets, e.g. {"google_genai rpm": 12.5}
+            available = {}
+            for name, bucket in self._buckets.items():
+                key, kind = name.split('|', 1)
+                if key == provider or key.startswith(f"{provider}:"):
+                    available[f"{key} {kind}"] = round(bucket.available(now), 2)
+
+        is_healthy = pause == 0 and consecutive_errors == 0
+        return {
+            "provider": provider,
+            "attempt_count": consecutive_errors,
+            "next_delay_seconds": round(pause, 3),
+            "last_error_time": status.get('last_error_time'),
+            "quota_exhausted": exhausted,
+            "available": available,
+            "status": "healthy" if is_healthy else "backing_off"
+        }
 
 
 # Global instance
-_rate_limiter = SimpleRateLimiter()
+_rate_limiter = RateLimiter(
+    limits=settings.AI_RATE_LIMITS,
+    max_attempts=settings.AI_RATE_LIMIT_MAX_ATTEMPTS,
+    base_delay=settings.AI_RATE_LIMIT_BASE_DELAY_SECONDS,
+    max_delay=settings.AI_RATE_LIMIT_MAX_DELAY_SECONDS
+)
 
 
-def get_rate_limiter() -> SimpleRateLimiter:
+def get_rate_limiter() -> RateLimiter:
     """Get the global rate limiter instance."""
     return _rate_limiter
 
 
-def with_exponential_backoff(provider: str):
-    """Decorator to add exponential backoff to a function."""
+def with_exponential_backoff(provider: str, model: Optional[str] = None, tokens: int = 0):
+    """Decorator to rate limit a function and retry its rate limit errors."""
     def decorator(func):
         def wrapper(*args, **kwargs):
-            return _rate_limiter.call_with_backoff(provider, func, *args, **kwargs)
+            return _rate_limiter.call_with_backoff(provider, func, *args, model=model, tokens=tokens, **kwargs)
+        return wrapper
+    return decorator
+
+
+def with_async_exponential_backoff(provider: str, model: Optional[str] = None, tokens: int = 0):
+    """Decorator to rate limit a coroutine function and retry its rate limit errors."""
+    def decorator(func):
+        async def wrapper(*args, **kwargs):
+            return await _rate_limiter.acall_with_backoff(provider, func, *args, model=model, tokens=tokens, **kwargs)
         return wrapper
     return decorator
 
@@ -185,7 +324,7 @@ def get_quota_status(provider: str) -> Dict[str, Any]:
 
     return {
         "provider": provider,
-        "quota_exhausted": status["attempt_count"] > 0,
+        "quota_exhausted": status["quota_exhausted"],
         "quota_wait_time": status["next_delay_seconds"],
         "attempt_count": status["attempt_count"],
         "status": status["status"]
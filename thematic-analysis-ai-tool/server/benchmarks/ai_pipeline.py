@@ -0,0 +1,160 @@
+"""
+End-to-end timings of AI initial coding against the offline local_fake provider.
+
+Runs `AICodingService.generate_code` over synthetic transcripts stored in an
+in-memory SQLite database, so the numbers are our own overhead (chunking,
+merging, refinement and grouping bookkeeping, database writes and building
+the response, which count as saving) plus whatever provider latency is
+configured. Usage, from the server folder::
+
+    python -m benchmarks.ai_pipeline [--documents 20] [--lines 400] [--latency 0.05]
+        [--error-rate 0.02] [--rate-limit-rate 0.05] [--concurrency 8]
+
+Prints the time spent in each pipeline stage, the number of provider calls
+and how many chunks failed. Exits non-zero when a run raised.
+"""
+import io
+import os
+import sys
+import time
+import argparse
+import contextlib
+
+from benchmarks.common import configure_environment, print_table
+from benchmarks import corpus
+
+configure_environment()
+
+STAGES = ("coding", "refinement", "grouping", "saving")
+
+
+def make_database(document_count: int, line_count: int):
+    """In-memory database holding a user, a project and `document_count` transcripts"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from app.db.session import Base
+    from app.models.user import User
+    from app.models.project import Project
+    from app.models.document import Document, DocumentType
+
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False},
+                           poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+    user = User(email="benchmark@example.com", hashed_password="benchmark")
+    db.add(user)
+    db.flush()
+    project = Project(title="Benchmark", owner_id=user.id)
+    db.add(project)
+    db.flush()
+    documents = [
+        Document(name=f"interview-{index + 1}.txt", document_type=DocumentType.TEXT,
+                 content=corpus.make_text(line_count, seed=index + 1).decode("utf-8"),
+                 project_id=project.id, uploaded_by_id=user.id)
+        for index in range(document_count)
+    ]
+    db.add_all(documents)
+    db.commit()
+    return db, user.id, [document.id for document in documents]
+
+
+def run_pipeline(document_count: int, line_count: int, use_cache: bool, verbose: bool) -> dict:
+    """One pipeline run on a fresh database; stage timings in seconds and counts"""
+    from app.services.ai.ai_coding_service import AICodingService
+    from app.services.ai.llm_service import LLMService
+
+    db, user_id, document_ids = make_database(document_count, line_count)
+    LLMService.clear_registry()
+    # Loading documents before the coding stage is announced counts as coding
+    marks = [("coding", time.perf_counter())]
+    chunks = {"total": 0, "failed": 0}
+
+    def progress(event: str, data: dict) -> None:
+        if event == "stage":
+            marks.append((data["stage"], time.perf_counter()))
+            chunks["total"] = data.get("chunks_total", chunks["total"])
+        elif event == "chunk_done" and data.get("error"):
+            chunks["failed"] += 1
+
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    try:
+        with output:
+            response = AICodingService.generate_code(
+                document_ids, db, user_id, model_name="fake", provider="local_fake",
+                use_cache=use_cache, progress=progress)
+        marks.append(("done", time.perf_counter()))
+    finally:
+        db.close()
+
+    timings = {stage: 0.0 for stage in STAGES}
+    for (stage, started), (_, ended) in zip(marks, marks[1:]):
+        timings[stage] += ended - started
+    timings["total"] = marks[-1][1] - marks[0][1]
+    model = LLMService.get(model_name="fake", provider="local_fake").llm
+    return {
+        "timings": timings,
+        "calls": model.calls,
+        "chunks": chunks["total"],
+        "failed": chunks["failed"],
+        "codes": response.get("summary", {}).get("total_codes", 0),
+        "assignments": len(response.get("results", [])),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--documents", type=int, default=20, help="synthetic transcripts per run")
+    parser.add_argument("--lines", type=int, default=400, help="lines per transcript")
+    parser.add_argument("--repeat", type=int, default=3, help="runs; the table shows each")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per provider call")
+    parser.add_argument("--jitter", type=float, default=0.02, help="+/- seconds of latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls failing with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of calls answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=0.2, help="Retry-After of injected 429s")
+    parser.add_argument("--concurrency", type=int, default=8, help="provider calls in flight at once")
+    parser.add_argument("--cache", action="store_true", help="use the LLM response cache")
+    parser.add_argument("--verbose", action="store_true", help="show the pipeline's own log")
+    args = parser.parse_args()
+
+    # Read when the chunk executor is created, so set before the app is imported
+    os.environ["AI_PROVIDER_MAX_CONCURRENT_REQUESTS"] = f'{{"local_fake": {args.concurrency}}}'
+    from app.core.config import settings
+
+    settings.LOCAL_FAKE_LATENCY_SECONDS = args.latency
+    settings.LOCAL_FAKE_LATENCY_JITTER = args.jitter
+    settings.LOCAL_FAKE_ERROR_RATE = args.error_rate
+    settings.LOCAL_FAKE_RATE_LIMIT_RATE = args.rate_limit_rate
+    settings.LOCAL_FAKE_RETRY_AFTER_SECONDS = args.retry_after
+
+    table = []
+    failed = False
+    for run in range(1, args.repeat + 1):
+        settings.LOCAL_FAKE_SEED = run
+        try:
+            result = run_pipeline(args.documents, args.lines, args.cache, args.verbose)
+        except Exception as e:
+            print(f"run {run} failed: {e!r}")
+            failed = True
+            continue
+        timings = result["timings"]
+        table.append(
+            [run]
+            + [f"{timings[stage]:.3f}" for stage in STAGES + ("total",)]
+            + [result["calls"], f"{result['failed']}/{result['chunks']}", result["codes"], result["assignments"]]
+        )
+
+    print(f"{args.documents} documents x {args.lines} lines, latency {args.latency}s "
+          f"+/- {args.jitter}s, errors {args.error_rate:.0%}, 429s {args.rate_limit_rate:.0%}, "
+          f"concurrency {args.concurrency}")
+    print_table(
+        ["run"] + [f"{stage} s" for stage in STAGES + ("total",)]
+        + ["calls", "failed chunks", "codes", "assignments"],
+        table,
+    )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Deterministic synthetic upload corpus for the benchmark scripts
+"""
+import io
+import random
+
+_WORDS = (
+    "participant interview health care doctor family support access trust "
+    "anxious stressed communication waiting appointment cost insurance clinic "
+    "nurse experience system frustration relief community friend advice time "
+    "information medication treatment symptom concern listen heard overwhelmed"
+).split()
+
+
+def sentence(rng: random.Random, min_words: int = 6, max_words: int = 18) -> str:
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(min_words, max_words))]
+    return " ".join(words).capitalize() + "."
+
+
+def make_text(line_count: int, seed: int = 1) -> bytes:
+    """Transcript-style text, one utterance per line with occasional blank lines"""
+    rng = random.Random(seed)
+    lines = []
+    for i in range(line_count):
+        if i % 25 == 24:
+            lines.append("")
+        else:
+            speaker = "Interviewer" if i % 2 else "Participant"
+            lines.append(f"{speaker}: {sentence(rng)}")
+    return "\n".join(lines).encode("utf-8")
+
+
+def make_frame(row_count: int, column_count: int, seed: int = 1):
+    """Survey-style frame mixing free text, integers, floats and gaps"""
+    import pandas as pd
+
+    rng = random.Random(seed)
+    data = {}
+    for column in range(column_count):
+        kind = column % 4
+        name = f"q{column + 1}"
+        if kind == 0:
+            data[name] = [sentence(rng) for _ in range(row_count)]
+        elif kind == 1:
+            data[name] = [rng.randint(1, 5) for _ in range(row_count)]
+        elif kind == 2:
+            data[name] = [round(rng.random() * 100, 2) for _ in range(row_count)]
+        else:
+            data[name] = [sentence(rng, 2, 5) if rng.random() > 0.3 else None
+                          for _ in range(row_count)]
+    return pd.DataFrame(data)
+
+
+def make_csv(row_count: int, column_count: int = 8, seed: int = 1) -> bytes:
+    return make_frame(row_count, column_count, seed).to_csv(index=False).encode("utf-8")
+
+
+def make_xlsx(row_count: int, column_count: int = 8, seed: int = 1) -> bytes:
+    buffer = io.BytesIO()
+    make_frame(row_count, column_count, seed).to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+def make_docx(paragraph_count: int, seed: int = 1) -> bytes:
+    from docx import Document as DocxDocument
+
+    rng = random.Random(seed)
+    doc = DocxDocument()
+    for i in range(paragraph_count):
+        if i % 10 == 9:
+            doc.add_paragraph("")
+        else:
+            doc.add_paragraph(" ".join(sentence(rng) for _ in range(rng.randint(2, 6))))
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(page_count: int, lines_per_page: int = 40, seed: int = 1) -> bytes:
+    """A minimal text PDF written by hand, so no PDF authoring library is needed"""
+    rng = random.Random(seed)
+    page_ids = [4 + 2 * i for i in range(page_count)]
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        ("<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            " ".join(f"{pid} 0 R" for pid in page_ids), page_count)).encode("latin-1"),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for page_id in page_ids:
+        objects.append((
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            "/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (page_id + 1)
+        ).encode("latin-1"))
+        lines = " ".join(
+            f"({_pdf_escape(sentence(rng, 4, 10))}) Tj T*" for _ in range(lines_per_page))
+        stream = f"BT /F1 10 Tf 14 TL 40 770 Td {lines} ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_offset = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, xref_offset)
+    return bytes(output)
@@ -0,0 +1,99 @@
+"""
+Single-pass extraction vs. the legacy two-pass upload parsing.
+
+Builds a synthetic corpus (PDF, DOCX, CSV, XLSX, text), then runs each file
+through both paths in a fresh interpreter and reports wall time and the growth
+of peak RSS. Usage, from the server folder::
+
+    python -m benchmarks.document_extraction [--scale 1.0]
+"""
+import argparse
+import pathlib
+import tempfile
+
+from benchmarks.common import configure_environment, measure_in_subprocess, print_table
+from benchmarks import corpus
+
+configure_environment()
+
+
+def _load(path: str):
+    from app.models.document import DocumentType
+
+    file_path = pathlib.Path(path)
+    document_type = DocumentType(file_path.parent.name)
+    return file_path.read_bytes(), document_type, file_path.name
+
+
+def run_legacy(path: str) -> None:
+    from benchmarks.legacy_extraction import legacy_two_pass
+
+    legacy_two_pass(*_load(path))
+
+
+def run_single_pass(path: str) -> None:
+    from app.services.document.extraction import DocumentExtractionEngine
+
+    DocumentExtractionEngine.extract(*_load(path))
+
+
+def contents_match(path: str) -> bool:
+    from benchmarks.legacy_extraction import legacy_two_pass
+    from app.services.document.extraction import DocumentExtractionEngine
+
+    legacy_content, _, _ = legacy_two_pass(*_load(path))
+    return DocumentExtractionEngine.extract(*_load(path)).content == legacy_content
+
+
+def build_corpus(root: pathlib.Path, scale: float) -> list[pathlib.Path]:
+    def scaled(value: int) -> int:
+        return max(1, int(value * scale))
+
+    files = {
+        "pdf/interviews_300_pages.pdf": lambda: corpus.make_pdf(scaled(300)),
+        "docx/transcript.docx": lambda: corpus.make_docx(scaled(3000)),
+        "csv/survey_10k_rows.csv": lambda: corpus.make_csv(scaled(10000)),
+        "csv/survey_10k_rows.xlsx": lambda: corpus.make_xlsx(scaled(10000)),
+        "text/transcript_20k_lines.txt": lambda: corpus.make_text(scaled(20000)),
+    }
+    paths = []
+    for relative, build in files.items():
+        path = root / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(build())
+        paths.append(path)
+    return paths
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="multiply every corpus size by this factor")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = build_corpus(pathlib.Path(tmp), args.scale)
+        rows = []
+        for path in paths:
+            legacy_seconds, legacy_kb = measure_in_subprocess(run_legacy, str(path))
+            single_seconds, single_kb = measure_in_subprocess(run_single_pass, str(path))
+            rows.append([
+                path.name,
+                f"{path.stat().st_size / 1024:.0f}",
+                f"{legacy_seconds:.2f}",
+                f"{single_seconds:.2f}",
+                f"{legacy_seconds / max(single_seconds, 1e-9):.2f}x",
+                f"{legacy_kb / 1024:.1f}",
+                f"{single_kb / 1024:.1f}",
+                "yes" if contents_match(str(path)) else "no",
+            ])
+
+    print_table(
+        ["file", "KiB", "two-pass s", "single s", "speedup",
+         "two-pass +RSS MiB", "single +RSS MiB", "same content"],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Column-wise CSV/Excel row rendering vs. the legacy iterrows loop.
+
+Renders wide (many columns) and tall (many rows) survey frames with both
+paths, checks that the rendered content is identical and reports the best of
+three wall times. Usage, from the server folder::
+
+    python -m benchmarks.row_rendering [--scale 1.0]
+"""
+import argparse
+
+from benchmarks.common import configure_environment, time_call, print_table
+from benchmarks import corpus
+
+configure_environment()
+
+
+def legacy_render(df) -> str:
+    """The pre-vectorisation loop: one Series per row and a growing string"""
+    import pandas as pd
+
+    content = ""
+    for row_index, (_, row) in enumerate(df.iterrows()):
+        row_values = []
+        for col in df.columns:
+            if pd.notna(row[col]):
+                row_values.append(f"{col}: {row[col]}")
+        if row_values:
+            row_text = f"Row {row_index + 1}: " + " | ".join(row_values)
+            row.to_dict()
+            content += row_text + "\n"
+    return content
+
+
+def vectorised_render(df) -> str:
+    from app.services.document.extraction import DocumentExtractionEngine
+
+    segments = DocumentExtractionEngine._build_row_segments(df)
+    return "".join(segment["content"] + "\n" for segment in segments)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="multiply every frame size by this factor")
+    args = parser.parse_args()
+
+    def scaled(value: int) -> int:
+        return max(1, int(value * args.scale))
+
+    frames = {
+        "wide 2k x 200": (scaled(2_000), 200),
+        "tall 200k x 8": (scaled(200_000), 8),
+        "mixed numeric 100k x 3": (scaled(100_000), 3),
+    }
+    rows = []
+    for name, (row_count, column_count) in frames.items():
+        df = corpus.make_frame(row_count, column_count)
+        legacy_seconds = time_call(legacy_render, df)
+        vectorised_seconds = time_call(vectorised_render, df)
+        rows.append([
+            name,
+            f"{legacy_seconds:.2f}",
+            f"{vectorised_seconds:.2f}",
+            f"{legacy_seconds / max(vectorised_seconds, 1e-9):.2f}x",
+            "yes" if legacy_render(df) == vectorised_render(df) else "no",
+        ])
+
+    print_table(["frame", "iterrows s", "column-wise s", "speedup", "identical"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Scaling of segment offset computation over 10k, 100k and 1M lines.
+
+Times the running-offset line and row segmenters against the legacy
+`sum(len(l) + 1 for l in lines[:i])` formula and checks that the cost per line
+stays flat as the input grows. The legacy formula is quadratic, so it is only
+run up to --legacy-max lines. Usage, from the server folder::
+
+    python -m benchmarks.segmentation_scaling [--legacy-max 10000]
+
+Exits non-zero when the per-line cost at the largest size is more than
+--max-growth times the cost at the smallest.
+"""
+import sys
+import argparse
+
+from benchmarks.common import configure_environment, time_call, print_table
+from benchmarks import corpus
+
+configure_environment()
+
+SIZES = (10_000, 100_000, 1_000_000)
+
+
+def legacy_line_segments(text: str) -> list:
+    lines = text.split('\n')
+    segments = []
+    for i, line in enumerate(lines):
+        line_content = line.strip()
+        if line_content:
+            segments.append({
+                "type": "line",
+                "content": line_content,
+                "line_number": i + 1,
+                "character_start": sum(len(l) + 1 for l in lines[:i]),
+                "character_end": sum(len(l) + 1 for l in lines[:i]) + len(line)
+            })
+    return segments
+
+
+def legacy_row_segments(rows: list) -> list:
+    content_lines = [row_text for _, row_text, _ in rows]
+    segments = []
+    for row_index, row_text, additional_data in rows:
+        segments.append({
+            "type": "row",
+            "content": row_text,
+            "row_index": row_index,
+            "character_start": sum(len(line) + 2 for line in content_lines[:row_index]),
+            "character_end": sum(len(line) + 2 for line in content_lines[:row_index]) + len(row_text),
+            "additional_data": additional_data
+        })
+    return segments
+
+
+def make_rows(text: str) -> list:
+    return [(i, f"Row {i + 1}: answer: {line}", {}) for i, line in enumerate(text.split('\n'))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--legacy-max", type=int, default=10_000,
+                        help="largest size the quadratic legacy formula is timed at")
+    parser.add_argument("--max-growth", type=float, default=3.0,
+                        help="allowed growth of the per-line cost from 10k to 1M lines")
+    args = parser.parse_args()
+
+    from app.services.document.extraction import DocumentExtractionEngine
+
+    per_line = {"lines": [], "rows": []}
+    table = []
+    for size in SIZES:
+        text = corpus.make_text(size).decode("utf-8")
+        rows = make_rows(text)
+
+        line_seconds = time_call(DocumentExtractionEngine._segment_lines, text, repeat=3)
+        row_seconds = time_call(DocumentExtractionEngine._segment_rows, rows, repeat=3)
+        per_line["lines"].append(line_seconds / size)
+        per_line["rows"].append(row_seconds / size)
+
+        if size <= args.legacy_max:
+            legacy_seconds = time_call(legacy_line_segments, text, repeat=1)
+            legacy_rows_seconds = time_call(legacy_row_segments, rows, repeat=1)
+            assert legacy_line_segments(text) == DocumentExtractionEngine._segment_lines(text)
+            assert legacy_row_segments(rows) == DocumentExtractionEngine._segment_rows(rows)
+            legacy = f"{legacy_seconds:.3f} / {legacy_rows_seconds:.3f}"
+        else:
+            legacy = "skipped"
+
+        table.append([
+            f"{size:,}",
+            f"{line_seconds:.3f}",
+            f"{line_seconds / size * 1e9:.0f}",
+            f"{row_seconds:.3f}",
+            f"{row_seconds / size * 1e9:.0f}",
+            legacy,
+        ])
+
+    print_table(
+        ["lines", "lines s", "ns/line", "rows s", "ns/row", "legacy lines / rows s"],
+        table,
+    )
+
+    failed = False
+    for name, costs in per_line.items():
+        growth = costs[-1] / max(costs[0], 1e-12)
+        verdict = "linear" if growth <= args.max_growth else "NOT linear"
+        print(f"{name}: per-line cost x{growth:.2f} from {SIZES[0]:,} to {SIZES[-1]:,} -> {verdict}")
+        failed = failed or growth > args.max_growth
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
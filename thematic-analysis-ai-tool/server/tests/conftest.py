@@ -3,17 +3,21 @@
 Configuration and fixtures for pytest
 """
 import pytest
+from collections import defaultdict
 from fastapi.testclient import TestClient
+from langchain_core.runnables import RunnableLambda
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 from typing import Dict, Generator, Any
 
 from app.main import app
+from app.core.config import settings
 from app.db.session import get_db
 from app.core.security import create_access_token
 from app.db.session import Base
 from app.services.user_service import create_user, get_user_by_email
+from app.services.ai.llm_service import LLMService
 from app.schemas.user import UserCreate
 import random
 import string
@@ -30,6 +34,59 @@ TestingSessionLocal = sessionmaker(
     autocommit=False, autoflush=False, bind=engine)
 
 
+@pytest.fixture(autouse=True)
+def no_llm_cache(monkeypatch):
+    """Keep tests from reading or filling the developer's LLM response cache"""
+    monkeypatch.setattr(settings, "AI_LLM_CACHE_ENABLED", False)
+
+
+class RecordingLLMService:
+    """
+    An LLM service whose chains record every input they are called with, in
+    `calls[service_type]`. Chains answer from the offline local_fake provider
+    unless a response function is given for them.
+    """
+
+    def __init__(self, **responses):
+        self.base = LLMService.get(model_name="fake", provider="local_fake")
+        self.model_name = self.base.model_name
+        self.calls = defaultdict(list)
+        self._responses = responses
+
+    def __getattr__(self, attribute):
+        if not attribute.endswith("_llm") or attribute.startswith("_"):
+            raise AttributeError(attribute)
+        service_type = attribute[:-len("_llm")]
+        respond = self._responses.get(service_type)
+        chain = RunnableLambda(respond) if respond else getattr(self.base, attribute)
+
+        def invoke(input_data):
+            self.calls[service_type].append(input_data)
+            return chain.invoke(input_data)
+
+        async def ainvoke(input_data):
+            self.calls[service_type].append(input_data)
+            return await chain.ainvoke(input_data)
+
+        return RunnableLambda(invoke, afunc=ainvoke, name=attribute)
+
+
+@pytest.fixture
+def recording_llm_service():
+    """Build a RecordingLLMService; keyword arguments replace chains with response functions"""
+    return RecordingLLMService
+
+
+@pytest.fixture
+def topics() -> Dict[str, str]:
+    """Three interview topics, keyed by the first word of the codes about them"""
+    return {
+        "waiting": "long waiting times in the clinic queue",
+        "staff": "kind and helpful nursing staff",
+        "cost": "high cost of medicine and bills",
+    }
+
+
 def random_email():
     """Generate a random email for testing"""
     random_string = ''.join(random.choices(
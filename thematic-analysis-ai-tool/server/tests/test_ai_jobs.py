@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Tests for background AI jobs and their progress stream
+"""
+import json
+import time
+import datetime
+import pytest
+from types import SimpleNamespace
+
+from sqlalchemy.orm import sessionmaker
+
+from app.models.ai_job import AIJob, AIJobEvent
+from app.schemas.ai_services import CodeOutput, CodeRefinementOutput, MultipleCodesOutput
+from app.services.ai import ai_job_runner
+from app.services.ai.ai_code_generation import AICodeGenerationService, CodingPlan
+from app.services.ai.ai_coding_service import AICodingService
+from app.services.ai.ai_coding_utils import AICodingUtils
+from app.services.ai.ai_job_runner import AIJobRunner
+from app.services.ai.llm_service import LLMService
+from app.services.ai.pipeline_checkpoints import PipelineCheckpoints, PipelineIncomplete
+
+
+@pytest.fixture
+def runner(monkeypatch):
+    """A runner without worker threads, driven with process_next()"""
+    test_runner = AIJobRunner(workers=0, lease_seconds=600, poll_seconds=0.1)
+    monkeypatch.setattr(ai_job_runner, "_ai_job_runner", test_runner)
+    return test_runner
+
+
+def _fake_pipeline(document_ids, db, user_id, use_cache=True, progress=None, checkpoints=None, incremental=False):
+    progress("stage", {"stage": "coding", "chunks_total": 3})
+    for chunk in range(1, 4):
+        progress("chunk_done", {"document_id": document_ids[0], "chunk": chunk, "chunk_count": 3,
+                                "error": "timeout" if chunk == 2 else None})
+    progress("stage", {"stage": "refinement"})
+    progress("refinement_done", {"codes": 2})
+    progress("stage", {"stage": "grouping"})
+    progress("grouping_done", {"codes_grouped": 0, "skipped": True})
+    return {"results": [{"text": "waiting"}], "summary": {"total_codes": 2}}
+
+
+def _events(client, auth_headers, job_id, **headers):
+    response = client.get(f"/api/v1/ai/jobs/{job_id}/events", headers={**auth_headers, **headers})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n") if not line.startswith(":"))
+        events.append((int(fields["id"]), fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_job_runs_in_background_and_streams_progress(client, auth_headers, runner, db, monkeypatch):
+    monkeypatch.setattr(AICodingService, "generate_code", _fake_pipeline)
+
+    response = client.post("/api/v1/ai/jobs/initial-coding", json={"document_ids": [7]}, headers=auth_headers)
+    assert response.status_code == 202
+    job = response.json()
+    assert (job["status"], job["stage"]) == ("pending", "queued")
+    assert client.get(f"/api/v1/ai/jobs/{job['id']}/result", headers=auth_headers).status_code == 409
+
+    assert runner.process_next() is True
+    assert runner.process_next() is False
+    db.expire_all()  # the worker committed through its own session
+
+    status = client.get(f"/api/v1/ai/jobs/{job['id']}", headers=auth_headers).json()
+    assert (status["status"], status["stage"]) == ("completed", "done")
+    assert (status["chunks_total"], status["chunks_done"], status["chunks_failed"]) == (3, 3, 1)
+    result = client.get(f"/api/v1/ai/jobs/{job['id']}/result", headers=auth_headers).json()
+    assert result["summary"] == {"total_codes": 2}
+
+    events = _events(client, auth_headers, job["id"])
+    names = [name for _, name, _ in events]
+    assert names.count("chunk_done") == 3
+    assert names[-3:] == ["stage", "grouping_done", "completed"]
+    assert [event_id for event_id, _, _ in events] == sorted(event_id for event_id, _, _ in events)
+
+    # A reconnect resumes after the last event the client saw
+    refinement_id = next(event_id for event_id, name, _ in events if name == "refinement_done")
+    resumed = _events(client, auth_headers, job["id"], **{"Last-Event-ID": str(refinement_id)})
+    assert [name for _, name, _ in resumed] == ["stage", "grouping_done", "completed"]
+
+
+def test_failed_job_reports_its_error(client, auth_headers, runner, monkeypatch):
+    def broken_pipeline(**kwargs):
+        kwargs["progress"]("stage", {"stage": "coding", "chunks_total": 1})
+        raise ValueError("Codebook 3 not found")
+
+    monkeypatch.setattr(AICodingService, "deductive_coding", broken_pipeline)
+    job = client.post("/api/v1/ai/jobs/deductive-coding", json={"document_ids": [1], "codebook_ids": [3]},
+                      headers=auth_headers).json()
+    runner.process_next()
+
+    status = client.get(f"/api/v1/ai/jobs/{job['id']}", headers=auth_headers).json()
+    assert status["status"] == "failed"
+    assert "Codebook 3 not found" in status["error"]
+    # The error text says "not found", but it is the job's state that conflicts
+    assert client.get(f"/api/v1/ai/jobs/{job['id']}/result", headers=auth_headers).status_code == 409
+    assert _events(client, auth_headers, job["id"])[-1][1] == "failed"
+    assert client.get("/api/v1/ai/jobs/999", headers=auth_headers).status_code == 404
+
+
+def _keep(reasoning):
+    return CodeRefinementOutput(action="keep", reasoning=reasoning, confidence=0.9)
+
+
+def test_checkpointed_calls_are_not_repeated(db, test_user):
+    job = AIJob(kind="initial_coding", user_id=test_user["id"], params={}, status="running", stage="coding")
+    db.add(job)
+    db.commit()
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=db.get_bind())
+    inputs = [{"text": "first"}, {"text": "second"}, {"text": "third"}]
+    calls = []
+
+    def flaky(input_data):
+        calls.append(input_data["text"])
+        if input_data["text"] == "second" and calls.count("second") == 1:
+            raise RuntimeError("429 quota exceeded")
+        return _keep(input_data["text"])
+
+    first = PipelineCheckpoints(factory, job.id).executor("coding").map("fake", flaky, inputs)
+    assert [o.error is not None for o in first] == [False, True, False]
+
+    # A resumed run only repeats the call that failed, and reports every chunk
+    done = []
+    resumed = PipelineCheckpoints(factory, job.id).executor("coding").map(
+        "fake", flaky, inputs, on_done=lambda index, outcome: done.append(index))
+    assert sorted(calls) == ["first", "second", "second", "third"]
+    assert [o.result.reasoning for o in resumed] == ["first", "second", "third"]
+    assert sorted(done) == [0, 1, 2]
+
+    # Changed input is a different call
+    PipelineCheckpoints(factory, job.id).executor("coding").map("fake", flaky, [{"text": "fourth"}])
+    assert calls[-1] == "fourth"
+
+
+def test_partially_failed_coding_fails_and_resumes_missing_chunks(db, test_user, monkeypatch):
+    job = AIJob(kind="initial_coding", user_id=test_user["id"], params={}, status="running", stage="coding")
+    db.add(job)
+    db.commit()
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=db.get_bind())
+    document = SimpleNamespace(id=1, project_id=1)
+    work = [(document, index + 1, 3, text, 0) for index, text in enumerate(["alpha", "beta", "gamma"])]
+    plan = CodingPlan(work, [{"text": text} for _, _, _, text, _ in work], {}, None)
+    monkeypatch.setattr(AICodeGenerationService, "_plan_initial_coding", lambda *args: plan)
+    monkeypatch.setattr(LLMService, "get", lambda **kwargs: None)
+    calls = []
+
+    def flaky(llm_service, service_type, input_data, provider, use_cache=True):
+        text = input_data["text"]
+        calls.append(text)
+        if text == "beta" and calls.count("beta") == 1:
+            raise RuntimeError("503 unavailable")
+        return MultipleCodesOutput(codes=[CodeOutput(
+            reasoning="", code=text, quote=text, code_description="", is_new_code=True,
+            confidence=90, color="#3B82F6")])
+    monkeypatch.setattr(AICodingUtils, "make_rate_limited_llm_call", flaky)
+
+    # Partial results are not passed on as a finished run
+    with pytest.raises(PipelineIncomplete, match="1 of 3 coding calls failed"):
+        AICodeGenerationService.generate_initial_codes_in_memory(
+            [1], db, test_user["id"], checkpoints=PipelineCheckpoints(factory, job.id))
+
+    result = AICodeGenerationService.generate_initial_codes_in_memory(
+        [1], db, test_user["id"], checkpoints=PipelineCheckpoints(factory, job.id))
+    assert sorted(result["codes_dict"]) == ["alpha", "beta", "gamma"]
+    assert sorted(calls) == ["alpha", "beta", "beta", "gamma"]
+
+
+def test_failed_job_resumes_from_its_checkpoints(client, auth_headers, runner, monkeypatch):
+    calls = []
+
+    def pipeline(document_ids, db, user_id, use_cache=True, progress=None, checkpoints=None, incremental=False):
+        def call(input_data):
+            calls.append(input_data["text"])
+            if input_data["text"] == "b" and calls.count("b") == 1:
+                raise RuntimeError("503 overloaded")
+            return _keep(input_data["text"])
+
+        outcomes = AICodingUtils.chunk_executor(checkpoints, "coding").map(
+            "fake", call, [{"text": text} for text in "abc"])
+        if any(outcome.error for outcome in outcomes):
+            raise RuntimeError("coding incomplete")
+        return {"results": [], "summary": {"chunks": len(outcomes)}}
+
+    monkeypatch.setattr(AICodingService, "generate_code", pipeline)
+    job = client.post("/api/v1/ai/jobs/initial-coding", json={"document_ids": [1]}, headers=auth_headers).json()
+    runner.process_next()
+    assert client.get(f"/api/v1/ai/jobs/{job['id']}", headers=auth_headers).json()["status"] == "failed"
+
+    response = client.post(f"/api/v1/ai/jobs/{job['id']}/resume", headers=auth_headers)
+    assert response.status_code == 202
+    assert response.json()["status"] == "pending"
+    runner.process_next()
+
+    assert client.get(f"/api/v1/ai/jobs/{job['id']}/result", headers=auth_headers).json()["summary"] == {"chunks": 3}
+    assert sorted(calls) == ["a", "b", "b", "c"]
+    assert client.post(f"/api/v1/ai/jobs/{job['id']}/resume", headers=auth_headers).status_code == 409
+
+
+def test_cancelled_jobs_stop_and_can_be_resumed(client, auth_headers, runner, db, monkeypatch):
+    def pipeline(document_ids, db, user_id, use_cache=True, progress=None, checkpoints=None, incremental=False):
+        progress("stage", {"stage": "coding", "chunks_total": 1})
+        # Cancelled from another request while the job runs
+        client.post(f"/api/v1/ai/jobs/{job['id']}/cancel", headers=auth_headers)
+        progress("stage", {"stage": "refinement"})
+        return {"results": [], "summary": {}}
+
+    monkeypatch.setattr(AICodingService, "generate_code", pipeline)
+    job = client.post("/api/v1/ai/jobs/initial-coding", json={"document_ids": [1]}, headers=auth_headers).json()
+    runner.process_next()
+
+    status = client.get(f"/api/v1/ai/jobs/{job['id']}", headers=auth_headers).json()
+    assert (status["status"], status["stage"]) == ("cancelled", "done")
+    assert _events(client, auth_headers, job["id"])[-1][1] == "cancelled"
+
+    # A pending job is cancelled at once, and a finished one cannot be
+    pending = client.post("/api/v1/ai/jobs/initial-coding", json={"document_ids": [1]}, headers=auth_headers).json()
+    assert client.post(f"/api/v1/ai/jobs/{pending['id']}/cancel", headers=auth_headers).json()["status"] == "cancelled"
+    assert runner.process_next() is False
+    assert client.post(f"/api/v1/ai/jobs/{pending['id']}/cancel", headers=auth_headers).status_code == 409
+
+    monkeypatch.setattr(AICodingService, "generate_code", _fake_pipeline)
+    assert client.post(f"/api/v1/ai/jobs/{pending['id']}/resume", headers=auth_headers).status_code == 202
+    runner.process_next()
+    db.expire_all()  # the worker committed through its own session
+    assert client.get(f"/api/v1/ai/jobs/{pending['id']}", headers=auth_headers).json()["status"] == "completed"
+
+
+def test_lease_is_renewed_while_a_stage_reports_nothing(client, auth_headers, db, monkeypatch):
+    quick = AIJobRunner(workers=0, lease_seconds=0.6, poll_seconds=0.1)
+    monkeypatch.setattr(ai_job_runner, "_ai_job_runner", quick)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=db.get_bind())
+
+    def silent_pipeline(document_ids, db, user_id, use_cache=True, progress=None, checkpoints=None,
+                        incremental=False):
+        # A long refinement or grouping stage: no progress events for longer than the lease
+        time.sleep(1.0)
+        with factory() as other:
+            quick._fail_abandoned(other, ai_job_runner._utcnow())
+        return {"results": [], "summary": {"total_codes": 0}}
+
+    monkeypatch.setattr(AICodingService, "generate_code", silent_pipeline)
+    job = client.post("/api/v1/ai/jobs/initial-coding", json={"document_ids": [1]}, headers=auth_headers).json()
+    quick.process_next()
+    db.expire_all()
+
+    assert client.get(f"/api/v1/ai/jobs/{job['id']}", headers=auth_headers).json()["status"] == "completed"
+
+
+def test_worker_that_lost_its_lease_does_not_finish_the_job(client, auth_headers, runner, db, monkeypatch):
+    taken_over = datetime.datetime(2030, 1, 1)
+
+    def pipeline(document_ids, db, user_id, use_cache=True, progress=None, checkpoints=None, incremental=False):
+        # Failed for an expired lease, resumed, and claimed by another worker meanwhile
+        db.query(AIJob).filter(AIJob.id == job["id"]).update({"locked_at": taken_over})
+        db.commit()
+        return {"results": [], "summary": {}}
+
+    monkeypatch.setattr(AICodingService, "generate_code", pipeline)
+    job = client.post("/api/v1/ai/jobs/initial-coding", json={"document_ids": [1]}, headers=auth_headers).json()
+    runner.process_next()
+    db.expire_all()
+
+    stored = db.query(AIJob).filter(AIJob.id == job["id"]).one()
+    assert (stored.status, stored.locked_at, stored.result) == ("running", taken_over, None)
+    assert not db.query(AIJobEvent).filter(AIJobEvent.job_id == job["id"], AIJobEvent.event == "completed").count()
@@ -3,7 +3,7 @@
 Tests for AI services API endpoints
 """
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 
 
 class TestAIServicesAPI:
@@ -129,6 +129,7 @@ Overall, the healthcare experience was described as overwhelming."""
         mock_response.existing_code_rationale = ""
 
         mock_llm_instance.initial_coding_llm.invoke.return_value = mock_response
+        mock_llm_instance.initial_coding_llm.ainvoke = AsyncMock(return_value=mock_response)
 
         # Mock the bulk_code_assignment service
         with patch('app.services.code_assignment_service.CodeAssignmentService.bulk_code_assignment') as mock_bulk_assignment:
@@ -214,6 +215,7 @@ Overall, the healthcare experience was described as overwhelming."""
         mock_response.rationale = "Text clearly indicates both communication problems and emotional reactions"
 
         mock_llm_instance.deductive_coding_llm.invoke.return_value = mock_response
+        mock_llm_instance.deductive_coding_llm.ainvoke = AsyncMock(return_value=mock_response)
 
         # Mock the bulk_code_assignment service
         with patch('app.services.code_assignment_service.CodeAssignmentService.bulk_code_assignment') as mock_bulk_assignment:
@@ -263,7 +265,7 @@ Overall, the healthcare experience was described as overwhelming."""
 
                 print(f"Deductive coding result: {result}")
 
-    @patch('app.services.ai.ai_coding_service.AICodingService.generate_themes')
+    @patch('app.services.ai.ai_coding_service.AICodingService.agenerate_themes', new_callable=AsyncMock)
     @patch('sqlalchemy.orm.Query.filter')
     def test_generate_themes_endpoint(self, mock_filter, mock_generate_themes, client, auth_headers, test_codebook):
         """Test the theme generation API endpoint"""
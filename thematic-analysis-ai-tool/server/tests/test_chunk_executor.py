@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Tests for the concurrent chunk executor used by AI coding
+"""
+import time
+import random
+import asyncio
+import threading
+
+from app.services.ai.chunk_executor import ChunkExecutor
+
+
+class _InFlight:
+    """Counts concurrent calls and records the peak"""
+
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def __exit__(self, *exc_info):
+        with self._lock:
+            self.current -= 1
+
+
+def test_outcomes_follow_input_order_and_errors_stay_per_chunk():
+    executor = ChunkExecutor(default_limit=4)
+
+    def call(item):
+        time.sleep(random.uniform(0, 0.01))
+        if item == 3:
+            raise ValueError("bad chunk")
+        return item * 10
+
+    done = []
+    outcomes = executor.map("fake", call, list(range(8)),
+                            on_done=lambda index, outcome: done.append((index, outcome)))
+
+    assert [o.result for o in outcomes] == [0, 10, 20, None, 40, 50, 60, 70]
+    assert sorted(index for index, _ in done) == list(range(8))
+    assert all(outcome is outcomes[index] for index, outcome in done)
+    assert isinstance(outcomes[3].error, ValueError)
+    assert all(o.error is None for i, o in enumerate(outcomes) if i != 3)
+
+
+def test_in_flight_calls_are_capped_per_provider():
+    executor = ChunkExecutor(default_limit=2, provider_limits={"fast": 5})
+    counters = {"slow": _InFlight(), "fast": _InFlight()}
+
+    def call_for(provider):
+        def call(item):
+            with counters[provider]:
+                time.sleep(0.02)
+        return call
+
+    started = time.perf_counter()
+    executor.map("fast", call_for("fast"), list(range(10)))
+    fast_elapsed = time.perf_counter() - started
+    executor.map("slow", call_for("slow"), list(range(6)))
+
+    assert counters["fast"].peak == 5
+    assert counters["slow"].peak == 2
+    # Ten 20ms calls five at a time take about two rounds, not ten
+    assert fast_elapsed < 0.15
+
+
+def test_concurrent_runs_share_the_provider_limit():
+    executor = ChunkExecutor(default_limit=3)
+    counter = _InFlight()
+
+    def call(item):
+        with counter:
+            time.sleep(0.01)
+
+    runs = [threading.Thread(target=executor.map, args=("shared", call, list(range(6))))
+            for _ in range(3)]
+    for run in runs:
+        run.start()
+    for run in runs:
+        run.join()
+
+    assert counter.peak <= 3
+
+
+def test_amap_keeps_order_and_caps_calls_on_the_loop():
+    executor = ChunkExecutor(default_limit=3)
+    counter = _InFlight()
+
+    async def call(item):
+        with counter:
+            await asyncio.sleep(random.uniform(0, 0.01))
+        if item == 2:
+            raise ValueError("bad chunk")
+        return item * 10
+
+    async def scenario():
+        # Two runs on one loop share the provider's semaphore
+        return await asyncio.gather(
+            executor.amap("fake", call, list(range(6))),
+            executor.amap("fake", call, list(range(6))))
+
+    first, second = asyncio.run(scenario())
+
+    assert [o.result for o in first] == [0, 10, None, 30, 40, 50]
+    assert isinstance(first[2].error, ValueError)
+    assert [o.result for o in second] == [o.result for o in first]
+    assert counter.peak == 3
+    # A new loop gets its own semaphore rather than one bound to a closed loop
+    assert [o.result for o in asyncio.run(executor.amap("fake", call, [1]))] == [10]
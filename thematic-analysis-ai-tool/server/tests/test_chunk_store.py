@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Tests for the stored chunk boundaries of document content
+"""
+from app.models.document import Document, DocumentType
+from app.models.document_chunk import DocumentChunk
+from app.models.project import Project
+from app.services.document.chunk_store import DocumentChunkStore
+from app.utils.chunks import create_chunks
+
+TEXT = "\n".join(f"Participant {index}: the appointment was moved again, and again." for index in range(120))
+
+
+def _document(db, user_id, content=TEXT):
+    project = Project(title="Chunks", owner_id=user_id)
+    db.add(project)
+    db.flush()
+    document = Document(name="interview.txt", document_type=DocumentType.TEXT, content=content,
+                        project_id=project.id, uploaded_by_id=user_id)
+    db.add(document)
+    db.commit()
+    return document
+
+
+def _rows(db, document_id, chunk_size=800):
+    return db.query(DocumentChunk).filter(
+        DocumentChunk.document_id == document_id, DocumentChunk.chunk_size == chunk_size).count()
+
+
+def test_chunks_are_split_once_and_read_back(db, test_user):
+    store = DocumentChunkStore()
+    document = _document(db, test_user["id"])
+
+    chunks = store.get_chunks(db, [document], chunk_size=800, chunk_overlap=50)[document.id]
+    assert [chunk.text(TEXT) for chunk in chunks] == create_chunks(TEXT, chunk_size=800, chunk_overlap=50)
+    assert [chunk.index for chunk in chunks] == list(range(len(chunks)))
+    assert _rows(db, document.id) == len(chunks) > 3
+
+    assert store.get_chunks(db, [document], chunk_size=800, chunk_overlap=50)[document.id] == chunks
+    assert store.stats() == {"hits": 1, "misses": 1}
+
+    # Other parameters are chunks of their own
+    assert len(store.get_chunks(db, [document], chunk_size=2000, chunk_overlap=50)[document.id]) < len(chunks)
+    assert _rows(db, document.id) == len(chunks)
+
+
+def test_changed_content_is_split_again(db, test_user):
+    store = DocumentChunkStore()
+    document = _document(db, test_user["id"])
+    before = store.get_chunks(db, [document], chunk_size=800, chunk_overlap=50)[document.id]
+
+    document.content = "Interviewer: Let us start.\n" + TEXT[:2000]
+    db.commit()
+    after = store.get_chunks(db, [document], chunk_size=800, chunk_overlap=50)[document.id]
+
+    assert store.stats() == {"hits": 0, "misses": 2}
+    assert after[0].chunk_hash != before[0].chunk_hash
+    assert [chunk.text(document.content) for chunk in after] == create_chunks(
+        document.content, chunk_size=800, chunk_overlap=50)
+    assert _rows(db, document.id) == len(after)
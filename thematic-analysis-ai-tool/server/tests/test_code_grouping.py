@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Tests for map-reduce grouping of large codebooks
+"""
+import asyncio
+import re
+
+from app.core.config import settings
+from app.services.ai.ai_code_grouping import AICodeGroupingService
+from app.services.ai.code_clustering import CodeClustering
+
+
+def _names(calls, field, heading):
+    """The names listed in each recorded prompt"""
+    return [re.findall(rf"^{heading}: (.*)$", call[field], re.M) for call in calls]
+
+
+def _codebook(topics, per_topic):
+    codes_dict, assignments = {}, []
+    for topic, description in topics.items():
+        for i in range(per_topic):
+            name = f"{topic} code {i}"
+            codes_dict[name] = {"name": name, "description": description, "status": "created"}
+            assignments.append({"code_name": name, "text": f"They spoke about {description}.", "status": "created"})
+    return codes_dict, assignments
+
+
+def test_clusters_separate_topics_and_respect_the_size_limit(topics):
+    texts = [f"{topic} {description}" for topic, description in topics.items() for _ in range(7)]
+    clusters = CodeClustering.cluster(CodeClustering.tfidf(texts), target_size=7, max_size=8)
+
+    assert sorted(index for cluster in clusters for index in cluster) == list(range(21))
+    assert all(len(cluster) <= 8 for cluster in clusters)
+    # Every cluster holds a single topic
+    assert all(len({index // 7 for index in cluster}) == 1 for cluster in clusters)
+    assert CodeClustering.cluster(CodeClustering.tfidf(texts), 7, 8) == clusters
+
+
+def test_large_codebooks_are_grouped_per_cluster_then_merged(monkeypatch, recording_llm_service, topics):
+    monkeypatch.setattr(settings, "AI_GROUPING_MAX_CODES_PER_PROMPT", 6)
+    monkeypatch.setattr(settings, "AI_GROUPING_CLUSTER_SIZE", 4)
+    monkeypatch.setattr(settings, "AI_GROUPING_MAX_GROUPS_PER_PROMPT", 4)
+    llm_service = recording_llm_service()
+    codes_dict, assignments = _codebook(topics, 10)
+
+    codes_dict = AICodeGroupingService.perform_code_grouping_in_memory(
+        codes_dict, assignments, llm_service, provider="fake")
+
+    # Every prompt stays bounded, however many codes there are
+    grouping_calls = _names(llm_service.calls["code_grouping"], "codes_summary", "Code")
+    merging_calls = _names(llm_service.calls["code_group_merging"], "groups_text", "Name")
+    assert len(grouping_calls) >= 5
+    assert all(len(names) <= 6 for names in grouping_calls)
+    assert sorted(name for names in grouping_calls for name in names) == sorted(codes_dict)
+    assert merging_calls
+    assert all(len(names) <= 4 for names in merging_calls)
+
+    # Groups of the same topic from different clusters end up as one
+    assert {code["group_name"] for code in codes_dict.values()} == {
+        "Waiting group", "Staff group", "Cost group"}
+    assert all(code["group_name"].lower().startswith(name.split()[0]) for name, code in codes_dict.items())
+
+
+def test_async_grouping_matches_and_small_codebooks_use_one_call(monkeypatch, recording_llm_service, topics):
+    monkeypatch.setattr(settings, "AI_GROUPING_MAX_CODES_PER_PROMPT", 6)
+    monkeypatch.setattr(settings, "AI_GROUPING_CLUSTER_SIZE", 4)
+    llm_service = recording_llm_service()
+    codes_dict = asyncio.run(AICodeGroupingService.aperform_code_grouping_in_memory(
+        *_codebook(topics, 4), llm_service, provider="fake"))
+    assert len({code["group_name"] for code in codes_dict.values()}) == 3
+
+    llm_service = recording_llm_service()
+    codes_dict, assignments = _codebook(topics, 2)
+    AICodeGroupingService.perform_code_grouping_in_memory(codes_dict, assignments, llm_service, provider="fake")
+    assert len(llm_service.calls["code_grouping"]) == 1
+    assert llm_service.calls["code_group_merging"] == []
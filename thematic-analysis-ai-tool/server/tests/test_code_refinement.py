@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Tests for batched code refinement
+"""
+import re
+
+from app.core.config import settings
+from app.schemas.ai_services import BatchCodeRefinementOutput, CodeRefinementDecision, CodeRefinementOutput
+from app.services.ai.ai_coding_refinement import AICodingRefinement
+
+
+def _refinement_service(recording_llm_service, batch_decisions):
+    """Batched refinement answers with `batch_decisions` per code name; single-code calls keep the code"""
+    def batch(input_data):
+        names = re.findall(r"^Name: (.*)$", input_data["codes_text"], re.M)
+        return BatchCodeRefinementOutput(
+            decisions=[d for name in names for d in batch_decisions.get(name, [])])
+
+    return recording_llm_service(
+        batch_code_refinement=batch,
+        code_refinement=lambda input_data: CodeRefinementOutput(action="keep", reasoning="fits", confidence=0.8))
+
+
+def _batch_calls(llm_service):
+    return [re.findall(r"^Name: (.*)$", call["codes_text"], re.M)
+            for call in llm_service.calls["batch_code_refinement"]]
+
+
+def _single_calls(llm_service):
+    return [call["code_name"] for call in llm_service.calls["code_refinement"]]
+
+
+def _codes(count, quote_length=20):
+    codes_dict = {
+        f"code {i}": {"name": f"code {i}", "description": "d", "project_id": 1, "status": "created"}
+        for i in range(1, count + 1)
+    }
+    assignments = [
+        {"document_id": 1, "code_name": name, "text": name[-1] * quote_length, "status": "created"}
+        for name in codes_dict
+    ]
+    return codes_dict, assignments
+
+
+def _refine(llm_service, codes_dict, assignments):
+    return AICodingRefinement.refine_codes_in_memory(
+        codes_dict=codes_dict, assignments=assignments, llm_service=llm_service,
+        ai_session_codebook=None, user_id=1, provider="fake")
+
+
+def _decision(number, name, action, **kwargs):
+    return CodeRefinementDecision(
+        code_number=number, code_name=name, action=action, reasoning="r", confidence=0.9, **kwargs)
+
+
+def test_codes_are_refined_in_batches_with_single_code_fallback(monkeypatch, recording_llm_service):
+    monkeypatch.setattr(settings, "AI_REFINEMENT_BATCH_MAX_CODES", 3)
+    llm_service = _refinement_service(recording_llm_service, {
+        "code 1": [_decision(1, "code 1", "keep")],
+        "code 2": [_decision(2, "code 2", "delete")],
+        "code 3": [_decision(3, "code 3", "Modify", refined_code_name="Code three")],
+        # code 4 gets no decision at all
+        "code 5": [_decision(2, "code 5", "merge")],
+        "code 6": [_decision(3, " CODE 6 ", "keep")],
+    })
+
+    codes_dict, assignments = _refine(llm_service, *_codes(6))
+
+    assert sorted(_batch_calls(llm_service)) == [["code 1", "code 2", "code 3"], ["code 4", "code 5", "code 6"]]
+    # Missing, invalid and misnamed decisions fall back to a call per code
+    assert sorted(_single_calls(llm_service)) == ["code 4", "code 5", "code 6"]
+    assert set(codes_dict) == {"code 1", "Code three", "code 4", "code 5", "code 6"}
+    assert [a["code_name"] for a in assignments] == ["code 1", "Code three", "code 4", "code 5", "code 6"]
+    assert assignments[1]["refined_status"] == "modified"
+
+
+def test_batching_respects_the_token_budget(monkeypatch, recording_llm_service):
+    monkeypatch.setattr(settings, "AI_REFINEMENT_BATCH_TOKENS", 200)
+    codes_dict, assignments = _codes(4)
+    # Too large to share a prompt with other codes
+    assignments[0]["text"] = "x" * 2000
+
+    requests = AICodingRefinement._refinement_requests(codes_dict, assignments)
+    assert AICodingRefinement._plan_batches(requests) == ([[1, 2, 3]], [0])
+
+    monkeypatch.setattr(settings, "AI_REFINEMENT_BATCH_TOKENS", 0)
+    llm_service = _refinement_service(recording_llm_service, {})
+    _refine(llm_service, *_codes(3))
+    assert _batch_calls(llm_service) == []
+    assert sorted(_single_calls(llm_service)) == ["code 1", "code 2", "code 3"]
+
+
+def test_decisions_are_matched_by_number_and_exact_name(recording_llm_service):
+    codes_dict = {
+        name: {"name": name, "description": "d", "project_id": 1, "status": "created"}
+        for name in ["Trust", "trust ", "Cost"]
+    }
+    assignments = [
+        {"document_id": 1, "code_name": name, "text": "quote", "status": "created"}
+        for name in codes_dict
+    ]
+    llm_service = _refinement_service(recording_llm_service, {
+        # Names that differ only in case or spacing keep their own decisions
+        "Trust": [_decision(1, "Trust", "keep")],
+        "trust ": [_decision(2, "trust ", "delete")],
+        # Two decisions for one code are ambiguous
+        "Cost": [_decision(3, "Cost", "delete"), _decision(3, "Cost", "keep")],
+    })
+
+    codes_dict, assignments = _refine(llm_service, codes_dict, assignments)
+
+    assert _single_calls(llm_service) == ["Cost"]
+    assert set(codes_dict) == {"Trust", "Cost"}
+    assert [a["code_name"] for a in assignments] == ["Trust", "Cost"]
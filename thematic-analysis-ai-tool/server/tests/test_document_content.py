@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests for ranged document content and content-free listings
+"""
+from sqlalchemy import inspect
+
+from app.core.config import settings
+from app.models.document import Document, DocumentType
+
+CONTENT = "".join(f"Line {i}: the participant described the wait. é\n" for i in range(100))
+
+
+def _setup(client, db, auth_headers, test_user):
+    project = client.post("/api/v1/projects/", json={"title": "Content"},
+                          headers=auth_headers).json()
+    document = Document(name="long.txt", document_type=DocumentType.TEXT, content=CONTENT,
+                        project_id=project["id"], uploaded_by_id=test_user["id"])
+    db.add(document)
+    db.commit()
+    return project["id"], document.id
+
+
+def test_content_range_pages_through_the_document(client, db, auth_headers, test_user, monkeypatch):
+    """Ranges are character offsets and next_start walks to the end"""
+    _, document_id = _setup(client, db, auth_headers, test_user)
+    monkeypatch.setattr(settings, "DOCUMENT_CONTENT_MAX_RANGE_CHARS", 1000)
+
+    response = client.get(f"/api/v1/documents/{document_id}/content",
+                          params={"start": 10, "end": 60}, headers=auth_headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["content"] == CONTENT[10:60]
+    assert body["total_length"] == len(CONTENT)
+
+    pieces, start = [], 0
+    while start is not None:
+        body = client.get(f"/api/v1/documents/{document_id}/content",
+                          params={"start": start}, headers=auth_headers).json()
+        assert len(body["content"]) <= 1000
+        pieces.append(body["content"])
+        start = body["next_start"]
+    assert "".join(pieces) == CONTENT
+
+    response = client.get(f"/api/v1/documents/{document_id}/content",
+                          params={"start": 20, "end": 10}, headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_listings_leave_out_content_unless_asked(client, db, auth_headers, test_user):
+    project_id, document_id = _setup(client, db, auth_headers, test_user)
+
+    listed = client.get(f"/api/v1/documents/project/{project_id}", headers=auth_headers).json()
+    assert "content" not in listed[0]
+    assert listed[0]["content_length"] == len(CONTENT)
+    document = client.get(f"/api/v1/documents/{document_id}", params={"include_content": False},
+                          headers=auth_headers).json()
+    assert "content" not in document
+    assert document["id"] == document_id
+    document = client.get(f"/api/v1/documents/{document_id}", headers=auth_headers).json()
+    assert document["content"] == CONTENT
+
+    project = client.get(f"/api/v1/projects/{project_id}", headers=auth_headers).json()
+    assert project["documents"][0]["content"] is None
+    project = client.get(f"/api/v1/projects/{project_id}", params={"include_content": True},
+                         headers=auth_headers).json()
+    assert project["documents"][0]["content"] == CONTENT
+
+    listed = client.get(f"/api/v1/documents/project/{project_id}",
+                        params={"include_content": True}, headers=auth_headers).json()
+    assert listed[0]["content"] == CONTENT
+
+
+def test_content_is_deferred_and_its_length_tracked(client, db, auth_headers, test_user):
+    _, document_id = _setup(client, db, auth_headers, test_user)
+    db.expire_all()
+
+    document = db.query(Document).filter(Document.id == document_id).one()
+    assert "content" not in inspect(document).dict
+    assert document.content_length == len(CONTENT)
+
+    document.content = "shorter"
+    db.commit()
+    assert document.content_length == len("shorter")
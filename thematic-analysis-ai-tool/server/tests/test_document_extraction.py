@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Tests for the single-pass document extraction engine
+"""
+import io
+from app.models.document import DocumentType
+from app.services.document.extraction import DocumentExtractionEngine
+
+
+def test_text_extraction_builds_content_and_line_segments():
+    """Text uploads keep the decoded text and get one segment per non-blank line"""
+    file_content = b"first line\n\n  second line  \nthird\x00 line"
+
+    result = DocumentExtractionEngine.extract(
+        file_content, DocumentType.TEXT, "notes.txt")
+
+    assert result.content == "first line\n\n  second line  \nthird line"
+    segments = result.segments["segments"]
+    assert [s["content"] for s in segments] == [
+        "first line", "second line", "third line"]
+    assert [s["line_number"] for s in segments] == [1, 3, 4]
+    for segment, line in zip(segments, ["first line", "  second line  ", "third line"]):
+        assert result.content[segment["character_start"]:segment["character_end"]] == line
+    assert result.file_metadata == {}
+
+
+def test_csv_extraction_lists_rows_and_metadata_from_one_parse():
+    """CSV uploads render every row, keep empty rows visible and report metadata"""
+    file_content = b"name,answer\nAlice,Yes\n\nBob,\n"
+
+    result = DocumentExtractionEngine.extract(
+        file_content, DocumentType.CSV, "survey.csv")
+
+    assert result.content == (
+        "CSV file with 3 rows and 2 columns\n"
+        "Columns: name, answer\n\n"
+        "Row 1: name: Alice | answer: Yes\n"
+        "Row 2: [empty row]\n"
+        "Row 3: name: Bob\n"
+    )
+    assert [s["content"] for s in result.segments["segments"]] == [
+        "Row 1: name: Alice | answer: Yes", "Row 3: name: Bob"]
+    assert result.file_metadata["row_count"] == 2
+    assert result.file_metadata["columns"] == ["name", "answer"]
+
+
+def test_excel_extraction_reads_the_sheet_once():
+    """Excel uploads are rendered straight from the sheet without a CSV round trip"""
+    import pandas as pd
+
+    buffer = io.BytesIO()
+    pd.DataFrame({"topic": ["cost", "wait"], "score": [3, None]}).to_excel(
+        buffer, index=False)
+
+    result = DocumentExtractionEngine.extract(
+        buffer.getvalue(), DocumentType.CSV, "survey.xlsx")
+
+    assert result.content == (
+        "Excel file with 2 rows and 2 columns\n"
+        "Columns: topic, score\n\n"
+        "Row 1: topic: cost | score: 3.0\n"
+        "Row 2: topic: wait\n"
+    )
+    assert result.file_metadata["row_count"] == 2
+    assert result.segments["total_segments"] == 2
+
+
+def test_broken_pdf_reports_error_instead_of_raising():
+    """Parser failures are stored as error content and metadata"""
+    result = DocumentExtractionEngine.extract(
+        b"not a pdf", DocumentType.PDF, "broken.pdf")
+
+    assert result.content.startswith("[Error extracting content:")
+    assert result.segments["segments"] == []
+    assert "error" in result.file_metadata
+
+
+def test_extraction_pool_runs_in_worker_process_and_matches_inline():
+    """The process pool returns the same result as parsing in the request worker"""
+    from app.services.document.extraction_pool import DocumentExtractionPool
+
+    file_content = "\n".join(f"line {i}" for i in range(200)).encode()
+    pool = DocumentExtractionPool(
+        max_workers=1, max_pending=2, timeout=60, inline_max_bytes=0)
+    try:
+        pooled = pool.extract(file_content, DocumentType.TEXT, "lines.txt")
+    finally:
+        pool.shutdown()
+
+    inline = DocumentExtractionEngine.extract(
+        file_content, DocumentType.TEXT, "lines.txt")
+    assert pooled == inline
+
+
+def test_line_offsets_match_the_prefix_sum_formula():
+    """Running offsets give the same values as summing every previous line"""
+    text = "alpha\n\n  beta  \r\ngamma\n\n\ndelta"
+    lines = text.split('\n')
+
+    segments = DocumentExtractionEngine._segment_lines(text, page_number=2)
+
+    expected = [
+        (i + 1, sum(len(l) + 1 for l in lines[:i]))
+        for i, line in enumerate(lines) if line.strip()
+    ]
+    assert [(s["line_number"], s["character_start"]) for s in segments] == expected
+    for segment in segments:
+        assert segment["page_number"] == 2
+        assert text[segment["character_start"]:segment["character_end"]].strip() == segment["content"]
+
+
+def test_row_offsets_skip_empty_rows():
+    """Row offsets address the rendered rows, not the skipped empty ones"""
+    rows = [(0, "Row 1: a: x", {}), (2, "Row 3: a: yz", {})]
+
+    segments = DocumentExtractionEngine._segment_rows(rows)
+
+    assert [(s["character_start"], s["character_end"]) for s in segments] == [(0, 11), (13, 25)]
+
+
+def test_row_rendering_matches_iterrows():
+    """Column-wise rendering keeps the text and upcasting of the iterrows loop"""
+    import pandas as pd
+
+    df = pd.DataFrame({
+        "text": ["yes", None, "no", "maybe"],
+        "score": [1, 2, 3, 4],
+        "weight": [0.5, float("nan"), 2.0, 1e16],
+        "flag": [True, False, True, False],
+    })
+
+    def iterrows_reference(frame):
+        rows = []
+        for row_index, (_, row) in enumerate(frame.iterrows()):
+            values = [f"{col}: {row[col]}" for col in frame.columns if pd.notna(row[col])]
+            if values:
+                rows.append((row_index, f"Row {row_index + 1}: " + " | ".join(values)))
+        return rows
+
+    for frame in (df, df[["score", "weight"]], df[["weight"]].iloc[[1]]):
+        segments = DocumentExtractionEngine._build_row_segments(frame)
+        assert [(s["row_index"], s["content"]) for s in segments] == iterrows_reference(frame)
+
+    first = DocumentExtractionEngine._build_row_segments(df)[0]
+    assert first["additional_data"] == next(df.iterrows())[1].to_dict()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Tests for ranked full-text document search
+"""
+from app.models.document import POSTGRES_SEARCH_DDL, SEARCH_CONTENT_MAX_CHARS, Document, DocumentType
+
+
+def _create_project(client, auth_headers, title="Search"):
+    response = client.post("/api/v1/projects/", json={"title": title}, headers=auth_headers)
+    return response.json()["id"]
+
+
+def _add_document(db, project_id, user_id, name, content, document_type=DocumentType.TEXT):
+    document = Document(name=name, document_type=document_type, content=content,
+                        project_id=project_id, uploaded_by_id=user_id)
+    db.add(document)
+    db.commit()
+    return document
+
+
+def _search(client, auth_headers, project_id, **params):
+    response = client.get(f"/api/v1/documents/project/{project_id}/search",
+                          params=params, headers=auth_headers)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_search_ranks_matches_and_returns_snippet_offsets(client, db, auth_headers, test_user):
+    """Results are ranked and snippets point back into the content"""
+    project_id = _create_project(client, auth_headers)
+    content = "Participant: the waiting room was full. " * 10 + "Nobody explained the delay."
+    waiting = _add_document(db, project_id, test_user["id"], "clinic.txt", content)
+    named = _add_document(db, project_id, test_user["id"], "waiting times.txt", "Short answers only.")
+    _add_document(db, project_id, test_user["id"], "other.txt", "Nothing relevant here.")
+
+    body = _search(client, auth_headers, project_id, q="waiting")
+
+    assert body["total"] == 2
+    assert [hit["document_id"] for hit in body["results"]] == [named.id, waiting.id]
+    snippets = body["results"][1]["snippets"]
+    assert 1 <= len(snippets) <= 3
+    for snippet in snippets:
+        assert content[snippet["start"]:snippet["end"]] == snippet["text"]
+        for start, end in snippet["highlights"]:
+            assert content[start:end].lower().startswith("wait")
+    assert "content" not in body["results"][0]
+
+
+def test_search_paginates_filters_and_follows_changes(client, db, auth_headers, test_user):
+    """Pages, type filters and later edits and deletes are reflected"""
+    project_id = _create_project(client, auth_headers)
+    documents = [
+        _add_document(db, project_id, test_user["id"], f"interview {i}.txt", f"The staff were kind, visit {i}.")
+        for i in range(5)
+    ]
+    _add_document(db, project_id, test_user["id"], "survey.csv", "staff: kind", DocumentType.CSV)
+
+    first = _search(client, auth_headers, project_id, q="kind staff", limit=4)
+    second = _search(client, auth_headers, project_id, q="kind staff", limit=4, offset=4)
+    assert first["total"] == second["total"] == 6
+    ids = [hit["document_id"] for hit in first["results"] + second["results"]]
+    assert len(ids) == len(set(ids)) == 6
+
+    assert _search(client, auth_headers, project_id, q="staff", document_type="csv")["total"] == 1
+    assert _search(client, auth_headers, project_id, q="kind rude")["total"] == 0
+
+    documents[0].content = "The staff were rude."
+    db.delete(documents[1])
+    db.commit()
+    assert _search(client, auth_headers, project_id, q="rude")["total"] == 1
+    assert _search(client, auth_headers, project_id, q="kind")["total"] == 4
+
+
+def test_search_input_is_not_interpreted_as_query_syntax(client, db, auth_headers, test_user):
+    project_id = _create_project(client, auth_headers)
+    _add_document(db, project_id, test_user["id"], "notes.txt", "NEAR the end, OR so they said")
+
+    body = _search(client, auth_headers, project_id, q='"NEAR" OR (end*')
+
+    assert body["total"] == 1
+
+
+def test_large_documents_can_be_stored_and_searched(client, db, auth_headers, test_user):
+    """PostgreSQL indexes only a prefix, so a document too large for one tsvector still saves"""
+    assert f"left(coalesce(content, ''), {SEARCH_CONTENT_MAX_CHARS})" in POSTGRES_SEARCH_DDL[0]
+
+    project_id = _create_project(client, auth_headers)
+    words = " ".join(f"term{i}" for i in range(400_000))
+    content = "Opening remarks about the clinic. " + words
+    assert len(content) > 4 * SEARCH_CONTENT_MAX_CHARS
+    document = _add_document(db, project_id, test_user["id"], "huge.txt", content)
+
+    body = _search(client, auth_headers, project_id, q="clinic")
+    assert [hit["document_id"] for hit in body["results"]] == [document.id]
+
+
+def test_snippets_come_from_excerpts_around_the_first_matches(client, db, auth_headers, test_user):
+    """Only text around each term's first occurrence is read, at its offsets in the full content"""
+    project_id = _create_project(client, auth_headers)
+    content = "Opening remarks. " + "filler " * 50_000 + "The Waiting room was full, waiting again. " \
+        + "filler " * 50_000 + "Nobody explained the delay."
+    _add_document(db, project_id, test_user["id"], "long.txt", content)
+
+    snippets = _search(client, auth_headers, project_id, q="waiting delay")["results"][0]["snippets"]
+
+    assert len(snippets) == 2
+    for snippet in snippets:
+        assert content[snippet["start"]:snippet["end"]] == snippet["text"]
+        assert len(snippet["text"]) < 300
+    highlighted = [content[start:end].lower() for snippet in snippets for start, end in snippet["highlights"]]
+    assert highlighted == ["waiting", "waiting", "delay"]
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Tests for content-hash reuse of stored extractions
+"""
+import hashlib
+
+from app.models.document import Document, DocumentType
+from app.services.document.extraction import EXTRACTION_VERSION
+from app.services.document.extraction_cache import get_extraction_cache
+from app.services.document.extraction_pool import get_extraction_pool
+from app.services.document.upload import DocumentUploadService
+from app.services.document.management import DocumentManagementService
+from app.services.storage import LocalStorage, StorageDeletionOutbox, run_storage
+from app.services.storage import factory, outbox as outbox_module
+
+FILE_CONTENT = b"Interviewer: how was the clinic?\nParticipant: the wait was long."
+FILE_HASH = hashlib.sha256(FILE_CONTENT).hexdigest()
+
+
+def _create_project(client, auth_headers, title):
+    response = client.post("/api/v1/projects/", json={"title": title}, headers=auth_headers)
+    return response.json()["id"]
+
+
+def _stored_document(db, project_id, user_id, version=EXTRACTION_VERSION, metadata=None, backend=None):
+    document = Document(
+        name="original.txt",
+        document_type=DocumentType.TEXT,
+        content=FILE_CONTENT.decode(),
+        file_size=len(FILE_CONTENT),
+        file_hash=FILE_HASH,
+        cloudinary_public_id=f"documents/{project_id}/{FILE_HASH}",
+        cloudinary_url="https://res.cloudinary.com/demo/raw/upload/original.txt",
+        file_metadata=metadata or {},
+        extraction_version=version,
+        storage_backend=backend,
+        project_id=project_id,
+        uploaded_by_id=user_id
+    )
+    db.add(document)
+    db.commit()
+    return document
+
+
+def test_identical_upload_skips_storage_and_parsing(client, db, auth_headers, test_user, monkeypatch):
+    """Re-uploading a processed file into another project reuses its extraction"""
+    first_project = _create_project(client, auth_headers, "First")
+    second_project = _create_project(client, auth_headers, "Second")
+    original = _stored_document(db, first_project, test_user["id"])
+
+    def fail(*args, **kwargs):
+        raise AssertionError("identical uploads should not be uploaded or parsed again")
+
+    monkeypatch.setattr(DocumentUploadService, "_upload_to_storage", fail)
+    monkeypatch.setattr(get_extraction_pool(), "extract", fail)
+    hits = get_extraction_cache().hits
+
+    uploaded = DocumentUploadService.create_document(
+        db, "copy.txt", None, DocumentType.TEXT, second_project,
+        test_user["id"], FILE_CONTENT, "copy.txt")
+
+    assert get_extraction_cache().hits == hits + 1
+    assert uploaded.content == original.content
+    assert uploaded.cloudinary_url == original.cloudinary_url
+    copy = db.query(Document).filter(Document.id == uploaded.id).first()
+    assert copy.project_id == second_project
+    assert copy.extraction_version == EXTRACTION_VERSION
+
+
+def test_stale_or_failed_extractions_are_not_reused(client, db, auth_headers, test_user):
+    """Older parser versions and failed parses count as misses"""
+    project_id = _create_project(client, auth_headers, "Stale")
+    cache = get_extraction_cache()
+
+    _stored_document(db, project_id, test_user["id"], version=EXTRACTION_VERSION - 1)
+    assert cache.lookup(db, FILE_HASH, DocumentType.TEXT) is None
+
+    _stored_document(db, project_id, test_user["id"], metadata={"error": "broken"})
+    assert cache.lookup(db, FILE_HASH, DocumentType.TEXT) is None
+    assert cache.lookup(db, FILE_HASH, DocumentType.PDF) is None
+
+
+def test_shared_storage_object_is_deleted_with_its_last_document(client, db, auth_headers, test_user, tmp_path, monkeypatch):
+    """Deleting one of two identical documents keeps the stored file"""
+    storage = LocalStorage(str(tmp_path))
+    monkeypatch.setitem(factory._backends, "local", storage)
+    outbox = StorageDeletionOutbox(poll_seconds=0, max_attempts=3, workers=0)
+    monkeypatch.setattr(outbox_module, "_storage_outbox", outbox)
+
+    project_id = _create_project(client, auth_headers, "Shared")
+    key = f"documents/{project_id}/{FILE_HASH}"
+    run_storage(storage.put(key, FILE_CONTENT))
+    first = _stored_document(db, project_id, test_user["id"], backend="local")
+    second = _stored_document(db, project_id, test_user["id"], backend="local")
+
+    DocumentManagementService.delete_document(db, first.id, test_user["id"])
+    assert outbox.drain_once() == 0
+    assert run_storage(storage.get(key)) == FILE_CONTENT
+
+    DocumentManagementService.delete_document(db, second.id, test_user["id"])
+    assert outbox.drain_once() == 1
+    assert not (tmp_path / key).exists()
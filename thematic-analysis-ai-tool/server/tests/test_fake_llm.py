@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Tests for the offline local_fake LLM provider
+"""
+import pytest
+
+from app.core.config import settings
+from app.models.document import Document, DocumentType
+from app.models.project import Project
+from app.services.ai.ai_coding_service import AICodingService
+from app.services.ai.ai_coding_utils import AICodingUtils
+from app.services.ai.fake_llm import FakeProviderError
+from app.services.ai.llm_service import LLMService, SERVICE_PROMPTS
+
+TEXT = (
+    "Participant: The waiting room was crowded and nobody explained the delay.\n"
+    "Interviewer: How did that feel?\n"
+    "Participant: Honestly the nurses were wonderful, they listened to every worry.\n"
+    "Participant: The medication bills keep climbing every single month.\n"
+)
+
+
+@pytest.fixture(autouse=True)
+def fresh_registry():
+    LLMService.clear_registry()
+    yield
+    LLMService.clear_registry()
+
+
+def _fake():
+    return LLMService.get(model_name="fake", provider="local_fake")
+
+
+def test_every_service_returns_its_schema():
+    service = _fake()
+    for service_type, (prompt, schema) in SERVICE_PROMPTS.items():
+        input_data = {name: "Code: waiting times\nName: waiting times" for name in prompt.input_variables}
+        input_data["text"] = TEXT
+        assert isinstance(service.chain(service_type).invoke(input_data), schema), service_type
+
+    codes = service.initial_coding_llm.invoke(
+        {"research_context": "Clinic visits", "existing_codes": "- Waiting concerns: delays", "text": TEXT})
+    assert codes.codes
+    # Quotes are exact passages of the text, so they can be located in the document
+    assert all(code.quote in TEXT for code in codes.codes)
+    assert [code.code for code in codes.codes] == [code.code for code in service.initial_coding_llm.invoke(
+        {"research_context": "Clinic visits", "existing_codes": "- Waiting concerns: delays", "text": TEXT}).codes]
+
+
+def test_injected_rate_limits_are_retried_and_errors_are_not(monkeypatch):
+    monkeypatch.setattr(settings, "LOCAL_FAKE_RATE_LIMIT_RATE", 0.6)
+    monkeypatch.setattr(settings, "LOCAL_FAKE_RETRY_AFTER_SECONDS", 0.01)
+    service = _fake()
+    input_data = {"research_context": "", "existing_codes": "", "text": TEXT}
+
+    result = AICodingUtils.make_rate_limited_llm_call(
+        service, "initial_coding", input_data, provider="local_fake", use_cache=False)
+    assert result.codes
+    calls = service.llm.calls
+    assert calls > 1  # the first draws were 429s
+
+    monkeypatch.setattr(settings, "LOCAL_FAKE_RATE_LIMIT_RATE", 0.0)
+    monkeypatch.setattr(settings, "LOCAL_FAKE_ERROR_RATE", 1.0)
+    with pytest.raises(FakeProviderError):
+        AICodingUtils.make_rate_limited_llm_call(
+            service, "initial_coding", input_data, provider="local_fake", use_cache=False)
+    assert service.llm.calls == calls + 1
+
+
+def test_generate_code_runs_end_to_end_offline(db, test_user):
+    project = Project(title="Offline", owner_id=test_user["id"])
+    db.add(project)
+    db.flush()
+    document = Document(name="interview.txt", document_type=DocumentType.TEXT, content=TEXT,
+                        project_id=project.id, uploaded_by_id=test_user["id"])
+    db.add(document)
+    db.commit()
+
+    response = AICodingService.generate_code(
+        [document.id], db, test_user["id"], model_name="fake", provider="local_fake", use_cache=False)
+
+    assert response["summary"]["total_codes"] >= 2
+    assert response["results"]
+    assert all(TEXT.find(result["code_assignment"]["text"]) >= 0 for result in response["results"])
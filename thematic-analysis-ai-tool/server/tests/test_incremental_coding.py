@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Tests for incremental AI initial coding
+"""
+import pytest
+
+from app.core.config import settings
+from app.models.ai_job import AICodedChunk
+from app.models.code import Code
+from app.models.code_assignments import CodeAssignment
+from app.models.codebook import Codebook
+from app.models.document import Document, DocumentType
+from app.models.project import Project
+from app.services.ai.ai_code_generation import AICodeGenerationService
+from app.services.ai.ai_coding_service import AICodingService
+from app.services.ai.llm_service import LLMService
+from app.services.document.chunk_store import get_chunk_store
+
+TEXTS = [
+    "Participant: The waiting room was crowded and nobody explained the delay.\n"
+    "Participant: Honestly the nurses were wonderful, they listened to every worry.\n",
+    "Participant: The medication bills keep climbing every single month.\n"
+    "Participant: I skip doses when money runs short before payday.\n",
+    "Participant: My daughter drives me because the bus never comes on time.\n"
+    "Participant: Parking at the hospital costs more than my lunch.\n",
+]
+
+
+@pytest.fixture(autouse=True)
+def fresh_registry():
+    LLMService.clear_registry()
+    yield
+    LLMService.clear_registry()
+
+
+@pytest.fixture
+def project(db, test_user):
+    project = Project(title="Incremental", owner_id=test_user["id"])
+    db.add(project)
+    db.commit()
+    return project
+
+
+def _add_document(db, project, user_id, text, name):
+    document = Document(name=name, document_type=DocumentType.TEXT, content=text,
+                        project_id=project.id, uploaded_by_id=user_id)
+    db.add(document)
+    db.commit()
+    return document
+
+
+def _code(db, user_id, document_ids, incremental=True):
+    coded = []
+
+    def progress(event, data):
+        if event == "stage" and data["stage"] == "coding":
+            coded.append(data["chunks_total"])
+
+    response = AICodingService.generate_code(
+        document_ids, db, user_id, model_name="fake", provider="local_fake",
+        use_cache=False, progress=progress, incremental=incremental)
+    db.expire_all()
+    return response, sum(coded)
+
+
+def _assignments(db, document_id):
+    return db.query(CodeAssignment).filter(CodeAssignment.document_id == document_id).all()
+
+
+def test_only_new_documents_are_sent_to_the_model(db, test_user, project):
+    user_id = test_user["id"]
+    first, second = (_add_document(db, project, user_id, text, f"interview-{index}.txt")
+                     for index, text in enumerate(TEXTS[:2]))
+    response, coded = _code(db, user_id, [first.id, second.id], incremental=False)
+    assert coded == 2
+    codebook_id = response["ai_session_codebook"]["id"]
+    saved = {document.id: len(_assignments(db, document.id)) for document in (first, second)}
+    assert all(saved.values())
+    assert db.query(AICodedChunk).filter(AICodedChunk.codebook_id == codebook_id).count() == 2
+
+    third = _add_document(db, project, user_id, TEXTS[2], "interview-3.txt")
+    response, coded = _code(db, user_id, [first.id, second.id, third.id])
+
+    # One chunk coded; the session continues in the same codebook, its saved work untouched
+    assert coded == 1
+    assert response["ai_session_codebook"]["id"] == codebook_id
+    assert db.query(Codebook).filter(Codebook.project_id == project.id).count() == 1
+    assert {document.id: len(_assignments(db, document.id)) for document in (first, second)} == saved
+    assert _assignments(db, third.id)
+    assert all(result["code_assignment"]["document_id"] == third.id for result in response["results"])
+
+    # Nothing left to code: no calls at all
+    response, coded = _code(db, user_id, [first.id, second.id, third.id])
+    assert coded == 0
+    assert response["summary"] == {"chunks_coded": 0, "chunks_skipped": 3}
+
+
+def test_changed_documents_are_recoded_and_saved_assignments_follow_their_text(db, test_user, project):
+    user_id = test_user["id"]
+    document = _add_document(db, project, user_id, TEXTS[0], "interview.txt")
+    response, _ = _code(db, user_id, [document.id])
+    codebook_id = response["ai_session_codebook"]["id"]
+    code = db.query(Code).filter(Code.codebook_id == codebook_id).first()
+
+    def assign(text, status):
+        start = TEXTS[0].index(text)
+        assignment = CodeAssignment(document_id=document.id, code_id=code.id, project_id=project.id,
+                                    start_char=start, end_char=start + len(text), text_snapshot=text,
+                                    status=status, created_by_id=user_id)
+        db.add(assignment)
+        return assignment
+
+    kept = assign("the nurses were wonderful", "pending")
+    gone = assign("nobody explained the delay", "pending")
+    reviewed = assign("The waiting room was crowded", "accepted")
+    db.commit()
+    kept_id, gone_id, reviewed_id = kept.id, gone.id, reviewed.id
+
+    document.content = "Interviewer: Welcome back.\n" + TEXTS[0].replace(
+        "The waiting room was crowded and nobody explained the delay.", "It was fine.")
+    db.commit()
+    response, coded = _code(db, user_id, [document.id])
+
+    assert coded == 1
+    content = document.content
+    kept = db.query(CodeAssignment).filter(CodeAssignment.id == kept_id).one()
+    assert content[kept.start_char:kept.end_char] == "the nurses were wonderful"
+    # Unreviewed work whose text is gone is removed; reviewed work is left alone
+    assert db.query(CodeAssignment).filter(CodeAssignment.id == gone_id).first() is None
+    assert db.query(CodeAssignment).filter(CodeAssignment.id == reviewed_id).one().status == "accepted"
+    keys = [row.chunk_key for row in db.query(AICodedChunk).filter(AICodedChunk.codebook_id == codebook_id)]
+    assert keys == [AICodeGenerationService.chunk_key(chunk.chunk_hash)
+                    for chunk in get_chunk_store().get_chunks(db, [document])[document.id]]
+
+
+def test_chunk_keys_change_with_chunking_parameters(monkeypatch):
+    key = AICodeGenerationService.chunk_key("0" * 64)
+    assert AICodeGenerationService.chunk_key("0" * 64) == key
+    monkeypatch.setattr(settings, "AI_CHUNK_SIZE", 2000)
+    assert AICodeGenerationService.chunk_key("0" * 64) != key
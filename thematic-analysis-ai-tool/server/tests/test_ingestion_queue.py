@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Tests for the background document ingestion queue
+"""
+import io
+import os
+import time
+import pytest
+
+from app.models.document_chunk import DocumentChunk
+from app.models.ingestion_job import IngestionJob
+from app.services.document import ingestion_queue
+from app.services.document.ingestion_queue import DocumentIngestionQueue
+from app.services.document.upload import DocumentUploadService
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    """A queue without worker threads, driven with process_next()"""
+    test_queue = DocumentIngestionQueue(
+        workers=0, max_attempts=2, retry_base_seconds=0,
+        lease_seconds=600, poll_seconds=0.1, spool_dir=str(tmp_path))
+    monkeypatch.setattr(ingestion_queue, "_ingestion_queue", test_queue)
+    return test_queue
+
+
+@pytest.fixture
+def project_id(client, auth_headers):
+    response = client.post("/api/v1/projects/", json={"title": "Background"}, headers=auth_headers)
+    return response.json()["id"]
+
+
+def _upload_in_background(client, auth_headers, project_id, content=b"first line\nsecond line"):
+    return client.post(
+        "/api/v1/documents/",
+        files={"file": ("interview.txt", io.BytesIO(content), "text/plain")},
+        data={"project_id": project_id, "background": "true"},
+        headers=auth_headers
+    )
+
+
+def test_background_upload_returns_pending_then_completes(client, auth_headers, project_id, queue, db, monkeypatch):
+    """The upload returns at once; the queue fills in content and processed_at"""
+    monkeypatch.setattr(DocumentUploadService, "_upload_to_storage",
+                        lambda upload, project_id: ("documents/test", "https://example.com/test"))
+
+    response = _upload_in_background(client, auth_headers, project_id)
+    assert response.status_code == 201
+    assert response.json()["upload_status"] == "pending"
+    document_id = response.json()["id"]
+
+    status = client.get(f"/api/v1/documents/{document_id}/status", headers=auth_headers).json()
+    assert status["processing_status"] == "pending"
+    assert status["job"]["status"] == "pending"
+
+    # A long poll of a pending document waits out its time, then reports it still pending
+    started = time.monotonic()
+    status = client.get(f"/api/v1/documents/{document_id}/status", params={"wait": 0.3},
+                        headers=auth_headers).json()
+    assert time.monotonic() - started >= 0.3
+    assert status["processing_status"] == "pending"
+
+    assert queue.process_next() is True
+    assert queue.process_next() is False
+
+    status = client.get(f"/api/v1/documents/{document_id}/status", params={"wait": 5},
+                        headers=auth_headers).json()
+    assert status["processing_status"] == "completed"
+    assert status["processed_at"] is not None
+    assert status["job"]["attempts"] == 1
+    document = client.get(f"/api/v1/documents/{document_id}", headers=auth_headers).json()
+    assert document["content"] == "first line\nsecond line"
+    assert os.listdir(queue.spool_dir) == []
+    # Chunked while processing, for AI coding to reuse
+    assert db.query(DocumentChunk).filter(DocumentChunk.document_id == document_id).count() == 1
+
+
+def test_failing_job_is_retried_then_dead_lettered(client, auth_headers, project_id, queue, monkeypatch):
+    """Storage failures are retried up to max_attempts and then dead-lettered"""
+    def unavailable(upload, project_id):
+        raise ConnectionError("storage unavailable")
+
+    monkeypatch.setattr(DocumentUploadService, "_upload_to_storage", unavailable)
+    document_id = _upload_in_background(client, auth_headers, project_id).json()["id"]
+
+    assert queue.process_next() is True
+    status = client.get(f"/api/v1/documents/{document_id}/status", headers=auth_headers).json()
+    assert status["processing_status"] == "pending"
+    assert "storage unavailable" in status["job"]["last_error"]
+
+    assert queue.process_next() is True
+    status = client.get(f"/api/v1/documents/{document_id}/status", headers=auth_headers).json()
+    assert status["processing_status"] == "failed"
+    assert status["job"]["status"] == "dead"
+
+    dead = client.get("/api/v1/documents/ingestion/dead-letter", headers=auth_headers).json()
+    assert [job["document_id"] for job in dead] == [document_id]
+
+    response = client.post(f"/api/v1/documents/ingestion/jobs/{dead[0]['id']}/retry", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["status"] == "pending"
+    assert response.json()["attempts"] == 0
+
+
+def test_document_cannot_be_deleted_while_it_is_processed(client, auth_headers, project_id, queue, db):
+    """A running job may already have stored the file; its document stays until the job ends"""
+    document_id = _upload_in_background(client, auth_headers, project_id).json()["id"]
+    job = db.query(IngestionJob).filter(IngestionJob.document_id == document_id).one()
+    job.status = "running"
+    db.commit()
+
+    response = client.delete(f"/api/v1/documents/{document_id}", headers=auth_headers)
+    assert response.status_code == 409
+    assert os.path.exists(job.spool_path)
+    assert client.get(f"/api/v1/documents/{document_id}", headers=auth_headers).status_code == 200
+
+    # Once it is back in the queue (or dead), the document and its spooled upload go together
+    job.status = "pending"
+    db.commit()
+    assert client.delete(f"/api/v1/documents/{document_id}", headers=auth_headers).status_code == 200
+    assert os.listdir(queue.spool_dir) == []
+    assert db.query(IngestionJob).count() == 0
+    assert queue.process_next() is False
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Tests for the persistent LLM response cache
+"""
+import asyncio
+from unittest.mock import MagicMock
+
+from app.schemas.ai_services import ThemeOutput
+from app.services.ai import ai_coding_utils
+from app.services.ai.ai_coding_utils import AICodingUtils
+from app.services.ai.llm_cache import LLMResponseCache
+
+
+def _theme(name="Waiting"):
+    return ThemeOutput(reasoning="r", theme_name=name, theme_description="d", related_codes=["a"])
+
+
+def test_entries_round_trip_expire_and_count_hits(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "llm.sqlite3"), ttl_seconds=3600, max_bytes=1024 * 1024)
+    key = LLMResponseCache.key("fake", "model", "theme_generation", "prompt")
+
+    assert cache.get(key) is None
+    assert cache.put(key, _theme(), "fake", "model", "theme_generation")
+    assert cache.get(key) == _theme()
+    assert not cache.put(key, {"not": "a schema"}, "fake", "model", "theme_generation")
+    assert LLMResponseCache.key("fake", "other", "theme_generation", "prompt") != key
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert stats["hit_rate"] == 0.5
+
+    # Entries survive reopening, but not their TTL
+    reopened = LLMResponseCache(cache.path, ttl_seconds=0, max_bytes=1024 * 1024)
+    assert reopened.get(key) is None
+    assert reopened.stats()["entries"] == 0
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    size = len(_theme("x0").model_dump_json())
+    cache = LLMResponseCache(str(tmp_path / "llm.sqlite3"), ttl_seconds=3600, max_bytes=size * 4)
+    keys = [LLMResponseCache.key("fake", None, "theme_generation", str(i)) for i in range(4)]
+    for i, key in enumerate(keys):
+        cache.put(key, _theme(f"x{i}"), "fake", None, "theme_generation")
+    cache.get(keys[0])
+
+    cache.put(LLMResponseCache.key("fake", None, "theme_generation", "new"), _theme("x4"),
+              "fake", None, "theme_generation")
+
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+    assert cache.stats()["bytes"] <= size * 4 * 0.9
+    assert cache.stats()["evictions"] >= 1
+
+
+def test_llm_calls_are_served_from_the_cache_unless_bypassed(tmp_path, monkeypatch):
+    cache = LLMResponseCache(str(tmp_path / "llm.sqlite3"), ttl_seconds=3600, max_bytes=1024 * 1024)
+    monkeypatch.setattr(ai_coding_utils, "get_llm_cache", lambda: cache)
+
+    class Runnable:
+        calls = 0
+
+        def invoke(self, input_data):
+            Runnable.calls += 1
+            return _theme()
+
+        async def ainvoke(self, input_data):
+            return self.invoke(input_data)
+
+    llm_service = MagicMock(model_name="fake-model")
+    llm_service.theme_generation_llm = Runnable()
+    call = dict(llm_service=llm_service, service_type="theme_generation",
+                input_data={"codes_text": "Code: waiting"}, provider="fake")
+
+    assert AICodingUtils.make_rate_limited_llm_call(**call) == _theme()
+    assert AICodingUtils.make_rate_limited_llm_call(**call) == _theme()
+    assert asyncio.run(AICodingUtils.amake_rate_limited_llm_call(**call)) == _theme()
+    assert Runnable.calls == 1
+
+    AICodingUtils.make_rate_limited_llm_call(**call, use_cache=False)
+    assert Runnable.calls == 2
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared LLM service registry
+"""
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from app.services.ai import llm_service as llm_service_module
+from app.services.ai.llm_service import LLMService
+
+
+class _FakeChatModel:
+    built = 0
+
+    def __init__(self):
+        _FakeChatModel.built += 1
+        self.structured = []
+
+    def with_structured_output(self, schema):
+        self.structured.append(schema.__name__)
+        return RunnableLambda(lambda prompt_value: schema.__name__)
+
+
+@pytest.fixture(autouse=True)
+def fake_models(monkeypatch):
+    _FakeChatModel.built = 0
+    monkeypatch.setattr(llm_service_module, "init_chat_model", lambda **kwargs: _FakeChatModel())
+    monkeypatch.setattr(llm_service_module, "get_llm_provider_api_key", lambda provider: "key")
+    LLMService.clear_registry()
+    yield
+    LLMService.clear_registry()
+
+
+def test_instances_are_shared_and_chains_built_on_first_use():
+    service = LLMService.get(model_name="model-a", provider="fake")
+
+    assert LLMService.get(model_name="model-a", provider="fake") is service
+    assert LLMService.get(model_name="model-b", provider="fake") is not service
+    assert _FakeChatModel.built == 0
+
+    chain = service.theme_generation_llm
+    assert service.theme_generation_llm is chain
+    assert chain.invoke({"codes_text": "Code: waiting"}) == "ThemeOutput"
+    assert _FakeChatModel.built == 1
+    assert service.llm.structured == ["ThemeOutput"]
+
+    with pytest.raises(ValueError):
+        service.chain("summarising")
+
+
+def test_warm_up_builds_everything_and_stats_report_it():
+    LLMService.warm_up(model_name="model-a", provider="fake", service_types=["initial_coding", "code_grouping"])
+    LLMService.get(model_name="model-a", provider="fake")
+
+    stats = LLMService.registry_stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+    [instance] = stats["instances"]
+    assert instance["model_loaded"] is True
+    assert set(instance["chain_uses"]) == {"initial_coding", "code_grouping"}
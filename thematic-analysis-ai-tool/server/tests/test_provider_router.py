@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Tests for weighted round-robin provider routing with failover
+"""
+import asyncio
+import pytest
+
+from app.services.ai import provider_router
+from app.services.ai.ai_coding_utils import AICodingUtils
+from app.services.ai.chunk_executor import ChunkExecutor
+from app.services.ai.llm_service import LLMService
+from app.services.ai.provider_router import ProviderRoute, ProviderRouter
+from app.utils.rate_limiter import RateLimiter
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class _RateLimitError(Exception):
+    status_code = 429
+
+
+def _router(clock=None, rate_limiter=None, **kwargs):
+    clock = clock or _Clock()
+    routes = [
+        ProviderRoute.parse({"name": "gemini", "provider": "google_genai", "model": "gemini-2.0-flash", "weight": 3}),
+        ProviderRoute.parse({"name": "groq", "provider": "groq", "model": "llama-3.3-70b-versatile"}),
+    ]
+    return ProviderRouter({"google_genai": routes}, clock=clock,
+                          rate_limiter=rate_limiter or RateLimiter(clock=clock), **kwargs)
+
+
+def test_calls_are_interleaved_by_weight():
+    router = _router()
+    picks = [router.call("google_genai", lambda route: route.name) for _ in range(8)]
+
+    assert picks.count("gemini") == 6 and picks.count("groq") == 2
+    # Smooth round-robin spreads the lighter route out instead of bunching the heavy one
+    assert "gemini,gemini,gemini,gemini" not in ",".join(picks)
+    assert router.routes("openai") == []
+    with pytest.raises(ValueError):
+        ProviderRoute.parse({"provider": "groq"})
+
+
+def test_failed_calls_fail_over_and_failing_routes_rest():
+    clock = _Clock()
+    router = _router(clock, failure_threshold=2, cooldown_seconds=30)
+    down = {"gemini"}
+
+    def call(route):
+        if route.name in down:
+            raise RuntimeError("503 unavailable")
+        return route.name
+
+    assert [router.call("google_genai", call) for _ in range(4)] == ["groq"] * 4
+    # Two failures in a row: gemini rests and is tried last
+    assert router.status("google_genai")["routes"][0]["status"] == "resting"
+    assert [route.name for route in router.order("google_genai")] == ["groq", "gemini"]
+
+    down.clear()
+    clock.now += 31
+    assert "gemini" in [router.call("google_genai", call) for _ in range(4)]
+
+    down.update({"gemini", "groq"})
+    with pytest.raises(RuntimeError):
+        asyncio.run(router.acall("google_genai", lambda route: asyncio.sleep(0, call(route))))
+
+
+def test_request_errors_are_raised_at_once_without_resting_the_route():
+    router = _router(failure_threshold=1)
+    tried = []
+
+    def invalid(route):
+        tried.append(route.name)
+        raise ValueError("Output did not match MultipleCodesOutput")
+
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            router.call("google_genai", invalid)
+    # Each bad request went to one route only, and no route was put to rest for it
+    assert len(tried) == 3
+    assert all(route["status"] == "healthy" for route in router.status("google_genai")["routes"])
+
+    class _BadRequest(Exception):
+        status_code = 400
+
+    assert not ProviderRouter.is_provider_error(_BadRequest("400 prompt is too long, 500 tokens over"))
+    assert ProviderRouter.is_provider_error(_RateLimitError("slow down"))
+    assert ProviderRouter.is_provider_error(RuntimeError("Error code: 503 - overloaded"))
+    assert ProviderRouter.is_provider_error(TimeoutError())
+
+
+def test_routes_without_quota_are_skipped_until_all_are_spent():
+    clock = _Clock()
+    rate_limiter = RateLimiter(max_attempts=1, clock=clock)
+    router = _router(clock, rate_limiter)
+
+    def exhaust():
+        raise _RateLimitError("429 quota exceeded")
+
+    with pytest.raises(Exception):
+        rate_limiter.call_with_backoff("gemini", exhaust)
+    assert [router.call("google_genai", lambda route: route.name) for _ in range(3)] == ["groq"] * 3
+    assert router.status("google_genai")["quota_exhausted"] is False
+
+    with pytest.raises(Exception):
+        rate_limiter.call_with_backoff("groq", exhaust)
+    assert router.status("google_genai")["quota_exhausted"] is True
+
+
+def test_pipeline_calls_are_routed_and_pools_run_all_routes_at_once(monkeypatch):
+    routes = [ProviderRoute.parse({"name": "fake-a", "provider": "local_fake", "model": "a", "weight": 2}),
+              ProviderRoute.parse({"name": "fake-b", "provider": "local_fake", "model": "b"})]
+    monkeypatch.setattr(provider_router, "_provider_router", ProviderRouter({"google_genai": routes}))
+    LLMService.clear_registry()
+    input_data = {"research_context": "", "existing_codes": "", "text": "The waiting room was crowded today."}
+
+    for _ in range(3):
+        result = AICodingUtils.make_rate_limited_llm_call(
+            None, "initial_coding", input_data, provider="google_genai", use_cache=False)
+        assert result.codes
+    calls = {route.model: AICodingUtils.route_llm_service(route).llm.calls for route in routes}
+    assert calls == {"a": 2, "b": 1}
+    assert AICodingUtils.get_rate_limit_status("google_genai")["quota_exhausted"] is False
+    LLMService.clear_registry()
+
+    executor = ChunkExecutor(default_limit=4, provider_limits={"fake-b": 2},
+                             pools={"google_genai": ["fake-a", "fake-b"]})
+    assert executor.limit("google_genai") == 6
+    assert executor.limit("fake-a") == 4
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Tests for placing AI quotes at absolute document offsets
+"""
+import pytest
+
+from app.models.document import Document, DocumentType
+from app.models.project import Project
+from app.services.ai.ai_coding_service import AICodingService
+from app.services.ai.llm_service import LLMService
+from app.services.ai.quote_alignment import QuoteAligner
+from app.utils.chunks import chunk_starts, create_chunks
+
+TEXT = (
+    "Interviewer: Tell me about your last visit.\n"
+    "Participant: The waiting room was crowded and   nobody explained\nthe delay to us.\n"
+    "Participant: I said “it’s fine” but honestly it wasn’t fine at all.\n"
+    "Interviewer: And the staff?\n"
+    "Participant: The nurses listened carefully to every single worry we raised that day.\n"
+)
+
+
+def test_quotes_differing_in_spacing_or_quote_marks_are_placed_exactly():
+    aligner = QuoteAligner(TEXT)
+
+    start, end = aligner.locate("the waiting room was crowded and nobody explained the delay", 0, len(TEXT))
+    assert TEXT[start:end] == "The waiting room was crowded and   nobody explained\nthe delay"
+
+    start, end = aligner.locate('I said "it\'s fine" but honestly', 0, len(TEXT))
+    assert TEXT[start:end] == "I said “it’s fine” but honestly"
+    assert aligner.stats["exact"] == 2
+
+
+def test_paraphrased_quotes_are_placed_by_their_trigrams():
+    aligner = QuoteAligner(TEXT)
+
+    # Elided and slightly reworded, as models do
+    quote = "The nurses listened carefully to every worry we raised that day"
+    start, end = aligner.locate(quote, 0, len(TEXT))
+    assert TEXT[start:end] == "The nurses listened carefully to every single worry we raised that day"
+    assert aligner.stats["fuzzy"] == 1
+
+    # Nothing like it in the text: the chunk's span
+    assert aligner.locate("the parking was impossible to find", 10, 50) == (10, 50)
+    assert aligner.locate("", 10, 50) == (10, 50)
+    assert aligner.stats["unplaced"] == 1
+
+
+def test_the_quotes_own_chunk_is_searched_first():
+    sentence = "We waited for hours without any news. "
+    text = sentence * 3
+    aligner = QuoteAligner(text)
+
+    second = (len(sentence), 2 * len(sentence))
+    assert aligner.locate("we waited for hours", *second)[0] == len(sentence)
+    assert aligner.locate("we waited for hours without news", *second)[0] == len(sentence)
+    # Not in the chunk given, but elsewhere in the document
+    assert aligner.locate("any news. We waited", 0, 20)[0] == text.index("any news. We waited")
+
+
+def test_chunk_starts_are_absolute_offsets():
+    text = "\n".join(f"Participant {index}: the appointment was moved again." for index in range(300))
+    chunks = create_chunks(text, chunk_size=800)
+    starts = chunk_starts(text, chunks)
+
+    assert len(chunks) > 3
+    assert all(text[start:start + len(chunk)] == chunk for chunk, start in zip(chunks, starts))
+    assert starts == sorted(starts)
+
+
+@pytest.fixture
+def fresh_registry():
+    LLMService.clear_registry()
+    yield
+    LLMService.clear_registry()
+
+
+def test_coded_quotes_point_into_the_whole_document(db, test_user, fresh_registry):
+    content = "".join(
+        f"Participant {index}: The clinic moved my appointment {index} times and nobody called.\n"
+        for index in range(150)
+    )
+    project = Project(title="Offsets", owner_id=test_user["id"])
+    db.add(project)
+    db.flush()
+    document = Document(name="long.txt", document_type=DocumentType.TEXT, content=content,
+                        project_id=project.id, uploaded_by_id=test_user["id"])
+    db.add(document)
+    db.commit()
+
+    response = AICodingService.generate_code(
+        [document.id], db, test_user["id"], model_name="fake", provider="local_fake", use_cache=False)
+
+    results = [result["code_assignment"] for result in response["results"]]
+    assert len(create_chunks(content, chunk_size=4000)) > 1
+    assert results
+    assert all(content[result["start_char"]:result["end_char"]] == result["text"] for result in results)
+    # Quotes of later chunks sit past the first chunk, not at chunk-relative offsets
+    assert max(result["start_char"] for result in results) > 4000
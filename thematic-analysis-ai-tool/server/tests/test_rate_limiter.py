@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Tests for the token-bucket LLM rate limiter
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.utils.rate_limiter import RateLimiter
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _fast_limiter(**kwargs):
+    return RateLimiter(max_attempts=3, base_delay=0.001, max_delay=0.01, **kwargs)
+
+
+def test_requests_and_tokens_are_paced_by_their_buckets():
+    clock = _Clock()
+    limiter = RateLimiter(limits={
+        "fake": {"rpm": 120, "tpm": 6000},
+        "fake:small": {"rpm": 6},
+    }, clock=clock)
+
+    # A minute's worth of requests goes straight through, then two a second
+    assert all(limiter.reserve("fake") == 0 for _ in range(120))
+    assert limiter.reserve("fake") == pytest.approx(0.5)
+    assert limiter.reserve("fake") == pytest.approx(1.0)
+    clock.now += 1.0
+    assert limiter.reserve("fake") == pytest.approx(0.5)
+
+    # Tokens are budgeted separately, and a model's limit applies on top of the provider's
+    clock.now += 120
+    assert limiter.reserve("fake", tokens=6000) == 0
+    assert limiter.reserve("fake", tokens=1000) == pytest.approx(10.0)
+    clock.now += 120
+    assert all(limiter.reserve("fake", "small") == 0 for _ in range(6))
+    assert limiter.reserve("fake", "small") == pytest.approx(10.0)
+    assert limiter.reserve("other") == 0
+
+
+def test_retry_after_pauses_the_provider():
+    clock = _Clock()
+    limiter = RateLimiter(max_attempts=3, max_delay=60, clock=clock)
+    error = Exception("Too Many Requests")
+    error.response = SimpleNamespace(status_code=429, headers={"retry-after": "20"})
+
+    assert limiter._record_failure("fake", 1, error) == 0
+    status = limiter.get_status("fake")
+    # A short pause is waited out, not reported as an exhausted quota
+    assert status["quota_exhausted"] is False
+    assert status["status"] == "backing_off"
+    assert 20 <= status["next_delay_seconds"] <= 22
+    assert 20 <= limiter.reserve("fake") <= 22
+    assert limiter.reserve("other") == 0
+
+    clock.now += 30
+    limiter._record_success("fake")
+    assert limiter.get_status("fake")["status"] == "healthy"
+    assert RateLimiter._retry_after(Exception("Quota exceeded. Please retry in 33.5s.")) == 33.5
+
+
+def test_only_real_exhaustion_is_reported():
+    clock = _Clock()
+    limiter = RateLimiter(max_attempts=3, max_delay=60, clock=clock)
+    daily = Exception("Daily quota exceeded")
+    daily.retry_after = 3600
+
+    # A pause longer than max_delay lasts until the API said
+    limiter._record_failure("fake", 1, daily)
+    assert limiter.get_status("fake")["quota_exhausted"] is True
+    assert 60 <= limiter.reserve("fake") <= 66
+    clock.now += 3601
+    assert limiter.get_status("fake")["quota_exhausted"] is False
+
+    # Running out of attempts lasts until a call succeeds
+    with pytest.raises(Exception, match="Max attempts"):
+        limiter._record_failure("fake", 3, Exception("429 Too Many Requests"))
+    assert limiter.get_status("fake")["quota_exhausted"] is True
+    limiter._record_success("fake")
+    assert limiter.get_status("fake")["quota_exhausted"] is False
+
+
+def test_async_backoff_retries_rate_limit_errors():
+    limiter = _fast_limiter()
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise Exception("429 Too Many Requests")
+        return "ok"
+
+    assert asyncio.run(limiter.acall_with_backoff("fake", flaky)) == "ok"
+    assert len(calls) == 3
+    assert limiter.get_status("fake")["status"] == "healthy"
+
+
+def test_backoff_reraises_other_errors_and_gives_up():
+    limiter = _fast_limiter()
+    calls = []
+
+    def broken():
+        calls.append(1)
+        raise KeyError("missing field")
+
+    with pytest.raises(KeyError):
+        limiter.call_with_backoff("fake", broken)
+    assert len(calls) == 1
+
+    async def limited():
+        raise Exception("quota exceeded")
+
+    with pytest.raises(Exception, match="Max attempts"):
+        asyncio.run(limiter.acall_with_backoff("other", limited))
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Tests for the object storage backends and the deletion outbox
+"""
+import pytest
+
+from app.models.document import Document, DocumentType
+from app.models.storage_deletion import StorageDeletion
+from app.services.document.ingestion import SpooledUpload
+from app.services.document.upload import DocumentUploadService
+from app.services.storage import LocalStorage, StorageDeletionOutbox, run_storage
+from app.services.storage import factory
+
+
+def test_local_storage_round_trip(tmp_path):
+    """Files put into local storage can be read back and deleted"""
+    storage = LocalStorage(str(tmp_path / "store"), base_url="http://files.local/")
+    source = tmp_path / "upload.txt"
+    source.write_bytes(b"from disk")
+
+    stored = run_storage(storage.put("documents/1/abc", b"in memory"))
+    assert stored.url == "http://files.local/documents/1/abc"
+    assert run_storage(storage.get("documents/1/abc")) == b"in memory"
+
+    run_storage(storage.put("documents/1/abc", str(source)))
+    assert run_storage(storage.get("documents/1/abc")) == b"from disk"
+
+    run_storage(storage.delete("documents/1/abc"))
+    run_storage(storage.delete("documents/1/abc"))
+    assert not (tmp_path / "store" / "documents/1/abc").exists()
+
+
+def test_local_storage_rejects_keys_outside_root(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+
+    with pytest.raises(ValueError):
+        run_storage(storage.put("../escape", b"x"))
+
+
+def test_outbox_skips_objects_still_referenced(client, db, auth_headers, test_user, tmp_path, monkeypatch):
+    """A key reused by a newer document is not deleted"""
+    storage = LocalStorage(str(tmp_path))
+    monkeypatch.setitem(factory._backends, "local", storage)
+    run_storage(storage.put("documents/1/shared", b"content"))
+    project = client.post("/api/v1/projects/", json={"title": "Outbox"}, headers=auth_headers).json()
+    db.add(Document(
+        name="reuser.txt", document_type=DocumentType.TEXT, content="content",
+        cloudinary_public_id="documents/1/shared", storage_backend="local",
+        project_id=project["id"], uploaded_by_id=test_user["id"]))
+    db.add(StorageDeletion(object_key="documents/1/shared", backend="local"))
+    db.commit()
+
+    outbox = StorageDeletionOutbox(poll_seconds=0, max_attempts=3, workers=0)
+    outbox.start(db.get_bind())
+
+    assert outbox.drain_once() == 1
+    assert db.query(StorageDeletion).count() == 0
+    assert run_storage(storage.get("documents/1/shared")) == b"content"
+
+
+def test_outbox_retries_failed_deletes(db, tmp_path, monkeypatch):
+    """Failed deletes stay queued with backoff until max_attempts"""
+    class BrokenStorage(LocalStorage):
+        async def delete(self, key):
+            raise ConnectionError("storage down")
+
+    monkeypatch.setitem(factory._backends, "local", BrokenStorage(str(tmp_path)))
+    db.add(StorageDeletion(object_key="documents/1/gone", backend="local"))
+    db.commit()
+
+    outbox = StorageDeletionOutbox(poll_seconds=0, max_attempts=2, workers=0)
+    outbox.start(db.get_bind())
+
+    assert outbox.drain_once() == 1
+    row = db.query(StorageDeletion).one()
+    db.refresh(row)
+    assert row.attempts == 1
+    assert "storage down" in row.last_error
+
+    assert outbox.drain_once() == 1
+    assert db.query(StorageDeletion).count() == 0
+
+
+def test_uploads_do_not_share_keys_and_deletions_wait(db, tmp_path, monkeypatch):
+    """A queued deletion cannot remove an object that a new upload has just written"""
+    storage = LocalStorage(str(tmp_path))
+    monkeypatch.setitem(factory._backends, "local", storage)
+    monkeypatch.setattr(factory.settings, "STORAGE_BACKEND", "local")
+    upload = SpooledUpload.from_bytes(b"same file", "interview.txt")
+
+    first, _ = DocumentUploadService._upload_to_storage(upload, 1)
+    second, _ = DocumentUploadService._upload_to_storage(upload, 1)
+    assert first != second
+    assert first.startswith(f"documents/1/{upload.file_hash}")
+
+    # The deletion of the first object is not due within the grace period
+    outbox = StorageDeletionOutbox(poll_seconds=0, max_attempts=3, workers=0, grace_seconds=60)
+    outbox.start(db.get_bind())
+    outbox.enqueue(db, first, "local")
+    db.commit()
+    assert outbox.drain_once() == 0
+    assert run_storage(storage.get(first)) == b"same file"
+    assert run_storage(storage.get(second)) == b"same file"
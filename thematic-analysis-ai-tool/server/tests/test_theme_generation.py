@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Tests for map-reduce theme generation from deduplicated, sampled codes
+"""
+import asyncio
+import re
+
+from app.core.config import settings
+from app.models.theme import Theme
+from app.schemas.ai_theme_generation import CodeAssignment
+from app.services.ai.ai_theme_generation import AIThemeGenerationService
+from app.services.ai.llm_service import LLMService
+
+
+def _assignments(topics, project_id, codes_per_topic, uses_per_code=5):
+    assignments, code_id = [], 0
+    for topic, description in topics.items():
+        for i in range(codes_per_topic):
+            code_id += 1
+            for use in range(uses_per_code):
+                snapshot = f"Participant {use} talked about {description} ({i})."
+                assignments.append(CodeAssignment(
+                    code_id=code_id, document_id=use % 2 + 1, project_id=project_id,
+                    text=f"Code: {topic} code {i}\n\nText snapshot from the documents: {snapshot}",
+                    code_name=f"{topic} code {i}", code_description=description, text_snapshot=snapshot))
+    return assignments
+
+
+def test_codes_are_deduplicated_with_sampled_snippets(monkeypatch, topics):
+    monkeypatch.setattr(settings, "AI_THEME_SNIPPETS_PER_CODE", 2)
+    monkeypatch.setattr(settings, "AI_THEME_SNIPPET_CHARS", 30)
+    assignments = _assignments(topics, 1, 1, uses_per_code=6)
+    # Repeated snippets count as assignments but are sampled once
+    assignments += [assignments[0]] * 3
+
+    codes = AIThemeGenerationService._code_summaries(assignments)
+
+    assert [code["code_id"] for code in codes] == [1, 2, 3]
+    assert [code["count"] for code in codes] == [9, 6, 6]
+    for code in codes:
+        assert len(code["snippets"]) == 2
+        assert len(set(code["snippets"])) == 2
+        assert all(len(snippet) <= 33 for snippet in code["snippets"])
+
+    # One snippet per document comes before a second from the same document
+    snippets = [(1, "waiting in the queue"), (1, "waiting in the long queue"), (2, "the queue at the desk")]
+    sampled = AIThemeGenerationService._sample_snippets(snippets, 2)
+    assert "the queue at the desk" in sampled
+
+
+def test_themes_are_generated_per_partition_and_consolidated(client, db, test_user, auth_headers, monkeypatch,
+                                                             recording_llm_service, topics):
+    monkeypatch.setattr(settings, "AI_THEME_MAX_CODES_PER_PROMPT", 4)
+    monkeypatch.setattr(settings, "AI_THEME_MAX_CANDIDATES_PER_PROMPT", 4)
+    monkeypatch.setattr(settings, "AI_THEME_SNIPPETS_PER_CODE", 2)
+    llm_service = recording_llm_service()
+    monkeypatch.setattr(LLMService, "get", staticmethod(lambda **kwargs: llm_service))
+    project = client.post("/api/v1/projects/", json={"title": "Themes"}, headers=auth_headers).json()
+    assignments = _assignments(topics, project["id"], 4)
+
+    themes = AIThemeGenerationService.generate_themes_in_memory(
+        assignments, db, test_user["id"], provider="fake")
+
+    # Every code appears once, in a prompt of bounded size
+    candidate_calls = llm_service.calls["theme_candidates"]
+    assert len(candidate_calls) >= 3
+    assert all(call["code_count"] <= 4 for call in candidate_calls)
+    listed = [int(code_id) for call in candidate_calls
+              for code_id in re.findall(r"^Code ID (\d+):", call["codes_text"], re.M)]
+    assert sorted(listed) == list(range(1, 13))
+    assert all(call["codes_text"].count("Participant") <= 2 * call["code_count"] for call in candidate_calls)
+
+    # Candidates of the same topic from different partitions end up as one theme
+    assert llm_service.calls["theme_consolidation"]
+    assert sorted(theme.name for theme in themes) == ["Cost theme", "Staff theme", "Waiting theme"]
+    for theme in themes:
+        topic = theme.name.split()[0].lower()
+        assert len(theme.related_code_ids) == 4
+        assert all(name.startswith(topic) for name in theme.related_codes)
+    assert db.query(Theme).filter(Theme.project_id == project["id"]).count() == 3
+
+
+def test_async_generation_uses_one_call_for_small_codebooks(client, db, test_user, auth_headers, monkeypatch,
+                                                            recording_llm_service, topics):
+    def invent_code_ids(input_data):
+        output = llm_service.base.theme_candidates_llm.invoke(input_data)
+        for theme in output.themes:
+            theme.related_code_ids.append(9999)
+        return output
+
+    llm_service = recording_llm_service(theme_candidates=invent_code_ids)
+    monkeypatch.setattr(LLMService, "get", staticmethod(lambda **kwargs: llm_service))
+    project = client.post("/api/v1/projects/", json={"title": "Themes"}, headers=auth_headers).json()
+
+    themes = asyncio.run(AIThemeGenerationService.agenerate_themes_in_memory(
+        _assignments(topics, project["id"], 2), db, test_user["id"], provider="fake"))
+
+    assert len(llm_service.calls["theme_candidates"]) == 1
+    assert llm_service.calls["theme_consolidation"] == []
+    assert len(themes) == 3
+    # Code IDs the model invented are dropped
+    assert all(9999 not in theme.related_code_ids for theme in themes)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Tests for streaming upload ingestion and the in-flight byte budgets
+"""
+import io
+import os
+import asyncio
+import hashlib
+from fastapi import UploadFile
+
+from app.core.config import settings
+from app.models.document import DocumentType
+from app.services.document.extraction import DocumentExtractionEngine
+from app.services.document.ingestion import UploadByteBudget, UploadIngestionService
+
+
+def test_small_upload_stays_in_memory():
+    """Uploads under the spool memory limit are kept as bytes"""
+    data = b"a short transcript"
+    file = UploadFile(io.BytesIO(data), filename="short.txt")
+
+    upload = asyncio.run(UploadIngestionService.spool(file))
+
+    assert not upload.on_disk
+    assert upload.source == data
+    assert upload.size == len(data)
+    assert upload.file_hash == hashlib.sha256(data).hexdigest()
+
+
+def test_large_upload_is_spooled_to_disk_and_hashed_incrementally(monkeypatch):
+    """Uploads over the memory limit go to a temp file that parsers read by path"""
+    monkeypatch.setattr(settings, "DOCUMENT_UPLOAD_SPOOL_MEMORY_BYTES", 16)
+    monkeypatch.setattr(settings, "DOCUMENT_UPLOAD_CHUNK_BYTES", 10)
+    data = "\n".join(f"line {i}" for i in range(50)).encode()
+    file = UploadFile(io.BytesIO(data), filename="long.txt")
+
+    with asyncio.run(UploadIngestionService.spool(file)) as upload:
+        path = upload.path
+        assert upload.on_disk
+        assert upload.file_hash == hashlib.sha256(data).hexdigest()
+        with upload.open() as stream:
+            assert stream.read() == data
+        from_path = DocumentExtractionEngine.extract(upload.source, DocumentType.TEXT, "long.txt")
+        assert from_path == DocumentExtractionEngine.extract(data, DocumentType.TEXT, "long.txt")
+
+    assert not os.path.exists(path)
+
+
+def test_upload_over_file_limit_is_rejected(monkeypatch):
+    """Files over the per-file limit fail before they are fully read"""
+    monkeypatch.setattr(settings, "DOCUMENT_UPLOAD_MAX_FILE_BYTES", 8)
+    file = UploadFile(io.BytesIO(b"0123456789"), filename="big.txt")
+
+    try:
+        asyncio.run(UploadIngestionService.spool(file))
+        assert False, "expected ValueError"
+    except ValueError as e:
+        assert "too large" in str(e)
+
+
+def test_byte_budget_applies_backpressure():
+    """A reservation waits until earlier ones release; oversized ones run alone"""
+    budget = UploadByteBudget(10)
+    events = []
+
+    async def hold(name, nbytes, delay):
+        async with budget.reserve(nbytes):
+            events.append(f"start {name}")
+            await asyncio.sleep(delay)
+            events.append(f"end {name}")
+
+    async def scenario():
+        first = asyncio.create_task(hold("a", 6, 0.05))
+        await asyncio.sleep(0)
+        await asyncio.gather(first, hold("b", 6, 0), hold("c", 25, 0))
+
+    asyncio.run(scenario())
+
+    assert events[:2] == ["start a", "end a"]
+    assert sorted(events[2:]) == ["end b", "end c", "start b", "start c"]
+    assert budget.in_flight == 0
+
+
+def test_upload_endpoint_returns_413_for_oversized_file(client, auth_headers, monkeypatch):
+    """The upload endpoint rejects oversized files with 413"""
+    project = client.post("/api/v1/projects/", json={"title": "Limits"},
+                          headers=auth_headers).json()
+    monkeypatch.setattr(settings, "DOCUMENT_UPLOAD_MAX_FILE_BYTES", 4)
+
+    response = client.post(
+        "/api/v1/documents/",
+        files={"file": ("big.txt", io.BytesIO(b"too many bytes"), "text/plain")},
+        data={"project_id": project["id"]},
+        headers=auth_headers
+    )
+
+    assert response.status_code == 413